@@ -0,0 +1,385 @@
+"""
+负载测试基准 - 在模拟模型和搜索服务上测量API吞吐量和延迟
+
+用法:
+    uv run python benchmarks/load.py --concurrency 1,8,32 --requests 200
+        --output run.json
+    uv run python benchmarks/load.py --compare baseline.json --output run.json
+
+脚本先启动模拟服务（benchmarks/mock_services.py），再以子进程方式启动API服务并把模型和
+Tavily地址指向模拟服务，然后按给定并发数依次压测 /chat、/agent/invoke 和 /graph/invoke，
+输出每个端点的吞吐量和 p50/p95/p99 延迟。结果保存为JSON，提供 --compare 时与基线对比，
+延迟或吞吐量退化超过 --max-regression 时以非零状态退出。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_services import add_config_arguments, config_from_args  # noqa: E402
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 用户消息模板，序号不同使模拟服务的工具调用决策分布均匀
+PROMPTS = [
+    "北京今天天气怎么样？",
+    "帮我算一下 12 * (3 + 4)",
+    "介绍一下LangChain",
+    "最近有什么科技新闻？",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(url: str, timeout: float = 60.0) -> None:
+    """轮询直到服务可以响应"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"服务未在{timeout}秒内就绪: {url}")
+
+
+@contextmanager
+def spawn(
+    args: List[str], ready_url: str, env: Optional[Dict[str, str]] = None
+) -> Iterator[None]:
+    """启动子进程并等待就绪，退出时终止"""
+    proc = subprocess.Popen(args, cwd=PROJECT_ROOT, env=env)
+    try:
+        wait_until_ready(ready_url)
+        yield
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def app_env(mock_url: str, workdir: str, args: argparse.Namespace) -> Dict[str, str]:
+    """API服务子进程的环境变量：模型、搜索和天气指向模拟服务，状态文件放在临时目录"""
+    env = dict(os.environ)
+    env.update({
+        "SILICONFLOW_API_KEY": "benchmark",
+        "SILICONFLOW_BASE_URL": f"{mock_url}/v1",
+        "TAVILY_API_KEY": "benchmark",
+        "TAVILY_BASE_URL": mock_url,
+        "WEATHER_BASE_URL": mock_url,
+        "LANGSMITH_TRACING": "false",
+        "LLM_CACHE_ENABLED": "true" if args.cache else "false",
+        "TOOL_CACHE_ENABLED": "true" if args.cache else "false",
+        "LLM_CACHE_PATH": os.path.join(workdir, "llm_cache.sqlite"),
+        "GRAPH_CHECKPOINT_PATH": os.path.join(workdir, "checkpoints.sqlite"),
+        "STATE_SQLITE_PATH": os.path.join(workdir, "state.sqlite"),
+        "WEATHER_CACHE_PATH": os.path.join(workdir, "weather.sqlite"),
+        "GRAPH_STORE_PATH": os.path.join(workdir, "store"),
+        # memmap存储文件只能由一个进程打开
+        "GRAPH_STORE": "memmap" if args.workers == 1 else "memory",
+        "LOG_LEVEL": "WARNING",
+        "PRELOAD": "true",
+    })
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    return env
+
+
+def build_request(
+    endpoint: str, index: int, sessions: int
+) -> Tuple[str, Dict[str, Any]]:
+    """构造第index个请求的路径和请求体"""
+    text = f"[{index}] {PROMPTS[index % len(PROMPTS)]}"
+    if endpoint == "chat":
+        body: Dict[str, Any] = {"message": text}
+        if sessions:
+            body["session_id"] = f"bench-{index % sessions}"
+        return "/chat", body
+    if endpoint == "agent":
+        return "/agent/invoke", {"input": {"message": text}}
+    if endpoint == "graph":
+        messages = [{"type": "human", "content": text}]
+        return "/graph/invoke", {"input": {"messages": messages}}
+    raise ValueError(f"未知端点: {endpoint}")
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """线性插值计算百分位数，sorted_values需已排序"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    fraction = position - lower
+    spread = sorted_values[upper] - sorted_values[lower]
+    return sorted_values[lower] + spread * fraction
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    """汇总一组请求的吞吐量和延迟（毫秒）"""
+    values = sorted(latency * 1000 for latency in latencies)
+    return {
+        "requests": len(values) + errors,
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(values) / elapsed, 3) if elapsed > 0 else 0.0,
+        "latency_ms": {
+            "mean": round(statistics.fmean(values), 2) if values else 0.0,
+            "p50": round(percentile(values, 0.50), 2),
+            "p95": round(percentile(values, 0.95), 2),
+            "p99": round(percentile(values, 0.99), 2),
+            "max": round(values[-1], 2) if values else 0.0,
+        },
+    }
+
+
+async def drive(
+    base_url: str,
+    endpoint: str,
+    concurrency: int,
+    requests: int,
+    sessions: int,
+    offset: int = 0,
+) -> Dict[str, Any]:
+    """以固定并发数发送requests个请求"""
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(offset, offset + requests))
+    limits = httpx.Limits(
+        max_connections=concurrency, max_keepalive_connections=concurrency
+    )
+
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=300.0
+    ) as client:
+
+        async def worker() -> None:
+            nonlocal errors
+            for index in counter:
+                path, body = build_request(endpoint, index, sessions)
+                start = time.perf_counter()
+                try:
+                    response = await client.post(path, json=body)
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return summarize(latencies, errors, elapsed)
+
+
+def compare_reports(
+    baseline: Dict[str, Any], current: Dict[str, Any], max_regression: float
+) -> List[Dict[str, Any]]:
+    """
+    逐项对比两次运行
+
+    Returns:
+        每个(端点, 并发数)的对比结果，
+            p95延迟上升或吞吐量下降超过max_regression时regressed为True
+    """
+    previous = {
+        (r["endpoint"], r["concurrency"]): r for r in baseline.get("results", [])
+    }
+    rows = []
+    for result in current.get("results", []):
+        base = previous.get((result["endpoint"], result["concurrency"]))
+        if base is None:
+            continue
+        row: Dict[str, Any] = {
+            "endpoint": result["endpoint"],
+            "concurrency": result["concurrency"],
+        }
+        for key in ("p50", "p95", "p99"):
+            old, new = base["latency_ms"][key], result["latency_ms"][key]
+            row[key] = (new - old) / old if old else 0.0
+        old, new = base["throughput_rps"], result["throughput_rps"]
+        row["throughput"] = (new - old) / old if old else 0.0
+        row["regressed"] = (
+            row["p95"] > max_regression or row["throughput"] < -max_regression
+        )
+        rows.append(row)
+    return rows
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=PROJECT_ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_all(args: argparse.Namespace, base_url: str) -> List[Dict[str, Any]]:
+    results = []
+    offset = 0
+    for endpoint in args.endpoints.split(","):
+        if args.warmup:
+            asyncio.run(
+                drive(base_url, endpoint, 1, args.warmup, args.sessions, offset)
+            )
+            offset += args.warmup
+        for concurrency in (int(c) for c in args.concurrency.split(",")):
+            summary = asyncio.run(
+                drive(
+                    base_url,
+                    endpoint,
+                    concurrency,
+                    args.requests,
+                    args.sessions,
+                    offset,
+                )
+            )
+            offset += args.requests
+            results.append(
+                {"endpoint": endpoint, "concurrency": concurrency, **summary}
+            )
+            latency = summary["latency_ms"]
+            print(
+                f"  {endpoint:<6} c={concurrency:<4} "
+                f"{summary['throughput_rps']:>8.2f} req/s  "
+                f"p50 {latency['p50']:>8.1f}  p95 {latency['p95']:>8.1f}  "
+                f"p99 {latency['p99']:>8.1f} ms  "
+                f"errors {summary['errors']}"
+            )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="在模拟服务上压测API")
+    parser.add_argument(
+        "--endpoints",
+        default="chat,agent,graph",
+        help="要压测的端点，逗号分隔（chat、agent、graph）",
+    )
+    parser.add_argument("--concurrency", default="8", help="并发数，逗号分隔时依次测量")
+    parser.add_argument(
+        "--requests", type=int, default=100, help="每个端点、每个并发数发送的请求数"
+    )
+    parser.add_argument(
+        "--warmup", type=int, default=3, help="每个端点正式测量前的预热请求数"
+    )
+    parser.add_argument(
+        "--sessions", type=int, default=0, help="/chat使用的会话数，0表示不带session_id"
+    )
+    parser.add_argument("--workers", type=int, default=1, help="API服务的工作进程数")
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="保留LLM和工具结果缓存（默认关闭以测量真实开销）",
+    )
+    parser.add_argument(
+        "--env",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="传给API服务的额外环境变量",
+    )
+    parser.add_argument("--app-url", help="压测已运行的服务，不再启动模拟服务和API服务")
+    parser.add_argument("--output", help="将结果保存为JSON文件")
+    parser.add_argument("--compare", help="与之前保存的JSON结果对比")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.1,
+        help="允许的p95延迟上升或吞吐量下降比例",
+    )
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    mock_config = config_from_args(args)
+    if args.app_url:
+        results = run_all(args, args.app_url)
+    else:
+        mock_port, app_port = free_port(), free_port()
+        mock_url = f"http://127.0.0.1:{mock_port}"
+        app_url = f"http://127.0.0.1:{app_port}"
+        mock_args = [
+            sys.executable, "benchmarks/mock_services.py", "--port", str(mock_port),
+            "--ttft", str(args.ttft),
+            "--tokens-per-second", str(args.tokens_per_second),
+            "--output-tokens", str(args.output_tokens),
+            "--tool-call-ratio", str(args.tool_call_ratio),
+            "--tool-rounds", str(args.tool_rounds),
+            "--parallel-tool-calls", str(args.parallel_tool_calls),
+            "--tools", args.tools, "--search-latency", str(args.search_latency),
+        ]
+        app_args = [
+            sys.executable, "-m", "uvicorn", "src.agent_1.server:app",
+            "--host", "127.0.0.1", "--port", str(app_port),
+            "--workers", str(args.workers), "--log-level", "warning", "--no-access-log",
+        ]
+        with tempfile.TemporaryDirectory() as workdir:
+            with spawn(mock_args, f"{mock_url}/v1/models"):
+                with spawn(app_args, f"{app_url}/", app_env(mock_url, workdir, args)):
+                    print(
+                        f"API服务: {app_url}  模拟服务: {mock_url}  "
+                        f"工作进程: {args.workers}"
+                    )
+                    results = run_all(args, app_url)
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": git_commit(),
+        "config": {
+            "endpoints": args.endpoints,
+            "requests": args.requests,
+            "sessions": args.sessions,
+            "workers": args.workers,
+            "cache": args.cache,
+            "mock": vars(mock_config),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare_reports(baseline, report, args.max_regression)
+        print(f"\n与基线对比 ({args.compare}, 提交 {baseline.get('git_commit')}):")
+        for row in rows:
+            flag = "  退化" if row["regressed"] else ""
+            print(
+                f"  {row['endpoint']:<6} c={row['concurrency']:<4} "
+                f"吞吐量 {row['throughput']:+7.1%}  "
+                f"p50 {row['p50']:+7.1%}  p95 {row['p95']:+7.1%}  "
+                f"p99 {row['p99']:+7.1%}{flag}"
+            )
+        if any(row["regressed"] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""
+模拟服务 - 兼容OpenAI接口的模型服务和Tavily搜索服务，供负载测试使用
+
+用法:
+    uv run python benchmarks/mock_services.py --port 9100 --ttft 0.2
+        --tokens-per-second 50
+
+提供三个端点：
+    POST /v1/chat/completions  兼容OpenAI的聊天补全（支持stream），可按比例返回工具调用
+    GET  /v1/models            模型列表
+    POST /search               兼容Tavily的搜索接口
+    GET  /v1/forecast          兼容Open-Meteo的当前天气接口（支持逗号分隔的多组坐标）
+
+模型响应耗时 = 首token延迟 + 输出token数 / 生成速率；流式请求按生成速率逐个推送token。
+同一条用户消息总是得到相同的决策（是否调用工具、调用哪个工具），便于多次运行之间对比。
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# 各工具的调用参数，query参数使用用户消息填充
+TOOL_ARGUMENTS: Dict[str, Dict[str, str]] = {
+    "calculator": {"expression": "12 * (3 + 4)"},
+    "get_weather": {"city": "北京"},
+    "tavily_search": {"query": ""},
+}
+
+
+@dataclass
+class MockConfig:
+    """模拟服务的行为配置"""
+
+    ttft: float = 0.2  # 首token延迟（秒）
+    tokens_per_second: float = 50.0  # 生成速率，0表示不限速
+    output_tokens: int = 40  # 最终回复的token数
+    tool_call_ratio: float = 0.5  # 需要调用工具的用户消息比例
+    tool_rounds: int = 1  # 每轮对话连续调用工具的次数
+    parallel_tool_calls: int = 1  # 每次同时调用的工具数
+    tools: List[str] = field(
+        default_factory=lambda: ["get_weather", "calculator", "tavily_search"]
+    )
+    search_latency: float = 0.3  # 搜索接口延迟（秒）
+    search_results: int = 5  # 每次搜索返回的结果数
+    weather_latency: float = 0.1  # 天气接口延迟（秒）
+
+
+def _fraction(text: str) -> float:
+    """把文本稳定地映射到[0, 1)区间"""
+    digest = hashlib.sha1(text.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2**64
+
+
+def _last_user_turn(messages: List[Dict[str, Any]]) -> tuple:
+    """返回最后一条用户消息的内容，以及它之后已经完成的工具调用次数"""
+    rounds = 0
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            content = message.get("content")
+            if isinstance(content, list):
+                content = " ".join(
+                    part.get("text", "") for part in content if isinstance(part, dict)
+                )
+            return str(content or ""), rounds
+        if message.get("role") == "assistant" and message.get("tool_calls"):
+            rounds += 1
+    return "", rounds
+
+
+class MockServices:
+    """根据配置生成模型和搜索响应"""
+
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.counters: Dict[str, int] = {
+            "chat": 0,
+            "tool_calls": 0,
+            "search": 0,
+            "weather": 0,
+        }
+
+    def plan_tool_calls(self, body: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """决定本次请求要返回的工具调用，空列表表示直接回复"""
+        available = [
+            t["function"]["name"]
+            for t in body.get("tools") or []
+            if t.get("type") == "function"
+        ]
+        candidates = [name for name in self.config.tools if name in available]
+        text, rounds = _last_user_turn(body.get("messages", []))
+        if not candidates or rounds >= self.config.tool_rounds:
+            return []
+        if _fraction(text) >= self.config.tool_call_ratio:
+            return []
+
+        calls = []
+        offset = int(_fraction(text + str(rounds)) * len(candidates))
+        for i in range(self.config.parallel_tool_calls):
+            name = candidates[(offset + i) % len(candidates)]
+            arguments = dict(TOOL_ARGUMENTS.get(name, {}))
+            if "query" in arguments:
+                arguments["query"] = text[:100]
+            calls.append({
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+                "type": "function",
+                "function": {
+                    "name": name,
+                    "arguments": json.dumps(arguments, ensure_ascii=False),
+                },
+            })
+        self.counters["tool_calls"] += len(calls)
+        return calls
+
+    def answer_tokens(self) -> List[str]:
+        return ["模拟"] + ["回复"] * (self.config.output_tokens - 1)
+
+    async def generation_delay(self, tokens: int) -> None:
+        delay = self.config.ttft
+        if self.config.tokens_per_second > 0:
+            delay += tokens / self.config.tokens_per_second
+        await asyncio.sleep(delay)
+
+    async def completion(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """非流式聊天补全"""
+        self.counters["chat"] += 1
+        tool_calls = self.plan_tool_calls(body)
+        tokens = [] if tool_calls else self.answer_tokens()
+        await self.generation_delay(len(tokens) or 10)
+
+        message: Dict[str, Any] = {"role": "assistant", "content": "".join(tokens)}
+        if tool_calls:
+            message["tool_calls"] = tool_calls
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": message,
+                "finish_reason": "tool_calls" if tool_calls else "stop",
+            }],
+            "usage": {
+                "prompt_tokens": 100,
+                "completion_tokens": len(tokens),
+                "total_tokens": 100 + len(tokens),
+            },
+        }
+
+    async def stream(self, body: Dict[str, Any]) -> AsyncIterator[str]:
+        """流式聊天补全，按生成速率推送token"""
+        self.counters["chat"] += 1
+        tool_calls = self.plan_tool_calls(body)
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+            data = {
+                "id": chunk_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "mock"),
+                "choices": [
+                    {"index": 0, "delta": delta, "finish_reason": finish_reason}
+                ],
+            }
+            return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+        await asyncio.sleep(self.config.ttft)
+        yield chunk({"role": "assistant", "content": ""})
+        if tool_calls:
+            calls = [dict(call, index=i) for i, call in enumerate(tool_calls)]
+            yield chunk({"tool_calls": calls})
+            yield chunk({}, "tool_calls")
+        else:
+            rate = self.config.tokens_per_second
+            interval = 1 / rate if rate > 0 else 0
+            for token in self.answer_tokens():
+                if interval:
+                    await asyncio.sleep(interval)
+                yield chunk({"content": token})
+            yield chunk({}, "stop")
+        yield "data: [DONE]\n\n"
+
+    async def search(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """兼容Tavily的搜索响应"""
+        self.counters["search"] += 1
+        await asyncio.sleep(self.config.search_latency)
+        query = body.get("query", "")
+        return {
+            "query": query,
+            "follow_up_questions": None,
+            "answer": None,
+            "images": [],
+            "results": [
+                {
+                    "title": f"{query} - 结果{i + 1}",
+                    "url": f"https://example.com/{i + 1}",
+                    "content": f"关于{query}的模拟搜索结果{i + 1}",
+                    "score": round(1 - i * 0.1, 2),
+                    "raw_content": None,
+                }
+                for i in range(self.config.search_results)
+            ],
+            "response_time": self.config.search_latency,
+        }
+
+
+    async def forecast(self, latitude: str, longitude: str) -> Any:
+        """兼容Open-Meteo的当前天气响应，一组坐标返回对象，多组坐标返回列表"""
+        self.counters["weather"] += 1
+        await asyncio.sleep(self.config.weather_latency)
+        now = int(time.time()) // 900 * 900
+        items = [
+            {
+                "latitude": float(lat),
+                "longitude": float(lon),
+                "current": {
+                    "time": now,
+                    "interval": 900,
+                    "temperature_2m": round(15 + 15 * _fraction(f"{lat},{lon}"), 1),
+                    "relative_humidity_2m": 60,
+                    "weather_code": 2,
+                    "wind_speed_10m": 10.0,
+                },
+            }
+            for lat, lon in zip(latitude.split(","), longitude.split(","))
+        ]
+        return items[0] if len(items) == 1 else items
+
+
+def create_app(config: Optional[MockConfig] = None) -> FastAPI:
+    """创建模拟服务应用"""
+    services = MockServices(config or MockConfig())
+    app = FastAPI(
+        title="Mock LLM and Tavily", docs_url=None, redoc_url=None, openapi_url=None
+    )
+    app.state.services = services
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        if body.get("stream"):
+            return StreamingResponse(
+                services.stream(body), media_type="text/event-stream"
+            )
+        return JSONResponse(await services.completion(body))
+
+    @app.get("/v1/models")
+    async def models():
+        return {
+            "object": "list",
+            "data": [{"id": "mock", "object": "model", "owned_by": "mock"}],
+        }
+
+    @app.post("/search")
+    async def search(request: Request):
+        return JSONResponse(await services.search(await request.json()))
+
+    @app.get("/v1/forecast")
+    async def forecast(latitude: str, longitude: str):
+        return JSONResponse(await services.forecast(latitude, longitude))
+
+    @app.get("/stats")
+    async def stats():
+        return {"config": asdict(services.config), "counters": services.counters}
+
+    return app
+
+
+def add_config_arguments(parser: argparse.ArgumentParser) -> None:
+    """向命令行解析器添加模拟服务的配置参数"""
+    defaults = MockConfig()
+    parser.add_argument(
+        "--ttft", type=float, default=defaults.ttft, help="首token延迟（秒）"
+    )
+    parser.add_argument(
+        "--tokens-per-second",
+        type=float,
+        default=defaults.tokens_per_second,
+        help="生成速率，0表示不限速",
+    )
+    parser.add_argument(
+        "--output-tokens",
+        type=int,
+        default=defaults.output_tokens,
+        help="最终回复的token数",
+    )
+    parser.add_argument(
+        "--tool-call-ratio",
+        type=float,
+        default=defaults.tool_call_ratio,
+        help="需要调用工具的消息比例",
+    )
+    parser.add_argument(
+        "--tool-rounds",
+        type=int,
+        default=defaults.tool_rounds,
+        help="每轮对话连续调用工具的次数",
+    )
+    parser.add_argument(
+        "--parallel-tool-calls",
+        type=int,
+        default=defaults.parallel_tool_calls,
+        help="每次同时调用的工具数",
+    )
+    parser.add_argument(
+        "--tools", default=",".join(defaults.tools), help="可能调用的工具，逗号分隔"
+    )
+    parser.add_argument(
+        "--search-latency",
+        type=float,
+        default=defaults.search_latency,
+        help="搜索接口延迟（秒）",
+    )
+    parser.add_argument(
+        "--weather-latency",
+        type=float,
+        default=defaults.weather_latency,
+        help="天气接口延迟（秒）",
+    )
+
+
+def config_from_args(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(
+        ttft=args.ttft,
+        tokens_per_second=args.tokens_per_second,
+        output_tokens=args.output_tokens,
+        tool_call_ratio=args.tool_call_ratio,
+        tool_rounds=args.tool_rounds,
+        parallel_tool_calls=args.parallel_tool_calls,
+        tools=[name.strip() for name in args.tools.split(",") if name.strip()],
+        search_latency=args.search_latency,
+        weather_latency=args.weather_latency,
+    )
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="启动模拟模型和搜索服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(
+        create_app(config_from_args(args)),
+        host=args.host,
+        port=args.port,
+        log_level="warning",
+    )
+
+
+if __name__ == "__main__":
+    main()
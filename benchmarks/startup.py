@@ -0,0 +1,120 @@
+"""
+启动耗时基准 - 测量导入服务模块和首次构建智能体的耗时
+
+用法:
+    uv run python benchmarks/startup.py [--module src.agent_1.server]
+        [--top 15] [--runs 3]
+
+在子进程中以 `python -X importtime` 方式导入目标模块，输出导入总耗时和累计耗时最高的
+模块，然后在同一个子进程中测量首次构建智能体和图的耗时。
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 子进程中执行的代码：导入模块后分别计时构建智能体和图
+CHILD_CODE = """
+import json, time
+t0 = time.perf_counter()
+import {module}
+t1 = time.perf_counter()
+from src.agent_1.agent import BasicAgent
+BasicAgent()
+t2 = time.perf_counter()
+from src.agent_1.graph import create_graph
+create_graph()
+t3 = time.perf_counter()
+print("STARTUP_RESULT " + json.dumps({{
+    "import_seconds": t1 - t0,
+    "agent_build_seconds": t2 - t1,
+    "graph_build_seconds": t3 - t2,
+}}))
+"""
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int]]:
+    """解析 -X importtime 输出，返回 (模块名, 累计微秒) 列表"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split("|", 2)
+        rows.append((name.strip(), int(cumulative_us.strip())))
+    return rows
+
+
+def run_once(module: str) -> Tuple[Dict[str, float], List[Tuple[str, int]]]:
+    """在新的子进程中运行一次测量"""
+    env = dict(os.environ)
+    env.setdefault("SILICONFLOW_API_KEY", "benchmark")
+    env.setdefault("LANGSMITH_TRACING", "false")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD_CODE.format(module=module)],
+        cwd=PROJECT_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    result_line = next(
+        line for line in proc.stdout.splitlines() if line.startswith("STARTUP_RESULT ")
+    )
+    return json.loads(result_line.split(" ", 1)[1]), parse_importtime(proc.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="测量服务启动耗时")
+    parser.add_argument("--module", default="src.agent_1.server", help="要导入的模块")
+    parser.add_argument(
+        "--top", type=int, default=15, help="显示累计耗时最高的模块数量"
+    )
+    parser.add_argument("--runs", type=int, default=3, help="重复测量次数，取中位数")
+    parser.add_argument("--output", help="将结果保存为JSON文件")
+    args = parser.parse_args()
+
+    runs = []
+    modules: List[Tuple[str, int]] = []
+    for _ in range(args.runs):
+        timings, modules = run_once(args.module)
+        runs.append(timings)
+
+    summary = {
+        key: statistics.median(run[key] for run in runs)
+        for key in ("import_seconds", "agent_build_seconds", "graph_build_seconds")
+    }
+    top_modules = sorted(modules, key=lambda row: row[1], reverse=True)[: args.top]
+
+    print(f"模块: {args.module}  (运行 {args.runs} 次取中位数)")
+    for key, value in summary.items():
+        print(f"  {key:<22}{value * 1000:>10.1f} ms")
+    print(f"\n累计导入耗时最高的 {args.top} 个模块:")
+    for name, cumulative_us in top_modules:
+        print(f"  {cumulative_us / 1000:>10.1f} ms  {name}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "module": args.module,
+                    "runs": runs,
+                    "median": summary,
+                    "top_modules": [
+                        {"module": name, "cumulative_ms": us / 1000}
+                        for name, us in top_modules
+                    ],
+                },
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""
+准入控制模块 - 在调用上游模型之前限制请求速率、token速率和并发数
+
+上游模型服务按每分钟请求数和token数限流。突发流量同时到达时，准入控制器让请求按先后
+顺序排队：请求数和token数各用一个令牌桶控制速率，同时限制在途请求数；队列已满时立即
+拒绝，在队列中等待超过截止时间的请求超时失败，两种情况都带有建议的重试等待时间，
+由服务端转换为503和Retry-After响应头。上游返回429时暂停放行，避免继续触发限流。
+"""
+
+import asyncio
+import math
+import random
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Tuple, Union
+
+from .config import settings
+from .metrics import LLM_ADMISSION
+
+
+class AdmissionError(Exception):
+    """请求未能获得准入"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionRejected(AdmissionError):
+    """等待队列已满，请求被立即拒绝"""
+
+
+class AdmissionTimeout(AdmissionError):
+    """在队列中等待超过截止时间"""
+
+
+def backoff_delay(
+    attempt: int, base: float, max_delay: float, retry_after: Optional[float] = None
+) -> float:
+    """
+    计算第attempt次重试前的等待时间：带全抖动的指数退避，且不短于上游要求的Retry-After
+
+    Args:
+        attempt: 已经失败的次数，从0开始
+        base: 退避基数（秒）
+        max_delay: 单次等待上限（秒）
+        retry_after: 上游要求的等待时间（秒）
+
+    Returns:
+        等待秒数
+    """
+    delay = random.uniform(0, min(max_delay, base * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+class TokenBucket:
+    """令牌桶，容量为一分钟的额度，按固定速率补充"""
+
+    def __init__(self, per_minute: float, now: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = now
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """补充到amount个令牌还需要的秒数（调用前需先refill）"""
+        # 单次请求超过桶容量时按满桶放行，否则永远无法获得准入
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+
+class _Waiter:
+    """队列中的一个等待者，可以被其他线程或事件循环唤醒"""
+
+    __slots__ = ("cost", "event", "loop")
+
+    def __init__(
+        self, cost: float, event: Union[threading.Event, asyncio.Event], loop=None
+    ):
+        self.cost = cost
+        self.event = event
+        self.loop = loop
+
+    def wake(self) -> None:
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self.event.set)
+
+
+class Permit:
+    """准入许可，调用结束后需要释放"""
+
+    __slots__ = ("controller", "cost", "released")
+
+    def __init__(self, controller: "AdmissionController", cost: float):
+        self.controller = controller
+        self.cost = cost
+        self.released = False
+
+    def release(self, actual_tokens: Optional[int] = None) -> None:
+        """
+        释放许可
+
+        Args:
+            actual_tokens: 实际消耗的token数，提供时按实际值修正token桶
+        """
+        if not self.released:
+            self.released = True
+            self.controller._release(self, actual_tokens)
+
+
+class AdmissionController:
+    """
+    上游模型调用的准入控制器
+
+    同步调用和异步调用共用同一个先进先出队列，只有队首的请求可以获得准入，
+    保证突发流量下按到达顺序放行。
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int = 0,
+        tokens_per_minute: int = 0,
+        max_concurrency: int = 0,
+        max_queue: int = 64,
+        queue_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        初始化准入控制器
+
+        Args:
+            requests_per_minute: 每分钟请求数上限，0表示不限制
+            tokens_per_minute: 每分钟token数上限，0表示不限制
+            max_concurrency: 在途请求数上限，0表示不限制
+            max_queue: 等待队列长度上限，超出时立即拒绝
+            queue_timeout: 默认排队截止时间（秒）
+            clock: 时间函数，便于测试时替换
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._clock = clock
+        now = clock()
+        self._requests = (
+            TokenBucket(requests_per_minute, now) if requests_per_minute else None
+        )
+        self._tokens = (
+            TokenBucket(tokens_per_minute, now) if tokens_per_minute else None
+        )
+        self._inflight = 0
+        self._paused_until = 0.0
+        self._waiters: Deque[_Waiter] = deque()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> "AdmissionController":
+        """根据全局配置创建准入控制器"""
+        return cls(
+            requests_per_minute=settings.llm_requests_per_minute,
+            tokens_per_minute=settings.llm_tokens_per_minute,
+            max_concurrency=settings.llm_max_concurrency,
+            max_queue=settings.llm_queue_max,
+            queue_timeout=settings.llm_queue_timeout,
+        )
+
+    # 以下方法调用方需持有锁
+
+    def _ready_in(self, cost: float, now: float) -> Optional[float]:
+        """距离可以放行还需要的秒数；受并发数限制、无法预估时返回None"""
+        if self.max_concurrency and self._inflight >= self.max_concurrency:
+            return None
+        wait = max(0.0, self._paused_until - now)
+        if self._requests is not None:
+            self._requests.refill(now)
+            wait = max(wait, self._requests.wait_time(1))
+        if self._tokens is not None:
+            self._tokens.refill(now)
+            wait = max(wait, self._tokens.wait_time(cost))
+        return wait
+
+    def _admit(self, cost: float) -> Permit:
+        if self._requests is not None:
+            self._requests.tokens -= 1
+        if self._tokens is not None:
+            self._tokens.tokens -= min(cost, self._tokens.capacity)
+        self._inflight += 1
+        LLM_ADMISSION.labels("admitted").inc()
+        return Permit(self, cost)
+
+    def _retry_after(self, now: float) -> float:
+        """估算被拒绝的请求应等待多久再重试"""
+        wait = max(0.0, self._paused_until - now)
+        if self._requests is not None:
+            wait = max(wait, (len(self._waiters) + 1) / self._requests.rate)
+        return float(max(1, math.ceil(wait)))
+
+    def _wake_head(self) -> None:
+        if self._waiters:
+            self._waiters[0].wake()
+
+    def _enter(self, waiter: _Waiter) -> Optional[Permit]:
+        """请求到达：能立即放行时返回许可，否则入队；队列已满时拒绝"""
+        now = self._clock()
+        if not self._waiters and self._ready_in(waiter.cost, now) == 0:
+            return self._admit(waiter.cost)
+        if len(self._waiters) >= self.max_queue:
+            LLM_ADMISSION.labels("rejected").inc()
+            raise AdmissionRejected(
+                "模型服务繁忙，等待队列已满", self._retry_after(now)
+            )
+        self._waiters.append(waiter)
+        return None
+
+    def _poll(self, waiter: _Waiter) -> Tuple[Optional[Permit], Optional[float]]:
+        """排队中的请求检查能否放行，返回(许可, 建议等待秒数)"""
+        if self._waiters[0] is not waiter:
+            return None, None
+        wait = self._ready_in(waiter.cost, self._clock())
+        if wait == 0:
+            self._waiters.popleft()
+            permit = self._admit(waiter.cost)
+            self._wake_head()
+            return permit, None
+        return None, wait
+
+    def _leave(self, waiter: _Waiter) -> None:
+        if waiter in self._waiters:
+            was_head = self._waiters[0] is waiter
+            self._waiters.remove(waiter)
+            if was_head:
+                self._wake_head()
+
+    def _timeout(self) -> AdmissionTimeout:
+        LLM_ADMISSION.labels("timeout").inc()
+        return AdmissionTimeout(
+            "模型服务繁忙，排队超时", self._retry_after(self._clock())
+        )
+
+    # 公共接口
+
+    def acquire(self, cost: float = 0, timeout: Optional[float] = None) -> Permit:
+        """
+        同步获取准入许可，必要时阻塞等待
+
+        Args:
+            cost: 本次调用预计消耗的token数
+            timeout: 最长等待时间（秒），默认使用queue_timeout
+
+        Returns:
+            准入许可
+
+        Raises:
+            AdmissionRejected: 等待队列已满
+            AdmissionTimeout: 超过截止时间仍未获得准入
+        """
+        waiter = _Waiter(cost, threading.Event())
+        deadline = self._clock() + (self.queue_timeout if timeout is None else timeout)
+        with self._lock:
+            permit = self._enter(waiter)
+        try:
+            while permit is None:
+                with self._lock:
+                    permit, wait = self._poll(waiter)
+                if permit is not None:
+                    break
+                remaining = deadline - self._clock()
+                if remaining <= 0:
+                    raise self._timeout()
+                waiter.event.wait(min(remaining, wait) if wait else remaining)
+                waiter.event.clear()
+            return permit
+        finally:
+            if permit is None:
+                with self._lock:
+                    self._leave(waiter)
+
+    async def aacquire(
+        self, cost: float = 0, timeout: Optional[float] = None
+    ) -> Permit:
+        """异步获取准入许可，等待时不阻塞事件循环，参数和异常同acquire"""
+        waiter = _Waiter(cost, asyncio.Event(), asyncio.get_running_loop())
+        deadline = self._clock() + (self.queue_timeout if timeout is None else timeout)
+        with self._lock:
+            permit = self._enter(waiter)
+        try:
+            while permit is None:
+                with self._lock:
+                    permit, wait = self._poll(waiter)
+                if permit is not None:
+                    break
+                remaining = deadline - self._clock()
+                if remaining <= 0:
+                    raise self._timeout()
+                try:
+                    await asyncio.wait_for(
+                        waiter.event.wait(), min(remaining, wait) if wait else remaining
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                waiter.event.clear()
+            return permit
+        finally:
+            if permit is None:
+                with self._lock:
+                    self._leave(waiter)
+
+    def _release(self, permit: Permit, actual_tokens: Optional[int]) -> None:
+        with self._lock:
+            self._inflight -= 1
+            if actual_tokens is not None and self._tokens is not None:
+                # 按实际消耗修正，允许暂时透支
+                reserved = min(permit.cost, self._tokens.capacity)
+                self._tokens.tokens -= actual_tokens - reserved
+            self._wake_head()
+
+    def pause(self, seconds: float) -> None:
+        """上游返回429时暂停放行seconds秒"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+    def stats(self) -> Dict[str, float]:
+        """获取准入控制统计信息"""
+        with self._lock:
+            return {
+                "inflight": self._inflight,
+                "queued": len(self._waiters),
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+            }
+
+
+_admission_controller: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> AdmissionController:
+    """获取全局准入控制器"""
+    global _admission_controller
+
+    if _admission_controller is None:
+        _admission_controller = AdmissionController.from_settings()
+    return _admission_controller
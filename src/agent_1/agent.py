@@ -2,54 +2,118 @@
 智能体核心模块 - 实现LangChain智能体的核心功能
 """
 
+import asyncio
+import logging
 import os
-from typing import List, Optional
+import threading
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
 
 from langchain_classic.agents import create_openai_tools_agent, AgentExecutor
-from langchain_community.chat_message_histories import ChatMessageHistory
-from langchain_core.chat_history import BaseChatMessageHistory
-# from langchain_core.memory import BaseMemory  # 移除这个导入
+from langchain_core.agents import AgentAction, AgentStep
 from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.messages import BaseMessage
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import Runnable
-from langchain_openai import ChatOpenAI  # 硅基流动兼容OpenAI API格式
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+from langchain_core.tools import BaseTool
+from langchain_openai import ChatOpenAI
 
+from .admission import AdmissionError
+from .cache import cacheable_temperature
+from .cancellation import raise_if_cancelled
 from .config import settings
+from .history import get_history_manager
+from .llm import get_llm
+from .log import get_logger, payload
+from .memory import AgentMemory
+from .metrics import metrics_handler
 from .prompts import create_agent_prompt, create_simple_prompt
+from .registry import compiled_key, get_registry
+from .router import AGENT, get_router, route_model
+from .semantic_cache import SemanticCache, get_semantic_cache, is_context_free
 from .tools import get_all_tools
 
+logger = get_logger(__name__)
+
 
 class ToolNameCallbackHandler(BaseCallbackHandler):
-    """工具名称回调处理器，用于在工具调用时显示工具名称"""
+    """工具名称回调处理器，用于在工具调用时记录工具名称"""
+    
+    # 只是把记录放入日志队列，直接在事件循环线程中执行即可
+    run_inline = True
     
     def on_tool_start(self, serialized: dict, input_str: str, **kwargs) -> None:
         """工具开始执行时调用"""
         tool_name = serialized.get('name', '未知工具') if serialized else '未知工具'
-        print(f"🔧 正在调用工具: {tool_name}")
+        logger.info("正在调用工具: %s", tool_name)
         
     def on_tool_error(self, error: Exception, **kwargs) -> None:
         """工具执行出错时调用"""
-        print(f"❌ 工具调用出错: {str(error)}")
+        if isinstance(error, asyncio.CancelledError):
+            logger.info("工具调用已取消")
+            return
+        logger.warning("工具调用出错: %s", payload(str(error)))
+
+
+# AgentExecutor达到迭代上限时返回的提示前缀
+AGENT_STOPPED_PREFIX = "Agent stopped"
 
+# 当前线程中正在执行的工具调用批次
+_tool_batches = threading.local()
 
-class AgentMemory:  # 移除 BaseMemory 继承
-    """自定义记忆类，用于存储对话历史"""
+
+class ParallelAgentExecutor(AgentExecutor):
+    """
+    并行执行工具调用的AgentExecutor
     
-    def __init__(self, chat_history: Optional[BaseChatMessageHistory] = None):
-        self.chat_history = chat_history or ChatMessageHistory()
+    异步路径中AgentExecutor已通过asyncio.gather并发执行同一轮的工具调用；
+    这里为同步路径补上线程池并发执行，结果仍按模型给出的调用顺序返回。
+    客户端断开后剩余的迭代不再执行。
+    """
     
-    def save_context(self, inputs: dict, outputs: dict) -> None:
-        # 从输入中获取用户消息
-        if "input" in inputs:
-            self.chat_history.add_user_message(inputs["input"])
-        
-        # 从输出中获取助手回复
-        if "output" in outputs:
-            self.chat_history.add_ai_message(outputs["output"])
+    max_concurrency: int = 4
+    
+    def _should_continue(self, iterations: int, time_elapsed: float) -> bool:
+        # 每轮开始前检查请求是否已被取消，同步路径在线程中运行，看不到任务取消
+        raise_if_cancelled()
+        return super()._should_continue(iterations, time_elapsed)
     
-    def clear(self) -> None:
-        self.chat_history.clear()
+    def _iter_next_step(self, *args: Any, **kwargs: Any):
+        # 父类会先产出本轮所有AgentAction，再逐个调用_perform_agent_action，
+        # 因此第一次执行工具时本轮的调用列表已经完整
+        previous = getattr(_tool_batches, "batch", None)
+        batch: Dict[str, Any] = {"actions": [], "results": None}
+        _tool_batches.batch = batch
+        try:
+            for item in super()._iter_next_step(*args, **kwargs):
+                if isinstance(item, AgentAction):
+                    batch["actions"].append(item)
+                yield item
+        finally:
+            _tool_batches.batch = previous
+    
+    def _perform_agent_action(
+        self, name_to_tool_map, color_mapping, agent_action, run_manager=None
+    ) -> AgentStep:
+        perform = super()._perform_agent_action
+        batch = getattr(_tool_batches, "batch", None)
+        actions = batch["actions"] if batch else []
+        if len(actions) < 2 or not any(a is agent_action for a in actions):
+            return perform(name_to_tool_map, color_mapping, agent_action, run_manager)
+        
+        if batch["results"] is None:
+            workers = min(self.max_concurrency, len(actions))
+            with ContextThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [
+                    pool.submit(
+                        perform, name_to_tool_map, color_mapping, action, run_manager
+                    )
+                    for action in actions
+                ]
+                batch["results"] = [future.result() for future in futures]
+        
+        index = next(i for i, a in enumerate(actions) if a is agent_action)
+        return batch["results"][index]
 
 
 class BasicAgent:
@@ -60,7 +124,8 @@ class BasicAgent:
         model_name: Optional[str] = None,
         temperature: Optional[float] = None,
         use_tools: bool = True,
-        memory: Optional[AgentMemory] = None
+        memory: Optional[AgentMemory] = None,
+        routing: bool = True,
     ):
         """
         初始化智能体
@@ -70,6 +135,7 @@ class BasicAgent:
             temperature: 温度参数，默认使用配置中的温度
             use_tools: 是否使用工具，默认为True
             memory: 记忆对象，如果不提供则创建默认记忆
+            routing: 是否按路由决策为不需要工具的对话选择更轻的模型，仅在使用工具时生效
         """
         # 设置LangSmith环境变量
         if settings.langsmith_api_key:
@@ -78,109 +144,444 @@ class BasicAgent:
             os.environ["LANGSMITH_PROJECT"] = settings.langsmith_project
         os.environ["LANGSMITH_TRACING"] = str(settings.langsmith_tracing).lower()
         
-        # 初始化LLM - 使用硅基流动(Silicon Flow) API
-        self.llm = ChatOpenAI(
-            model=model_name or settings.siliconflow_model,
-            temperature=temperature or settings.siliconflow_temperature,
-            api_key=settings.siliconflow_api_key,
-            base_url=settings.siliconflow_base_url  # 硅基流动API端点
-        )
+        # 初始化LLM和智能体 - 使用硅基流动(Silicon Flow) API
+        # 编译好的模型和智能体不保存会话状态，相同配置的实例共享同一份
+        self.llm, self.agent = self._get_compiled(model_name, temperature, use_tools)
         
         # 设置记忆
         self.memory = memory or AgentMemory()
         
-        # 创建智能体
-        if use_tools:
-            self.agent = self._create_agent_with_tools()
-        else:
-            self.agent = self._create_simple_agent()
+        # 按模型的token预算裁剪历史，较早的对话折叠为摘要
+        self.model_name = model_name or settings.siliconflow_model
+        self.history = get_history_manager()
+        
+        # 寒暄和不需要工具的问答路由到更轻的模型
+        self.temperature = temperature
+        self.routing = routing and use_tools
+        
+        # 语义缓存按模型和是否使用工具区分命名空间
+        kind = "tools" if use_tools else "chat"
+        self.cache_namespace = f"agent:{self.model_name}:{kind}"
+
+    @classmethod
+    def _get_compiled(
+        cls, model_name: Optional[str], temperature: Optional[float], use_tools: bool
+    ) -> Tuple[ChatOpenAI, Runnable]:
+        """
+        从注册表获取编译好的模型和智能体
+
+        按(模型, 温度, 是否使用工具, 工具集合)缓存。
+        """
+        tools = get_all_tools() if use_tools else []
+        
+        def build() -> Tuple[ChatOpenAI, Runnable]:
+            llm = get_llm(model_name, temperature)
+            if use_tools:
+                return llm, cls._create_agent_with_tools(llm, tools)
+            return llm, cls._create_simple_agent(llm)
+        
+        key = compiled_key("agent", model_name, temperature, use_tools, tools)
+        return get_registry().get_or_build(key, build)
     
-    def _create_agent_with_tools(self) -> AgentExecutor:
+    @staticmethod
+    def _create_agent_with_tools(
+        llm: ChatOpenAI, tools: List[BaseTool]
+    ) -> AgentExecutor:
         """创建带工具的智能体"""
-        # 获取工具
-        tools = get_all_tools()
-        
         # 创建提示词
         prompt = create_agent_prompt()
         
         # 创建智能体
-        agent = create_openai_tools_agent(self.llm, tools, prompt)
+        agent = create_openai_tools_agent(llm, tools, prompt)
         
         # 创建工具回调处理器
         tool_callback = ToolNameCallbackHandler()
         
         # 创建执行器
-        agent_executor = AgentExecutor(
+        agent_executor = ParallelAgentExecutor(
             agent=agent,
             tools=tools,
-            verbose=True,
+            verbose=settings.agent_verbose,  # 默认关闭，调试信息通过日志记录
             handle_parsing_errors=True,
             max_iterations=5,  # 限制最大迭代次数
             early_stopping_method="force",  # 强制停止方法
-            callbacks=[tool_callback],  # 添加工具回调
+            callbacks=[tool_callback, metrics_handler],  # 添加工具回调和指标回调
             return_intermediate_steps=True,  # 返回中间步骤
+            max_concurrency=settings.tool_max_concurrency,  # 同一轮工具调用的并发上限
         )
         
         return agent_executor
     
-    def _create_simple_agent(self) -> Runnable:
+    @staticmethod
+    def _create_simple_agent(llm: ChatOpenAI) -> Runnable:
         """创建简单对话智能体"""
         # 创建提示词
         prompt = create_simple_prompt()
         
         # 创建链
-        chain = prompt | self.llm
+        chain = prompt | llm
         
         return chain
     
-    def invoke(self, input_text: str) -> str:
+    def _select_agent(self, input_text: str, memory: AgentMemory) -> Runnable:
+        """按路由决策选择本轮使用的智能体，不需要工具时使用不带工具的简单链"""
+        router = get_router()
+        if (
+            router is None
+            or not self.routing
+            or not isinstance(self.agent, AgentExecutor)
+        ):
+            return self.agent
+        
+        decision = router.route(input_text, has_history=memory.has_messages)
+        if decision.route == AGENT:
+            return self.agent
+        model_name, use_tools = route_model(decision, self.model_name)
+        return self._get_compiled(model_name, self.temperature, use_tools)[1]
+
+    def _semantic_cache(
+        self, input_text: str, memory: AgentMemory
+    ) -> Optional[SemanticCache]:
+        """本轮可以使用的语义缓存；温度高于缓存上限或问题依赖之前的对话时不使用"""
+        cache = get_semantic_cache()
+        if cache is None or not cacheable_temperature(self.temperature):
+            return None
+        if memory.has_messages and not is_context_free(input_text):
+            return None
+        return cache
+    
+    @staticmethod
+    def _cacheable(output: str) -> bool:
+        """回复是否可以写入语义缓存，空回复和达到迭代上限后的停止提示不缓存"""
+        return bool(output) and not output.startswith(AGENT_STOPPED_PREFIX)
+    
+    @staticmethod
+    def _tools_used(result: Dict[str, Any]) -> List[str]:
+        """AgentExecutor结果中调用过的工具名称"""
+        steps = result.get("intermediate_steps", [])
+        return [action.tool for action, _ in steps if isinstance(action, AgentAction)]
+    
+    @staticmethod
+    def _log_result(result: Dict[str, Any], output: str) -> None:
+        """记录AgentExecutor的结果，完整结果和中间步骤只在DEBUG级别记录"""
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("完整结果: %s", payload(result))
+            logger.debug("中间步骤: %s", payload(result.get("intermediate_steps", [])))
+        logger.info(
+            "输出: %s",
+            payload(output),
+            extra={"tool_calls": len(result.get("intermediate_steps", []))},
+        )
+    
+    def invoke(self, input_text: str, memory: Optional[AgentMemory] = None) -> str:
         """
         调用智能体处理输入
         
         Args:
             input_text: 用户输入文本
+            memory: 本次调用使用的会话记忆，默认使用智能体自身的记忆
             
         Returns:
             智能体的回复
         """
+        memory = memory if memory is not None else self.memory
+        cache = self._semantic_cache(input_text, memory)
         try:
-            if isinstance(self.agent, AgentExecutor):
-                print(f"🤖 处理输入: {input_text}")
-                result = self.agent.invoke({"input": input_text})
-                print(f"📊 完整结果: {result}")
-                
+            cached = None
+            if cache is not None:
+                cached = cache.lookup(input_text, self.cache_namespace)
+            if cached is not None:
+                memory.save_context({"input": input_text}, {"output": cached})
+                return cached
+            
+            agent = self._select_agent(input_text, memory)
+            if isinstance(agent, AgentExecutor):
+                logger.info("处理输入: %s", payload(input_text))
+                result = agent.invoke({
+                    "input": input_text,
+                    "chat_history": self.history.fold_memory(memory, self.model_name)
+                })
                 output = result.get("output", "").strip()
-                intermediate_steps = result.get("intermediate_steps", [])
-                
-                print(f"🔍 中间步骤: {intermediate_steps}")
-                print(f"📝 输出: {output}")
-                
+                self._log_result(result, output)
+                if cache is not None and self._cacheable(output):
+                    tools_used = self._tools_used(result)
+                    cache.store(input_text, output, self.cache_namespace, tools_used)
+
                 # 如果AgentExecutor返回空结果或只有换行符，使用LLM直接回答
                 if not output or output == "":
-                    print("⚠️  AgentExecutor返回空结果，使用LLM直接回答")
+                    logger.warning("AgentExecutor返回空结果，使用LLM直接回答")
                     # 创建简单的LLM调用
                     simple_response = self.llm.invoke(f"用户问：{input_text}\n请用中文回答：")
                     output = simple_response.content.strip()
                 
-                return output if output else "抱歉，我无法生成合适的回复。"
+                output = output if output else "抱歉，我无法生成合适的回复。"
+                memory.save_context({"input": input_text}, {"output": output})
+                
+                return output
             else:
                 # 简单链式调用
-                messages = self.memory.chat_history.messages
+                messages = self.history.fold_memory(memory, self.model_name)
                 if messages:
                     # 如果有历史记录，需要将其包含在输入中
-                    result = self.agent.invoke({
+                    result = agent.invoke({
                         "input": input_text,
                         "chat_history": messages
                     })
                 else:
-                    result = self.agent.invoke({"input": input_text})
+                    result = agent.invoke({"input": input_text})
                 
                 # 保存到记忆中
-                self.memory.save_context({"input": input_text}, {"output": result.content})
+                memory.save_context({"input": input_text}, {"output": result.content})
+                if cache is not None:
+                    cache.store(input_text, result.content, self.cache_namespace)
                 
                 return result.content
+        except AdmissionError:
+            # 模型服务繁忙，交给调用方快速返回503
+            raise
         except Exception as e:
+            logger.exception("处理请求时出错")
             return f"处理请求时出错: {str(e)}"
+
+    async def ainvoke(
+        self, input_text: str, memory: Optional[AgentMemory] = None
+    ) -> str:
+        """
+        异步调用智能体处理输入，不会阻塞事件循环
+
+        Args:
+            input_text: 用户输入文本
+            memory: 本次调用使用的会话记忆，默认使用智能体自身的记忆
+
+        Returns:
+            智能体的回复
+        """
+        memory = memory if memory is not None else self.memory
+        cache = self._semantic_cache(input_text, memory)
+        try:
+            cached = None
+            if cache is not None:
+                cached = await cache.alookup(input_text, self.cache_namespace)
+            if cached is not None:
+                await memory.asave_context(
+                    {"input": input_text}, {"output": cached}
+                )
+                return cached
+            
+            agent = self._select_agent(input_text, memory)
+            if isinstance(agent, AgentExecutor):
+                logger.info("处理输入: %s", payload(input_text))
+                chat_history = await self.history.afold_memory(memory, self.model_name)
+                result = await agent.ainvoke({
+                    "input": input_text,
+                    "chat_history": chat_history
+                })
+                output = result.get("output", "").strip()
+                self._log_result(result, output)
+                if cache is not None and self._cacheable(output):
+                    tools_used = self._tools_used(result)
+                    await cache.astore(
+                        input_text, output, self.cache_namespace, tools_used
+                    )
+
+                # 如果AgentExecutor返回空结果或只有换行符，使用LLM直接回答
+                if not output:
+                    logger.warning("AgentExecutor返回空结果，使用LLM直接回答")
+                    simple_response = await self.llm.ainvoke(
+                        f"用户问：{input_text}\n请用中文回答："
+                    )
+                    output = simple_response.content.strip()
+                
+                output = output if output else "抱歉，我无法生成合适的回复。"
+                await memory.asave_context(
+                    {"input": input_text}, {"output": output}
+                )
+                
+                return output
+            else:
+                # 简单链式调用
+                messages = await self.history.afold_memory(memory, self.model_name)
+                if messages:
+                    result = await agent.ainvoke({
+                        "input": input_text,
+                        "chat_history": messages
+                    })
+                else:
+                    result = await agent.ainvoke({"input": input_text})
+                
+                # 保存到记忆中
+                await memory.asave_context(
+                    {"input": input_text}, {"output": result.content}
+                )
+                if cache is not None:
+                    await cache.astore(
+                        input_text, result.content, self.cache_namespace
+                    )
+                
+                return result.content
+        except AdmissionError:
+            # 模型服务繁忙，交给调用方快速返回503
+            raise
+        except Exception as e:
+            logger.exception("处理请求时出错")
+            return f"处理请求时出错: {str(e)}"
+    
+    async def abatch_as_completed(
+        self,
+        items: Sequence[Tuple[str, Optional[AgentMemory]]],
+        max_concurrency: Optional[int] = None,
+    ) -> AsyncIterator[Tuple[int, str]]:
+        """
+        并发处理多条输入，按完成先后产出结果
+        
+        最多同时处理max_concurrency条输入；使用同一个记忆对象的输入按提交顺序依次执行，
+        以保证同一会话的上下文连续。
+        
+        Args:
+            items: (输入文本, 会话记忆) 列表，记忆为None时使用一次性记忆
+            max_concurrency: 最大并发数，默认使用配置中的batch_max_concurrency
+            
+        Yields:
+            (输入序号, 回复) 元组
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or settings.batch_max_concurrency)
+        session_locks: Dict[int, asyncio.Lock] = {}
+
+        async def run(
+            index: int, input_text: str, memory: Optional[AgentMemory]
+        ) -> Tuple[int, str]:
+            memory = memory if memory is not None else AgentMemory()
+            lock = session_locks.setdefault(id(memory), asyncio.Lock())
+            async with lock, semaphore:
+                try:
+                    return index, await self.ainvoke(input_text, memory=memory)
+                except AdmissionError as e:
+                    return index, f"服务繁忙，请在{e.retry_after:.0f}秒后重试"
+        
+        tasks = [
+            asyncio.ensure_future(run(index, input_text, memory))
+            for index, (input_text, memory) in enumerate(items)
+        ]
+        try:
+            for future in asyncio.as_completed(tasks):
+                yield await future
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def abatch(
+        self,
+        items: Sequence[Tuple[str, Optional[AgentMemory]]],
+        max_concurrency: Optional[int] = None,
+    ) -> List[str]:
+        """
+        并发处理多条输入，按输入顺序返回结果
+        
+        Args:
+            items: (输入文本, 会话记忆) 列表，记忆为None时使用一次性记忆
+            max_concurrency: 最大并发数，默认使用配置中的batch_max_concurrency
+            
+        Returns:
+            与输入顺序一致的回复列表
+        """
+        results: List[str] = [""] * len(items)
+        async for index, response in self.abatch_as_completed(items, max_concurrency):
+            results[index] = response
+        return results
+    
+    async def astream(
+        self, input_text: str, memory: Optional[AgentMemory] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        流式调用智能体，边执行边产出事件
+        
+        产出的事件格式为 {"event": 类型, "data": 内容}，类型包括：
+        token（模型输出片段）、tool_start、tool_end、final（最终回复）和error。
+        
+        Args:
+            input_text: 用户输入文本
+            memory: 本次调用使用的会话记忆，默认使用智能体自身的记忆
+            
+        Yields:
+            流式事件字典
+        """
+        memory = memory if memory is not None else self.memory
+        cache = self._semantic_cache(input_text, memory)
+        tokens: List[str] = []
+        tools_used: List[str] = []
+        output = ""
+        
+        try:
+            cached = None
+            if cache is not None:
+                cached = await cache.alookup(input_text, self.cache_namespace)
+            if cached is not None:
+                await memory.asave_context({"input": input_text}, {"output": cached})
+                yield {"event": "token", "data": cached}
+                yield {"event": "final", "data": cached}
+                return
+            
+            agent = self._select_agent(input_text, memory)
+            is_executor = isinstance(agent, AgentExecutor)
+            chat_history = await self.history.afold_memory(memory, self.model_name)
+            inputs = {"input": input_text, "chat_history": chat_history}
+            async for event in agent.astream_events(inputs, version="v2"):
+                kind = event["event"]
+                if kind == "on_chat_model_stream":
+                    text = event["data"]["chunk"].content
+                    if text:
+                        tokens.append(text)
+                        yield {"event": "token", "data": text}
+                elif kind == "on_tool_start":
+                    tools_used.append(event["name"])
+                    yield {
+                        "event": "tool_start",
+                        "data": {
+                            "name": event["name"],
+                            "input": event["data"].get("input"),
+                        },
+                    }
+                elif kind == "on_tool_end":
+                    result = event["data"].get("output")
+                    yield {
+                        "event": "tool_end",
+                        "data": {
+                            "name": event["name"],
+                            "output": str(getattr(result, "content", result)),
+                        },
+                    }
+                elif (
+                    kind == "on_chain_end"
+                    and not event.get("parent_ids")
+                    and is_executor
+                ):
+                    output = (event["data"].get("output") or {}).get("output", "")
+            
+            output = output.strip() if is_executor else "".join(tokens)
+            if cache is not None and self._cacheable(output):
+                await cache.astore(input_text, output, self.cache_namespace, tools_used)
+            
+            # 如果AgentExecutor返回空结果，使用LLM直接流式回答
+            if is_executor and not output:
+                async for chunk in self.llm.astream(
+                    f"用户问：{input_text}\n请用中文回答："
+                ):
+                    if chunk.content:
+                        output += chunk.content
+                        yield {"event": "token", "data": chunk.content}
+                output = output.strip() or "抱歉，我无法生成合适的回复。"
+            
+            await memory.asave_context({"input": input_text}, {"output": output})
+            yield {"event": "final", "data": output}
+        except AdmissionError as e:
+            logger.warning("模型服务繁忙: %s", e)
+            yield {
+                "event": "error",
+                "data": f"服务繁忙，请在{e.retry_after:.0f}秒后重试",
+            }
+        except Exception as e:
+            logger.exception("流式处理请求时出错")
+            yield {"event": "error", "data": f"处理请求时出错: {str(e)}"}
     
     def clear_memory(self) -> None:
         """清除记忆"""
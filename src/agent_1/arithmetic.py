@@ -0,0 +1,288 @@
+"""
+算术表达式求值模块 - 为计算器工具提供安全的表达式求值
+
+基于AST白名单求值，只允许数字、算术/比较运算和白名单内的数学函数，并限制表达式长度、
+节点数量和整数结果大小，防止恶意输入（如 9**9**9）长时间占用CPU。
+"""
+
+import ast
+import math
+import operator
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Union
+
+# 资源限制
+MAX_EXPRESSION_LENGTH = 1000  # 表达式最大字符数
+MAX_NODES = 200  # 语法树最大节点数，即求值步数上限
+MAX_INT_BITS = 10000  # 整数结果最大位数（约3000位十进制数）
+MAX_FACTORIAL = 1000  # 阶乘参数上限
+MAX_MODPOW_BITS = 1024  # 模幂的指数和模数最大位数，模幂耗时随两者位数乘积增长
+MAX_ROUND_DIGITS = 100  # round保留位数的绝对值上限，负数位数会在内部计算10**(-ndigits)
+
+Number = Union[int, float, complex]
+
+
+class ExpressionError(ValueError):
+    """表达式不被允许或超出资源限制"""
+
+
+def _check_int(value: Any) -> Any:
+    """检查整数结果是否超过位数上限"""
+    if isinstance(value, int) and value.bit_length() > MAX_INT_BITS:
+        raise ExpressionError(f"结果过大，超过{MAX_INT_BITS}位")
+    return value
+
+
+def _safe_pow(base: Number, exponent: Number) -> Number:
+    """在计算前估算整数幂的位数，超限直接拒绝"""
+    if (
+        isinstance(base, int)
+        and isinstance(exponent, int)
+        and exponent > 0
+        and abs(base) > 1
+        and exponent * (abs(base).bit_length() - 1) > MAX_INT_BITS
+    ):
+        raise ExpressionError(f"指数过大，结果将超过{MAX_INT_BITS}位")
+    return operator.pow(base, exponent)
+
+
+def _safe_mul(left: Number, right: Number) -> Number:
+    """在计算前估算整数乘积的位数，超限直接拒绝"""
+    if (
+        isinstance(left, int)
+        and isinstance(right, int)
+        and left.bit_length() + right.bit_length() > MAX_INT_BITS + 1
+    ):
+        raise ExpressionError(f"结果过大，超过{MAX_INT_BITS}位")
+    return operator.mul(left, right)
+
+
+def _safe_factorial(n: int) -> int:
+    if isinstance(n, int) and n > MAX_FACTORIAL:
+        raise ExpressionError(f"阶乘参数不能超过{MAX_FACTORIAL}")
+    return math.factorial(n)
+
+
+def _builtin_pow(*args: Number) -> Number:
+    """pow函数：两参数时按安全幂运算，三参数时为模幂"""
+    if len(args) == 2:
+        return _safe_pow(*args)
+    if len(args) == 3 and any(
+        isinstance(arg, int) and arg.bit_length() > MAX_MODPOW_BITS for arg in args[1:]
+    ):
+        raise ExpressionError(f"模幂的指数和模数不能超过{MAX_MODPOW_BITS}位")
+    return pow(*args)
+
+
+def _safe_round(number: Number, ndigits: Any = None) -> Number:
+    """round函数：限制保留位数，避免超大的负数位数长时间计算"""
+    if isinstance(ndigits, int) and abs(ndigits) > MAX_ROUND_DIGITS:
+        raise ExpressionError(f"round的保留位数不能超过{MAX_ROUND_DIGITS}")
+    return round(number, ndigits)
+
+
+_BINARY_OPERATORS: Dict[type, Callable[[Any, Any], Any]] = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: _safe_mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: _safe_pow,
+}
+
+_UNARY_OPERATORS: Dict[type, Callable[[Any], Any]] = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+_COMPARE_OPERATORS: Dict[type, Callable[[Any, Any], bool]] = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+
+# 允许调用的函数，既可以直接调用（sqrt(2)），也可以通过math访问（math.sqrt(2)）
+FUNCTIONS: Dict[str, Callable[..., Any]] = {
+    "abs": abs,
+    "round": _safe_round,
+    "min": min,
+    "max": max,
+    "pow": _builtin_pow,
+    "sqrt": math.sqrt,
+    "exp": math.exp,
+    "log": math.log,
+    "log2": math.log2,
+    "log10": math.log10,
+    "sin": math.sin,
+    "cos": math.cos,
+    "tan": math.tan,
+    "asin": math.asin,
+    "acos": math.acos,
+    "atan": math.atan,
+    "atan2": math.atan2,
+    "hypot": math.hypot,
+    "degrees": math.degrees,
+    "radians": math.radians,
+    "floor": math.floor,
+    "ceil": math.ceil,
+    "factorial": _safe_factorial,
+}
+
+CONSTANTS: Dict[str, float] = {
+    "pi": math.pi,
+    "e": math.e,
+    "tau": math.tau,
+}
+
+
+def _validate(tree: ast.Expression) -> None:
+    """检查语法树只包含白名单节点"""
+    nodes = list(ast.walk(tree))
+    if len(nodes) > MAX_NODES:
+        raise ExpressionError(f"表达式过于复杂，超过{MAX_NODES}个节点")
+
+    for node in nodes:
+        if isinstance(node, ast.Constant):
+            if not isinstance(node.value, (int, float, complex)):
+                raise ExpressionError(f"不支持的常量: {node.value!r}")
+        elif isinstance(node, ast.BinOp):
+            if type(node.op) not in _BINARY_OPERATORS:
+                raise ExpressionError(f"不支持的运算符: {type(node.op).__name__}")
+        elif isinstance(node, ast.UnaryOp):
+            if type(node.op) not in _UNARY_OPERATORS:
+                raise ExpressionError(f"不支持的运算符: {type(node.op).__name__}")
+        elif isinstance(node, ast.Compare):
+            for op in node.ops:
+                if type(op) not in _COMPARE_OPERATORS:
+                    raise ExpressionError(f"不支持的运算符: {type(op).__name__}")
+        elif isinstance(node, ast.Call):
+            if node.keywords:
+                raise ExpressionError("函数调用不支持关键字参数")
+            if not _function_name(node.func):
+                raise ExpressionError("只能调用白名单内的数学函数")
+        elif isinstance(node, ast.Attribute):
+            if not (isinstance(node.value, ast.Name) and node.value.id == "math"):
+                raise ExpressionError("不支持的属性访问")
+        elif not isinstance(
+            node,
+            (ast.Expression, ast.Name, ast.Load, ast.operator, ast.unaryop, ast.cmpop),
+        ):
+            raise ExpressionError(f"不支持的表达式: {type(node).__name__}")
+
+
+def _function_name(func: ast.expr) -> str:
+    """获取被调用函数的名称，不是简单名称或math.xxx时返回空字符串"""
+    if isinstance(func, ast.Name):
+        return func.id
+    if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name):
+        if func.value.id == "math":
+            return func.attr
+    return ""
+
+
+@lru_cache(maxsize=1024)
+def parse_expression(expression: str) -> ast.Expression:
+    """
+    解析并校验表达式，结果会被缓存
+
+    Args:
+        expression: 数学表达式
+
+    Returns:
+        校验通过的语法树
+
+    Raises:
+        SyntaxError: 表达式语法错误，错误信息与eval一致
+        ExpressionError: 表达式不被允许或过长
+    """
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise ExpressionError(f"表达式过长，超过{MAX_EXPRESSION_LENGTH}个字符")
+    # 与eval一致，忽略开头的空格和制表符
+    tree = ast.parse(expression.lstrip(" \t"), filename="<string>", mode="eval")
+    _validate(tree)
+    return tree
+
+
+def _evaluate(node: ast.AST) -> Any:
+    if isinstance(node, ast.Expression):
+        return _evaluate(node.body)
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, ast.BinOp):
+        left = _evaluate(node.left)
+        right = _evaluate(node.right)
+        return _check_int(_BINARY_OPERATORS[type(node.op)](left, right))
+    if isinstance(node, ast.UnaryOp):
+        return _UNARY_OPERATORS[type(node.op)](_evaluate(node.operand))
+    if isinstance(node, ast.Compare):
+        left = _evaluate(node.left)
+        for op, comparator in zip(node.ops, node.comparators):
+            right = _evaluate(comparator)
+            if not _COMPARE_OPERATORS[type(op)](left, right):
+                return False
+            left = right
+        return True
+    if isinstance(node, ast.Call):
+        name = _function_name(node.func)
+        if name not in FUNCTIONS:
+            raise NameError(f"name '{name}' is not defined")
+        return _check_int(FUNCTIONS[name](*[_evaluate(arg) for arg in node.args]))
+    if isinstance(node, ast.Name):
+        if node.id in CONSTANTS:
+            return CONSTANTS[node.id]
+        raise NameError(f"name '{node.id}' is not defined")
+    if isinstance(node, ast.Attribute):
+        if node.attr in CONSTANTS:
+            return CONSTANTS[node.attr]
+        raise AttributeError(f"module 'math' has no attribute '{node.attr}'")
+    raise ExpressionError(f"不支持的表达式: {type(node).__name__}")
+
+
+def evaluate(expression: str) -> Any:
+    """
+    安全地计算数学表达式
+
+    Args:
+        expression: 数学表达式，例如 "2 + 2" 或 "sqrt(16) * 3"
+
+    Returns:
+        计算结果
+
+    Raises:
+        Exception: 语法错误、未定义的名称、除零或超出资源限制时抛出，错误信息与eval一致
+    """
+    return _evaluate(parse_expression(expression))
+
+
+def format_result(expression: str) -> str:
+    """
+    计算表达式并格式化为计算器工具的返回字符串
+
+    Args:
+        expression: 数学表达式
+
+    Returns:
+        "计算结果: ..." 或 "计算错误: ..."
+    """
+    try:
+        result = evaluate(expression)
+        return f"计算结果: {result}"
+    except Exception as e:
+        return f"计算错误: {str(e)}"
+
+
+def evaluate_many(expressions: List[str]) -> List[str]:
+    """
+    批量计算多个表达式
+
+    Args:
+        expressions: 表达式列表
+
+    Returns:
+        与输入顺序一致的结果字符串列表，单个表达式出错不影响其他表达式
+    """
+    return [format_result(expression) for expression in expressions]
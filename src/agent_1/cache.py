@@ -0,0 +1,358 @@
+"""
+LLM响应缓存模块 - 为ChatOpenAI提供可插拔的响应缓存
+
+缓存键由模型配置（llm_string，包含模型名、温度和绑定的工具schema）与渲染后的提示词
+共同决定，支持进程内LRU、本地SQLite和共享状态后端三种存储方式。
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+
+from .config import settings
+from .state import StateBackend, get_state_backend
+
+
+class CacheBackend(ABC):
+    """缓存存储后端接口"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[RETURN_VAL_TYPE]:
+        """读取缓存，不存在或已过期时返回None"""
+
+    @abstractmethod
+    def set(
+        self, key: str, value: RETURN_VAL_TYPE, ttl_seconds: Optional[float]
+    ) -> None:
+        """写入缓存"""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """清空缓存"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """当前缓存条目数"""
+
+
+class LRUCacheBackend(CacheBackend):
+    """进程内LRU缓存后端"""
+
+    def __init__(
+        self, max_entries: int = 1000, clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        初始化LRU缓存
+
+        Args:
+            max_entries: 最多保留的条目数
+            clock: 时间函数，便于测试时替换
+        """
+        self.max_entries = max_entries
+        self._clock = clock
+        self._data: "OrderedDict[str, Tuple[Optional[float], RETURN_VAL_TYPE]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[RETURN_VAL_TYPE]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at is not None and expires_at <= self._clock():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(
+        self, key: str, value: RETURN_VAL_TYPE, ttl_seconds: Optional[float]
+    ) -> None:
+        expires_at = self._clock() + ttl_seconds if ttl_seconds else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """本地SQLite缓存后端，进程重启后缓存仍然有效"""
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 10000,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        初始化SQLite缓存
+
+        Args:
+            path: 数据库文件路径
+            max_entries: 最多保留的条目数，超出时淘汰最久未访问的条目
+            clock: 时间函数（需为墙上时间，以便跨进程使用）
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[RETURN_VAL_TYPE]:
+        now = self._clock()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+        return loads(value)
+
+    def set(
+        self, key: str, value: RETURN_VAL_TYPE, ttl_seconds: Optional[float]
+    ) -> None:
+        now = self._clock()
+        expires_at = now + ttl_seconds if ttl_seconds else None
+        payload = dumps(value)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache "
+                "(key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, payload, expires_at, now),
+            )
+            overflow = len(self) - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN "
+                    "(SELECT key FROM llm_cache ORDER BY accessed_at LIMIT ?)",
+                    (overflow,),
+                )
+                self.evictions += overflow
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+
+class StateCacheBackend(CacheBackend):
+    """基于共享状态后端的缓存，多个工作进程共享同一份缓存"""
+
+    KEY_PREFIX = "llm:"
+
+    def __init__(self, backend: StateBackend):
+        self.backend = backend
+
+    def get(self, key: str) -> Optional[RETURN_VAL_TYPE]:
+        value = self.backend.get(self.KEY_PREFIX + key)
+        return loads(value.decode("utf-8")) if value is not None else None
+
+    def set(
+        self, key: str, value: RETURN_VAL_TYPE, ttl_seconds: Optional[float]
+    ) -> None:
+        self.backend.set(
+            self.KEY_PREFIX + key, dumps(value).encode("utf-8"), ttl_seconds
+        )
+
+    def clear(self) -> None:
+        self.backend.clear(self.KEY_PREFIX)
+
+    def __len__(self) -> int:
+        return self.backend.count(self.KEY_PREFIX)
+
+
+_WHITESPACE_RE = re.compile(r"(?:\s|\\n|\\t|\\r)+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    规范化提示词：合并连续空白（包括序列化后的转义换行）并去除首尾空白
+
+    Args:
+        prompt: 序列化后的提示词
+
+    Returns:
+        规范化后的提示词
+    """
+    return _WHITESPACE_RE.sub(" ", prompt).strip()
+
+
+class ResponseCache(BaseCache):
+    """
+    LLM响应缓存
+
+    实现LangChain的BaseCache接口，可直接作为ChatOpenAI的cache参数使用。
+    """
+
+    def __init__(
+        self,
+        backend: CacheBackend,
+        ttl_seconds: Optional[float] = 3600.0,
+        normalize: bool = True,
+    ):
+        """
+        初始化响应缓存
+
+        Args:
+            backend: 存储后端
+            ttl_seconds: 缓存有效期（秒），None表示永不过期
+            normalize: 是否使用规范化提示词作为缓存键，False时按提示词精确匹配
+        """
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.normalize = normalize
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, prompt: str, llm_string: str) -> str:
+        """根据模型配置和提示词生成缓存键"""
+        if self.normalize:
+            prompt = normalize_prompt(prompt)
+        digest = hashlib.sha256()
+        digest.update(llm_string.encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update(prompt.encode("utf-8"))
+        return digest.hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        value = self.backend.get(self._key(prompt, llm_string))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        self.backend.set(self._key(prompt, llm_string), return_val, self.ttl_seconds)
+
+    def clear(self, **kwargs: Any) -> None:
+        self.backend.clear()
+
+    async def _offload(self, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        在异步调用中访问后端
+
+        进程内LRU的开销很小，直接在事件循环中执行，避免线程池调度开销；
+        SQLite和共享状态后端有磁盘或网络往返，放到线程中执行，不阻塞事件循环。
+        """
+        if isinstance(self.backend, LRUCacheBackend):
+            return func(*args)
+        return await asyncio.to_thread(func, *args)
+
+    async def alookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        return await self._offload(self.lookup, prompt, llm_string)
+
+    async def aupdate(
+        self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE
+    ) -> None:
+        await self._offload(self.update, prompt, llm_string, return_val)
+
+    async def aclear(self, **kwargs: Any) -> None:
+        await self._offload(self.backend.clear)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        total = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": getattr(self.backend, "evictions", 0),
+        }
+
+
+_llm_cache: Optional[ResponseCache] = None
+
+
+def cacheable_temperature(temperature: Optional[float]) -> bool:
+    """
+    该温度下的回复是否可以缓存
+
+    温度高于llm_cache_max_temperature意味着期望非确定性的回复，LLM响应缓存和语义缓存
+    都不使用。默认上限为0，只缓存确定性的调用。
+
+    Args:
+        temperature: 模型温度，None表示使用配置中的默认温度
+
+    Returns:
+        可以缓存时返回True
+    """
+    if temperature is None:
+        temperature = settings.siliconflow_temperature
+    return temperature <= settings.llm_cache_max_temperature
+
+
+def get_llm_cache() -> Optional[ResponseCache]:
+    """
+    获取全局LLM响应缓存
+
+    Returns:
+        根据配置创建的缓存实例，未启用缓存时返回None
+    """
+    global _llm_cache
+
+    if not settings.llm_cache_enabled:
+        return None
+
+    if _llm_cache is None:
+        if settings.llm_cache_backend == "sqlite":
+            backend: CacheBackend = SQLiteCacheBackend(
+                settings.llm_cache_path, max_entries=settings.llm_cache_max_entries
+            )
+        elif settings.llm_cache_backend == "shared":
+            backend = StateCacheBackend(get_state_backend())
+        else:
+            backend = LRUCacheBackend(max_entries=settings.llm_cache_max_entries)
+        _llm_cache = ResponseCache(
+            backend,
+            ttl_seconds=settings.llm_cache_ttl_seconds,
+            normalize=settings.llm_cache_normalize,
+        )
+    return _llm_cache
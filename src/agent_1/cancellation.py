@@ -0,0 +1,156 @@
+"""
+请求取消模块 - 客户端断开连接后取消仍在进行的模型和工具调用
+"""
+
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterator,
+    MutableMapping,
+    Optional,
+    Sequence,
+)
+
+from .log import get_logger
+from .metrics import REQUESTS_CANCELLED
+
+logger = get_logger(__name__)
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+
+class RequestCancelled(asyncio.CancelledError):
+    """
+    请求已被取消
+
+    继承CancelledError，因此不会被智能体和工具中通用的 except Exception 吞掉，
+    而是一直传到请求入口。
+    """
+
+
+class CancelScope:
+    """
+    一次请求的取消范围
+
+    异步代码在任务被取消时自然中止；在线程中运行的同步代码看不到任务取消，
+    需要在开始模型或工具调用之前检查这个标记。
+    """
+
+    __slots__ = ("cancelled", "reason")
+
+    def __init__(self) -> None:
+        self.cancelled = False
+        self.reason = ""
+
+    def cancel(self, reason: str = "请求已取消") -> None:
+        """标记取消，之后的检查点会抛出RequestCancelled"""
+        self.reason = reason
+        self.cancelled = True
+
+
+# 当前请求的取消范围；任务和ContextThreadPoolExecutor会复制上下文，
+# 因此在子任务和工作线程中同样可见
+_current_scope: ContextVar[Optional[CancelScope]] = ContextVar(
+    "agent_cancel_scope", default=None
+)
+
+
+@contextmanager
+def cancel_scope() -> Iterator[CancelScope]:
+    """在当前上下文中打开一个取消范围，范围内创建的任务和线程共享同一个标记"""
+    scope = CancelScope()
+    token = _current_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _current_scope.reset(token)
+
+
+def cancel_requested() -> bool:
+    """当前请求是否已被取消"""
+    scope = _current_scope.get()
+    return scope is not None and scope.cancelled
+
+
+def raise_if_cancelled() -> None:
+    """检查点：当前请求已被取消时抛出RequestCancelled"""
+    scope = _current_scope.get()
+    if scope is not None and scope.cancelled:
+        raise RequestCancelled(scope.reason)
+
+
+class DisconnectMiddleware:
+    """
+    客户端断开连接时取消请求处理的ASGI中间件
+
+    ASGI服务器只在应用读取receive通道时才告知连接已断开，而普通端点读完请求体后不再读取，
+    处理过程会一直进行到结束。中间件在后台持续读取receive通道并把消息经队列转交给应用；
+    响应发送完毕之前收到http.disconnect时，标记取消范围并取消处理请求的任务。
+    """
+
+    def __init__(self, app: ASGIApp, paths: Sequence[str] = ()):
+        """
+        初始化中间件
+
+        Args:
+            app: 下游ASGI应用
+            paths: 需要在断开时取消的路径前缀，同时作为指标标签
+        """
+        self.app = app
+        self.paths = tuple(paths)
+
+    def _label(self, path: str) -> Optional[str]:
+        for prefix in self.paths:
+            if path == prefix or path.startswith(prefix + "/"):
+                return prefix
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        label = self._label(scope.get("path", "")) if scope["type"] == "http" else None
+        if label is None:
+            await self.app(scope, receive, send)
+            return
+
+        messages: "asyncio.Queue[Message]" = asyncio.Queue()
+        state: Dict[str, bool] = {"complete": False}
+
+        async def send_wrapper(message: Message) -> None:
+            # 在交给服务器之前标记，服务器发送完最后一段后receive也会返回http.disconnect
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                state["complete"] = True
+            await send(message)
+
+        with cancel_scope() as cancel:
+            app_task = asyncio.ensure_future(
+                self.app(scope, messages.get, send_wrapper)
+            )
+
+        async def listen() -> None:
+            while True:
+                message = await receive()
+                messages.put_nowait(message)
+                if message["type"] == "http.disconnect":
+                    if not state["complete"] and not app_task.done():
+                        cancel.cancel("客户端已断开连接")
+                        app_task.cancel()
+                    return
+
+        listener = asyncio.ensure_future(listen())
+        try:
+            await app_task
+        except asyncio.CancelledError:
+            if not cancel.cancelled:
+                raise
+            REQUESTS_CANCELLED.labels(label).inc()
+            logger.info("客户端已断开连接，取消请求: %s", scope.get("path"))
+        finally:
+            listener.cancel()
@@ -0,0 +1,542 @@
+"""
+图检查点模块 - 基于SQLite的LangGraph检查点存储
+
+按thread_id保存图的状态，客户端每轮只需发送新消息。内存中保留最近使用线程的检查点，
+读取时不访问磁盘；写入可以先进入缓冲区，由后台线程按固定间隔批量写入SQLite。
+每个线程只保留最近的若干个检查点，旧检查点和不再被引用的通道数据会被一并裁剪。
+多个工作进程共享同一个数据库时使用共享模式：每次访问都从SQLite重新加载线程，写入立即落盘。
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+from collections import OrderedDict, defaultdict
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+)
+from langgraph.checkpoint.memory import InMemorySaver
+
+from .config import settings
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS checkpoints ("
+    "thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, "
+    "checkpoint_id TEXT NOT NULL, parent_checkpoint_id TEXT, "
+    "type TEXT, checkpoint BLOB, metadata_type TEXT, metadata BLOB, "
+    "PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id))",
+    "CREATE TABLE IF NOT EXISTS writes ("
+    "thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, "
+    "checkpoint_id TEXT NOT NULL, task_id TEXT NOT NULL, idx INTEGER NOT NULL, "
+    "channel TEXT NOT NULL, type TEXT, value BLOB, "
+    "task_path TEXT NOT NULL DEFAULT '', "
+    "PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx))",
+    "CREATE TABLE IF NOT EXISTS blobs ("
+    "thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, channel TEXT NOT NULL, "
+    "version TEXT NOT NULL, type TEXT, value BLOB, "
+    "PRIMARY KEY (thread_id, checkpoint_ns, channel, version))",
+)
+
+
+class SQLiteCheckpointSaver(InMemorySaver):
+    """
+    SQLite检查点存储
+
+    复用InMemorySaver的检查点读写逻辑，内存中只保留最近使用的max_cached_threads个线程，
+    其余线程在访问时从SQLite加载。内存中的数据总是最新的，SQLite是它的持久化副本。
+
+    裁剪只保留每个命名空间最新的检查点，本项目的图没有使用DeltaChannel，
+    因此不需要为其保留祖先检查点。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        write_behind: bool = False,
+        flush_interval: float = 1.0,
+        keep_last: Optional[int] = None,
+        max_cached_threads: int = 256,
+        shared: bool = False,
+        serde: Optional[SerializerProtocol] = None,
+    ):
+        """
+        初始化检查点存储
+
+        Args:
+            path: 数据库文件路径
+            write_behind: 是否延迟写入，开启后写操作只进入缓冲区，由后台线程批量写入
+            flush_interval: 延迟写入时的写盘间隔（秒）
+            keep_last: 每个线程最多保留的检查点数，None表示不裁剪
+            max_cached_threads: 内存中最多保留的线程数
+            shared: 是否与其他进程共享数据库，开启后忽略write_behind，
+                内存中的数据只在单次访问内有效
+            serde: 序列化器，默认使用LangGraph的JsonPlusSerializer
+        """
+        super().__init__(serde=serde)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.shared = shared
+        write_behind = write_behind and not shared
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self.keep_last = keep_last
+        self.max_cached_threads = max_cached_threads
+
+        # 同一个图的并行任务可能在多个线程中同时写入
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+
+        self._resident: "OrderedDict[str, None]" = OrderedDict()
+        # writes和blobs以(thread_id, ...)元组为键，按线程索引这些键，
+        # 淘汰线程时不需要遍历全部键
+        self._write_keys: Dict[str, Set[tuple]] = defaultdict(set)
+        self._blob_keys: Dict[str, Set[tuple]] = defaultdict(set)
+        self._pending: List[Tuple[str, tuple]] = []
+        self._closed = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        if write_behind:
+            self._flusher = threading.Thread(
+                target=self._flush_loop, name="checkpoint-flush", daemon=True
+            )
+            self._flusher.start()
+
+    # 内存与磁盘之间的同步
+
+    def _ensure_loaded(self, thread_id: str) -> None:
+        """确保线程的检查点已在内存中，必要时淘汰最久未使用的线程"""
+        if self.shared and thread_id in self._resident:
+            # 其他进程可能已经写入了新的检查点，丢弃内存副本后重新加载
+            del self._resident[thread_id]
+            self._drop_from_memory(thread_id)
+        if thread_id in self._resident:
+            self._resident.move_to_end(thread_id)
+            return
+
+        for row in self._conn.execute(
+            "SELECT checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, "
+            "checkpoint, metadata_type, metadata FROM checkpoints WHERE thread_id = ?",
+            (thread_id,),
+        ):
+            ns, checkpoint_id, parent_id, ctype, checkpoint, mtype, metadata = row
+            self.storage[thread_id][ns][checkpoint_id] = (
+                (ctype, checkpoint),
+                (mtype, metadata),
+                parent_id,
+            )
+        for row in self._conn.execute(
+            "SELECT checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, "
+            "task_path FROM writes WHERE thread_id = ?",
+            (thread_id,),
+        ):
+            ns, checkpoint_id, task_id, idx, channel, vtype, value, task_path = row
+            outer_key = (thread_id, ns, checkpoint_id)
+            self.writes[outer_key][(task_id, idx)] = (
+                task_id,
+                channel,
+                (vtype, value),
+                task_path,
+            )
+            self._write_keys[thread_id].add(outer_key)
+        for ns, channel, version, vtype, value in self._conn.execute(
+            "SELECT checkpoint_ns, channel, version, type, value FROM blobs "
+            "WHERE thread_id = ?",
+            (thread_id,),
+        ):
+            self.blobs[(thread_id, ns, channel, version)] = (vtype, value)
+            self._blob_keys[thread_id].add((thread_id, ns, channel, version))
+
+        self._resident[thread_id] = None
+        while len(self._resident) > self.max_cached_threads:
+            evicted, _ = self._resident.popitem(last=False)
+            # 淘汰前先把缓冲区写盘，保证之后能从SQLite完整加载
+            self._flush_locked()
+            self._drop_from_memory(evicted)
+
+    def _drop_from_memory(self, thread_id: str) -> None:
+        self.storage.pop(thread_id, None)
+        for key in self._write_keys.pop(thread_id, ()):
+            self.writes.pop(key, None)
+        for key in self._blob_keys.pop(thread_id, ()):
+            self.blobs.pop(key, None)
+
+    def _enqueue(self, sql: str, params: tuple) -> None:
+        self._pending.append((sql, params))
+
+    def _flush_locked(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        with self._conn:
+            for sql, params in pending:
+                self._conn.execute(sql, params)
+
+    def _maybe_flush(self) -> None:
+        if not self.write_behind:
+            self._flush_locked()
+
+    def _flush_loop(self) -> None:
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self) -> None:
+        """把缓冲区中的写操作写入SQLite"""
+        with self._lock:
+            self._flush_locked()
+
+    def close(self) -> None:
+        """停止后台写盘线程，写出剩余数据并关闭数据库连接"""
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        with self._lock:
+            self._flush_locked()
+            self._conn.close()
+
+    # 读取
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        with self._lock:
+            self._ensure_loaded(config["configurable"]["thread_id"])
+            return super().get_tuple(config)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        if config is not None:
+            thread_ids = [config["configurable"]["thread_id"]]
+        else:
+            with self._lock:
+                stored = [row[0] for row in self._conn.execute(
+                    "SELECT DISTINCT thread_id FROM checkpoints"
+                )]
+                thread_ids = list(dict.fromkeys([*self._resident, *stored]))
+
+        for thread_id in thread_ids:
+            if limit is not None and limit <= 0:
+                return
+            thread_config = config or {"configurable": {"thread_id": thread_id}}
+            with self._lock:
+                self._ensure_loaded(thread_id)
+                # 先取出完整结果，避免其他线程写入时遍历中的字典被修改
+                items = [
+                    *super().list(
+                        thread_config, filter=filter, before=before, limit=limit
+                    )
+                ]
+            if limit is not None:
+                limit -= len(items)
+            yield from items
+
+    def get_delta_channel_history(
+        self, *, config: RunnableConfig, channels: Sequence[str]
+    ):
+        with self._lock:
+            self._ensure_loaded(config["configurable"]["thread_id"])
+            return super().get_delta_channel_history(config=config, channels=channels)
+
+    # 写入
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        with self._lock:
+            self._ensure_loaded(thread_id)
+            next_config = super().put(config, checkpoint, metadata, new_versions)
+
+            namespace = self.storage[thread_id][checkpoint_ns]
+            saved, saved_metadata, parent_id = namespace[checkpoint["id"]]
+            self._enqueue(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint["id"],
+                    parent_id,
+                    *saved,
+                    *saved_metadata,
+                ),
+            )
+            for channel, version in new_versions.items():
+                key = (thread_id, checkpoint_ns, channel, version)
+                self._blob_keys[thread_id].add(key)
+                self._enqueue(
+                    "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)",
+                    (thread_id, checkpoint_ns, channel, str(version),
+                     *self.blobs[key]),
+                )
+
+            # 超过上限的两倍时才裁剪，把反序列化检查点的开销分摊到多次写入
+            if (
+                self.keep_last
+                and len(self.storage[thread_id][checkpoint_ns]) > 2 * self.keep_last
+            ):
+                self._prune_namespace(thread_id, checkpoint_ns, self.keep_last)
+            self._maybe_flush()
+        return next_config
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        with self._lock:
+            self._ensure_loaded(thread_id)
+            super().put_writes(config, writes, task_id, task_path)
+
+            outer_key = (thread_id, checkpoint_ns, checkpoint_id)
+            self._write_keys[thread_id].add(outer_key)
+            stored = self.writes[outer_key]
+            for (write_task_id, idx), (_, channel, value, path) in stored.items():
+                if write_task_id == task_id:
+                    self._enqueue(
+                        "INSERT OR REPLACE INTO writes "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (*outer_key, task_id, idx, channel, *value, path),
+                    )
+            self._maybe_flush()
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._resident.pop(thread_id, None)
+            self._drop_from_memory(thread_id)
+            for table in ("checkpoints", "writes", "blobs"):
+                self._enqueue(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+            self._maybe_flush()
+
+    # 异步接口：加载和写入都会访问SQLite，放到线程中执行，避免阻塞事件循环
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        def collect() -> List[CheckpointTuple]:
+            return [*self.list(config, filter=filter, before=before, limit=limit)]
+
+        for item in await asyncio.to_thread(collect):
+            yield item
+
+    async def aget_delta_channel_history(
+        self, *, config: RunnableConfig, channels: Sequence[str]
+    ):
+        return await asyncio.to_thread(
+            self.get_delta_channel_history, config=config, channels=channels
+        )
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(
+            self.put, config, checkpoint, metadata, new_versions
+        )
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    # 裁剪与压缩
+
+    def _prune_namespace(self, thread_id: str, checkpoint_ns: str, keep: int) -> int:
+        """只保留命名空间内最新的keep个检查点，返回删除的检查点数"""
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        expired = sorted(checkpoints)[:-keep] if keep > 0 else sorted(checkpoints)
+        if not expired:
+            return 0
+
+        for checkpoint_id in expired:
+            del checkpoints[checkpoint_id]
+            outer_key = (thread_id, checkpoint_ns, checkpoint_id)
+            self.writes.pop(outer_key, None)
+            self._write_keys[thread_id].discard(outer_key)
+            self._enqueue(
+                "DELETE FROM checkpoints "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            )
+            self._enqueue(
+                "DELETE FROM writes "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            )
+
+        # 删除不再被任何剩余检查点引用的通道数据
+        referenced: Set[Tuple[str, Any]] = set()
+        for saved, _, _ in checkpoints.values():
+            versions = self.serde.loads_typed(saved).get("channel_versions", {})
+            referenced.update(versions.items())
+        blob_keys = self._blob_keys[thread_id]
+        for key in [
+            k
+            for k in blob_keys
+            if k[1] == checkpoint_ns and (k[2], k[3]) not in referenced
+        ]:
+            blob_keys.discard(key)
+            self.blobs.pop(key, None)
+            self._enqueue(
+                "DELETE FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? "
+                "AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, key[2], str(key[3])),
+            )
+        return len(expired)
+
+    def prune(
+        self, thread_ids: Sequence[str], *, strategy: str = "keep_latest"
+    ) -> None:
+        """
+        裁剪指定线程的检查点
+
+        Args:
+            thread_ids: 线程ID列表
+            strategy: "keep_latest"只保留每个命名空间最新的检查点，
+                "delete"删除全部检查点
+        """
+        if strategy not in ("keep_latest", "delete"):
+            raise ValueError(f"不支持的裁剪策略: {strategy}")
+
+        with self._lock:
+            for thread_id in thread_ids:
+                if strategy == "delete":
+                    self.delete_thread(thread_id)
+                    continue
+                self._ensure_loaded(thread_id)
+                for checkpoint_ns in list(self.storage[thread_id]):
+                    self._prune_namespace(thread_id, checkpoint_ns, 1)
+            self._maybe_flush()
+
+    async def aprune(
+        self, thread_ids: Sequence[str], *, strategy: str = "keep_latest"
+    ) -> None:
+        await asyncio.to_thread(self.prune, thread_ids, strategy=strategy)
+
+    def compact(self) -> Dict[str, int]:
+        """
+        按keep_last裁剪所有线程，写出缓冲区并回收数据库文件空间
+
+        Returns:
+            {"threads": 处理的线程数, "pruned": 删除的检查点数}
+        """
+        keep = self.keep_last or 1
+        pruned = 0
+        with self._lock:
+            thread_ids = [row[0] for row in self._conn.execute(
+                "SELECT DISTINCT thread_id FROM checkpoints"
+            )]
+            thread_ids = list(dict.fromkeys([*thread_ids, *self._resident]))
+            for thread_id in thread_ids:
+                self._ensure_loaded(thread_id)
+                for checkpoint_ns in list(self.storage[thread_id]):
+                    pruned += self._prune_namespace(thread_id, checkpoint_ns, keep)
+                self._flush_locked()
+            self._conn.execute("VACUUM")
+        return {"threads": len(thread_ids), "pruned": pruned}
+
+    def stats(self) -> Dict[str, int]:
+        """获取检查点存储统计信息"""
+        with self._lock:
+            return {
+                "cached_threads": len(self._resident),
+                "pending_writes": len(self._pending),
+                "checkpoints": self._conn.execute(
+                    "SELECT COUNT(*) FROM checkpoints"
+                ).fetchone()[0],
+            }
+
+
+_checkpointer: Optional[BaseCheckpointSaver] = None
+
+
+def get_checkpointer() -> Optional[BaseCheckpointSaver]:
+    """
+    获取全局图检查点存储
+
+    Returns:
+        根据graph_checkpointer配置创建的检查点存储，配置为none时返回None
+    """
+    global _checkpointer
+
+    if settings.graph_checkpointer == "none":
+        return None
+
+    if _checkpointer is None:
+        if settings.graph_checkpointer == "memory":
+            _checkpointer = InMemorySaver()
+        else:
+            _checkpointer = SQLiteCheckpointSaver(
+                settings.graph_checkpoint_path,
+                write_behind=settings.graph_checkpoint_write_behind,
+                flush_interval=settings.graph_checkpoint_flush_interval,
+                keep_last=settings.graph_checkpoint_keep_last,
+                max_cached_threads=settings.graph_checkpoint_max_cached_threads,
+                shared=settings.workers != 1,
+            )
+    return _checkpointer
+
+
+def close_checkpointer() -> None:
+    """写出并关闭全局检查点存储"""
+    global _checkpointer
+
+    if isinstance(_checkpointer, SQLiteCheckpointSaver):
+        _checkpointer.close()
+    _checkpointer = None
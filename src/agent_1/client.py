@@ -1,24 +1,211 @@
 """
 API客户端示例 - 展示如何使用智能体API
+
+同步客户端AgentClient基于requests.Session，异步客户端AsyncAgentClient基于httpx.AsyncClient，
+两者都复用keep-alive连接，并在遇到429/5xx或连接错误时按带抖动的指数退避重试。
+POST请求不是幂等的，默认只在服务端确定没有处理请求时（连接失败、429、503）重试。
 """
 
-import requests
+import asyncio
 import json
-from typing import Dict, Any
+import random
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Union
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError
+
+# 需要重试的状态码
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# 非幂等请求只在这些状态码下重试：服务端拒绝了请求，没有开始处理
+NON_IDEMPOTENT_RETRY_STATUSES = frozenset({429, 503})
+# 重复发送不会产生额外副作用的请求方法
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+def backoff_delay(
+    attempt: int, base: float, max_delay: float, retry_after: Optional[float] = None
+) -> float:
+    """
+    计算第attempt次重试前的等待时间
+
+    在[0, min(max_delay, base * 2^attempt)]区间内随机取值（全抖动），
+    避免大量客户端同时重试；
+    服务端通过Retry-After给出等待时间时不短于该值。
+
+    Args:
+        attempt: 已经失败的次数，从0开始
+        base: 退避基数（秒）
+        max_delay: 单次等待上限（秒）
+        retry_after: 服务端要求的等待时间（秒）
+
+    Returns:
+        等待秒数
+    """
+    delay = random.uniform(0, min(max_delay, base * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+def parse_retry_after(headers: Any) -> Optional[float]:
+    """解析以秒为单位的Retry-After响应头，不支持HTTP日期格式"""
+    value = headers.get("Retry-After")
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _connect_failed(error: requests.exceptions.RequestException) -> bool:
+    """请求是否在建立连接时失败，此时请求还没有发送到服务端"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    # NewConnectionError（拒绝连接、域名解析失败）是ConnectTimeoutError的子类
+    return isinstance(error, requests.exceptions.ConnectionError) and isinstance(
+        reason, ConnectTimeoutError
+    )
+
+
+class SSEDecoder:
+    """把SSE文本行解析为事件，data字段是JSON时自动解码"""
+    
+    def __init__(self):
+        self._event: Optional[str] = None
+        self._data: List[str] = []
+    
+    def feed(self, line: str) -> Optional[Dict[str, Any]]:
+        """
+        输入一行文本
+        
+        Returns:
+            遇到空行且有数据时返回 {"event": 类型, "data": 内容}，否则返回None
+        """
+        line = line.rstrip("\r\n")
+        if not line:
+            if not self._data:
+                self._event = None
+                return None
+            raw = "\n".join(self._data)
+            try:
+                data = json.loads(raw)
+            except json.JSONDecodeError:
+                data = raw
+            event = {"event": self._event or "message", "data": data}
+            self._event, self._data = None, []
+            return event
+        if line.startswith(":"):
+            # 注释行，例如心跳
+            return None
+        field, _, value = line.partition(":")
+        value = value[1:] if value.startswith(" ") else value
+        if field == "event":
+            self._event = value
+        elif field == "data":
+            self._data.append(value)
+        return None
+
+
+def iter_sse(lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """从文本行迭代SSE事件"""
+    decoder = SSEDecoder()
+    for line in lines:
+        event = decoder.feed(line)
+        if event is not None:
+            yield event
+    event = decoder.feed("")
+    if event is not None:
+        yield event
 
 
 class AgentClient:
     """智能体API客户端"""
     
-    def __init__(self, base_url: str = "http://localhost:8000"):
+    def __init__(
+        self,
+        base_url: str = "http://localhost:8000",
+        session_id: Optional[str] = None,
+        timeout: float = 60.0,
+        connect_timeout: float = 5.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        pool_maxsize: int = 10,
+        retry_non_idempotent: bool = False,
+    ):
         """
         初始化客户端
         
         Args:
             base_url: API服务器地址
+            session_id: 默认会话ID，不提供时为每个客户端生成一个
+            timeout: 读取超时（秒）
+            connect_timeout: 连接超时（秒）
+            max_retries: 遇到429/5xx或连接错误时的最大重试次数
+            backoff_base: 退避基数（秒）
+            backoff_max: 单次退避上限（秒）
+            pool_maxsize: 连接池中保留的最大连接数
+            retry_non_idempotent: POST请求在读取超时和500/502/504时也重试，
+                服务端可能已经处理过请求，重试会让同一条消息执行多次
         """
         self.base_url = base_url.rstrip("/")
-        self.session_id = "default_session"
+        self.session_id = session_id or f"client-{uuid.uuid4().hex}"
+        self.timeout = (connect_timeout, timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_non_idempotent = retry_non_idempotent
+        
+        # 重试由_request统一处理，连接池只负责复用连接
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_maxsize, max_retries=0
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _request(
+        self, method: str, path: str, stream: bool = False, **kwargs: Any
+    ) -> requests.Response:
+        """
+        发送请求，遇到429/5xx或连接错误时退避重试
+
+        非幂等请求默认只在连接失败和429/503时重试，避免服务端已经处理的请求被重复执行。
+        """
+        idempotent = method.upper() in IDEMPOTENT_METHODS or self.retry_non_idempotent
+        statuses = RETRY_STATUSES if idempotent else NON_IDEMPOTENT_RETRY_STATUSES
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.request(
+                    method,
+                    f"{self.base_url}{path}",
+                    timeout=self.timeout,
+                    stream=stream,
+                    **kwargs,
+                )
+            except (
+                requests.exceptions.ConnectionError, requests.exceptions.Timeout
+            ) as e:
+                if attempt == self.max_retries or not (
+                    idempotent or _connect_failed(e)
+                ):
+                    raise
+                time.sleep(backoff_delay(attempt, self.backoff_base, self.backoff_max))
+                continue
+
+            retryable = response.status_code in statuses
+            if not retryable or attempt == self.max_retries:
+                return response
+            response.close()
+            retry_after = parse_retry_after(response.headers)
+            time.sleep(backoff_delay(
+                attempt, self.backoff_base, self.backoff_max, retry_after
+            ))
+        raise AssertionError("unreachable")
     
     def chat(self, message: str, session_id: str = None) -> str:
         """
@@ -27,19 +214,17 @@ class AgentClient:
         Args:
             message: 用户消息
             session_id: 会话ID，可选
-            
+        
         Returns:
             智能体回复
         """
-        url = f"{self.base_url}/chat"
-        
         payload = {
             "message": message,
             "session_id": session_id or self.session_id
         }
         
         try:
-            response = requests.post(url, json=payload)
+            response = self._request("POST", "/chat", json=payload)
             response.raise_for_status()
             
             data = response.json()
@@ -48,6 +233,74 @@ class AgentClient:
             return f"请求错误: {str(e)}"
         except json.JSONDecodeError:
             return "解析响应时出错"
+
+    def chat_stream(
+        self, message: str, session_id: str = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        流式发送聊天消息
+
+        Args:
+            message: 用户消息
+            session_id: 会话ID，可选
+
+        Yields:
+            事件字典 {"event": 类型, "data": 内容}，
+                类型包括token、tool_start、tool_end、final和error
+        """
+        payload = {
+            "message": message,
+            "session_id": session_id or self.session_id
+        }
+        
+        try:
+            with self._request(
+                "POST", "/chat/stream", stream=True, json=payload
+            ) as response:
+                response.raise_for_status()
+                # 未声明字符集时按UTF-8解码，否则iter_lines会返回bytes
+                response.encoding = response.encoding or "utf-8"
+                yield from iter_sse(response.iter_lines(decode_unicode=True))
+        except requests.exceptions.RequestException as e:
+            yield {"event": "error", "data": f"请求错误: {str(e)}"}
+    
+    def chat_many(
+        self,
+        messages: List[Union[str, Dict[str, str]]],
+        max_concurrency: Optional[int] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        批量发送聊天消息，按完成先后逐条返回结果
+        
+        Args:
+            messages: 消息列表，元素可以是字符串，也可以是包含message和session_id的字典
+            max_concurrency: 服务端最大并发数，可选
+        
+        Yields:
+            结果字典，包含index（输入序号）、response和session_id
+        """
+        payload: Dict[str, Any] = {
+            "messages": [
+                {"message": item, "session_id": None} if isinstance(item, str) else item
+                for item in messages
+            ]
+        }
+        if max_concurrency:
+            payload["max_concurrency"] = max_concurrency
+        
+        try:
+            with self._request(
+                "POST", "/chat/batch", stream=True, json=payload
+            ) as response:
+                response.raise_for_status()
+                response.encoding = response.encoding or "utf-8"
+                for line in response.iter_lines(decode_unicode=True):
+                    if line:
+                        yield json.loads(line)
+        except requests.exceptions.RequestException as e:
+            yield {"error": f"请求错误: {str(e)}"}
+        except json.JSONDecodeError:
+            yield {"error": "解析响应时出错"}
     
     def invoke_agent(self, message: str) -> Dict[str, Any]:
         """
@@ -55,12 +308,10 @@ class AgentClient:
         
         Args:
             message: 用户消息
-            
+        
         Returns:
             完整的响应数据
         """
-        url = f"{self.base_url}/agent/invoke"
-        
         payload = {
             "input": {
                 "message": message,
@@ -69,7 +320,7 @@ class AgentClient:
         }
         
         try:
-            response = requests.post(url, json=payload)
+            response = self._request("POST", "/agent/invoke", json=payload)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -84,16 +335,254 @@ class AgentClient:
         Returns:
             API信息字典
         """
-        url = f"{self.base_url}/"
-        
         try:
-            response = requests.get(url)
+            response = self._request("GET", "/")
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
             return {"error": f"请求错误: {str(e)}"}
         except json.JSONDecodeError:
             return {"error": "解析响应时出错"}
+    
+    def close(self) -> None:
+        """关闭连接池"""
+        self.session.close()
+    
+    def __enter__(self) -> "AgentClient":
+        return self
+    
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+class AsyncAgentClient:
+    """异步智能体API客户端，适合在服务内部以高并发调用"""
+    
+    def __init__(
+        self,
+        base_url: str = "http://localhost:8000",
+        session_id: Optional[str] = None,
+        timeout: float = 60.0,
+        connect_timeout: float = 5.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        retry_non_idempotent: bool = False,
+    ):
+        """
+        初始化客户端
+        
+        Args:
+            base_url: API服务器地址
+            session_id: 默认会话ID，不提供时为每个客户端生成一个
+            timeout: 读写超时（秒）
+            connect_timeout: 连接超时（秒）
+            max_retries: 遇到429/5xx或连接错误时的最大重试次数
+            backoff_base: 退避基数（秒）
+            backoff_max: 单次退避上限（秒）
+            max_connections: 最大连接数
+            max_keepalive_connections: 保持空闲的最大连接数
+            keepalive_expiry: 空闲连接的保持时间（秒）
+            transport: 自定义传输层，便于测试时替换
+            retry_non_idempotent: POST请求在读写超时和500/502/504时也重试，
+                服务端可能已经处理过请求，重试会让同一条消息执行多次
+        """
+        self.session_id = session_id or f"client-{uuid.uuid4().hex}"
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_non_idempotent = retry_non_idempotent
+        self._client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            transport=transport,
+        )
+
+    async def _send(
+        self, method: str, path: str, stream: bool = False, **kwargs: Any
+    ) -> httpx.Response:
+        """
+        发送请求，遇到429/5xx或连接错误时退避重试；流式响应只在读取响应体之前重试
+
+        非幂等请求默认只在连接失败和429/503时重试，避免服务端已经处理的请求被重复执行。
+        """
+        idempotent = method.upper() in IDEMPOTENT_METHODS or self.retry_non_idempotent
+        statuses = RETRY_STATUSES if idempotent else NON_IDEMPOTENT_RETRY_STATUSES
+        for attempt in range(self.max_retries + 1):
+            request = self._client.build_request(method, path, **kwargs)
+            try:
+                response = await self._client.send(request, stream=stream)
+            except httpx.TransportError as e:
+                # ConnectError和ConnectTimeout时请求还没有发送到服务端
+                connect_failed = isinstance(
+                    e, (httpx.ConnectError, httpx.ConnectTimeout)
+                )
+                if attempt == self.max_retries or not (idempotent or connect_failed):
+                    raise
+                await asyncio.sleep(
+                    backoff_delay(attempt, self.backoff_base, self.backoff_max)
+                )
+                continue
+
+            retryable = response.status_code in statuses
+            if not retryable or attempt == self.max_retries:
+                return response
+            await response.aclose()
+            retry_after = parse_retry_after(response.headers)
+            await asyncio.sleep(backoff_delay(
+                attempt, self.backoff_base, self.backoff_max, retry_after
+            ))
+        raise AssertionError("unreachable")
+
+    async def _stream_lines(
+        self, path: str, payload: Dict[str, Any]
+    ) -> AsyncIterator[str]:
+        response = await self._send("POST", path, stream=True, json=payload)
+        try:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                yield line
+        finally:
+            await response.aclose()
+    
+    async def chat(self, message: str, session_id: Optional[str] = None) -> str:
+        """
+        发送聊天消息
+        
+        Args:
+            message: 用户消息
+            session_id: 会话ID，可选
+        
+        Returns:
+            智能体回复
+        """
+        payload = {"message": message, "session_id": session_id or self.session_id}
+        
+        try:
+            response = await self._send("POST", "/chat", json=payload)
+            response.raise_for_status()
+            return response.json().get("response", "抱歉，没有收到回复。")
+        except httpx.HTTPError as e:
+            return f"请求错误: {str(e)}"
+        except json.JSONDecodeError:
+            return "解析响应时出错"
+
+    async def chat_stream(
+        self, message: str, session_id: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        流式发送聊天消息
+
+        Args:
+            message: 用户消息
+            session_id: 会话ID，可选
+
+        Yields:
+            事件字典 {"event": 类型, "data": 内容}，
+                类型包括token、tool_start、tool_end、final和error
+        """
+        payload = {"message": message, "session_id": session_id or self.session_id}
+        decoder = SSEDecoder()
+        
+        try:
+            async for line in self._stream_lines("/chat/stream", payload):
+                event = decoder.feed(line)
+                if event is not None:
+                    yield event
+            event = decoder.feed("")
+            if event is not None:
+                yield event
+        except httpx.HTTPError as e:
+            yield {"event": "error", "data": f"请求错误: {str(e)}"}
+    
+    async def chat_many(
+        self,
+        messages: List[Union[str, Dict[str, str]]],
+        max_concurrency: Optional[int] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        批量发送聊天消息，按完成先后逐条返回结果
+        
+        Args:
+            messages: 消息列表，元素可以是字符串，也可以是包含message和session_id的字典
+            max_concurrency: 服务端最大并发数，可选
+        
+        Yields:
+            结果字典，包含index（输入序号）、response和session_id
+        """
+        payload: Dict[str, Any] = {
+            "messages": [
+                {"message": item, "session_id": None} if isinstance(item, str) else item
+                for item in messages
+            ]
+        }
+        if max_concurrency:
+            payload["max_concurrency"] = max_concurrency
+        
+        try:
+            async for line in self._stream_lines("/chat/batch", payload):
+                if line:
+                    yield json.loads(line)
+        except httpx.HTTPError as e:
+            yield {"error": f"请求错误: {str(e)}"}
+        except json.JSONDecodeError:
+            yield {"error": "解析响应时出错"}
+    
+    async def invoke_agent(self, message: str) -> Dict[str, Any]:
+        """
+        调用智能体端点
+        
+        Args:
+            message: 用户消息
+        
+        Returns:
+            完整的响应数据
+        """
+        payload = {"input": {"message": message, "session_id": self.session_id}}
+        
+        try:
+            response = await self._send("POST", "/agent/invoke", json=payload)
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPError as e:
+            return {"error": f"请求错误: {str(e)}"}
+        except json.JSONDecodeError:
+            return {"error": "解析响应时出错"}
+    
+    async def get_api_info(self) -> Dict[str, Any]:
+        """
+        获取API信息
+        
+        Returns:
+            API信息字典
+        """
+        try:
+            response = await self._send("GET", "/")
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPError as e:
+            return {"error": f"请求错误: {str(e)}"}
+        except json.JSONDecodeError:
+            return {"error": "解析响应时出错"}
+    
+    async def aclose(self) -> None:
+        """关闭连接池"""
+        await self._client.aclose()
+    
+    async def __aenter__(self) -> "AsyncAgentClient":
+        return self
+    
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
 
 
 def main():
@@ -122,11 +611,23 @@ def main():
         response = client.chat(question)
         print(f"智能体: {response}")
     
+    # 流式聊天示例
+    print("\n流式聊天示例:")
+    print("智能体: ", end="", flush=True)
+    for event in client.chat_stream("用三句话介绍LangChain"):
+        if event["event"] == "token":
+            print(event["data"], end="", flush=True)
+        elif event["event"] == "error":
+            print(event["data"], end="")
+    print()
+    
     # 使用智能体端点示例
     print("\n使用智能体端点示例:")
     response = client.invoke_agent("请用一句话总结人工智能")
     print(f"响应: {json.dumps(response, indent=2, ensure_ascii=False)}")
+    
+    client.close()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
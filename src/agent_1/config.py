@@ -3,7 +3,7 @@
 """
 
 import os
-from typing import Optional
+from typing import Dict, List, Optional
 
 from dotenv import load_dotenv
 from pydantic import Field
@@ -17,22 +17,262 @@ class Settings(BaseSettings):
     """应用设置"""
     
     # Silicon Flow (硅基流动) 配置 - 兼容OpenAI API格式
-    siliconflow_api_key: str = Field(..., env="SILICONFLOW_API_KEY")
+    # 密钥在首次创建模型时才校验，缺失时不影响模块导入
+    siliconflow_api_key: Optional[str] = Field(default=None, env="SILICONFLOW_API_KEY")
     siliconflow_model: str = Field(default="THUDM/GLM-Z1-9B-0414", env="SILICONFLOW_MODEL")
     siliconflow_temperature: float = Field(default=0.7, env="SILICONFLOW_TEMPERATURE")
     siliconflow_base_url: str = Field(default="https://api.siliconflow.cn/v1", env="SILICONFLOW_BASE_URL")
     
     # Tavily搜索配置
     tavily_api_key: Optional[str] = Field(default=None, env="TAVILY_API_KEY")
+    # 为空时使用官方地址
+    tavily_base_url: Optional[str] = Field(default=None, env="TAVILY_BASE_URL")
     
     # LangSmith配置
     langsmith_api_key: Optional[str] = Field(default=None, env="LANGSMITH_API_KEY")
     langsmith_project: str = Field(default="langchain-agent-1", env="LANGSMITH_PROJECT")
     langsmith_tracing: bool = Field(default=True, env="LANGSMITH_TRACING")
     
+    # HTTP连接池配置（模型和搜索工具共享）
+    http_max_connections: int = Field(default=100, env="HTTP_MAX_CONNECTIONS")
+    http_max_keepalive_connections: int = Field(
+        default=20, env="HTTP_MAX_KEEPALIVE_CONNECTIONS"
+    )
+    # 空闲连接保留时间（秒）
+    http_keepalive_expiry: float = Field(default=30.0, env="HTTP_KEEPALIVE_EXPIRY")
+    http_timeout: float = Field(default=60.0, env="HTTP_TIMEOUT")  # 读写超时（秒）
+    # 建连超时（秒）
+    http_connect_timeout: float = Field(default=10.0, env="HTTP_CONNECT_TIMEOUT")
+    http2: bool = Field(default=False, env="HTTP2")  # 需要安装 httpx[http2]
+    
+    # LLM响应缓存配置
+    llm_cache_enabled: bool = Field(default=True, env="LLM_CACHE_ENABLED")
+    # memory、sqlite 或 shared（使用共享状态后端）
+    llm_cache_backend: str = Field(default="memory", env="LLM_CACHE_BACKEND")
+    llm_cache_path: str = Field(default=".cache/llm_cache.sqlite", env="LLM_CACHE_PATH")
+    llm_cache_max_entries: int = Field(default=1000, env="LLM_CACHE_MAX_ENTRIES")
+    llm_cache_ttl_seconds: float = Field(default=3600.0, env="LLM_CACHE_TTL_SECONDS")
+    # 超过该温度不使用LLM响应缓存和语义缓存，默认只缓存温度为0的确定性调用
+    llm_cache_max_temperature: float = Field(
+        default=0.0, env="LLM_CACHE_MAX_TEMPERATURE"
+    )
+    # 按规范化提示词匹配
+    llm_cache_normalize: bool = Field(default=True, env="LLM_CACHE_NORMALIZE")
+    
+    # 模型准入控制配置（上游按每分钟请求数和token数限流）
+    llm_admission_enabled: bool = Field(default=True, env="LLM_ADMISSION_ENABLED")
+    # 0表示不限制
+    llm_requests_per_minute: int = Field(default=1000, env="LLM_REQUESTS_PER_MINUTE")
+    # 0表示不限制
+    llm_tokens_per_minute: int = Field(default=50000, env="LLM_TOKENS_PER_MINUTE")
+    # 在途模型请求数上限，0表示不限制
+    llm_max_concurrency: int = Field(default=16, env="LLM_MAX_CONCURRENCY")
+    # 等待队列长度，超出时立即返回503
+    llm_queue_max: int = Field(default=64, env="LLM_QUEUE_MAX")
+    # 排队截止时间（秒）
+    llm_queue_timeout: float = Field(default=30.0, env="LLM_QUEUE_TIMEOUT")
+    # 预估token消耗时预留的输出长度
+    llm_expected_output_tokens: int = Field(
+        default=512, env="LLM_EXPECTED_OUTPUT_TOKENS"
+    )
+    # 429/5xx/连接错误的最大重试次数
+    llm_max_retries: int = Field(default=3, env="LLM_MAX_RETRIES")
+    # 单次模型调用排队和重试的总时间预算
+    llm_retry_budget_seconds: float = Field(
+        default=60.0, env="LLM_RETRY_BUDGET_SECONDS"
+    )
+    # 退避基数（秒）
+    llm_backoff_base: float = Field(default=0.5, env="LLM_BACKOFF_BASE")
+    # 单次退避上限（秒）
+    llm_backoff_max: float = Field(default=10.0, env="LLM_BACKOFF_MAX")
+    
+    # 语义缓存配置（换了说法的重复问题直接返回之前的回答）
+    semantic_cache_enabled: bool = Field(default=True, env="SEMANTIC_CACHE_ENABLED")
+    # 余弦相似度阈值
+    semantic_cache_threshold: float = Field(
+        default=0.85, env="SEMANTIC_CACHE_THRESHOLD"
+    )
+    semantic_cache_ttl_seconds: float = Field(
+        default=3600.0, env="SEMANTIC_CACHE_TTL_SECONDS"
+    )
+    semantic_cache_volatile_tools: List[str] = Field(
+        default_factory=lambda: ["tavily_search", "get_weather"],
+        env="SEMANTIC_CACHE_VOLATILE_TOOLS",
+    )  # 实时性工具，使用了这些工具的回答使用较短的有效期，JSON格式
+    # 0表示不缓存
+    semantic_cache_volatile_ttl_seconds: float = Field(
+        default=600.0, env="SEMANTIC_CACHE_VOLATILE_TTL_SECONDS"
+    )
+    semantic_cache_max_entries: int = Field(
+        default=2000, env="SEMANTIC_CACHE_MAX_ENTRIES"
+    )
+    # 持久化文件前缀，为空时只保存在内存中
+    semantic_cache_path: Optional[str] = Field(default=None, env="SEMANTIC_CACHE_PATH")
+    # fastembed模型名，为空时使用特征哈希
+    semantic_cache_embedding_model: Optional[str] = Field(
+        default=None, env="SEMANTIC_CACHE_EMBEDDING_MODEL"
+    )
+
+    # 工具执行配置
+    # 默认单次工具调用超时
+    tool_timeout_seconds: float = Field(default=30.0, env="TOOL_TIMEOUT_SECONDS")
+    # 按工具名覆盖超时，JSON格式
+    tool_timeouts: Dict[str, float] = Field(default_factory=dict, env="TOOL_TIMEOUTS")
+    # 全局工具并发上限
+    tool_max_concurrency: int = Field(default=8, env="TOOL_MAX_CONCURRENCY")
+    
+    # 工具结果缓存配置
+    tool_cache_enabled: bool = Field(default=True, env="TOOL_CACHE_ENABLED")
+    # 按工具名配置的缓存有效期（秒），未配置的工具不缓存，JSON格式；
+    # 天气工具按观测更新周期自行缓存
+    tool_cache_ttls: Dict[str, float] = Field(
+        default_factory=lambda: {"tavily_search": 300.0}, env="TOOL_CACHE_TTLS"
+    )
+    # 失败结果的缓存时间
+    tool_cache_negative_ttl_seconds: float = Field(
+        default=10.0, env="TOOL_CACHE_NEGATIVE_TTL_SECONDS"
+    )
+    tool_cache_max_entries: int = Field(default=1000, env="TOOL_CACHE_MAX_ENTRIES")
+    
+    # 天气查询配置
+    # open-meteo 或 stub（本地固定数据）
+    weather_provider: str = Field(default="open-meteo", env="WEATHER_PROVIDER")
+    weather_base_url: str = Field(
+        default="https://api.open-meteo.com", env="WEATHER_BASE_URL"
+    )
+    # 为空时只缓存在内存中
+    weather_cache_path: Optional[str] = Field(
+        default=".cache/weather.sqlite", env="WEATHER_CACHE_PATH"
+    )
+    # 观测至少缓存的时间
+    weather_min_ttl_seconds: float = Field(default=60.0, env="WEATHER_MIN_TTL_SECONDS")
+    
+    # 批量请求配置
+    # 批量请求的默认并发数
+    batch_max_concurrency: int = Field(default=8, env="BATCH_MAX_CONCURRENCY")
+    # 单个批量请求最多包含的消息数
+    batch_max_items: int = Field(default=100, env="BATCH_MAX_ITEMS")
+    
+    # 会话配置
+    # LRU容量
+    session_max_sessions: int = Field(default=1000, env="SESSION_MAX_SESSIONS")
+    # 空闲过期时间
+    session_ttl_seconds: float = Field(default=3600.0, env="SESSION_TTL_SECONDS")
+    # 每个会话最多保留的消息数
+    session_max_messages: int = Field(default=40, env="SESSION_MAX_MESSAGES")
+    # 每个会话最多保留的token数
+    session_max_tokens: int = Field(default=4000, env="SESSION_MAX_TOKENS")
+    # 进程内会话的快照文件，退出时写入、启动时恢复
+    session_snapshot_path: Optional[str] = Field(
+        default=None, env="SESSION_SNAPSHOT_PATH"
+    )
+
+    # 历史裁剪配置
+    # 每轮注入提示词的历史token预算
+    history_max_tokens: int = Field(default=3000, env="HISTORY_MAX_TOKENS")
+    # 按模型名覆盖预算，JSON格式
+    history_token_budgets: Dict[str, int] = Field(
+        default_factory=dict, env="HISTORY_TOKEN_BUDGETS"
+    )
+    # 超出预算时保留原文的最近轮数
+    history_keep_turns: int = Field(default=4, env="HISTORY_KEEP_TURNS")
+    # 关闭时直接丢弃较早的对话
+    history_summary_enabled: bool = Field(default=True, env="HISTORY_SUMMARY_ENABLED")
+    # 生成摘要的模型
+    history_summary_model: str = Field(
+        default="Qwen/Qwen2.5-7B-Instruct", env="HISTORY_SUMMARY_MODEL"
+    )
+
+    # 图检查点配置（/graph按thread_id保存对话状态）
+    # sqlite、memory 或 none
+    graph_checkpointer: str = Field(default="sqlite", env="GRAPH_CHECKPOINTER")
+    graph_checkpoint_path: str = Field(
+        default=".cache/checkpoints.sqlite", env="GRAPH_CHECKPOINT_PATH"
+    )
+    # 延迟批量写盘
+    graph_checkpoint_write_behind: bool = Field(
+        default=True, env="GRAPH_CHECKPOINT_WRITE_BEHIND"
+    )
+    # 写盘间隔（秒）
+    graph_checkpoint_flush_interval: float = Field(
+        default=1.0, env="GRAPH_CHECKPOINT_FLUSH_INTERVAL"
+    )
+    # 每个线程保留的检查点数
+    graph_checkpoint_keep_last: int = Field(
+        default=10, env="GRAPH_CHECKPOINT_KEEP_LAST"
+    )
+    # 内存中保留的线程数
+    graph_checkpoint_max_cached_threads: int = Field(
+        default=256, env="GRAPH_CHECKPOINT_MAX_CACHED_THREADS"
+    )
+
+    # 长期记忆存储配置（图的store，条目追加写入日志，向量保存在内存映射文件中）
+    graph_store: str = Field(default="memmap", env="GRAPH_STORE")  # memmap 或 memory
+    # 文件前缀
+    graph_store_path: str = Field(default=".cache/store", env="GRAPH_STORE_PATH")
+    # 后台压缩检查间隔（秒），0表示不压缩
+    graph_store_compact_interval: float = Field(
+        default=60.0, env="GRAPH_STORE_COMPACT_INTERVAL"
+    )
+    # 日志中失效数据超过该比例时压缩
+    graph_store_compact_min_dead_ratio: float = Field(
+        default=0.5, env="GRAPH_STORE_COMPACT_MIN_DEAD_RATIO"
+    )
+    # 生成向量的字段，JSON格式
+    graph_store_index_fields: List[str] = Field(
+        default_factory=lambda: ["$"], env="GRAPH_STORE_INDEX_FIELDS"
+    )
+    # fastembed模型名，为空时使用特征哈希
+    graph_store_embedding_model: Optional[str] = Field(
+        default=None, env="GRAPH_STORE_EMBEDDING_MODEL"
+    )
+
+    # 模型路由配置（寒暄使用小模型，不需要工具的问答不携带工具）
+    router_enabled: bool = Field(default=True, env="ROUTER_ENABLED")
+    # 回答寒暄的小模型
+    router_small_model: str = Field(
+        default="Qwen/Qwen2.5-7B-Instruct", env="ROUTER_SMALL_MODEL"
+    )
+    # 特征打分超过该概率时使用工具智能体
+    router_threshold: float = Field(default=0.5, env="ROUTER_THRESHOLD")
+    
+    # 编译结果缓存配置
+    # 缓存的智能体执行器和图的数量
+    agent_registry_max_size: int = Field(default=32, env="AGENT_REGISTRY_MAX_SIZE")
+    
+    # 日志配置
+    # DEBUG级别才会记录完整结果和中间步骤
+    log_level: str = Field(default="INFO", env="LOG_LEVEL")
+    log_format: str = Field(default="text", env="LOG_FORMAT")  # text 或 json
+    # 单个负载最多记录的字符数
+    log_payload_max_chars: int = Field(default=500, env="LOG_PAYLOAD_MAX_CHARS")
+    # DEBUG日志的采样比例
+    log_sample_rate: float = Field(default=1.0, env="LOG_SAMPLE_RATE")
+    # 是否开启AgentExecutor的stdout调试输出
+    agent_verbose: bool = Field(default=False, env="AGENT_VERBOSE")
+    
+    # 共享状态配置（多进程部署时会话记忆保存在共享后端中）
+    # memory、sqlite 或 redis
+    state_backend: str = Field(default="memory", env="STATE_BACKEND")
+    state_sqlite_path: str = Field(
+        default=".cache/state.sqlite", env="STATE_SQLITE_PATH"
+    )
+    # 需要安装redis可选依赖
+    state_redis_url: str = Field(
+        default="redis://localhost:6379/0", env="STATE_REDIS_URL"
+    )
+
     # LangServe配置
     host: str = Field(default="0.0.0.0", env="HOST")  # 监听所有网络接口，支持Docker访问
     port: int = Field(default=8000, env="PORT")
+    # 工作进程数，0表示CPU核数；大于1时关闭自动重载
+    workers: int = Field(default=1, env="WORKERS")
+    # 单进程开发模式下代码修改后自动重载
+    reload: bool = Field(default=True, env="RELOAD")
+    # 每个工作进程启动时预先构建智能体和图
+    preload: bool = Field(default=False, env="PRELOAD")
+    # 客户端断开连接时取消/chat、/agent和/graph上仍在进行的调用
+    cancel_on_disconnect: bool = Field(default=True, env="CANCEL_ON_DISCONNECT")
     
     class Config:
         env_file = ".env"
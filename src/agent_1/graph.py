@@ -2,49 +2,149 @@
 LangGraph图定义 - 用于LangGraph CLI测试
 """
 
-from typing import Annotated, Optional
+import asyncio
+from typing import TYPE_CHECKING, Annotated, Any, Dict, List, Optional, Tuple
 from typing_extensions import TypedDict
 
-from langchain_core.messages import BaseMessage
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from langchain_core.tools import BaseTool
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.graph import StateGraph, add_messages
 from langgraph.prebuilt import ToolNode
+from langgraph.store.base import BaseStore
 
-from src.agent_1.agent import BasicAgent
+from src.agent_1.cache import cacheable_temperature
+from src.agent_1.config import settings
+from src.agent_1.history import get_history_manager
+from src.agent_1.registry import compiled_key, get_registry
+from src.agent_1.router import AGENT, SMALL, get_router
+from src.agent_1.semantic_cache import (
+    SemanticCache,
+    get_semantic_cache,
+    is_context_free,
+)
 from src.agent_1.tools import get_all_tools
 
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+
 
 class AgentState(TypedDict):
     """智能体状态定义"""
     messages: Annotated[list[BaseMessage], add_messages]
 
 
-def create_graph():
-    """创建LangGraph图"""
-    from langchain_openai import ChatOpenAI
-    from src.agent_1.config import settings
-    
-    # 创建LLM - 使用硅基流动(Silicon Flow) API
-    llm = ChatOpenAI(
-        model=settings.siliconflow_model,
-        temperature=settings.siliconflow_temperature,
-        api_key=settings.siliconflow_api_key,
-        base_url=settings.siliconflow_base_url
-    )
+def get_bound_model(tools: List[BaseTool]) -> Tuple["ChatOpenAI", Runnable]:
+    """
+    获取绑定了工具的模型，工具schema只转换一次，在所有图之间共享
+    
+    Args:
+        tools: 绑定的工具
+        
+    Returns:
+        (模型, 绑定工具后的模型) 元组
+    """
+    from src.agent_1.llm import get_llm
+    
+    def build() -> Tuple["ChatOpenAI", Runnable]:
+        llm = get_llm()
+        return llm, llm.bind_tools(tools)
+
+    key = compiled_key("bound_model", None, None, True, tools)
+    return get_registry().get_or_build(key, build)
+
+
+def get_small_model() -> "ChatOpenAI":
+    """获取回答寒暄的小模型"""
+    from src.agent_1.llm import get_llm
     
+    return get_llm(settings.router_small_model)
+
+
+def create_workflow() -> StateGraph:
+    """创建未编译的LangGraph工作流，便于使用不同的检查点存储编译"""
     # 创建工具
     tools = get_all_tools()
     
     # 创建工具节点
     tool_node = ToolNode(tools)
     
-    # 创建模型绑定工具
-    model = llm.bind_tools(tools)
+    # 创建模型绑定工具 - 使用硅基流动(Silicon Flow) API
+    llm, model = get_bound_model(tools)
+    
+    # 按模型的token预算裁剪历史，较早的对话折叠为摘要
+    history = get_history_manager()
+    model_name = llm.model_name
+    
+    # 寒暄和不需要工具的问答路由到更轻的模型
+    def select_model(messages: List[BaseMessage]) -> Runnable:
+        """本轮第一次调用模型时按路由决策选择模型，工具返回结果后始终使用绑定工具的模型"""
+        router = get_router()
+        if router is None or not messages or not isinstance(messages[-1], HumanMessage):
+            return model
+        text = str(messages[-1].content)
+        decision = router.route(text, has_history=len(messages) > 1)
+        if decision.route == AGENT:
+            return model
+        if decision.route == SMALL:
+            return get_small_model()
+        return llm
+    
+    # 换了说法的重复问题直接返回语义缓存中的回答
+    cache_namespace = f"graph:{model_name}"
+    
+    def turn_cache(messages: List[BaseMessage]) -> Tuple[Optional[SemanticCache], int]:
+        """本轮可以使用的语义缓存和本轮问题的位置，问题依赖之前的对话时不使用缓存"""
+        cache = get_semantic_cache()
+        if cache is None or not cacheable_temperature(llm.temperature):
+            return None, -1
+        humans = [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)]
+        index = humans[-1] if humans else -1
+        if index < 0:
+            return None, -1
+        if index > 0 and not is_context_free(str(messages[index].content)):
+            return None, -1
+        return cache, index
+    
+    def cached_response(messages: List[BaseMessage]) -> Optional[AIMessage]:
+        """本轮第一次调用模型时查找语义缓存"""
+        cache, index = turn_cache(messages)
+        if cache is None or index != len(messages) - 1:
+            return None
+        answer = cache.lookup(str(messages[index].content), cache_namespace)
+        return AIMessage(content=answer) if answer is not None else None
     
+    def store_response(messages: List[BaseMessage], response: BaseMessage) -> None:
+        """本轮的最终回答写入语义缓存，记录本轮调用过的工具"""
+        cache, index = turn_cache(messages)
+        if cache is not None and not response.tool_calls:
+            turn = messages[index + 1:]
+            tools = [m.name for m in turn if isinstance(m, ToolMessage) and m.name]
+            question = str(messages[index].content)
+            cache.store(question, str(response.content), cache_namespace, tools)
+
     # 定义模型调用函数
     def call_model(state: AgentState):
         """调用模型"""
-        messages = state["messages"]
-        response = model.invoke(messages)
+        cached = cached_response(state["messages"])
+        if cached is not None:
+            return {"messages": [cached]}
+        selected = select_model(state["messages"])
+        messages = history.trim_messages(state["messages"], model_name)
+        response = selected.invoke(messages)
+        store_response(state["messages"], response)
+        return {"messages": [response]}
+    
+    async def acall_model(state: AgentState):
+        """异步调用模型，语义缓存的向量计算和写盘放到线程中执行"""
+        cached = await asyncio.to_thread(cached_response, state["messages"])
+        if cached is not None:
+            return {"messages": [cached]}
+        selected = select_model(state["messages"])
+        messages = await history.atrim_messages(state["messages"], model_name)
+        response = await selected.ainvoke(messages)
+        await asyncio.to_thread(store_response, state["messages"], response)
         return {"messages": [response]}
     
     # 定义决策函数
@@ -64,7 +164,7 @@ def create_graph():
     workflow = StateGraph[AgentState, None, AgentState, AgentState](AgentState)
     
     # 添加节点
-    workflow.add_node("agent", call_model)
+    workflow.add_node("agent", RunnableLambda(call_model, acall_model))
     workflow.add_node("tools", tool_node)
     
     # 设置入口点
@@ -79,7 +179,50 @@ def create_graph():
     # 添加从工具到代理的边
     workflow.add_edge("tools", "agent")
     
+    return workflow
+
+
+def create_graph():
+    """
+    创建LangGraph图，编译结果按模型和工具集合缓存
+    
+    `langgraph dev` 不接受编译时自带存储的图，长期记忆存储通过 langgraph.json 的
+    store.path 配置为 src.agent_1.store.get_store，由LangGraph API在运行时注入。
+    """
+    key = compiled_key("graph", None, None, True, get_all_tools())
+    
     # 编译图
-    app = workflow.compile()
+    app = get_registry().get_or_build(key, lambda: create_workflow().compile())
+    
+    return app
+
+
+def create_thread_graph(
+    checkpointer: Optional[BaseCheckpointSaver], store: Optional[BaseStore] = None
+) -> Runnable:
+    """
+    创建按thread_id保存状态的图
+    
+    请求配置中带有thread_id时使用带检查点的图，客户端每轮只需发送新消息；
+    未提供thread_id时使用无状态的图，兼容每次发送完整消息列表的客户端。
+    
+    Args:
+        checkpointer: 检查点存储，为None时直接返回无状态的图
+        store: 长期记忆存储，有无thread_id的请求共用
+        
+    Returns:
+        可直接用于LangServe路由的Runnable
+    """
+    workflow = create_workflow()
+    stateless = workflow.compile(store=store)
+    if checkpointer is None:
+        return stateless
+    
+    stateful = workflow.compile(checkpointer=checkpointer, store=store)
+    
+    def route(state: Dict[str, Any], config: RunnableConfig) -> Runnable:
+        if config.get("configurable", {}).get("thread_id"):
+            return stateful
+        return stateless
     
-    return app
\ No newline at end of file
+    return RunnableLambda(route, name="graph")
\ No newline at end of file
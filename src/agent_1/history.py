@@ -0,0 +1,420 @@
+"""
+对话历史管理模块 - 按token预算裁剪历史并把较早的对话折叠为摘要
+
+历史没有超出模型的token预算时原样发送；超出后只保留最近K轮对话原文，更早的对话
+由一个较便宜的模型压缩为滚动摘要。摘要会被缓存：智能体路径保存在会话记忆中，
+图路径按消息前缀的哈希缓存，每次只需要把新折叠的几轮对话合并进已有摘要。
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+)
+
+from .config import settings
+from .log import get_logger
+from .memory import (
+    AgentMemory,
+    CompactChatMessageHistory,
+    MessageRecord,
+    estimate_tokens,
+)
+
+logger = get_logger(__name__)
+
+# 每条消息的格式开销（角色标记等）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# 摘要中每条消息最多保留的字符数，避免大段工具输出撑大摘要请求
+TRANSCRIPT_MAX_CHARS = 500
+
+SUMMARY_PREFIX = "以下是之前对话的摘要：\n"
+
+SUMMARY_INSTRUCTION = """请把下面的对话压缩为一段简洁的中文摘要，供后续对话参考。
+保留用户的身份信息、偏好、已确认的事实、计算或查询的结论以及尚未完成的任务，省略寒暄和重复内容。
+只输出摘要本身。"""
+
+
+def message_tokens(message: BaseMessage) -> int:
+    """
+    估算单条消息的token数，包括工具调用参数
+
+    Args:
+        message: 消息
+
+    Returns:
+        估算的token数
+    """
+    tokens = MESSAGE_OVERHEAD_TOKENS + estimate_tokens(str(message.content))
+    for call in getattr(message, "tool_calls", None) or ():
+        tokens += estimate_tokens(str(call.get("args", "")))
+    return tokens
+
+
+def record_tokens(record: MessageRecord) -> int:
+    """估算一条历史记录的token数，普通消息复用记录上缓存的文本token数"""
+    if record.message is not None:
+        return message_tokens(record.message)
+    return MESSAGE_OVERHEAD_TOKENS + record.tokens
+
+
+def count_tokens(messages: Sequence[BaseMessage]) -> int:
+    """估算消息列表的token总数"""
+    return sum(message_tokens(m) for m in messages)
+
+
+def _role(message: BaseMessage) -> str:
+    if isinstance(message, HumanMessage):
+        return "用户"
+    if isinstance(message, ToolMessage):
+        return f"工具({message.name or 'tool'})"
+    if isinstance(message, AIMessage):
+        return "助手"
+    return message.type
+
+
+def format_transcript(messages: Sequence[BaseMessage]) -> str:
+    """把消息格式化为摘要模型的输入文本"""
+    lines = []
+    for message in messages:
+        text = str(message.content)
+        if len(text) > TRANSCRIPT_MAX_CHARS:
+            text = text[:TRANSCRIPT_MAX_CHARS] + "..."
+        if text:
+            lines.append(f"{_role(message)}: {text}")
+    return "\n".join(lines)
+
+
+def summary_message(summary: str) -> SystemMessage:
+    """把摘要包装为注入提示词的系统消息"""
+    return SystemMessage(content=SUMMARY_PREFIX + summary)
+
+
+class HistoryManager:
+    """
+    对话历史管理器
+
+    一轮对话从一条用户消息开始，到下一条用户消息之前结束，按轮切分可以保证
+    工具调用消息和对应的工具结果不会被拆开。
+    """
+
+    def __init__(
+        self,
+        summarizer: Optional[Callable[[], BaseChatModel]] = None,
+        keep_turns: int = 4,
+        max_tokens: int = 3000,
+        token_budgets: Optional[Dict[str, int]] = None,
+        max_cached_summaries: int = 256,
+    ):
+        """
+        初始化历史管理器
+
+        Args:
+            summarizer: 创建摘要模型的工厂函数，None表示不做摘要，直接丢弃较早的对话
+            keep_turns: 超出预算时保留原文的最近轮数
+            max_tokens: 默认的历史token预算
+            token_budgets: 按模型名覆盖的token预算
+            max_cached_summaries: 图路径最多缓存的摘要数
+        """
+        self._summarizer_factory = summarizer
+        self._summarizer: Optional[BaseChatModel] = None
+        self.keep_turns = keep_turns
+        self.max_tokens = max_tokens
+        self.token_budgets = token_budgets or {}
+        self.max_cached_summaries = max_cached_summaries
+        self._summaries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> "HistoryManager":
+        """根据配置创建历史管理器"""
+        summarizer = None
+        if settings.history_summary_enabled:
+            def summarizer() -> BaseChatModel:
+                from .llm import create_llm
+
+                return create_llm(settings.history_summary_model, temperature=0)
+
+        return cls(
+            summarizer=summarizer,
+            keep_turns=settings.history_keep_turns,
+            max_tokens=settings.history_max_tokens,
+            token_budgets=settings.history_token_budgets,
+        )
+
+    @property
+    def summarizer(self) -> Optional[BaseChatModel]:
+        """摘要模型，首次使用时创建"""
+        if self._summarizer is None and self._summarizer_factory is not None:
+            self._summarizer = self._summarizer_factory()
+        return self._summarizer
+
+    def budget_for(self, model_name: Optional[str]) -> int:
+        """获取指定模型的历史token预算"""
+        return self.token_budgets.get(model_name or "", self.max_tokens)
+
+    # 切分
+
+    def split(
+        self,
+        messages: Sequence[BaseMessage],
+        budget: int,
+        counts: Optional[Sequence[int]] = None,
+    ) -> int:
+        """
+        计算需要保留原文的起始位置
+
+        Args:
+            messages: 历史消息
+            budget: token预算
+            counts: 每条消息的token数，不提供时逐条估算
+
+        Returns:
+            保留原文部分的起始下标，0表示无需折叠
+        """
+        if counts is None:
+            counts = [message_tokens(m) for m in messages]
+        if sum(counts) <= budget:
+            return 0
+
+        starts = [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)]
+        if not starts:
+            return 0
+        index = max(0, len(starts) - self.keep_turns)
+        # 最近K轮仍然超出预算时继续丢弃较早的轮次，但至少保留最后一轮
+        tokens = sum(counts[starts[index]:])
+        while tokens > budget and index < len(starts) - 1:
+            tokens -= sum(counts[starts[index]:starts[index + 1]])
+            index += 1
+        return starts[index]
+
+    # 摘要
+
+    def _summary_request(
+        self, summary: Optional[str], messages: Sequence[BaseMessage]
+    ) -> List[BaseMessage]:
+        content = f"新增对话：\n{format_transcript(messages)}"
+        if summary:
+            content = f"已有摘要：\n{summary}\n\n{content}"
+        return [
+            SystemMessage(content=SUMMARY_INSTRUCTION),
+            HumanMessage(content=content),
+        ]
+
+    def summarize(
+        self, summary: Optional[str], messages: Sequence[BaseMessage]
+    ) -> Optional[str]:
+        """
+        把新折叠的消息合并进已有摘要
+
+        Args:
+            summary: 已有摘要
+            messages: 新折叠的消息
+
+        Returns:
+            新摘要；未配置摘要模型或调用失败时返回原摘要
+        """
+        if self.summarizer is None or not messages:
+            return summary
+        try:
+            response = self.summarizer.invoke(self._summary_request(summary, messages))
+            return str(response.content).strip() or summary
+        except Exception:
+            logger.exception("生成历史摘要失败，较早的对话将被直接丢弃")
+            return summary
+
+    async def asummarize(
+        self, summary: Optional[str], messages: Sequence[BaseMessage]
+    ) -> Optional[str]:
+        """异步版本的summarize"""
+        if self.summarizer is None or not messages:
+            return summary
+        try:
+            response = await self.summarizer.ainvoke(
+                self._summary_request(summary, messages)
+            )
+            return str(response.content).strip() or summary
+        except Exception:
+            logger.exception("生成历史摘要失败，较早的对话将被直接丢弃")
+            return summary
+
+    # 智能体路径：摘要保存在会话记忆中
+
+    def _memory_plan(
+        self, memory: AgentMemory, model_name: Optional[str]
+    ) -> Tuple[List[BaseMessage], int]:
+        history = memory.chat_history
+        messages = list(history.messages)
+        counts = None
+        if isinstance(history, CompactChatMessageHistory):
+            # 记录上的token数在多轮之间保留，每轮只需估算新增的消息
+            counts = [record_tokens(record) for record in history.records]
+        budget = self.budget_for(model_name)
+        if memory.summary:
+            budget -= message_tokens(summary_message(memory.summary))
+        return messages, self.split(messages, max(budget, 0), counts)
+
+    def _apply_memory_fold(
+        self,
+        memory: AgentMemory,
+        messages: List[BaseMessage],
+        start: int,
+        summary: Optional[str],
+    ) -> List[BaseMessage]:
+        if start:
+            memory.summary = summary
+            memory.drop_oldest(start)
+            logger.info("折叠了%d条历史消息，保留%d条", start, len(messages) - start)
+        recent = messages[start:]
+        return [summary_message(memory.summary), *recent] if memory.summary else recent
+
+    def fold_memory(
+        self, memory: AgentMemory, model_name: Optional[str] = None
+    ) -> List[BaseMessage]:
+        """
+        按预算折叠会话记忆，返回本轮应注入提示词的历史
+
+        超出预算时较早的对话会从记忆中移除并合并进记忆的滚动摘要。
+
+        Args:
+            memory: 会话记忆
+            model_name: 本轮使用的模型名，用于选择token预算
+
+        Returns:
+            摘要消息（如果有）加上保留原文的历史消息
+        """
+        messages, start = self._memory_plan(memory, model_name)
+        summary = (
+            self.summarize(memory.summary, messages[:start])
+            if start
+            else memory.summary
+        )
+        return self._apply_memory_fold(memory, messages, start, summary)
+
+    async def afold_memory(
+        self, memory: AgentMemory, model_name: Optional[str] = None
+    ) -> List[BaseMessage]:
+        """异步版本的fold_memory"""
+        messages, start = self._memory_plan(memory, model_name)
+        summary = (
+            await self.asummarize(memory.summary, messages[:start])
+            if start
+            else memory.summary
+        )
+        return await memory.arun(
+            self._apply_memory_fold, memory, messages, start, summary
+        )
+
+    # 图路径：状态中的消息列表不会被修改，摘要按消息前缀缓存
+
+    @staticmethod
+    def _prefix_hashes(messages: Sequence[BaseMessage], end: int) -> List[str]:
+        """计算messages[:i]（i = 1..end）的链式哈希"""
+        hashes = []
+        digest = hashlib.sha1()
+        for message in messages[:end]:
+            digest.update(message.type.encode())
+            digest.update(b"\x00")
+            digest.update(str(message.content).encode("utf-8", "surrogatepass"))
+            digest.update(b"\x01")
+            hashes.append(digest.copy().hexdigest())
+        return hashes
+
+    def _cached_prefix(self, hashes: List[str]) -> Tuple[int, Optional[str]]:
+        """找到已缓存摘要的最长前缀，返回 (前缀长度, 摘要)"""
+        with self._lock:
+            for length in range(len(hashes), 0, -1):
+                summary = self._summaries.get(hashes[length - 1])
+                if summary is not None:
+                    self._summaries.move_to_end(hashes[length - 1])
+                    return length, summary
+        return 0, None
+
+    def _store_summary(self, key: str, summary: Optional[str]) -> None:
+        if summary is None:
+            return
+        with self._lock:
+            self._summaries[key] = summary
+            self._summaries.move_to_end(key)
+            while len(self._summaries) > self.max_cached_summaries:
+                self._summaries.popitem(last=False)
+
+    def _messages_plan(
+        self, messages: Sequence[BaseMessage], model_name: Optional[str]
+    ) -> Tuple[int, int, List[str]]:
+        # 开头的系统消息始终保留
+        pinned = 0
+        while pinned < len(messages) and isinstance(messages[pinned], SystemMessage):
+            pinned += 1
+        budget = self.budget_for(model_name) - count_tokens(messages[:pinned])
+        start = self.split(messages[pinned:], max(budget, 0))
+        if not start:
+            return pinned, pinned, []
+        return pinned, pinned + start, self._prefix_hashes(messages, pinned + start)
+
+    @staticmethod
+    def _assemble(
+        messages: Sequence[BaseMessage], pinned: int, start: int, summary: Optional[str]
+    ) -> List[BaseMessage]:
+        head = list(messages[:pinned])
+        if summary:
+            head.append(summary_message(summary))
+        return head + list(messages[start:])
+
+    def trim_messages(
+        self, messages: Sequence[BaseMessage], model_name: Optional[str] = None
+    ) -> List[BaseMessage]:
+        """
+        按预算裁剪消息列表，较早的对话替换为摘要
+
+        Args:
+            messages: 完整的消息列表，不会被修改
+            model_name: 本轮使用的模型名，用于选择token预算
+
+        Returns:
+            发送给模型的消息列表
+        """
+        pinned, start, hashes = self._messages_plan(messages, model_name)
+        if start == pinned:
+            return list(messages)
+        length, summary = self._cached_prefix(hashes)
+        if length < start:
+            summary = self.summarize(summary, messages[max(length, pinned):start])
+            self._store_summary(hashes[-1], summary)
+        return self._assemble(messages, pinned, start, summary)
+
+    async def atrim_messages(
+        self, messages: Sequence[BaseMessage], model_name: Optional[str] = None
+    ) -> List[BaseMessage]:
+        """异步版本的trim_messages"""
+        pinned, start, hashes = self._messages_plan(messages, model_name)
+        if start == pinned:
+            return list(messages)
+        length, summary = self._cached_prefix(hashes)
+        if length < start:
+            summary = await self.asummarize(
+                summary, messages[max(length, pinned):start]
+            )
+            self._store_summary(hashes[-1], summary)
+        return self._assemble(messages, pinned, start, summary)
+
+
+_history_manager: Optional[HistoryManager] = None
+
+
+def get_history_manager() -> HistoryManager:
+    """获取全局历史管理器"""
+    global _history_manager
+
+    if _history_manager is None:
+        _history_manager = HistoryManager.from_settings()
+    return _history_manager
@@ -0,0 +1,78 @@
+"""
+HTTP连接池模块 - 进程内共享的httpx同步/异步客户端
+
+模型客户端（ChatOpenAI）和搜索工具都通过这里获取客户端，复用keep-alive连接，
+避免每个请求重新建立TCP/TLS连接。
+"""
+
+import importlib.util
+from typing import Any, Dict, Optional
+
+import httpx
+
+from .config import settings
+
+_http_client: Optional[httpx.Client] = None
+_async_http_client: Optional[httpx.AsyncClient] = None
+
+
+def _client_options() -> Dict[str, Any]:
+    """根据配置生成客户端参数"""
+    # HTTP/2需要可选依赖h2，未安装时回退到HTTP/1.1
+    http2 = settings.http2 and importlib.util.find_spec("h2") is not None
+
+    return {
+        "limits": httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            keepalive_expiry=settings.http_keepalive_expiry,
+        ),
+        "timeout": httpx.Timeout(
+            settings.http_timeout,
+            connect=settings.http_connect_timeout,
+        ),
+        "http2": http2,
+    }
+
+
+def get_http_client() -> httpx.Client:
+    """
+    获取共享的同步HTTP客户端
+
+    Returns:
+        进程内唯一的httpx.Client
+    """
+    global _http_client
+
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.Client(**_client_options())
+    return _http_client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    获取共享的异步HTTP客户端
+
+    异步连接池绑定在首次使用它的事件循环上，服务进程内只有一个事件循环，
+    因此整个进程共享同一个客户端。
+
+    Returns:
+        进程内唯一的httpx.AsyncClient
+    """
+    global _async_http_client
+
+    if _async_http_client is None or _async_http_client.is_closed:
+        _async_http_client = httpx.AsyncClient(**_client_options())
+    return _async_http_client
+
+
+async def aclose_http_clients() -> None:
+    """关闭共享的HTTP客户端，释放连接"""
+    global _http_client, _async_http_client
+
+    if _async_http_client is not None:
+        await _async_http_client.aclose()
+        _async_http_client = None
+    if _http_client is not None:
+        _http_client.close()
+        _http_client = None
@@ -0,0 +1,114 @@
+"""
+延迟构建模块 - 在第一次使用时才创建代价较高的Runnable
+"""
+
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Callable, Iterator, List, Optional, Sequence
+
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.runnables.utils import ConfigurableFieldSpec
+
+
+class LazyRunnable(Runnable):
+    """
+    延迟构建的Runnable代理
+
+    注册路由时只需要输入输出类型，真正的智能体或图在第一次调用时才通过工厂函数创建，
+    之后所有调用都转发给同一个实例。异步调用在线程中构建，首次请求不会阻塞事件循环；
+    需要预加载时显式调用build。
+    """
+    
+    def __init__(
+        self,
+        factory: Callable[[], Runnable],
+        input_type: Any = Any,
+        output_type: Any = Any,
+        name: Optional[str] = None,
+        config_specs: Sequence[ConfigurableFieldSpec] = (),
+    ):
+        """
+        初始化代理
+        
+        Args:
+            factory: 创建真实Runnable的工厂函数
+            input_type: 输入类型，用于生成路由的输入schema
+            output_type: 输出类型，用于生成路由的输出schema
+            name: Runnable名称
+            config_specs: 允许客户端通过configurable传入的配置项
+        """
+        self._factory = factory
+        self._input_type = input_type
+        self._output_type = output_type
+        self._config_specs = list(config_specs)
+        self._runnable: Optional[Runnable] = None
+        self._lock = threading.Lock()
+        self.name = name
+    
+    @property
+    def InputType(self) -> Any:
+        return self._input_type
+    
+    @property
+    def OutputType(self) -> Any:
+        return self._output_type
+    
+    @property
+    def config_specs(self) -> List[ConfigurableFieldSpec]:
+        return self._config_specs
+    
+    @property
+    def is_built(self) -> bool:
+        """真实Runnable是否已经创建"""
+        return self._runnable is not None
+    
+    def build(self) -> Runnable:
+        """创建真实Runnable，已经创建时直接返回"""
+        if self._runnable is None:
+            with self._lock:
+                if self._runnable is None:
+                    self._runnable = self._factory()
+        return self._runnable
+    
+    async def abuild(self) -> Runnable:
+        """异步版本的build，首次创建放到线程中执行"""
+        if self._runnable is None:
+            return await asyncio.to_thread(self.build)
+        return self._runnable
+    
+    @property
+    def runnable(self) -> Runnable:
+        """获取真实Runnable，首次访问时创建"""
+        return self.build()
+
+    def invoke(
+        self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> Any:
+        return self.runnable.invoke(input, config, **kwargs)
+    
+    async def ainvoke(
+        self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> Any:
+        runnable = await self.abuild()
+        return await runnable.ainvoke(input, config, **kwargs)
+    
+    def batch(self, inputs: List[Any], config: Any = None, **kwargs: Any) -> List[Any]:
+        return self.runnable.batch(inputs, config, **kwargs)
+
+    async def abatch(
+        self, inputs: List[Any], config: Any = None, **kwargs: Any
+    ) -> List[Any]:
+        runnable = await self.abuild()
+        return await runnable.abatch(inputs, config, **kwargs)
+    
+    def stream(
+        self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> Iterator[Any]:
+        yield from self.runnable.stream(input, config, **kwargs)
+    
+    async def astream(
+        self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> AsyncIterator[Any]:
+        runnable = await self.abuild()
+        async for chunk in runnable.astream(input, config, **kwargs):
+            yield chunk
@@ -0,0 +1,374 @@
+"""
+LLM工厂模块 - 统一创建硅基流动(Silicon Flow)聊天模型
+"""
+
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+import openai
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_openai import ChatOpenAI  # 硅基流动兼容OpenAI API格式
+
+from .admission import backoff_delay, get_admission_controller
+from .cache import cacheable_temperature, get_llm_cache
+from .cancellation import raise_if_cancelled
+from .config import settings
+from .http_clients import get_async_http_client, get_http_client
+from .log import get_logger
+from .memory import estimate_tokens
+from .metrics import LLM_ADMISSION, metrics_handler
+from .registry import compiled_key, get_registry
+
+logger = get_logger(__name__)
+
+# 当前调用是否已经获得准入；
+# streaming=True时ChatOpenAI会在_generate中调用_stream，避免重复排队
+_admitted: ContextVar[bool] = ContextVar("llm_admitted", default=False)
+
+# 可以重试的上游错误：429、5xx、连接错误和超时
+_RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.InternalServerError,
+    openai.APIConnectionError,
+)
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    """从上游错误响应中读取以秒为单位的Retry-After"""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _total_tokens(result: ChatResult) -> Optional[int]:
+    usage = (result.llm_output or {}).get("token_usage") or {}
+    return usage.get("total_tokens")
+
+
+class CancellableChatOpenAI(ChatOpenAI):
+    """
+    支持请求取消的ChatOpenAI
+
+    BaseChatModel.agenerate通过asyncio.gather调用_agenerate，任务被取消时不会触发on_llm_error，
+    这里补上回调，让运行指标和追踪记录这次取消。同步调用在发出请求之前检查当前请求是否已被取消。
+    """
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        raise_if_cancelled()
+        return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        raise_if_cancelled()
+        yield from super()._stream(
+            messages, stop=stop, run_manager=run_manager, **kwargs
+        )
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        try:
+            return await self._acall(
+                messages, stop=stop, run_manager=run_manager, **kwargs
+            )
+        except asyncio.CancelledError as e:
+            if run_manager is not None:
+                await run_manager.on_llm_error(e)
+            raise
+
+    async def _acall(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        """实际的异步调用，子类覆盖这个方法而不是_agenerate"""
+        return await super()._agenerate(
+            messages, stop=stop, run_manager=run_manager, **kwargs
+        )
+
+
+class AdmittedChatOpenAI(CancellableChatOpenAI):
+    """
+    经过准入控制的ChatOpenAI
+
+    每次调用上游前先从全局准入控制器获取许可；遇到429、5xx或连接错误时释放许可，
+    按带抖动的指数退避重试，排队和重试的总耗时不超过llm_retry_budget_seconds。
+    流式调用只在产出第一个片段之前重试。
+    """
+
+    def _cost(self, messages: List[BaseMessage], kwargs: dict) -> int:
+        """预估本次调用消耗的token数：提示词加上预留的输出长度"""
+        reserve = (
+            kwargs.get("max_tokens")
+            or self.max_tokens
+            or settings.llm_expected_output_tokens
+        )
+        return sum(estimate_tokens(str(m.content)) for m in messages) + reserve
+
+    @staticmethod
+    def _acquire_timeout(deadline: float) -> float:
+        remaining = deadline - time.monotonic()
+        return max(0.0, min(get_admission_controller().queue_timeout, remaining))
+
+    def _retry_delay(
+        self, error: BaseException, attempt: int, deadline: float
+    ) -> Optional[float]:
+        """可重试错误后的等待秒数，超出重试次数或时间预算时返回None"""
+        retry_after = _retry_after(error)
+        if isinstance(error, openai.RateLimitError):
+            # 上游已经限流，暂停放行其他请求
+            get_admission_controller().pause(retry_after or settings.llm_backoff_base)
+        delay = backoff_delay(
+            attempt, settings.llm_backoff_base, settings.llm_backoff_max, retry_after
+        )
+        if attempt >= settings.llm_max_retries or time.monotonic() + delay >= deadline:
+            return None
+        LLM_ADMISSION.labels("retry").inc()
+        logger.warning(
+            "模型调用失败，%.2f秒后第%d次重试: %s", delay, attempt + 1, error
+        )
+        return delay
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if _admitted.get():
+            return super()._generate(
+                messages, stop=stop, run_manager=run_manager, **kwargs
+            )
+
+        controller = get_admission_controller()
+        cost = self._cost(messages, kwargs)
+        deadline = time.monotonic() + settings.llm_retry_budget_seconds
+        attempt = 0
+        while True:
+            permit = controller.acquire(cost, timeout=self._acquire_timeout(deadline))
+            token = _admitted.set(True)
+            try:
+                result = super()._generate(
+                    messages, stop=stop, run_manager=run_manager, **kwargs
+                )
+            except _RETRYABLE_ERRORS as e:
+                permit.release()
+                delay = self._retry_delay(e, attempt, deadline)
+                if delay is None:
+                    raise
+            else:
+                permit.release(_total_tokens(result))
+                return result
+            finally:
+                permit.release()
+                _admitted.reset(token)
+            time.sleep(delay)
+            attempt += 1
+
+    async def _acall(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if _admitted.get():
+            return await super()._acall(
+                messages, stop=stop, run_manager=run_manager, **kwargs
+            )
+
+        controller = get_admission_controller()
+        cost = self._cost(messages, kwargs)
+        deadline = time.monotonic() + settings.llm_retry_budget_seconds
+        attempt = 0
+        while True:
+            permit = await controller.aacquire(
+                cost, timeout=self._acquire_timeout(deadline)
+            )
+            token = _admitted.set(True)
+            try:
+                result = await super()._acall(
+                    messages, stop=stop, run_manager=run_manager, **kwargs
+                )
+            except _RETRYABLE_ERRORS as e:
+                permit.release()
+                delay = self._retry_delay(e, attempt, deadline)
+                if delay is None:
+                    raise
+            else:
+                permit.release(_total_tokens(result))
+                return result
+            finally:
+                permit.release()
+                _admitted.reset(token)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        if _admitted.get():
+            yield from super()._stream(
+                messages, stop=stop, run_manager=run_manager, **kwargs
+            )
+            return
+
+        controller = get_admission_controller()
+        cost = self._cost(messages, kwargs)
+        deadline = time.monotonic() + settings.llm_retry_budget_seconds
+        attempt = 0
+        while True:
+            permit = controller.acquire(cost, timeout=self._acquire_timeout(deadline))
+            started = False
+            try:
+                for chunk in super()._stream(
+                    messages, stop=stop, run_manager=run_manager, **kwargs
+                ):
+                    started = True
+                    yield chunk
+                return
+            except _RETRYABLE_ERRORS as e:
+                permit.release()
+                delay = None if started else self._retry_delay(e, attempt, deadline)
+                if delay is None:
+                    raise
+            finally:
+                permit.release()
+            time.sleep(delay)
+            attempt += 1
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        if _admitted.get():
+            async for chunk in super()._astream(
+                messages, stop=stop, run_manager=run_manager, **kwargs
+            ):
+                yield chunk
+            return
+
+        controller = get_admission_controller()
+        cost = self._cost(messages, kwargs)
+        deadline = time.monotonic() + settings.llm_retry_budget_seconds
+        attempt = 0
+        while True:
+            permit = await controller.aacquire(
+                cost, timeout=self._acquire_timeout(deadline)
+            )
+            started = False
+            try:
+                async for chunk in super()._astream(
+                    messages, stop=stop, run_manager=run_manager, **kwargs
+                ):
+                    started = True
+                    yield chunk
+                return
+            except _RETRYABLE_ERRORS as e:
+                permit.release()
+                delay = None if started else self._retry_delay(e, attempt, deadline)
+                if delay is None:
+                    raise
+            finally:
+                permit.release()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+def create_llm(
+    model_name: Optional[str] = None,
+    temperature: Optional[float] = None,
+) -> ChatOpenAI:
+    """
+    创建聊天模型
+    
+    温度不超过llm_cache_max_temperature时启用响应缓存；更高的温度意味着期望
+    非确定性的回复，此时绕过缓存。所有模型共享进程内的HTTP连接池；启用准入控制时
+    所有模型共享同一个准入控制器，并由它负责重试。
+    
+    Args:
+        model_name: 模型名称，默认使用配置中的模型
+        temperature: 温度参数，默认使用配置中的温度
+        
+    Returns:
+        配置好的ChatOpenAI实例
+        
+    Raises:
+        ValueError: 未配置SILICONFLOW_API_KEY时抛出
+    """
+    if not settings.siliconflow_api_key:
+        raise ValueError("未配置SILICONFLOW_API_KEY，请在.env文件或环境变量中设置")
+    
+    if temperature is None:
+        temperature = settings.siliconflow_temperature
+    
+    cache = get_llm_cache()
+    if cache is None or not cacheable_temperature(temperature):
+        cache = False
+    
+    if settings.llm_admission_enabled:
+        # 重试由准入控制负责，关闭openai客户端自身的重试，避免重试期间一直占用许可
+        model_class, max_retries = AdmittedChatOpenAI, 0
+    else:
+        model_class, max_retries = CancellableChatOpenAI, None
+    
+    return model_class(
+        model=model_name or settings.siliconflow_model,
+        temperature=temperature,
+        api_key=settings.siliconflow_api_key,
+        base_url=settings.siliconflow_base_url,  # 硅基流动API端点
+        cache=cache,
+        timeout=settings.http_timeout,
+        max_retries=max_retries,
+        http_client=get_http_client(),
+        http_async_client=get_async_http_client(),
+        callbacks=[metrics_handler],
+    )
+
+
+def get_llm(
+    model_name: Optional[str] = None, temperature: Optional[float] = None
+) -> ChatOpenAI:
+    """
+    获取共享的聊天模型，相同模型和温度的调用方复用同一个实例
+    
+    Args:
+        model_name: 模型名称，默认使用配置中的模型
+        temperature: 温度参数，默认使用配置中的温度
+        
+    Returns:
+        配置好的ChatOpenAI实例
+    """
+    key = compiled_key("model", model_name, temperature, False)
+    return get_registry().get_or_build(key, lambda: create_llm(model_name, temperature))
@@ -0,0 +1,200 @@
+"""
+日志模块 - 基于异步队列的结构化日志
+
+业务代码只把日志记录放入内存队列，由后台线程负责格式化和写出，请求路径上不会发生
+同步的stdout写入。大对象（模型结果、搜索返回）通过payload()包装，只有在日志真正输出时
+才会被序列化并截断；DEBUG级别的日志可以按比例采样。
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+from typing import Any, Optional
+
+from .config import settings
+
+# 本项目所有日志记录器的根名称
+LOGGER_NAME = "agent_1"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.handlers.QueueHandler] = None
+_lock = threading.Lock()
+
+
+class Payload:
+    """
+    延迟序列化的日志负载
+
+    只在日志被格式化时才调用repr，并把结果截断到max_chars个字符。
+    """
+
+    __slots__ = ("value", "max_chars")
+
+    def __init__(self, value: Any, max_chars: int):
+        self.value = value
+        self.max_chars = max_chars
+
+    def __str__(self) -> str:
+        text = self.value if isinstance(self.value, str) else repr(self.value)
+        return truncate(text, self.max_chars)
+
+    __repr__ = __str__
+
+
+def truncate(text: str, max_chars: int) -> str:
+    """
+    截断过长的文本
+
+    Args:
+        text: 原始文本
+        max_chars: 最多保留的字符数，小于等于0时不截断
+
+    Returns:
+        截断后的文本，被截断时在末尾注明原始长度
+    """
+    if max_chars <= 0 or len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}...(共{len(text)}字符)"
+
+
+def payload(value: Any, max_chars: Optional[int] = None) -> Payload:
+    """
+    包装需要记录的大对象
+
+    Args:
+        value: 任意对象
+        max_chars: 最大字符数，默认使用配置中的log_payload_max_chars
+
+    Returns:
+        延迟序列化的负载对象，可直接作为日志参数使用
+    """
+    return Payload(
+        value, settings.log_payload_max_chars if max_chars is None else max_chars
+    )
+
+
+class SamplingFilter(logging.Filter):
+    """按比例采样低于指定级别的日志，高于该级别的日志全部保留"""
+
+    def __init__(self, rate: float, max_level: int = logging.DEBUG):
+        super().__init__()
+        self.rate = rate
+        self.max_level = max_level
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.max_level or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+# LogRecord自带的属性，JSON格式中其余属性视为通过extra传入的结构化字段
+_RESERVED_ATTRS = frozenset(
+    logging.LogRecord("", 0, "", 0, "", (), None).__dict__
+) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    只传递日志参数、不在调用线程中格式化消息的队列处理器
+
+    标准QueueHandler会在调用线程中完成消息格式化，这里改为保留原始参数，
+    消息和异常堆栈的格式化都交给后台线程。
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            # 异常对象中的traceback不能跨线程安全持有，提前格式化
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _create_formatter() -> logging.Formatter:
+    if settings.log_format == "json":
+        return JsonFormatter()
+    return logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s")
+
+
+def setup_logging(stream: Any = None) -> logging.Logger:
+    """
+    根据配置初始化日志，重复调用时直接返回
+
+    Args:
+        stream: 日志输出流，默认为stderr
+
+    Returns:
+        项目根日志记录器
+    """
+    global _listener, _queue_handler
+
+    logger = logging.getLogger(LOGGER_NAME)
+    with _lock:
+        if _listener is not None:
+            return logger
+
+        output = logging.StreamHandler(stream or sys.stderr)
+        output.setFormatter(_create_formatter())
+
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        _queue_handler = _QueueHandler(log_queue)
+        _queue_handler.addFilter(SamplingFilter(settings.log_sample_rate))
+        _listener = logging.handlers.QueueListener(
+            log_queue, output, respect_handler_level=True
+        )
+        _listener.start()
+
+        logger.setLevel(settings.log_level.upper())
+        logger.addHandler(_queue_handler)
+        logger.propagate = False
+        atexit.register(shutdown_logging)
+    return logger
+
+
+def shutdown_logging() -> None:
+    """停止后台线程并写出队列中剩余的日志"""
+    global _listener, _queue_handler
+
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        logging.getLogger(LOGGER_NAME).removeHandler(_queue_handler)
+        _listener = None
+        _queue_handler = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    获取项目内的日志记录器
+
+    Args:
+        name: 模块名，通常传入__name__
+
+    Returns:
+        位于agent_1根记录器之下的日志记录器
+    """
+    suffix = name.rsplit(".", 1)[-1]
+    return logging.getLogger(f"{LOGGER_NAME}.{suffix}")
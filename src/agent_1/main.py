@@ -13,12 +13,15 @@ sys.path.append(project_root)
 
 # 使用相对导入
 from agent_1.agent import BasicAgent
+from agent_1.log import setup_logging
 
 
 def main():
     """主函数 - 运行交互式智能体"""
     import sys
     
+    setup_logging()
+    
     # 检查是否有命令行参数
     if len(sys.argv) > 1:
         # 命令行模式 - 直接处理参数中的问题
@@ -0,0 +1,352 @@
+"""
+记忆模块 - 存储对话历史
+
+该模块只依赖langchain_core和ormsgpack，可以在不加载模型和智能体依赖的情况下使用。
+"""
+
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Type, Union
+
+import ormsgpack
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    message_to_dict,
+    messages_from_dict,
+)
+
+# 快照格式版本，格式变化时递增
+SNAPSHOT_VERSION = 1
+
+# 可以只用角色和文本表示的消息类型
+_PLAIN_ROLES: Dict[Type[BaseMessage], str] = {
+    HumanMessage: "human",
+    AIMessage: "ai",
+    SystemMessage: "system",
+}
+_PLAIN_CLASSES: Dict[str, Type[BaseMessage]] = {
+    role: cls for cls, role in _PLAIN_ROLES.items()
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本的token数量
+
+    中文字符按每字一个token计算，其余字符按每4个字符一个token计算。
+
+    Args:
+        text: 待估算的文本
+
+    Returns:
+        估算的token数量
+    """
+    cjk = sum(1 for ch in text if "\u4e00" <= ch <= "\u9fff")
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _is_plain(message: BaseMessage) -> bool:
+    """消息是否只有角色和文本内容，没有工具调用、元数据等附加字段"""
+    return (
+        type(message) in _PLAIN_ROLES
+        and isinstance(message.content, str)
+        and not message.additional_kwargs
+        and not message.response_metadata
+        and message.name is None
+        and message.id is None
+        and not getattr(message, "tool_calls", None)
+        and not getattr(message, "invalid_tool_calls", None)
+        and getattr(message, "usage_metadata", None) is None
+    )
+
+
+class MessageRecord:
+    """
+    一条历史消息的紧凑表示
+
+    普通的用户、助手和系统消息只保存角色、文本和时间戳，需要时才转换为BaseMessage；
+    带工具调用或元数据的消息原样保存在message中，保证转换前后完全一致。
+    """
+
+    __slots__ = ("role", "content", "created_at", "message", "_tokens")
+
+    def __init__(
+        self,
+        role: str,
+        content: str,
+        created_at: float,
+        message: Optional[BaseMessage] = None,
+    ):
+        # 从快照解码出的角色字符串各自独立，驻留后所有记录共用同一个对象
+        self.role = sys.intern(role)
+        self.content = content
+        self.created_at = created_at
+        self.message = message
+        self._tokens = -1
+
+    @classmethod
+    def from_message(cls, message: BaseMessage, created_at: float) -> "MessageRecord":
+        """从BaseMessage创建记录"""
+        if _is_plain(message):
+            return cls(_PLAIN_ROLES[type(message)], message.content, created_at)  # type: ignore[arg-type]
+        return cls(message.type, str(message.content), created_at, message)
+
+    @property
+    def tokens(self) -> int:
+        """估算的token数，第一次访问时计算"""
+        if self._tokens < 0:
+            self._tokens = estimate_tokens(self.content)
+        return self._tokens
+
+    def to_message(self) -> BaseMessage:
+        """转换为BaseMessage"""
+        if self.message is not None:
+            return self.message
+        return _PLAIN_CLASSES[self.role](content=self.content)
+
+    def to_row(self) -> List[Any]:
+        """快照中的一行：[角色, 文本, 时间戳, 完整消息或None]"""
+        if self.message is None:
+            return [self.role, self.content, self.created_at, None]
+        return [self.role, "", self.created_at, message_to_dict(self.message)]
+
+    @classmethod
+    def from_row(cls, row: Sequence[Any]) -> "MessageRecord":
+        """从快照中的一行恢复记录"""
+        role, content, created_at, data = row
+        if data is None:
+            return cls(role, content, created_at)
+        return cls.from_message(messages_from_dict([data])[0], created_at)
+
+
+def dump_snapshot(
+    records: Sequence[MessageRecord], summary: Optional[str] = None
+) -> bytes:
+    """
+    把消息记录和摘要编码为msgpack快照
+
+    Args:
+        records: 消息记录
+        summary: 滚动摘要
+
+    Returns:
+        快照字节串
+    """
+    rows = [record.to_row() for record in records]
+    return ormsgpack.packb([SNAPSHOT_VERSION, summary, rows])
+
+
+def load_snapshot(data: bytes) -> Tuple[List[MessageRecord], Optional[str]]:
+    """
+    解码dump_snapshot生成的快照
+
+    Args:
+        data: 快照字节串
+
+    Returns:
+        (消息记录, 摘要)
+
+    Raises:
+        ValueError: 快照版本不受支持时抛出
+    """
+    version, summary, rows = ormsgpack.unpackb(data)
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"不支持的会话快照版本: {version}")
+    return [MessageRecord.from_row(row) for row in rows], summary
+
+
+class CompactChatMessageHistory(BaseChatMessageHistory):
+    """
+    紧凑的内存聊天历史
+
+    以带__slots__的记录保存消息，只在构建提示词读取messages时才转换为BaseMessage，
+    每条普通消息的内存占用只有角色、文本和时间戳。
+    """
+
+    def __init__(
+        self,
+        records: Optional[List[MessageRecord]] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        初始化聊天历史
+
+        Args:
+            records: 已有的消息记录
+            clock: 生成时间戳的时间函数，便于测试时替换
+        """
+        self._records: List[MessageRecord] = records if records is not None else []
+        self._clock = clock
+
+    @property
+    def messages(self) -> List[BaseMessage]:  # type: ignore[override]
+        return [record.to_message() for record in self._records]
+
+    @property
+    def records(self) -> List[MessageRecord]:
+        """消息记录，调用方不应直接修改"""
+        return self._records
+
+    def _changed(self) -> None:
+        """历史被修改后调用，子类可以在这里持久化"""
+
+    def _append(self, records: List[MessageRecord]) -> None:
+        """追加消息记录，所有新增消息都经过这里"""
+        self._records.extend(records)
+        self._changed()
+
+    def add_user_message(self, message: Union[HumanMessage, str]) -> None:
+        # 字符串直接保存为记录，不创建中间的消息对象
+        if isinstance(message, str):
+            self._append([MessageRecord("human", message, self._clock())])
+        else:
+            self.add_message(message)
+
+    def add_ai_message(self, message: Union[AIMessage, str]) -> None:
+        if isinstance(message, str):
+            self._append([MessageRecord("ai", message, self._clock())])
+        else:
+            self.add_message(message)
+
+    def add_message(self, message: BaseMessage) -> None:
+        self.add_messages([message])
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        now = self._clock()
+        self._append([MessageRecord.from_message(message, now) for message in messages])
+
+    def drop_oldest(self, count: int) -> None:
+        """丢弃最早的count条消息"""
+        if count > 0:
+            del self._records[:count]
+            self._changed()
+
+    def clear(self) -> None:
+        self._records = []
+        self._changed()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+
+class AgentMemory:  # 移除 BaseMemory 继承
+    """自定义记忆类，用于存储对话历史"""
+    
+    def __init__(
+        self,
+        chat_history: Optional[BaseChatMessageHistory] = None,
+        max_messages: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+    ):
+        """
+        初始化记忆
+
+        Args:
+            chat_history: 聊天历史对象，不提供则创建紧凑的内存历史
+            max_messages: 最多保留的消息条数，None表示不限制
+            max_tokens: 最多保留的估算token数，None表示不限制
+        """
+        # 空的紧凑历史长度为0，不能用or判断
+        if chat_history is None:
+            chat_history = CompactChatMessageHistory()
+        self.chat_history = chat_history
+        self.max_messages = max_messages
+        self.max_tokens = max_tokens
+        # 较早对话的滚动摘要，由HistoryManager维护
+        self.summary: Optional[str] = None
+    
+    @property
+    def has_messages(self) -> bool:
+        """历史中是否有消息，紧凑历史不需要转换消息"""
+        if isinstance(self.chat_history, CompactChatMessageHistory):
+            return len(self.chat_history) > 0
+        return bool(self.chat_history.messages)
+    
+    def save_context(self, inputs: dict, outputs: dict) -> None:
+        # 从输入中获取用户消息
+        if "input" in inputs:
+            self.chat_history.add_user_message(inputs["input"])
+        
+        # 从输出中获取助手回复
+        if "output" in outputs:
+            self.chat_history.add_ai_message(outputs["output"])
+        
+        self._trim()
+    
+    async def arun(self, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        在异步路径上执行会读写历史的同步操作
+
+        进程内历史只操作内存，直接执行；共享历史会访问后端，由子类改到线程中执行。
+        """
+        return func(*args)
+    
+    async def asave_context(self, inputs: dict, outputs: dict) -> None:
+        """异步版本的save_context"""
+        await self.arun(self.save_context, inputs, outputs)
+    
+    def _trim(self) -> None:
+        """按消息条数和token上限丢弃最早的消息"""
+        if self.max_messages is None and self.max_tokens is None:
+            return
+        
+        if isinstance(self.chat_history, CompactChatMessageHistory):
+            counts = [record.tokens for record in self.chat_history.records]
+        else:
+            counts = [
+                estimate_tokens(str(m.content)) for m in self.chat_history.messages
+            ]
+        start = 0
+        if self.max_messages is not None:
+            start = max(0, len(counts) - self.max_messages)
+        if self.max_tokens is not None:
+            tokens = sum(counts[start:])
+            while start < len(counts) and tokens > self.max_tokens:
+                tokens -= counts[start]
+                start += 1
+        
+        self.drop_oldest(start)
+    
+    def drop_oldest(self, count: int) -> None:
+        """丢弃最早的count条消息"""
+        if count <= 0:
+            return
+        if isinstance(self.chat_history, CompactChatMessageHistory):
+            self.chat_history.drop_oldest(count)
+            return
+        messages = list(self.chat_history.messages)
+        self.chat_history.clear()
+        self.chat_history.add_messages(messages[count:])
+    
+    def dumps(self) -> bytes:
+        """把历史和摘要编码为快照"""
+        if isinstance(self.chat_history, CompactChatMessageHistory):
+            records = self.chat_history.records
+        else:
+            now = time.time()
+            records = [
+                MessageRecord.from_message(m, now) for m in self.chat_history.messages
+            ]
+        return dump_snapshot(records, self.summary)
+    
+    @classmethod
+    def loads(
+        cls,
+        data: bytes,
+        max_messages: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+    ) -> "AgentMemory":
+        """从dumps生成的快照恢复记忆"""
+        records, summary = load_snapshot(data)
+        history = CompactChatMessageHistory(records)
+        memory = cls(history, max_messages=max_messages, max_tokens=max_tokens)
+        memory.summary = summary
+        return memory
+    
+    def clear(self) -> None:
+        self.chat_history.clear()
+        self.summary = None
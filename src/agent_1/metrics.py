@@ -0,0 +1,400 @@
+"""
+运行指标模块 - 记录各阶段耗时并以Prometheus文本格式导出
+
+指标对象在创建时预分配好所有桶，记录一次观测只做几次整数/浮点加法，不加锁：
+服务端的回调都在事件循环线程内执行，同步路径下极少量的计数竞争可以接受。
+"""
+
+import asyncio
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+# 默认耗时桶（秒）
+DEFAULT_LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+
+class Counter:
+    """单调递增计数器"""
+
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def samples(self, name: str, labels: str) -> List[str]:
+        return [f"{name}{labels} {_format_value(self.value)}"]
+
+
+class Gauge:
+    """可增可减的瞬时值"""
+
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def samples(self, name: str, labels: str) -> List[str]:
+        return [f"{name}{labels} {_format_value(self.value)}"]
+
+
+class Histogram:
+    """固定桶直方图"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个桶对应+Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name: str, labels: str) -> List[str]:
+        lines = []
+        cumulative = 0
+        bounds = [_format_value(b) for b in self.buckets] + ["+Inf"]
+        for bound, count in zip(bounds, self.counts):
+            cumulative += count
+            bucket_labels = _merge_labels(labels, 'le="%s"' % bound)
+            lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+        lines.append(f"{name}_sum{labels} {_format_value(self.sum)}")
+        lines.append(f"{name}_count{labels} {self.count}")
+        return lines
+
+
+class MetricFamily:
+    """同名指标按标签值区分的一组子指标"""
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        metric_type: str,
+        factory: Callable[[], Any],
+        labelnames: Sequence[str] = (),
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.metric_type = metric_type
+        self.labelnames = tuple(labelnames)
+        self._factory = factory
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        if not self.labelnames:
+            self._children[()] = factory()
+
+    def labels(self, *values: str) -> Any:
+        """获取指定标签值的子指标，不存在时创建"""
+        child = self._children.get(values)
+        if child is None:
+            child = self._children.setdefault(values, self._factory())
+        return child
+
+    def __getattr__(self, item: str) -> Any:
+        # 无标签指标可以直接调用inc/observe等方法
+        if item.startswith("_"):
+            raise AttributeError(item)
+        return getattr(self._children[()], item)
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+        for values, child in list(self._children.items()):
+            labels = ",".join(
+                f'{key}="{_escape(value)}"'
+                for key, value in zip(self.labelnames, values)
+            )
+            lines.extend(child.samples(self.name, f"{{{labels}}}" if labels else ""))
+        return lines
+
+
+class CallbackMetric:
+    """在导出时通过函数读取当前值的指标，用于暴露其他模块已有的计数"""
+
+    def __init__(
+        self, name: str, help_text: str, metric_type: str, func: Callable[[], float]
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.metric_type = metric_type
+        self.func = func
+
+    def render(self) -> List[str]:
+        try:
+            value = self.func()
+        except Exception:
+            return []
+        return [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} {self.metric_type}",
+            f"{self.name} {_format_value(value)}",
+        ]
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Any] = {}
+
+    def _register(self, metric: Any) -> Any:
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(
+        self, name: str, help_text: str, labelnames: Sequence[str] = ()
+    ) -> MetricFamily:
+        return self._register(
+            MetricFamily(name, help_text, "counter", Counter, labelnames)
+        )
+
+    def gauge(
+        self, name: str, help_text: str, labelnames: Sequence[str] = ()
+    ) -> MetricFamily:
+        return self._register(MetricFamily(name, help_text, "gauge", Gauge, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+    ) -> MetricFamily:
+        return self._register(
+            MetricFamily(
+                name, help_text, "histogram", lambda: Histogram(buckets), labelnames
+            )
+        )
+
+    def register_callback(
+        self,
+        name: str,
+        help_text: str,
+        func: Callable[[], float],
+        metric_type: str = "gauge",
+    ) -> CallbackMetric:
+        """注册导出时才读取的指标，同名指标会被替换"""
+        metric = CallbackMetric(name, help_text, metric_type, func)
+        self._metrics[name] = metric
+        return metric
+
+    def render(self) -> str:
+        """导出Prometheus文本格式"""
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _merge_labels(labels: str, extra: str) -> str:
+    if not labels:
+        return f"{{{extra}}}"
+    return f"{labels[:-1]},{extra}}}"
+
+
+# 全局注册表和指标
+registry = MetricsRegistry()
+
+LLM_LATENCY = registry.histogram("agent_llm_latency_seconds", "LLM调用耗时", ["model"])
+LLM_ERRORS = registry.counter("agent_llm_errors_total", "LLM调用失败次数", ["model"])
+LLM_TOKENS = registry.counter(
+    "agent_llm_tokens_total", "LLM消耗的token数", ["direction"]
+)
+LLM_ADMISSION = registry.counter(
+    "agent_llm_admission_total",
+    "LLM准入控制结果（admitted、rejected、timeout、retry）",
+    ["result"],
+)
+ROUTE_DECISIONS = registry.counter(
+    "agent_route_decisions_total",
+    "模型路由决策次数（small、simple、agent）",
+    ["route", "reason"],
+)
+TOOL_LATENCY = registry.histogram(
+    "agent_tool_latency_seconds", "工具调用耗时", ["tool"]
+)
+TOOL_ERRORS = registry.counter("agent_tool_errors_total", "工具调用失败次数", ["tool"])
+AGENT_RUN_LATENCY = registry.histogram(
+    "agent_run_latency_seconds", "AgentExecutor单次运行耗时"
+)
+AGENT_ACTIONS = registry.histogram(
+    "agent_actions_per_run",
+    "AgentExecutor单次运行的工具调用次数",
+    buckets=(0, 1, 2, 3, 4, 5, 8, 13),
+)
+HTTP_LATENCY = registry.histogram(
+    "agent_http_request_latency_seconds", "HTTP请求耗时", ["path"]
+)
+HTTP_INFLIGHT = registry.gauge("agent_http_inflight_requests", "正在处理的HTTP请求数")
+REQUESTS_CANCELLED = registry.counter(
+    "agent_http_requests_cancelled_total", "客户端断开连接后取消的请求数", ["path"]
+)
+CALLS_CANCELLED = registry.counter(
+    "agent_calls_cancelled_total",
+    "请求取消时中止的模型和工具调用次数（llm、tool）",
+    ["kind"],
+)
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    指标回调处理器
+
+    作为局部回调挂在模型、工具和AgentExecutor上，分别记录各自运行的耗时。
+    """
+
+    # 直接在事件循环线程中执行，避免每个事件都调度到线程池
+    run_inline = True
+
+    def __init__(self) -> None:
+        self._started: Dict[UUID, Tuple[float, str]] = {}
+        self._actions: Dict[UUID, int] = {}
+
+    # LLM
+    def on_chat_model_start(
+        self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model") or params.get("model_name") or "unknown"
+        self._started[run_id] = (time.perf_counter(), str(model))
+
+    def on_llm_start(
+        self,
+        serialized: Dict[str, Any],
+        prompts: List[str],
+        *,
+        run_id: UUID,
+        **kwargs: Any,
+    ) -> None:
+        self.on_chat_model_start(serialized, prompts, run_id=run_id, **kwargs)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            LLM_LATENCY.labels(started[1]).observe(time.perf_counter() - started[0])
+
+        usage = _token_usage(response)
+        if usage:
+            LLM_TOKENS.labels("in").inc(usage[0])
+            LLM_TOKENS.labels("out").inc(usage[1])
+
+    def on_llm_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        started = self._started.pop(run_id, None)
+        if isinstance(error, asyncio.CancelledError):
+            CALLS_CANCELLED.labels("llm").inc()
+            return
+        LLM_ERRORS.labels(started[1] if started else "unknown").inc()
+
+    # 工具
+    def on_tool_start(
+        self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        name = (serialized or {}).get("name") or "unknown"
+        self._started[run_id] = (time.perf_counter(), name)
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            TOOL_LATENCY.labels(started[1]).observe(time.perf_counter() - started[0])
+
+    def on_tool_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        started = self._started.pop(run_id, None)
+        if isinstance(error, asyncio.CancelledError):
+            CALLS_CANCELLED.labels("tool").inc()
+            return
+        name = started[1] if started else "unknown"
+        TOOL_ERRORS.labels(name).inc()
+        if started is not None:
+            TOOL_LATENCY.labels(name).observe(time.perf_counter() - started[0])
+
+    # AgentExecutor
+    def on_chain_start(
+        self,
+        serialized: Dict[str, Any],
+        inputs: Dict[str, Any],
+        *,
+        run_id: UUID,
+        **kwargs: Any,
+    ) -> None:
+        self._started[run_id] = (time.perf_counter(), "agent")
+        self._actions[run_id] = 0
+
+    def on_agent_action(self, action: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        if run_id in self._actions:
+            self._actions[run_id] += 1
+
+    def on_chain_end(
+        self, outputs: Dict[str, Any], *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        started = self._started.pop(run_id, None)
+        actions = self._actions.pop(run_id, None)
+        if started is not None:
+            AGENT_RUN_LATENCY.observe(time.perf_counter() - started[0])
+        if actions is not None:
+            AGENT_ACTIONS.observe(actions)
+
+    def on_chain_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._started.pop(run_id, None)
+        self._actions.pop(run_id, None)
+
+
+def _token_usage(response: LLMResult) -> Optional[Tuple[int, int]]:
+    """从LLM结果中取出 (输入token数, 输出token数)"""
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(
+                getattr(generation, "message", None), "usage_metadata", None
+            )
+            if usage:
+                return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+
+    token_usage = (response.llm_output or {}).get("token_usage") or {}
+    if token_usage:
+        return (
+            token_usage.get("prompt_tokens", 0),
+            token_usage.get("completion_tokens", 0),
+        )
+    return None
+
+
+# 全局指标回调处理器
+metrics_handler = MetricsCallbackHandler()
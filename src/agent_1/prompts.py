@@ -2,6 +2,8 @@
 智能体提示词模块 - 定义智能体的系统提示和交互提示
 """
 
+from functools import lru_cache
+
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 
 # 系统提示词
@@ -9,7 +11,7 @@ SYSTEM_PROMPT = """你是一个有用的AI助手，能够使用多种工具来
 
 你有以下工具可以使用：
 1. calculator: 计算数学表达式
-2. get_weather: 获取指定城市的天气信息
+2. get_weather: 获取城市的当前天气，多个城市用逗号分隔一次查询
 3. tavily_search: 搜索网络获取最新信息和实时数据
 
 使用工具时请遵循以下原则：
@@ -27,7 +29,8 @@ SYSTEM_PROMPT = """你是一个有用的AI助手，能够使用多种工具来
 
 请用中文回答用户的问题。如果你被问到"你是谁"，请直接介绍自己是一个AI助手，不需要使用工具。"""
 
-# 创建提示词模板
+# 创建提示词模板（模板不可变，所有智能体共享同一个实例）
+@lru_cache(maxsize=None)
 def create_agent_prompt() -> ChatPromptTemplate:
     """
     创建智能体提示词模板
@@ -50,6 +53,7 @@ SIMPLE_PROMPT = """你是一个友好的AI助手，能够回答各种问题和
 
 请用中文回答用户的问题，保持友好、专业的态度。"""
 
+@lru_cache(maxsize=None)
 def create_simple_prompt() -> ChatPromptTemplate:
     """
     创建简单对话提示词模板
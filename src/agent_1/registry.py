@@ -0,0 +1,142 @@
+"""
+编译结果注册表模块 - 缓存编译好的智能体执行器、模型链和图
+
+创建AgentExecutor需要获取工具、生成工具schema、创建提示词和模型，编译图还要再做一次
+bind_tools。这些对象本身不保存会话状态（记忆由调用方在每次调用时传入），因此按
+(模型, 温度, 是否使用工具, 工具集合)缓存后可以被所有会话共享，每个会话的智能体
+只需要持有自己的记忆。
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Sequence, Tuple, TypeVar
+
+from langchain_core.tools import BaseTool
+
+from .config import settings
+
+T = TypeVar("T")
+
+
+def tool_set_key(tools: Sequence[BaseTool]) -> Tuple[str, ...]:
+    """工具集合在缓存键中的表示"""
+    return tuple(sorted(tool.name for tool in tools))
+
+
+def compiled_key(
+    kind: str,
+    model_name: Optional[str],
+    temperature: Optional[float],
+    use_tools: bool,
+    tools: Sequence[BaseTool] = (),
+) -> Tuple[Any, ...]:
+    """
+    生成编译结果的缓存键，未指定的模型和温度按配置中的默认值归一化
+
+    Args:
+        kind: 编译结果的种类，例如agent或graph
+        model_name: 模型名称
+        temperature: 温度参数
+        use_tools: 是否使用工具
+        tools: 使用的工具
+
+    Returns:
+        可哈希的缓存键
+    """
+    return (
+        kind,
+        model_name or settings.siliconflow_model,
+        settings.siliconflow_temperature if temperature is None else float(temperature),
+        use_tools,
+        tool_set_key(tools) if use_tools else (),
+    )
+
+
+class CompiledRegistry:
+    """
+    按键缓存编译结果，超出容量时淘汰最久未使用的条目
+
+    同一个键只会构建一次：并发请求同一个尚未构建的键时，后到的调用等待先到的构建完成。
+    """
+
+    def __init__(self, max_size: int = 32):
+        """
+        初始化注册表
+
+        Args:
+            max_size: 最多缓存的编译结果数量
+        """
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._building: Dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get_or_build(self, key: Hashable, build: Callable[[], T]) -> T:
+        """
+        获取缓存的编译结果，不存在时调用build构建并缓存
+
+        Args:
+            key: 缓存键
+            build: 构建编译结果的函数
+
+        Returns:
+            编译结果
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return self._entries[key]
+            building = self._building.setdefault(key, threading.Lock())
+
+        with building:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return self._entries[key]
+                self._misses += 1
+            try:
+                value = build()
+            except BaseException:
+                with self._lock:
+                    self._building.pop(key, None)
+                raise
+            with self._lock:
+                self._entries[key] = value
+                self._building.pop(key, None)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+            return value
+
+    def clear(self) -> None:
+        """清空缓存，之后的调用重新构建"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取注册表统计信息"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+            }
+
+
+_registry: Optional[CompiledRegistry] = None
+
+
+def get_registry() -> CompiledRegistry:
+    """获取全局编译结果注册表"""
+    global _registry
+
+    if _registry is None:
+        _registry = CompiledRegistry(settings.agent_registry_max_size)
+    return _registry
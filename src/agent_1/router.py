@@ -0,0 +1,181 @@
+"""
+模型路由模块 - 在调用模型之前判断本轮对话是否需要工具
+
+大部分对话是寒暄和简单问答，不需要携带工具schema走完整的AgentExecutor。路由器先用
+关键词识别明确需要工具的请求（计算、天气、搜索）和明确的寒暄，其余请求交给一个
+基于特征打分的小模型判断。路由结果分为三档：
+
+- small: 寒暄等简单对话，使用较小的模型直接回答
+- simple: 不需要工具的普通问答，使用主模型但不携带工具
+- agent: 需要工具，使用完整的工具智能体
+
+每次路由决策都会计入运行指标并记录日志。
+"""
+
+import math
+import re
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from .config import settings
+from .log import get_logger
+from .metrics import ROUTE_DECISIONS
+
+logger = get_logger(__name__)
+
+SMALL = "small"
+SIMPLE = "simple"
+AGENT = "agent"
+
+# 明确需要工具的关键词，按原因分组
+TOOL_PATTERNS: Dict[str, "re.Pattern[str]"] = {
+    "calculation": re.compile(
+        r"\d\s*[-+*/×÷^%]\s*[\d(]|计算|算一下|算算|等于几|等于多少|sqrt|log|sin|cos|tan|平方|开方|乘以|除以",
+        re.IGNORECASE,
+    ),
+    "weather": re.compile(r"天气|气温|温度|下雨|降雨|下雪|weather", re.IGNORECASE),
+    "search": re.compile(
+        r"搜索|搜一下|查找|查一下|查询|最新|今天|今日|现在|目前|最近|新闻|股价|汇率|价格|实时|search|news|latest",
+        re.IGNORECASE,
+    ),
+}
+
+# 去掉标点和语气词后与之完全匹配的寒暄
+SMALL_TALK = frozenset({
+    "你好", "您好", "你好呀", "你好啊", "嗨", "哈喽", "在吗", "在么", "早", "早上好",
+    "中午好", "下午好", "晚上好", "晚安", "hi", "hello", "hey", "谢谢", "谢谢你",
+    "多谢", "感谢", "thanks", "thankyou", "再见", "拜拜", "bye", "好的", "好", "ok",
+    "嗯", "嗯嗯", "收到", "明白了", "知道了", "你是谁", "你叫什么", "你叫什么名字",
+    "你能做什么", "你会什么", "介绍一下你自己", "介绍下你自己",
+})
+
+_PUNCTUATION_RE = re.compile(r"[\s,.!?~，。！？、~…：:；;\"'“”‘’()（）]+")
+_TRAILING_PARTICLES_RE = re.compile(r"[呀啊吧呢嘛哦哈]+$")
+
+# 依赖上一轮上下文的追问，例如"那上海呢"，上一轮可能调用过工具
+_FOLLOW_UP_RE = re.compile(r"^(那|那么|还有|再|换成|换个)|呢[?？]?$")
+
+# 特征打分模型的权重：偏置、包含数字、包含年份、长度、疑问句、包含英文专有名词
+_WEIGHTS = (-1.5, 2.0, 1.0, 1.0, 0.3, 0.5)
+_YEAR_RE = re.compile(r"(19|20)\d{2}\s*年")
+_PROPER_NOUN_RE = re.compile(r"\b[A-Z][a-zA-Z]+")
+_QUESTION_RE = re.compile(r"[?？]|吗|什么|怎么|如何|为什么|哪|几|多少|是否")
+
+
+@dataclass(frozen=True)
+class RouteDecision:
+    """一次路由决策"""
+    route: str  # small、simple 或 agent
+    reason: str  # 决策依据
+    score: float  # 需要工具的估计概率
+
+
+def _normalize(text: str) -> str:
+    text = _PUNCTUATION_RE.sub("", text.strip().lower())
+    return _TRAILING_PARTICLES_RE.sub("", text) or text
+
+
+def tool_probability(text: str) -> float:
+    """
+    用特征打分估计一条消息需要工具的概率
+
+    Args:
+        text: 用户输入
+
+    Returns:
+        0到1之间的概率
+    """
+    features = (
+        1.0,
+        1.0 if any(ch.isdigit() for ch in text) else 0.0,
+        1.0 if _YEAR_RE.search(text) else 0.0,
+        min(len(text) / 50.0, 1.0),
+        1.0 if _QUESTION_RE.search(text) else 0.0,
+        1.0 if _PROPER_NOUN_RE.search(text) else 0.0,
+    )
+    score = sum(w * x for w, x in zip(_WEIGHTS, features))
+    return 1.0 / (1.0 + math.exp(-score))
+
+
+class TurnRouter:
+    """对话轮次路由器"""
+
+    def __init__(self, threshold: float = 0.5):
+        """
+        初始化路由器
+
+        Args:
+            threshold: 特征打分的概率超过该值时使用工具智能体
+        """
+        self.threshold = threshold
+
+    def classify(self, text: str, has_history: bool = False) -> RouteDecision:
+        """
+        判断一条用户输入应该使用哪一档模型
+
+        Args:
+            text: 用户输入
+            has_history: 是否有之前的对话，有时短追问按需要工具处理
+
+        Returns:
+            路由决策
+        """
+        for reason, pattern in TOOL_PATTERNS.items():
+            if pattern.search(text):
+                return RouteDecision(AGENT, reason, 1.0)
+        if _normalize(text) in SMALL_TALK:
+            return RouteDecision(SMALL, "small_talk", 0.0)
+        if has_history and _FOLLOW_UP_RE.search(text.strip()):
+            return RouteDecision(AGENT, "follow_up", 1.0)
+        score = tool_probability(text)
+        if score > self.threshold:
+            return RouteDecision(AGENT, "heuristic", score)
+        return RouteDecision(SIMPLE, "heuristic", score)
+
+    def route(self, text: str, has_history: bool = False) -> RouteDecision:
+        """判断路由并记录决策，参数同classify"""
+        decision = self.classify(text, has_history)
+        ROUTE_DECISIONS.labels(decision.route, decision.reason).inc()
+        logger.info(
+            "路由到%s（%s）",
+            decision.route,
+            decision.reason,
+            extra={
+                "route": decision.route,
+                "route_reason": decision.reason,
+                "route_score": round(decision.score, 3),
+            },
+        )
+        return decision
+
+
+_router: Optional[TurnRouter] = None
+
+
+def get_router() -> Optional[TurnRouter]:
+    """获取全局路由器，未启用路由时返回None"""
+    global _router
+
+    if not settings.router_enabled:
+        return None
+    if _router is None:
+        _router = TurnRouter(settings.router_threshold)
+    return _router
+
+
+def route_model(
+    decision: RouteDecision, model_name: Optional[str]
+) -> Tuple[Optional[str], bool]:
+    """
+    路由决策对应的(模型名称, 是否使用工具)
+
+    Args:
+        decision: 路由决策
+        model_name: 主模型名称
+
+    Returns:
+        (模型名称, 是否使用工具) 元组
+    """
+    if decision.route == SMALL:
+        return settings.router_small_model, False
+    return model_name, decision.route == AGENT
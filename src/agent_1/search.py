@@ -0,0 +1,82 @@
+"""
+搜索工具模块 - 创建Tavily搜索工具
+
+Tavily依赖较重，只有在配置了API密钥并真正需要搜索工具时才会导入本模块。
+"""
+
+from typing import Any, Dict, Optional
+
+from langchain_core.tools import BaseTool
+
+try:
+    # 尝试使用新的langchain-tavily包
+    from langchain_tavily import TavilySearch
+    from langchain_tavily._utilities import TAVILY_API_URL, TavilySearchAPIWrapper
+    USE_NEW_TAVILY = True
+except ImportError:
+    # 回退到旧的实现
+    from langchain_community.tools.tavily_search import TavilySearchResults
+    USE_NEW_TAVILY = False
+
+from .http_clients import get_async_http_client, get_http_client
+
+
+if USE_NEW_TAVILY:
+    class PooledTavilySearchAPIWrapper(TavilySearchAPIWrapper):
+        """通过共享的httpx连接池调用Tavily搜索API"""
+        
+        def _request(self, query: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+            """组装请求参数，去掉值为None的参数"""
+            params = {"query": query, **kwargs}
+            return {
+                "url": f"{self.api_base_url or TAVILY_API_URL}/search",
+                "json": {k: v for k, v in params.items() if v is not None},
+                "headers": {
+                    "Authorization": f"Bearer {self.tavily_api_key.get_secret_value()}",
+                    "Content-Type": "application/json",
+                    "X-Client-Source": "langchain-tavily",
+                },
+            }
+        
+        @staticmethod
+        def _check(response: Any) -> Dict[str, Any]:
+            if response.status_code != 200:
+                raise ValueError(f"Error {response.status_code}: {response.text}")
+            return response.json()
+        
+        def raw_results(self, query: str, **kwargs: Any) -> Dict[str, Any]:
+            return self._check(get_http_client().post(**self._request(query, kwargs)))
+        
+        async def raw_results_async(self, query: str, **kwargs: Any) -> Dict[str, Any]:
+            response = await get_async_http_client().post(
+                **self._request(query, kwargs)
+            )
+            return self._check(response)
+
+
+def create_tavily_search(api_key: str, base_url: Optional[str] = None) -> BaseTool:
+    """
+    创建Tavily搜索工具
+    
+    Args:
+        api_key: Tavily API密钥
+        base_url: API地址，为空时使用官方地址（仅新版langchain-tavily支持）
+        
+    Returns:
+        Tavily搜索工具
+    """
+    if USE_NEW_TAVILY:
+        # 使用新的TavilySearch类，请求走共享连接池
+        return TavilySearch(
+            api_wrapper=PooledTavilySearchAPIWrapper(
+                tavily_api_key=api_key, api_base_url=base_url
+            ),
+            max_results=5,
+        )
+    
+    # 回退到旧的TavilySearchResults
+    return TavilySearchResults(
+        max_results=5,
+        api_key=api_key,
+        description="搜索网络获取最新信息"
+    )
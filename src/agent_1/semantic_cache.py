@@ -0,0 +1,497 @@
+"""
+语义缓存模块 - 按问题的语义相似度复用之前的回答
+
+精确匹配的响应缓存无法命中换了说法的重复问题，例如"北京天气怎么样"和"北京今天天气如何"。
+语义缓存先把问题规范化（去掉标点、语气词和"请问"、"怎么样"等套话），再用本地CPU
+嵌入模型转换为向量，在NumPy向量索引中查找相似度超过阈值的已回答问题；命中时直接返回
+之前的回答，不再调用模型。为避免"北京天气"命中"上海天气"这类只差一个实体的问题，
+相似度达标后还要求两个问题的关键字符足够重合、数字完全一致。
+
+- 默认使用基于字符n-gram特征哈希的嵌入，不依赖额外的模型文件；配置了
+  semantic_cache_embedding_model 时使用 fastembed 加载本地ONNX模型
+  （需要安装 semantic 可选依赖）
+- 每个条目有自己的过期时间；使用了实时性工具（搜索、天气）的回答使用较短的有效期，
+  也可以按工具名立即失效
+- 索引按需倍增扩容直到容量上限，之后优先复用过期条目的位置；配置了 semantic_cache_path
+  时向量保存在内存映射文件中，条目元数据以追加日志保存，重启后可以继续使用
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+import numpy as np
+
+from .config import settings
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# 规范化时去掉的套话和语气词，较长的短语排在前面
+FILLER_PHRASES = tuple(sorted(
+    {
+        "请问", "请", "帮我", "给我", "麻烦", "一下", "怎么样", "如何", "是什么",
+        "什么是", "是怎样的", "今天", "现在", "目前", "的", "了", "吗", "呢", "吧",
+        "呀", "啊", "嘛",
+    },
+    key=len,
+    reverse=True,
+))
+
+_PUNCTUATION_RE = re.compile(r"[\s,.!?~，。！？、~…：:；;\"'“”‘’()（）]+")
+_FILLER_RE = re.compile("|".join(map(re.escape, FILLER_PHRASES)))
+_TERM_RE = re.compile(r"\d+(?:\.\d+)?|[a-z]+|[^\da-z]")
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+
+# 依赖上下文的指代词，带有这些词的问题在有历史时不使用缓存
+_REFERENCE_RE = re.compile(
+    r"它|他|她|这个|那个|这些|那些|上面|刚才|之前|继续|再来|还有|那么|^那"
+)
+
+# 相似度达标后，两个问题的关键字符至少要有这么大比例重合
+MIN_TERM_OVERLAP = 0.6
+
+# 每次查找检查的最相似候选数
+TOP_K = 4
+
+
+def canonicalize(text: str) -> str:
+    """问题的规范形式：小写，去掉标点、套话和语气词"""
+    text = _PUNCTUATION_RE.sub("", text.strip().lower())
+    return _FILLER_RE.sub("", text) or text
+
+
+def _terms(text: str) -> FrozenSet[str]:
+    return frozenset(_TERM_RE.findall(canonicalize(text)))
+
+
+def terms_match(a: str, b: str) -> bool:
+    """两个问题的数字完全一致，且关键字符的Jaccard相似度不低于MIN_TERM_OVERLAP"""
+    if _NUMBER_RE.findall(a) != _NUMBER_RE.findall(b):
+        return False
+    terms_a, terms_b = _terms(a), _terms(b)
+    union = terms_a | terms_b
+    return not union or len(terms_a & terms_b) / len(union) >= MIN_TERM_OVERLAP
+
+
+def is_context_free(text: str) -> bool:
+    """问题是否不依赖之前的对话，可以在有历史的会话中使用缓存"""
+    return not _REFERENCE_RE.search(text.strip())
+
+
+class HashingEmbedder:
+    """
+    基于字符n-gram特征哈希的嵌入
+
+    对规范化后的问题取1到3个字符的n-gram，用稳定哈希映射到固定维度并带符号累加，
+    最后归一化为单位向量。不需要模型文件，跨进程结果一致。
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def _features(self, text: str) -> Iterable[str]:
+        text = canonicalize(text)
+        for n in (1, 2, 3):
+            for i in range(len(text) - n + 1):
+                yield text[i:i + n]
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                hashed = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+                digest = int.from_bytes(hashed, "little")
+                vectors[row, digest % self.dim] += 1.0 if digest >> 63 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+
+class FastEmbedEmbedder:
+    """使用 fastembed 在CPU上运行的本地嵌入模型，需要安装 semantic 可选依赖"""
+
+    def __init__(self, model_name: str):
+        try:
+            from fastembed import TextEmbedding
+        except ImportError as e:
+            raise ImportError(
+                "使用本地嵌入模型需要安装可选依赖: pip install 'agent_1[semantic]'"
+            ) from e
+        self.name = model_name
+        self._model = TextEmbedding(model_name)
+        self.dim = self.embed(["维度"]).shape[1]
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        canonical = [canonicalize(t) for t in texts]
+        vectors = np.asarray(list(self._model.embed(canonical)), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+
+@dataclass
+class _Entry:
+    """缓存条目"""
+    namespace: str
+    question: str
+    answer: str
+    tools: Tuple[str, ...]
+    expires_at: float
+
+
+class SemanticCache:
+    """基于向量相似度的回答缓存"""
+
+    def __init__(
+        self,
+        embedder: Any = None,
+        threshold: float = 0.85,
+        ttl_seconds: float = 3600.0,
+        volatile_ttl_seconds: float = 600.0,
+        volatile_tools: Sequence[str] = ("tavily_search", "get_weather"),
+        max_entries: int = 2000,
+        path: Optional[str] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        初始化语义缓存
+
+        Args:
+            embedder: 嵌入模型，需要提供dim属性和embed方法，默认使用HashingEmbedder
+            threshold: 余弦相似度阈值
+            ttl_seconds: 条目默认有效期（秒）
+            volatile_ttl_seconds: 使用了实时性工具的回答的有效期（秒），0表示不缓存
+            volatile_tools: 实时性工具名称
+            max_entries: 最多保留的条目数
+            path: 持久化文件前缀，为None时只保存在内存中
+            clock: 时间函数，条目过期时间需要跨进程重启有效，因此使用墙上时间
+        """
+        self.embedder = embedder or HashingEmbedder()
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.volatile_ttl_seconds = volatile_ttl_seconds
+        self.volatile_tools = frozenset(volatile_tools)
+        self.max_entries = max_entries
+        self.path = path
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: List[Optional[_Entry]] = []
+        self._free: List[int] = []
+        self._namespace_ids: Dict[str, int] = {}
+        self._log_lines = 0
+        self._hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._invalidations = 0
+
+        self._capacity = 0
+        self._vectors = np.zeros((0, self.embedder.dim), dtype=np.float32)
+        self._expires = np.zeros(0, dtype=np.float64)  # 0表示空位
+        self._namespaces = np.zeros(0, dtype=np.int32)
+        if path:
+            self._load()
+        else:
+            self._grow(min(64, max_entries))
+
+    @classmethod
+    def from_settings(cls) -> "SemanticCache":
+        """根据全局配置创建语义缓存"""
+        embedder = None
+        if settings.semantic_cache_embedding_model:
+            embedder = FastEmbedEmbedder(settings.semantic_cache_embedding_model)
+        return cls(
+            embedder=embedder,
+            threshold=settings.semantic_cache_threshold,
+            ttl_seconds=settings.semantic_cache_ttl_seconds,
+            volatile_ttl_seconds=settings.semantic_cache_volatile_ttl_seconds,
+            volatile_tools=settings.semantic_cache_volatile_tools,
+            max_entries=settings.semantic_cache_max_entries,
+            path=settings.semantic_cache_path,
+        )
+
+    # 存储
+
+    @property
+    def _vectors_path(self) -> str:
+        return f"{self.path}.vectors"
+
+    @property
+    def _log_path(self) -> str:
+        return f"{self.path}.jsonl"
+
+    def _grow(self, capacity: int) -> None:
+        """把索引扩容到capacity个位置，已有向量保持不变"""
+        dim = self.embedder.dim
+        if self.path:
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(capacity * dim * 4)
+            self._vectors = np.memmap(
+                self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, dim)
+            )
+        else:
+            vectors = np.zeros((capacity, dim), dtype=np.float32)
+            vectors[:self._capacity] = self._vectors
+            self._vectors = vectors
+        added = capacity - self._capacity
+        self._expires = np.concatenate([self._expires, np.zeros(added)])
+        namespaces = np.full(added, -1, np.int32)
+        self._namespaces = np.concatenate([self._namespaces, namespaces])
+        self._entries.extend([None] * added)
+        self._free.extend(range(self._capacity, capacity))
+        self._capacity = capacity
+
+    def _load(self) -> None:
+        """从追加日志恢复条目，向量直接映射已有文件"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        header = {"dim": self.embedder.dim, "embedder": self.embedder.name}
+        records: List[Dict[str, Any]] = []
+        if os.path.exists(self._log_path):
+            with open(self._log_path, encoding="utf-8") as f:
+                lines = [json.loads(line) for line in f if line.strip()]
+            if lines and lines[0] == header:
+                records = lines[1:]
+            else:
+                # 嵌入模型变化后旧向量不可比较，丢弃
+                logger.warning("语义缓存的嵌入模型已变化，清空持久化的条目")
+                for path in (self._log_path, self._vectors_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+
+        slots = max([r["slot"] + 1 for r in records], default=0)
+        self._grow(max(min(64, self.max_entries), slots))
+        for record in records:
+            slot = record["slot"]
+            if record.get("deleted"):
+                self._entries[slot] = None
+                self._expires[slot] = 0
+            else:
+                self._set(slot, _Entry(
+                    record["namespace"], record["question"], record["answer"],
+                    tuple(record["tools"]), record["expires_at"],
+                ))
+        self._free = [
+            slot for slot in range(self._capacity) if self._entries[slot] is None
+        ]
+        self._rewrite_log(header)
+
+    def _rewrite_log(self, header: Optional[Dict[str, Any]] = None) -> None:
+        """只保留存活条目重写日志"""
+        header = header or {"dim": self.embedder.dim, "embedder": self.embedder.name}
+        tmp = f"{self._log_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps(header) + "\n")
+            for slot, entry in enumerate(self._entries):
+                if entry is not None:
+                    record = self._record(slot, entry)
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp, self._log_path)
+        self._log_lines = len(self)
+
+    @staticmethod
+    def _record(slot: int, entry: _Entry) -> Dict[str, Any]:
+        return {
+            "slot": slot,
+            "namespace": entry.namespace,
+            "question": entry.question,
+            "answer": entry.answer,
+            "tools": list(entry.tools),
+            "expires_at": entry.expires_at,
+        }
+
+    def _append_log(self, records: List[Dict[str, Any]]) -> None:
+        if not self.path or not records:
+            return
+        with open(self._log_path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._log_lines += len(records)
+        if self._log_lines > 2 * len(self) + 64:
+            self._rewrite_log()
+
+    # 以下方法调用方需持有锁
+
+    def _namespace_id(self, namespace: str) -> int:
+        return self._namespace_ids.setdefault(namespace, len(self._namespace_ids))
+
+    def _set(
+        self, slot: int, entry: _Entry, vector: Optional[np.ndarray] = None
+    ) -> None:
+        self._entries[slot] = entry
+        self._expires[slot] = entry.expires_at
+        self._namespaces[slot] = self._namespace_id(entry.namespace)
+        if vector is not None:
+            self._vectors[slot] = vector
+
+    def _drop(self, slots: Iterable[int]) -> List[Dict[str, Any]]:
+        records = []
+        for slot in slots:
+            if self._entries[slot] is not None:
+                self._entries[slot] = None
+                self._expires[slot] = 0
+                self._free.append(slot)
+                records.append({"slot": slot, "deleted": True})
+        return records
+
+    def _allocate(self) -> Tuple[int, List[Dict[str, Any]]]:
+        """分配一个空位：优先复用空位，其次扩容，再次清理过期条目，最后覆盖最早过期的条目"""
+        records: List[Dict[str, Any]] = []
+        if not self._free and self._capacity < self.max_entries:
+            self._grow(min(self.max_entries, max(1, self._capacity * 2)))
+        if not self._free:
+            now = self._clock()
+            expired = np.flatnonzero((self._expires > 0) & (self._expires <= now))
+            records = self._drop(expired.tolist())
+        if not self._free:
+            records = self._drop([int(np.argmin(self._expires))])
+        # 先使用编号较小的位置，查找时扫描的范围更紧凑
+        self._free.sort(reverse=True)
+        return self._free.pop(), records
+
+    # 公共接口
+
+    def lookup(self, question: str, namespace: str = "") -> Optional[str]:
+        """
+        查找语义相似的已回答问题
+
+        Args:
+            question: 用户问题
+            namespace: 命名空间，不同模型或配置的回答互不命中
+
+        Returns:
+            之前的回答，未命中时返回None
+        """
+        vector = self.embedder.embed([question])[0]
+        with self._lock:
+            namespace_id = self._namespace_ids.get(namespace)
+            if namespace_id is not None:
+                now = self._clock()
+                valid = (self._namespaces == namespace_id) & (self._expires > now)
+                if valid.any():
+                    scores = np.where(valid, self._vectors @ vector, -1.0)
+                    k = min(TOP_K, len(scores))
+                    top = np.argpartition(-scores, k - 1)[:k]
+                    for slot in top[np.argsort(-scores[top])]:
+                        if scores[slot] < self.threshold:
+                            break
+                        entry = self._entries[slot]
+                        if terms_match(question, entry.question):
+                            self._hits += 1
+                            logger.info(
+                                "语义缓存命中（相似度%.3f）: %s",
+                                scores[slot],
+                                entry.question,
+                            )
+                            return entry.answer
+            self._misses += 1
+        return None
+
+    def store(
+        self, question: str, answer: str, namespace: str = "", tools: Sequence[str] = ()
+    ) -> bool:
+        """
+        缓存一个问题的回答
+
+        Args:
+            question: 用户问题
+            answer: 回答
+            namespace: 命名空间
+            tools: 生成回答时调用过的工具，包含实时性工具时使用较短的有效期
+
+        Returns:
+            是否写入了缓存
+        """
+        volatile = self.volatile_tools.intersection(tools)
+        ttl = self.volatile_ttl_seconds if volatile else self.ttl_seconds
+        if ttl <= 0 or not answer:
+            return False
+        vector = self.embedder.embed([question])[0]
+        tools = tuple(sorted(set(tools)))
+        entry = _Entry(namespace, question, answer, tools, self._clock() + ttl)
+        with self._lock:
+            slot, records = self._allocate()
+            self._set(slot, entry, vector)
+            self._stores += 1
+            self._append_log(records + [self._record(slot, entry)])
+        return True
+
+    async def alookup(self, question: str, namespace: str = "") -> Optional[str]:
+        """异步版本的lookup，生成向量和扫描矩阵放到线程中执行，避免阻塞事件循环"""
+        return await asyncio.to_thread(self.lookup, question, namespace)
+
+    async def astore(
+        self, question: str, answer: str, namespace: str = "", tools: Sequence[str] = ()
+    ) -> bool:
+        """异步版本的store，生成向量和追加日志放到线程中执行"""
+        return await asyncio.to_thread(self.store, question, answer, namespace, tools)
+
+    def invalidate(self, tool: Optional[str] = None) -> int:
+        """
+        让缓存条目立即失效
+
+        Args:
+            tool: 只让调用过该工具的回答失效，为None时清空所有条目
+
+        Returns:
+            失效的条目数
+        """
+        with self._lock:
+            slots = [
+                slot for slot, entry in enumerate(self._entries)
+                if entry is not None and (tool is None or tool in entry.tools)
+            ]
+            records = self._drop(slots)
+            self._invalidations += len(records)
+            self._append_log(records)
+        return len(records)
+
+    def __len__(self) -> int:
+        return sum(entry is not None for entry in self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取语义缓存统计信息"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self),
+                "capacity": self._capacity,
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "stores": self._stores,
+                "invalidations": self._invalidations,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+            }
+
+
+_semantic_cache: Optional[SemanticCache] = None
+_semantic_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """获取全局语义缓存，未启用时返回None"""
+    global _semantic_cache
+
+    if not settings.semantic_cache_enabled:
+        return None
+    if _semantic_cache is None:
+        with _semantic_cache_lock:
+            if _semantic_cache is None:
+                _semantic_cache = SemanticCache.from_settings()
+    return _semantic_cache
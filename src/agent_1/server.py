@@ -2,21 +2,80 @@
 LangServe服务器配置 - 部署智能体为API服务
 """
 
-from typing import Any, Dict, List, Optional
+import asyncio
+import json
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
 
-from fastapi import FastAPI
-from langchain_core.messages import AIMessage, HumanMessage
-from langchain_core.runnables import RunnableConfig
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from langchain_core.messages import AnyMessage
+from langchain_core.runnables import RunnableLambda
+from langchain_core.runnables.utils import ConfigurableFieldSpec
 from langserve import add_routes
 from pydantic import BaseModel, Field
+from sse_starlette.sse import EventSourceResponse
 
-from .agent import BasicAgent
+from .admission import AdmissionError, get_admission_controller
+from .cache import get_llm_cache
+from .cancellation import DisconnectMiddleware
+from .checkpoint import close_checkpointer, get_checkpointer
 from .config import settings
-from .graph import create_graph
+from .http_clients import aclose_http_clients
+from .lazy import LazyRunnable
+from .log import get_logger, setup_logging, shutdown_logging
+from .memory import AgentMemory
+from .metrics import HTTP_INFLIGHT, HTTP_LATENCY, registry
+from .session import SessionStore
+from .tool_wrappers import get_tool_cache
+
+logger = get_logger(__name__)
+
+
+def preload() -> None:
+    """构建智能体和图，多进程部署时每个工作进程启动时各执行一次"""
+    get_agent()
+    graph_runnable.build()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """应用生命周期：启动时初始化日志、恢复会话并按需预加载，退出时关闭连接池、写出会话快照、检查点、长期记忆和剩余日志"""
+    setup_logging()
+    if settings.session_snapshot_path:
+        try:
+            restored = session_store.load_snapshot(settings.session_snapshot_path)
+            logger.info("从快照恢复了%d个会话", restored)
+        except Exception:
+            logger.exception("恢复会话快照失败")
+    if settings.preload:
+        try:
+            await asyncio.to_thread(preload)
+            logger.info("工作进程 %d 预加载完成", os.getpid())
+        except Exception:
+            # 预加载失败不阻止启动，之后在第一次请求时重试
+            logger.exception("预加载失败")
+    yield
+    await aclose_http_clients()
+    if settings.session_snapshot_path:
+        start = time.perf_counter()
+        saved = session_store.save_snapshot(settings.session_snapshot_path)
+        elapsed = time.perf_counter() - start
+        logger.info("写出%d个会话的快照，耗时%.3f秒", saved, elapsed)
+    close_checkpointer()
+    # 存储模块依赖NumPy，在创建图时才导入
+    from .store import close_store
+    
+    close_store()
+    shutdown_logging()
 
 
 # 创建FastAPI应用（禁用文档自动生成功能）
 app = FastAPI(
+    lifespan=lifespan,
     title="Agent_1 API",
     description="基于LangChain的基础智能体API服务",
     version="0.1.0",
@@ -26,6 +85,18 @@ app = FastAPI(
 )
 
 
+@app.exception_handler(AdmissionError)
+async def admission_error_handler(
+    request: Request, exc: AdmissionError
+) -> JSONResponse:
+    """模型服务繁忙时快速返回503，并通过Retry-After告知客户端何时重试"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(int(exc.retry_after))},
+    )
+
+
 # 定义请求和响应模型
 class ChatInput(BaseModel):
     """聊天输入模型"""
@@ -39,15 +110,186 @@ class ChatOutput(BaseModel):
     session_id: Optional[str] = Field(None, description="会话ID")
 
 
-# 创建全局智能体实例
-agent_instance = BasicAgent()
-graph_instance = create_graph()
+class BatchChatInput(BaseModel):
+    """批量聊天输入模型"""
+    messages: List[ChatInput] = Field(
+        ..., description="消息列表，每条消息可带各自的会话ID"
+    )
+    max_concurrency: Optional[int] = Field(
+        None, ge=1, description="最大并发数，默认使用服务配置"
+    )
+
+
+class GraphInput(BaseModel):
+    """图输入模型"""
+    messages: List[AnyMessage] = Field(
+        ...,
+        description="对话消息列表，在config.configurable中提供thread_id时只需发送新消息",
+    )
+
+
+_agent_instance = None
+_agent_lock = threading.Lock()
+
+
+def get_agent():
+    """获取全局智能体实例，首次调用时创建"""
+    global _agent_instance
+    
+    if _agent_instance is None:
+        with _agent_lock:
+            if _agent_instance is None:
+                from .agent import BasicAgent
+                
+                _agent_instance = BasicAgent()
+    return _agent_instance
+
+
+async def aget_agent():
+    """
+    异步获取全局智能体实例
+
+    未预加载时第一次请求需要创建智能体，放到线程中执行，避免阻塞事件循环中的其他请求。
+    """
+    if _agent_instance is None:
+        return await asyncio.to_thread(get_agent)
+    return get_agent()
+
+
+def _build_graph():
+    """创建LangGraph图，配置了检查点存储时按thread_id保存对话状态"""
+    from .graph import create_thread_graph
+    from .store import get_store
+    
+    return create_thread_graph(get_checkpointer(), get_store())
+
+
+def _build_agent_route():
+    """/agent路由：把ChatInput转换为AgentExecutor的输入，并把执行结果转换为ChatOutput"""
+    return (
+        RunnableLambda(
+            lambda data: {
+                "input": data["message"],
+                "session_id": data.get("session_id"),
+            }
+        )
+        | get_agent().agent
+        | RunnableLambda(
+            lambda result: {
+                "response": result["output"],
+                "session_id": result.get("session_id"),
+            }
+        )
+    )
+
+
+# 智能体和图都在第一次请求时才构建，导入本模块不会创建模型和工具
+agent_runnable = LazyRunnable(_build_agent_route, name="agent")
+graph_runnable = LazyRunnable(
+    _build_graph,
+    input_type=GraphInput,
+    name="graph",
+    config_specs=[
+        ConfigurableFieldSpec(
+            id="thread_id",
+            annotation=Optional[str],
+            name="Thread ID",
+            description="会话线程ID，提供后服务端保存对话状态，每轮只需发送新消息",
+            default=None,
+            is_shared=True,
+        )
+    ],
+)
+
+# 按会话隔离的记忆注册表
+session_store = SessionStore.from_settings()
+
+
+def _llm_cache_stat(key: str) -> float:
+    cache = get_llm_cache()
+    return cache.stats()[key] if cache else 0
+
+
+def _semantic_cache_stat(key: str) -> float:
+    from .semantic_cache import get_semantic_cache
+    
+    cache = get_semantic_cache()
+    return cache.stats()[key] if cache is not None else 0
+
+
+registry.register_callback(
+    "agent_llm_cache_hits_total", "LLM响应缓存命中次数",
+    lambda: _llm_cache_stat("hits"), metric_type="counter",
+)
+registry.register_callback(
+    "agent_llm_cache_misses_total", "LLM响应缓存未命中次数",
+    lambda: _llm_cache_stat("misses"), metric_type="counter",
+)
+registry.register_callback(
+    "agent_semantic_cache_hits_total", "语义缓存命中次数",
+    lambda: _semantic_cache_stat("hits"), metric_type="counter",
+)
+registry.register_callback(
+    "agent_semantic_cache_misses_total", "语义缓存未命中次数",
+    lambda: _semantic_cache_stat("misses"), metric_type="counter",
+)
+registry.register_callback("agent_sessions", "当前会话数", lambda: len(session_store))
+registry.register_callback(
+    "agent_llm_inflight",
+    "正在进行的模型请求数",
+    lambda: get_admission_controller().stats()["inflight"],
+)
+registry.register_callback(
+    "agent_llm_queued",
+    "等待准入的模型请求数",
+    lambda: get_admission_controller().stats()["queued"],
+)
+
+
+def _tool_cache_stat(key: str) -> float:
+    return sum(stats[key] for stats in get_tool_cache().stats()["tools"].values())
+
+
+registry.register_callback(
+    "agent_tool_cache_hits_total",
+    "工具结果缓存命中次数（含失败结果）",
+    lambda: _tool_cache_stat("hits") + _tool_cache_stat("negative_hits"),
+    metric_type="counter",
+)
+registry.register_callback(
+    "agent_tool_cache_misses_total", "工具结果缓存未命中次数",
+    lambda: _tool_cache_stat("misses"), metric_type="counter",
+)
+registry.register_callback(
+    "agent_tool_cache_coalesced_total", "与进行中的相同调用合并的工具调用次数",
+    lambda: _tool_cache_stat("coalesced"), metric_type="counter",
+)
+
+
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    """记录每个请求的耗时和正在处理的请求数"""
+    HTTP_INFLIGHT.inc()
+    start = time.perf_counter()
+    try:
+        return await call_next(request)
+    finally:
+        HTTP_INFLIGHT.dec()
+        # 使用路由模板作为标签，避免路径参数导致标签数量膨胀
+        route = request.scope.get("route")
+        path = getattr(route, "path", "other")
+        HTTP_LATENCY.labels(path).observe(time.perf_counter() - start)
+
+
+# 客户端断开连接时取消仍在进行的模型和工具调用；后添加的中间件位于最外层
+if settings.cancel_on_disconnect:
+    app.add_middleware(DisconnectMiddleware, paths=("/chat", "/agent", "/graph"))
 
 
 # 添加智能体路由
 add_routes(
     app,
-    agent_instance.agent,
+    agent_runnable,
     path="/agent",
     input_type=ChatInput,
     output_type=ChatOutput,
@@ -57,19 +299,29 @@ add_routes(
 # 添加图路由
 add_routes(
     app,
-    graph_instance,
+    graph_runnable,
     path="/graph",
 )
 
 
+async def get_session_memory(session_id: Optional[str]) -> AgentMemory:
+    """按会话获取记忆，未提供session_id时使用一次性记忆"""
+    if session_id:
+        return await session_store.aget(session_id)
+    return AgentMemory()
+
+
 # 创建自定义端点
 @app.post("/chat", response_model=ChatOutput)
 async def chat_endpoint(input_data: ChatInput) -> ChatOutput:
     """
     自定义聊天端点，提供更简单的接口
     """
-    # 调用智能体
-    response = agent_instance.invoke(input_data.message)
+    memory = await get_session_memory(input_data.session_id)
+    
+    # 异步调用智能体，避免阻塞事件循环
+    agent = await aget_agent()
+    response = await agent.ainvoke(input_data.message, memory=memory)
     
     return ChatOutput(
         response=response,
@@ -77,6 +329,114 @@ async def chat_endpoint(input_data: ChatInput) -> ChatOutput:
     )
 
 
+@app.post("/chat/stream")
+async def chat_stream_endpoint(input_data: ChatInput) -> EventSourceResponse:
+    """
+    流式聊天端点，通过SSE推送token、工具调用和最终回复
+    """
+    memory = await get_session_memory(input_data.session_id)
+    agent = await aget_agent()
+    
+    async def event_generator() -> AsyncIterator[Dict[str, str]]:
+        async for event in agent.astream(input_data.message, memory=memory):
+            yield {
+                "event": event["event"],
+                "data": json.dumps(event["data"], ensure_ascii=False, default=str),
+            }
+    
+    return EventSourceResponse(event_generator())
+
+
+@app.post("/chat/batch")
+async def chat_batch_endpoint(input_data: BatchChatInput) -> StreamingResponse:
+    """
+    批量聊天端点，以NDJSON格式按完成先后逐条返回结果
+    
+    每行是一个JSON对象：{"index": 输入序号, "response": 回复, "session_id": 会话ID}
+    """
+    if len(input_data.messages) > settings.batch_max_items:
+        raise HTTPException(
+            status_code=413,
+            detail=f"单次最多提交{settings.batch_max_items}条消息",
+        )
+    
+    # 同一会话的消息共用一个记忆对象，保证它们按顺序执行
+    memories: Dict[Optional[str], AgentMemory] = {}
+    items = []
+    for item in input_data.messages:
+        if item.session_id and item.session_id not in memories:
+            memories[item.session_id] = await get_session_memory(item.session_id)
+        memory = memories[item.session_id] if item.session_id else AgentMemory()
+        items.append((item.message, memory))
+    max_concurrency = min(
+        input_data.max_concurrency or settings.batch_max_concurrency,
+        settings.batch_max_concurrency,
+    )
+    agent = await aget_agent()
+    
+    async def line_generator() -> AsyncIterator[str]:
+        async for index, response in agent.abatch_as_completed(
+            items, max_concurrency
+        ):
+            line = {
+                "index": index,
+                "response": response,
+                "session_id": input_data.messages[index].session_id,
+            }
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(line_generator(), media_type="application/x-ndjson")
+
+
+@app.get("/sessions/stats")
+async def session_stats() -> Dict[str, int]:
+    """会话注册表统计信息"""
+    return session_store.stats()
+
+
+@app.get("/cache/stats")
+async def cache_stats() -> Dict[str, Any]:
+    """LLM响应缓存统计信息"""
+    cache = get_llm_cache()
+    return cache.stats() if cache else {"enabled": False}
+
+
+@app.get("/llm/admission/stats")
+async def admission_stats() -> Dict[str, float]:
+    """模型准入控制统计信息"""
+    return get_admission_controller().stats()
+
+
+@app.get("/tools/cache/stats")
+async def tool_cache_stats() -> Dict[str, Any]:
+    """工具结果缓存统计信息"""
+    return get_tool_cache().stats()
+
+
+@app.get("/semantic-cache/stats")
+async def semantic_cache_stats() -> Dict[str, Any]:
+    """语义缓存统计信息"""
+    from .semantic_cache import get_semantic_cache
+    
+    cache = get_semantic_cache()
+    return cache.stats() if cache is not None else {"enabled": False}
+
+
+@app.post("/semantic-cache/invalidate")
+async def semantic_cache_invalidate(tool: Optional[str] = None) -> Dict[str, int]:
+    """让语义缓存中调用过指定工具的回答立即失效，未指定工具时清空缓存"""
+    from .semantic_cache import get_semantic_cache
+    
+    cache = get_semantic_cache()
+    return {"invalidated": cache.invalidate(tool) if cache is not None else 0}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint() -> PlainTextResponse:
+    """Prometheus文本格式的运行指标"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/")
 async def root():
     """根端点，提供API信息"""
@@ -88,17 +448,50 @@ async def root():
             "agent": "/agent",
             "graph": "/graph",
             "chat": "/chat",
+            "chat_stream": "/chat/stream",
+            "chat_batch": "/chat/batch",
+            "session_stats": "/sessions/stats",
+            "cache_stats": "/cache/stats",
+            "tool_cache_stats": "/tools/cache/stats",
+            "admission_stats": "/llm/admission/stats",
+            "semantic_cache_stats": "/semantic-cache/stats",
+            "metrics": "/metrics",
         },
         "note": "API文档功能已禁用"
     }
 
 
-if __name__ == "__main__":
+def run() -> None:
+    """
+    启动服务
+
+    workers大于1时以多进程方式运行并关闭自动重载，每个工作进程各自执行一次生命周期
+    启动逻辑；此时应使用sqlite或redis状态后端，使任何进程都能处理任何会话。
+
+    Raises:
+        ValueError: 多进程模式下图的长期记忆存储使用memmap时抛出，
+            同一个存储文件只能由一个进程打开
+    """
     import uvicorn
     
+    workers = settings.workers or os.cpu_count() or 1
+    if workers > 1 and settings.graph_store == "memmap":
+        raise ValueError(
+            f"GRAPH_STORE=memmap 的存储文件只能由一个进程打开，"
+            f"{workers}个工作进程时请设置 GRAPH_STORE=memory"
+        )
+    if workers > 1 and settings.state_backend == "memory":
+        logger.warning("多进程模式使用进程内状态后端，会话不会在工作进程之间共享")
+    
     uvicorn.run(
         "src.agent_1.server:app",
         host=settings.host,
         port=settings.port,
-        reload=True,
-    )
\ No newline at end of file
+        workers=workers,
+        reload=settings.reload and workers == 1,
+    )
+
+
+if __name__ == "__main__":
+    setup_logging()
+    run()
\ No newline at end of file
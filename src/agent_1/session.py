@@ -0,0 +1,497 @@
+"""
+会话管理模块 - 按session_id隔离对话记忆，并进行LRU/TTL淘汰
+
+配置共享状态后端（state_backend为sqlite或redis）时，会话记忆保存在后端中，
+多个工作进程中的任何一个都可以处理同一会话的后续请求。
+"""
+
+import asyncio
+import json
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import ormsgpack
+
+from langchain_core.messages import messages_from_dict
+
+from .memory import (
+    AgentMemory,
+    CompactChatMessageHistory,
+    MessageRecord,
+    dump_snapshot,
+    load_snapshot,
+)
+from .config import settings
+from .state import StateBackend, get_state_backend
+
+# 会话在共享状态后端中的键前缀
+SESSION_KEY_PREFIX = "session:"
+
+# 会话快照文件的魔数，之后是写入时间和每个会话一段带长度前缀的msgpack记录
+SNAPSHOT_MAGIC = b"AGSESS1\n"
+_SAVED_AT = struct.Struct("<d")
+_FRAME_HEADER = struct.Struct("<I")
+
+
+def _same_message(a: MessageRecord, b: MessageRecord) -> bool:
+    """两条记录是否为同一条消息；旧版本JSON会话每次加载的时间戳不同，不参与比较"""
+    return a.role == b.role and a.content == b.content and a.message == b.message
+
+
+class SharedChatMessageHistory(CompactChatMessageHistory):
+    """
+    保存在共享状态后端中的聊天历史
+
+    创建时从后端加载一次，之后读取本地副本；每次修改都把消息和摘要整体编码为
+    msgpack快照，以上次读到的快照为预期值用compare_and_set写回后端。其他进程在此期间
+    写入了同一会话时写回失败，此时重新加载后端中的最新状态，在其上重放本地新增和丢弃的
+    消息以及摘要的修改后重试，两边各自追加的消息都会保留。
+    """
+
+    # 写回冲突时最多尝试的次数
+    MAX_PERSIST_ATTEMPTS = 10
+
+    def __init__(
+        self,
+        backend: StateBackend,
+        key: str,
+        ttl_seconds: Optional[float] = None,
+        records: Optional[List[MessageRecord]] = None,
+        summary: Optional[str] = None,
+        version: Optional[bytes] = None,
+    ):
+        super().__init__(records)
+        self.backend = backend
+        self.key = key
+        self.ttl_seconds = ttl_seconds
+        self._summary = summary
+        self._deferred = 0
+        self._dirty = False
+        # 上次从后端读到或写入后端的快照，None表示后端中还没有该会话
+        self._version = version
+        # 尚未写回的本地修改，写回冲突时在后端的最新状态上重放
+        self._added: List[MessageRecord] = []
+        self._removed: List[MessageRecord] = []
+        self._cleared = False
+        self._summary_changed = False
+
+    @staticmethod
+    def _decode(raw: Optional[bytes]) -> Tuple[List[MessageRecord], Optional[str]]:
+        """解码后端中保存的会话，不存在时返回空历史"""
+        if raw is None:
+            return [], None
+        if raw[:1] == b"{":
+            # 旧版本以JSON保存
+            data = json.loads(raw)
+            now = time.time()
+            messages = messages_from_dict(data["messages"])
+            records = [MessageRecord.from_message(m, now) for m in messages]
+            return records, data.get("summary")
+        return load_snapshot(raw)
+
+    @classmethod
+    def load(
+        cls, backend: StateBackend, key: str, ttl_seconds: Optional[float] = None
+    ) -> "SharedChatMessageHistory":
+        """从后端加载，不存在时返回空历史"""
+        raw = backend.get(key)
+        records, summary = cls._decode(raw)
+        return cls(
+            backend, key, ttl_seconds, records=records, summary=summary, version=raw
+        )
+
+    @property
+    def summary(self) -> Optional[str]:
+        """较早对话的滚动摘要，修改后需要调用persist写回"""
+        return self._summary
+
+    @summary.setter
+    def summary(self, value: Optional[str]) -> None:
+        self._summary = value
+        self._summary_changed = True
+
+    def _append(self, records: List[MessageRecord]) -> None:
+        self._added.extend(records)
+        super()._append(records)
+
+    def drop_oldest(self, count: int) -> None:
+        # 新增的消息总在末尾，丢弃到它们时说明之前加载的消息已经全部丢弃
+        for record in self._records[:max(count, 0)]:
+            if self._added and self._added[0] is record:
+                self._added.pop(0)
+            else:
+                self._removed.append(record)
+        super().drop_oldest(count)
+
+    def clear(self) -> None:
+        self._cleared = True
+        self._added = []
+        self._removed = []
+        super().clear()
+
+    def _changed(self) -> None:
+        self.persist()
+
+    @contextmanager
+    def deferred(self) -> Iterator[None]:
+        """在上下文中合并多次修改，退出时只写回一次"""
+        self._deferred += 1
+        try:
+            yield
+        finally:
+            self._deferred -= 1
+            if not self._deferred and self._dirty:
+                self.persist()
+
+    def _rebase(self, raw: Optional[bytes]) -> None:
+        """以后端中的最新状态为基础，重放尚未写回的本地修改"""
+        records, summary = self._decode(raw)
+        if self._cleared:
+            records = list(self._added)
+        else:
+            # 本地丢弃的消息可能已被其他进程丢弃，只去掉开头仍然存在的那些
+            start = 0
+            for removed in self._removed:
+                if start < len(records) and _same_message(records[start], removed):
+                    start += 1
+            records = records[start:] + self._added
+        self._records = records
+        if not self._summary_changed:
+            self._summary = summary
+        self._version = raw
+
+    def persist(self) -> None:
+        """
+        把当前消息和摘要写回后端
+
+        Raises:
+            RuntimeError: 连续MAX_PERSIST_ATTEMPTS次与其他进程的写入冲突时抛出
+        """
+        if self._deferred:
+            self._dirty = True
+            return
+        self._dirty = False
+        for _ in range(self.MAX_PERSIST_ATTEMPTS):
+            data = dump_snapshot(self._records, self._summary)
+            if self.backend.compare_and_set(
+                self.key, self._version, data, self.ttl_seconds
+            ):
+                self._version = data
+                self._added, self._removed = [], []
+                self._cleared = self._summary_changed = False
+                return
+            self._rebase(self.backend.get(self.key))
+        raise RuntimeError(
+            f"会话写回冲突，{self.MAX_PERSIST_ATTEMPTS}次尝试后仍未成功: {self.key}"
+        )
+
+
+class SharedAgentMemory(AgentMemory):
+    """使用共享聊天历史的会话记忆，摘要与消息一起保存"""
+
+    def __init__(
+        self,
+        chat_history: SharedChatMessageHistory,
+        max_messages: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+    ):
+        # 不调用父类初始化，避免把已加载的摘要重置为None
+        self.chat_history = chat_history
+        self.max_messages = max_messages
+        self.max_tokens = max_tokens
+
+    @property  # type: ignore[override]
+    def summary(self) -> Optional[str]:
+        return self.chat_history.summary
+
+    @summary.setter
+    def summary(self, value: Optional[str]) -> None:
+        if value != self.chat_history.summary:
+            self.chat_history.summary = value
+            self.chat_history.persist()
+
+    def save_context(self, inputs: dict, outputs: dict) -> None:
+        with self.chat_history.deferred():
+            super().save_context(inputs, outputs)
+
+    def clear(self) -> None:
+        with self.chat_history.deferred():
+            super().clear()
+
+    async def arun(self, func: Callable[..., Any], *args: Any) -> Any:
+        # 写回需要访问SQLite或Redis，放到线程中执行，避免阻塞事件循环
+        return await asyncio.to_thread(func, *args)
+
+
+class SessionStore:
+    """
+    会话记忆注册表
+
+    以session_id为键保存每个会话的AgentMemory。内部使用OrderedDict按最近访问顺序
+    排列，查找、插入和淘汰均为O(1)；超过容量时淘汰最久未使用的会话，空闲超过TTL的
+    会话在访问时被惰性清理。
+
+    提供共享状态后端时，会话记忆保存在后端中，每次get都从后端加载最新状态；
+    过期由后端的TTL负责，容量由后端自身限制。
+    """
+    
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        ttl_seconds: Optional[float] = 3600.0,
+        max_messages: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+        backend: Optional[StateBackend] = None,
+    ):
+        """
+        初始化会话注册表
+        
+        Args:
+            max_sessions: 最多保留的会话数量
+            ttl_seconds: 会话空闲过期时间（秒），None表示永不过期
+            max_messages: 每个会话最多保留的消息条数
+            max_tokens: 每个会话最多保留的估算token数
+            clock: 时间函数，便于测试时替换
+            backend: 共享状态后端，None表示在进程内保存会话
+        """
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self.max_tokens = max_tokens
+        self._clock = clock
+        self.backend = backend
+        self._sessions: "OrderedDict[str, AgentMemory]" = OrderedDict()
+        self._last_access: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        
+        # 统计指标
+        self.hits = 0
+        self.misses = 0
+        self.lru_evictions = 0
+        self.ttl_evictions = 0
+    
+    @classmethod
+    def from_settings(cls) -> "SessionStore":
+        """根据全局配置创建会话注册表"""
+        backend = get_state_backend()
+        return cls(
+            max_sessions=settings.session_max_sessions,
+            ttl_seconds=settings.session_ttl_seconds,
+            max_messages=settings.session_max_messages,
+            max_tokens=settings.session_max_tokens,
+            backend=backend if backend.shared else None,
+        )
+    
+    def get(self, session_id: str) -> AgentMemory:
+        """
+        获取会话记忆，不存在时创建
+        
+        Args:
+            session_id: 会话ID
+            
+        Returns:
+            该会话的记忆对象
+        """
+        if self.backend is not None:
+            return self._get_shared(session_id)
+
+        with self._lock:
+            now = self._clock()
+            self._purge_expired(now)
+            
+            memory = self._sessions.get(session_id)
+            if memory is not None:
+                self.hits += 1
+                self._sessions.move_to_end(session_id)
+            else:
+                self.misses += 1
+                memory = AgentMemory(
+                    max_messages=self.max_messages,
+                    max_tokens=self.max_tokens,
+                )
+                self._sessions[session_id] = memory
+                while len(self._sessions) > self.max_sessions:
+                    evicted, _ = self._sessions.popitem(last=False)
+                    del self._last_access[evicted]
+                    self.lru_evictions += 1
+            
+            self._last_access[session_id] = now
+            return memory
+    
+    async def aget(self, session_id: str) -> AgentMemory:
+        """
+        异步版本的get
+
+        进程内会话直接查找；共享后端的加载放到线程中执行，避免阻塞事件循环。
+        """
+        if self.backend is None:
+            return self.get(session_id)
+        return await asyncio.to_thread(self._get_shared, session_id)
+    
+    def _get_shared(self, session_id: str) -> AgentMemory:
+        """从共享状态后端加载会话记忆"""
+        history = SharedChatMessageHistory.load(
+            self.backend, SESSION_KEY_PREFIX + session_id, self.ttl_seconds
+        )
+        with self._lock:
+            if history.messages or history.summary:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return SharedAgentMemory(
+            history, max_messages=self.max_messages, max_tokens=self.max_tokens
+        )
+
+    def drop(self, session_id: str) -> bool:
+        """
+        删除会话
+        
+        Args:
+            session_id: 会话ID
+            
+        Returns:
+            会话存在并被删除时返回True
+        """
+        if self.backend is not None:
+            return self.backend.delete(SESSION_KEY_PREFIX + session_id)
+        with self._lock:
+            if self._sessions.pop(session_id, None) is None:
+                return False
+            del self._last_access[session_id]
+            return True
+    
+    def purge_expired(self) -> int:
+        """清理所有过期会话，返回清理数量"""
+        with self._lock:
+            return self._purge_expired(self._clock())
+    
+    def _purge_expired(self, now: float) -> int:
+        """从最久未访问的一端开始清理过期会话（调用方需持有锁）"""
+        if self.ttl_seconds is None:
+            return 0
+        
+        purged = 0
+        while self._sessions:
+            oldest = next(iter(self._sessions))
+            if now - self._last_access[oldest] < self.ttl_seconds:
+                break
+            del self._sessions[oldest]
+            del self._last_access[oldest]
+            purged += 1
+        
+        self.ttl_evictions += purged
+        return purged
+    
+    def save_snapshot(self, path: str) -> int:
+        """
+        把进程内的会话写入快照文件
+        
+        文件头之后按最近访问顺序逐个写入 [session_id, 空闲秒数, 记忆快照]，每段带4字节
+        长度前缀；先写临时文件再替换，写到一半退出不会损坏已有的快照。使用共享状态后端时
+        会话已经保存在后端中，不写快照。
+        
+        Args:
+            path: 快照文件路径
+        
+        Returns:
+            写入的会话数
+        """
+        if self.backend is not None:
+            return 0
+        with self._lock:
+            now = self._clock()
+            self._purge_expired(now)
+            sessions = [
+                (session_id, now - self._last_access[session_id], memory)
+                for session_id, memory in self._sessions.items()
+            ]
+        
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(_SAVED_AT.pack(time.time()))
+            for session_id, idle, memory in sessions:
+                frame = ormsgpack.packb([session_id, idle, memory.dumps()])
+                f.write(_FRAME_HEADER.pack(len(frame)))
+                f.write(frame)
+        os.replace(tmp_path, path)
+        return len(sessions)
+    
+    def load_snapshot(self, path: str) -> int:
+        """
+        从save_snapshot写入的快照文件恢复会话
+        
+        空闲时间（包括服务停止的时间）已超过TTL的会话被跳过，恢复的会话保留空闲时间和访问顺序。
+        
+        Args:
+            path: 快照文件路径，不存在时不做任何事
+        
+        Returns:
+            恢复的会话数
+        
+        Raises:
+            ValueError: 文件不是会话快照时抛出
+        """
+        if self.backend is not None or not os.path.exists(path):
+            return 0
+        with open(path, "rb") as f:
+            data = memoryview(f.read())
+        if data[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            raise ValueError(f"不是会话快照文件: {path}")
+        
+        (saved_at,) = _SAVED_AT.unpack_from(data, len(SNAPSHOT_MAGIC))
+        downtime = max(0.0, time.time() - saved_at)
+        offset = len(SNAPSHOT_MAGIC) + _SAVED_AT.size
+        loaded = 0
+        with self._lock:
+            now = self._clock()
+            while offset + _FRAME_HEADER.size <= len(data):
+                (length,) = _FRAME_HEADER.unpack_from(data, offset)
+                offset += _FRAME_HEADER.size
+                frame = data[offset:offset + length]
+                session_id, idle, payload = ormsgpack.unpackb(frame)
+                offset += length
+                idle += downtime
+                if self.ttl_seconds is not None and idle >= self.ttl_seconds:
+                    continue
+                self._sessions[session_id] = AgentMemory.loads(
+                    payload, self.max_messages, self.max_tokens
+                )
+                self._sessions.move_to_end(session_id)
+                self._last_access[session_id] = now - idle
+                loaded += 1
+            while len(self._sessions) > self.max_sessions:
+                evicted, _ = self._sessions.popitem(last=False)
+                del self._last_access[evicted]
+        return loaded
+    
+    def __len__(self) -> int:
+        if self.backend is not None:
+            return self.backend.count(SESSION_KEY_PREFIX)
+        return len(self._sessions)
+    
+    def __contains__(self, session_id: object) -> bool:
+        if self.backend is not None:
+            return (
+                isinstance(session_id, str)
+                and self.backend.get(SESSION_KEY_PREFIX + session_id) is not None
+            )
+        return session_id in self._sessions
+    
+    def stats(self) -> Dict[str, int]:
+        """获取会话统计信息"""
+        return {
+            "sessions": len(self),
+            "max_sessions": self.max_sessions,
+            "hits": self.hits,
+            "misses": self.misses,
+            "lru_evictions": self.lru_evictions,
+            "ttl_evictions": self.ttl_evictions,
+        }
@@ -0,0 +1,321 @@
+"""
+共享状态模块 - 可插拔的键值存储后端
+
+多进程部署时，会话记忆和缓存需要放在所有工作进程都能访问的存储中，任何进程都可以
+处理任何会话。提供三种后端：进程内存储（单进程）、本地SQLite文件（同一台机器上的
+多个进程）和Redis兼容服务（需要安装 redis 可选依赖）。
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+from .config import settings
+
+
+class StateBackend(ABC):
+    """键值存储后端接口，值为bytes"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        """读取值，不存在或已过期时返回None"""
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl_seconds: Optional[float] = None) -> None:
+        """写入值，ttl_seconds为None表示永不过期"""
+
+    @abstractmethod
+    def compare_and_set(
+        self,
+        key: str,
+        expected: Optional[bytes],
+        value: bytes,
+        ttl_seconds: Optional[float] = None,
+    ) -> bool:
+        """当前值等于expected（None表示键不存在）时原子地写入value，写入成功时返回True"""
+
+    @abstractmethod
+    def delete(self, key: str) -> bool:
+        """删除值，存在并被删除时返回True"""
+
+    @abstractmethod
+    def count(self, prefix: str = "") -> int:
+        """统计指定前缀下未过期的键数量"""
+
+    @abstractmethod
+    def clear(self, prefix: str = "") -> None:
+        """删除指定前缀下的所有键"""
+
+    @property
+    def shared(self) -> bool:
+        """数据是否在多个进程之间共享"""
+        return True
+
+
+class MemoryStateBackend(StateBackend):
+    """进程内存储后端，超过容量时淘汰最久未访问的键"""
+
+    def __init__(
+        self, max_entries: int = 10000, clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        初始化进程内存储
+
+        Args:
+            max_entries: 最多保留的键数量
+            clock: 时间函数，便于测试时替换
+        """
+        self.max_entries = max_entries
+        self._clock = clock
+        self._data: "OrderedDict[str, Tuple[Optional[float], bytes]]" = OrderedDict()
+        # compare_and_set在持有锁时调用get和set
+        self._lock = threading.RLock()
+
+    @property
+    def shared(self) -> bool:
+        return False
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at is not None and expires_at <= self._clock():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl_seconds: Optional[float] = None) -> None:
+        expires_at = self._clock() + ttl_seconds if ttl_seconds else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def compare_and_set(
+        self,
+        key: str,
+        expected: Optional[bytes],
+        value: bytes,
+        ttl_seconds: Optional[float] = None,
+    ) -> bool:
+        with self._lock:
+            if self.get(key) != expected:
+                return False
+            self.set(key, value, ttl_seconds)
+            return True
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def count(self, prefix: str = "") -> int:
+        now = self._clock()
+        with self._lock:
+            return sum(
+                1 for key, (expires_at, _) in self._data.items()
+                if key.startswith(prefix) and (expires_at is None or expires_at > now)
+            )
+
+    def clear(self, prefix: str = "") -> None:
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+
+
+class SQLiteStateBackend(StateBackend):
+    """
+    本地SQLite存储后端
+
+    同一台机器上的多个工作进程共享同一个数据库文件，WAL模式下读写互不阻塞。
+    """
+
+    # 每写入多少次清理一次过期数据
+    PURGE_EVERY = 256
+
+    def __init__(self, path: str, clock: Callable[[], float] = time.time):
+        """
+        初始化SQLite存储
+
+        Args:
+            path: 数据库文件路径
+            clock: 时间函数（需为墙上时间，以便跨进程使用）
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM state WHERE key = ? "
+                "AND (expires_at IS NULL OR expires_at > ?)",
+                (key, self._clock()),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, ttl_seconds: Optional[float] = None) -> None:
+        now = self._clock()
+        expires_at = now + ttl_seconds if ttl_seconds else None
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO state (key, value, expires_at) "
+                "VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                self._conn.execute("DELETE FROM state WHERE expires_at <= ?", (now,))
+
+    def compare_and_set(
+        self,
+        key: str,
+        expected: Optional[bytes],
+        value: bytes,
+        ttl_seconds: Optional[float] = None,
+    ) -> bool:
+        now = self._clock()
+        expires_at = now + ttl_seconds if ttl_seconds else None
+        with self._lock, self._conn:
+            # 先取得写锁再读取，比较和写入之间其他进程无法修改
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._conn.execute(
+                "SELECT value FROM state WHERE key = ? "
+                "AND (expires_at IS NULL OR expires_at > ?)",
+                (key, now),
+            ).fetchone()
+            if (row[0] if row else None) != expected:
+                return False
+            self._conn.execute(
+                "INSERT OR REPLACE INTO state (key, value, expires_at) "
+                "VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+            return True
+
+    def delete(self, key: str) -> bool:
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM state WHERE key = ?", (key,))
+            return cursor.rowcount > 0
+
+    def count(self, prefix: str = "") -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM state WHERE substr(key, 1, ?) = ? "
+                "AND (expires_at IS NULL OR expires_at > ?)",
+                (len(prefix), prefix, self._clock()),
+            ).fetchone()[0]
+
+    def clear(self, prefix: str = "") -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM state WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+            )
+
+
+class RedisStateBackend(StateBackend):
+    """Redis兼容服务存储后端，需要安装 redis 可选依赖"""
+
+    def __init__(self, url: str, client: Any = None):
+        """
+        初始化Redis存储
+
+        Args:
+            url: 连接地址，例如 redis://localhost:6379/0
+            client: 已创建的客户端，便于测试时替换
+        """
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise ImportError(
+                    "使用redis状态后端需要安装可选依赖: pip install 'agent_1[redis]'"
+                ) from e
+            client = redis.Redis.from_url(url)
+        self._client = client
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._client.get(key)
+
+    def set(self, key: str, value: bytes, ttl_seconds: Optional[float] = None) -> None:
+        if ttl_seconds:
+            self._client.set(key, value, px=int(ttl_seconds * 1000))
+        else:
+            self._client.set(key, value)
+
+    def compare_and_set(
+        self,
+        key: str,
+        expected: Optional[bytes],
+        value: bytes,
+        ttl_seconds: Optional[float] = None,
+    ) -> bool:
+        from redis.exceptions import WatchError
+
+        with self._client.pipeline() as pipe:
+            try:
+                # WATCH之后键被其他客户端修改时EXEC失败
+                pipe.watch(key)
+                if pipe.get(key) != expected:
+                    pipe.unwatch()
+                    return False
+                pipe.multi()
+                if ttl_seconds:
+                    pipe.set(key, value, px=int(ttl_seconds * 1000))
+                else:
+                    pipe.set(key, value)
+                pipe.execute()
+                return True
+            except WatchError:
+                return False
+
+    def delete(self, key: str) -> bool:
+        return bool(self._client.delete(key))
+
+    def count(self, prefix: str = "") -> int:
+        return sum(1 for _ in self._client.scan_iter(match=f"{prefix}*", count=500))
+
+    def clear(self, prefix: str = "") -> None:
+        keys = list(self._client.scan_iter(match=f"{prefix}*", count=500))
+        if keys:
+            self._client.delete(*keys)
+
+
+_state_backend: Optional[StateBackend] = None
+
+
+def get_state_backend() -> StateBackend:
+    """
+    获取全局状态存储后端
+
+    Returns:
+        根据state_backend配置（memory、sqlite或redis）创建的后端
+    """
+    global _state_backend
+
+    if _state_backend is None:
+        if settings.state_backend == "sqlite":
+            _state_backend = SQLiteStateBackend(settings.state_sqlite_path)
+        elif settings.state_backend == "redis":
+            _state_backend = RedisStateBackend(settings.state_redis_url)
+        else:
+            _state_backend = MemoryStateBackend()
+    return _state_backend
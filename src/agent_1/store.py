@@ -0,0 +1,695 @@
+"""
+长期记忆存储模块 - 基于追加日志和内存映射向量矩阵的LangGraph存储
+
+`langgraph dev` 默认把长期记忆保存在 .langgraph_api/store.pckl 和
+store.vectors.pckl 中，每次保存都重写整个pickle，启动时把所有条目和向量读入内存，
+数据越多重启越慢。
+MemmapStore 把条目以JSON行追加写入日志文件，向量写入按需倍增的float32内存映射矩阵：
+
+- 写入只追加一行日志和若干行向量，不重写已有数据
+- 内存中只保留命名空间、键、日志偏移和向量位置，条目的值在需要时按偏移从日志读取
+- 相似度检索按块读取候选条目所在的向量行，只保留每个条目的得分，不把整个矩阵读入内存
+- 被覆盖或删除的条目在日志中留下的空间由后台线程定期压缩，释放的向量位置直接复用
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langgraph.store.base import (
+    BaseStore,
+    GetOp,
+    IndexConfig,
+    Item,
+    ListNamespacesOp,
+    Op,
+    PutOp,
+    Result,
+    SearchItem,
+    SearchOp,
+    ensure_embeddings,
+    get_text_at_path,
+    tokenize_path,
+)
+from langgraph.store.memory import InMemoryStore, _compare_values, _does_match
+
+from .config import settings
+from .log import get_logger
+
+if sys.platform != "win32":
+    import fcntl
+else:
+    fcntl = None
+
+logger = get_logger(__name__)
+
+# 相似度检索时每次从内存映射矩阵读取的向量行数
+SEARCH_CHUNK_ROWS = 4096
+
+Namespace = Tuple[str, ...]
+
+
+class _ItemRef:
+    """内存中条目的位置信息，值保存在日志中"""
+
+    __slots__ = ("offset", "length", "created_at", "updated_at", "slots")
+
+    def __init__(
+        self,
+        offset: int,
+        length: int,
+        created_at: float,
+        updated_at: float,
+        slots: Tuple[int, ...],
+    ):
+        self.offset = offset
+        self.length = length
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.slots = slots
+
+
+def _timestamp(value: float) -> datetime:
+    return datetime.fromtimestamp(value, timezone.utc)
+
+
+class MemmapStore(BaseStore):
+    """
+    追加日志加内存映射向量矩阵的长期记忆存储
+
+    未提供index时只支持键值读写和按过滤条件查找；提供index时按fields中的字段生成向量，
+    search的query按余弦相似度排序，一个条目有多个向量时取最高得分。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        index: Optional[IndexConfig] = None,
+        embedding_name: str = "",
+        compact_interval: float = 60.0,
+        compact_min_dead_ratio: float = 0.5,
+    ):
+        """
+        初始化存储
+
+        Args:
+            path: 文件前缀，条目保存在{path}.jsonl，向量保存在{path}.vectors
+            index: 向量索引配置，包含dims、embed和可选的fields，格式与InMemoryStore相同
+            embedding_name: 嵌入模型名称，与持久化文件中记录的不同时重新生成所有向量
+            compact_interval: 后台检查是否需要压缩日志的间隔（秒），0表示不启动后台线程
+            compact_min_dead_ratio: 日志中失效数据的比例超过该值时压缩
+        """
+        self.path = path
+        self.compact_min_dead_ratio = compact_min_dead_ratio
+        self.index_config = index
+        self.embeddings = None
+        self.dims = 0
+        self._fields: List[Tuple[str, Any]] = []
+        if index:
+            self.embeddings = ensure_embeddings(index.get("embed"))
+            self.dims = index["dims"]
+            fields = index.get("fields") or ["$"]
+            self._fields = [
+                (p, tokenize_path(p)) if p != "$" else (p, p) for p in fields
+            ]
+        embedder = embedding_name if index else None
+        self._header = {"dims": self.dims, "embedder": embedder}
+
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self._items: Dict[Namespace, Dict[str, _ItemRef]] = {}
+        self._live_bytes = 0
+        self._log_size = 0
+        self._header_size = 0
+        self._compactions = 0
+        self._capacity = 0
+        self._free: List[int] = []
+        self._vectors = np.zeros((0, max(self.dims, 1)), dtype=np.float32)
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock_file = self._acquire_file_lock()
+        self._load()
+
+        self._closed = threading.Event()
+        self._compactor: Optional[threading.Thread] = None
+        if compact_interval > 0:
+            self._compactor = threading.Thread(
+                target=self._compact_loop,
+                args=(compact_interval,),
+                name="store-compact",
+                daemon=True,
+            )
+            self._compactor.start()
+
+    # 文件
+
+    @property
+    def _log_path(self) -> str:
+        return f"{self.path}.jsonl"
+
+    @property
+    def _vectors_path(self) -> str:
+        return f"{self.path}.vectors"
+
+    def _acquire_file_lock(self) -> Any:
+        """日志只能由一个进程追加，同一路径已被其他进程打开时报错"""
+        lock_file = open(f"{self.path}.lock", "w")
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError as e:
+                lock_file.close()
+                raise RuntimeError(
+                    f"长期记忆存储 {self.path} 已被其他进程打开，"
+                    "多进程部署时请使用 GRAPH_STORE=memory 或为每个进程配置不同的路径"
+                ) from e
+        return lock_file
+
+    def _open_log(self) -> None:
+        self._log = open(self._log_path, "ab")
+        self._reader = os.open(self._log_path, os.O_RDONLY)
+        self._log_size = self._log.seek(0, os.SEEK_END)
+        with open(self._log_path, "rb") as f:
+            self._header_size = len(f.readline())
+
+    def _grow(self, capacity: int) -> None:
+        """把向量矩阵扩容到capacity行，已有向量保持不变"""
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(capacity * self.dims * 4)
+        self._vectors = np.memmap(
+            self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dims)
+        )
+        self._free.extend(range(capacity - 1, self._capacity - 1, -1))
+        self._capacity = capacity
+
+    def _load(self) -> None:
+        """重放日志恢复条目索引，向量直接映射已有文件"""
+        header_line = (json.dumps(self._header) + "\n").encode()
+        reindex = False
+        if os.path.exists(self._log_path):
+            with open(self._log_path, "rb") as f:
+                header = json.loads(f.readline() or b"null")
+                offset = f.tell()
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("记录没有换行符")
+                        self._replay(json.loads(line), offset, len(line))
+                    except (ValueError, KeyError, TypeError):
+                        break
+                    offset += len(line)
+                size = f.seek(0, os.SEEK_END)
+            if offset < size:
+                # 写入中途崩溃会留下半行记录，丢弃它及之后的内容，
+                # 后续追加从最后一条完整记录之后开始
+                logger.warning(
+                    "长期记忆存储日志在偏移%d处损坏，丢弃之后的%d字节",
+                    offset,
+                    size - offset,
+                )
+                os.truncate(self._log_path, offset)
+            if header != self._header:
+                logger.warning("长期记忆存储的向量索引配置已变化，重新生成所有向量")
+                reindex = True
+                self._rewrite_header(header_line)
+        else:
+            with open(self._log_path, "wb") as f:
+                f.write(header_line)
+        self._open_log()
+
+        if not self.dims:
+            return
+        if reindex and os.path.exists(self._vectors_path):
+            os.remove(self._vectors_path)
+        stored = 0
+        if os.path.exists(self._vectors_path):
+            stored = os.path.getsize(self._vectors_path) // (self.dims * 4)
+        refs = [ref for items in self._items.values() for ref in items.values()]
+        used = {slot for ref in refs for slot in ref.slots}
+        self._grow(max(64, stored, max(used, default=-1) + 1))
+        self._free = [
+            slot for slot in range(self._capacity - 1, -1, -1) if slot not in used
+        ]
+        if reindex:
+            self._reindex()
+
+    def _rewrite_header(self, header_line: bytes) -> None:
+        """替换日志的第一行，其余内容原样保留"""
+        tmp = f"{self._log_path}.tmp"
+        with open(self._log_path, "rb") as src, open(tmp, "wb") as dst:
+            old_header = len(src.readline())
+            dst.write(header_line)
+            while chunk := src.read(1 << 20):
+                dst.write(chunk)
+        os.replace(tmp, self._log_path)
+        shift = len(header_line) - old_header
+        for refs in self._items.values():
+            for ref in refs.values():
+                ref.offset += shift
+                ref.slots = ()
+
+    def _reindex(self) -> None:
+        """嵌入模型变化后按新模型重新生成所有条目的向量"""
+        refs = [(ns, key) for ns, items in self._items.items() for key in items]
+        for start in range(0, len(refs), 256):
+            puts = {}
+            for ns, key in refs[start:start + 256]:
+                record = self._read(self._items[ns][key])
+                puts[(ns, key)] = PutOp(ns, key, record["value"], record.get("index"))
+            self._apply_puts(puts, self._embed_puts(puts))
+        self.compact()
+
+    def _replay(self, record: Dict[str, Any], offset: int, length: int) -> None:
+        # 先读出所有字段，字段缺失的记录不会改动已恢复的索引
+        namespace, key = tuple(record["ns"]), record["key"]
+        ref = None
+        if record["value"] is not None:
+            slots = tuple(record.get("slots", {}).values()) if self.dims else ()
+            ref = _ItemRef(
+                offset, length, record["created_at"], record["updated_at"], slots
+            )
+        items = self._items.setdefault(namespace, {})
+        old = items.pop(key, None)
+        if old is not None:
+            self._live_bytes -= old.length
+        if ref is None:
+            if not items:
+                del self._items[namespace]
+            return
+        items[key] = ref
+        self._live_bytes += length
+
+    def _read(self, ref: _ItemRef) -> Dict[str, Any]:
+        return json.loads(os.pread(self._reader, ref.length, ref.offset))
+
+    def _append(self, records: List[Dict[str, Any]]) -> List[Tuple[int, int]]:
+        """把记录追加到日志，返回每条记录的(偏移, 长度)"""
+        lines = [
+            (json.dumps(record, ensure_ascii=False) + "\n").encode()
+            for record in records
+        ]
+        positions = []
+        for line in lines:
+            positions.append((self._log_size, len(line)))
+            self._log_size += len(line)
+        self._log.write(b"".join(lines))
+        self._log.flush()
+        return positions
+
+    # 写入（调用方需持有锁）
+
+    def _allocate(self) -> int:
+        if not self._free:
+            self._grow(self._capacity * 2)
+        return self._free.pop()
+
+    def _embed_puts(
+        self, puts: Dict[Tuple[Namespace, str], PutOp]
+    ) -> Dict[Tuple[Namespace, str], List[Tuple[str, str]]]:
+        """提取需要生成向量的文本，返回{(命名空间, 键): [(字段路径, 文本)]}"""
+        texts: Dict[Tuple[Namespace, str], List[Tuple[str, str]]] = {}
+        if not self.embeddings:
+            return texts
+        for (namespace, key), op in puts.items():
+            if op.value is None or op.index is False:
+                continue
+            paths = self._fields
+            if op.index is not None:
+                paths = [(ix, tokenize_path(ix)) for ix in op.index]
+            for path, field in paths:
+                found = get_text_at_path(op.value, field)
+                if len(found) > 1:
+                    indexed = ((f"{path}.{i}", t) for i, t in enumerate(found))
+                    texts.setdefault((namespace, key), []).extend(indexed)
+                elif found:
+                    texts.setdefault((namespace, key), []).append((path, found[0]))
+        return texts
+
+    def _apply_puts(
+        self,
+        puts: Dict[Tuple[Namespace, str], PutOp],
+        texts: Dict[Tuple[Namespace, str], List[Tuple[str, str]]],
+        embeddings: Optional[List[List[float]]] = None,
+    ) -> None:
+        if texts and embeddings is None:
+            pending = [t for pairs in texts.values() for _, t in pairs]
+            embeddings = self.embeddings.embed_documents(pending)
+        vectors = iter(self._normalize(embeddings) if texts else ())
+        with self._lock:
+            now = time.time()
+            records, targets, released = [], [], []
+            for (namespace, key), op in puts.items():
+                items = self._items.get(namespace, {})
+                old = items.get(key)
+                if old is not None:
+                    released.extend(old.slots)
+                if op.value is None:
+                    if old is not None:
+                        del items[key]
+                        self._live_bytes -= old.length
+                        if not items:
+                            del self._items[namespace]
+                        records.append(
+                            {"ns": list(namespace), "key": key, "value": None}
+                        )
+                    continue
+                slots = {}
+                for path, _ in texts.get((namespace, key), ()):
+                    slot = self._allocate()
+                    self._vectors[slot] = next(vectors)
+                    slots[path] = slot
+                created_at = old.created_at if old is not None else now
+                records.append({
+                    "ns": list(namespace), "key": key, "value": op.value,
+                    "index": op.index, "created_at": created_at, "updated_at": now,
+                    "slots": slots,
+                })
+                targets.append((namespace, key, created_at, now, tuple(slots.values())))
+
+            # 删除记录不需要索引，只取写入条目的位置
+            written = zip(self._append(records), records)
+            positions = [p for p, r in written if r["value"] is not None]
+            for target, (offset, length) in zip(targets, positions):
+                namespace, key, created_at, updated_at, slots = target
+                items = self._items.setdefault(namespace, {})
+                old = items.get(key)
+                if old is not None:
+                    self._live_bytes -= old.length
+                items[key] = _ItemRef(offset, length, created_at, updated_at, slots)
+                self._live_bytes += length
+            # 新记录写入日志后旧向量才能复用，
+            # 否则中途崩溃时日志中的旧记录会指向被覆盖的向量
+            self._free.extend(released)
+
+    def _normalize(self, embeddings: Sequence[Sequence[float]]) -> np.ndarray:
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dims)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+    # 读取（调用方需持有锁）
+
+    def _get(self, op: GetOp) -> Optional[Item]:
+        ref = self._items.get(op.namespace, {}).get(op.key)
+        if ref is None:
+            return None
+        return Item(
+            value=self._read(ref)["value"],
+            key=op.key,
+            namespace=op.namespace,
+            created_at=_timestamp(ref.created_at),
+            updated_at=_timestamp(ref.updated_at),
+        )
+
+    def _candidates(self, prefix: Namespace) -> List[Tuple[Namespace, str, _ItemRef]]:
+        return [
+            (namespace, key, ref)
+            for namespace, items in self._items.items()
+            if namespace[:len(prefix)] == prefix
+            for key, ref in items.items()
+        ]
+
+    def _scores(
+        self, candidates: List[Tuple[Namespace, str, _ItemRef]], query: np.ndarray
+    ) -> np.ndarray:
+        """按块计算每个候选条目的最高相似度，没有向量的条目为-inf"""
+        slots = np.fromiter(
+            (s for _, _, ref in candidates for s in ref.slots), dtype=np.int64
+        )
+        counts = [len(ref.slots) for _, _, ref in candidates]
+        owners = np.repeat(np.arange(len(candidates)), counts)
+        # 按向量位置排序，读取内存映射文件时尽量顺序访问
+        order = np.argsort(slots, kind="stable")
+        slots, owners = slots[order], owners[order]
+        scores = np.full(len(candidates), -np.inf, dtype=np.float32)
+        for start in range(0, len(slots), SEARCH_CHUNK_ROWS):
+            chunk = slice(start, start + SEARCH_CHUNK_ROWS)
+            np.maximum.at(scores, owners[chunk], self._vectors[slots[chunk]] @ query)
+        return scores
+
+    def _search(self, op: SearchOp, query: Optional[np.ndarray]) -> List[SearchItem]:
+        candidates = self._candidates(op.namespace_prefix)
+        scores: Optional[np.ndarray] = None
+        order: Iterable[int] = range(len(candidates))
+        if query is not None and candidates:
+            scores = self._scores(candidates, query)
+            wanted = op.offset + op.limit
+            if not op.filter and wanted < len(candidates):
+                # 没有过滤条件时只需要对前offset+limit个条目排序
+                top = np.argpartition(-scores, wanted - 1)[:wanted]
+                order = top[np.lexsort((top, -scores[top]))]
+            else:
+                order = np.lexsort((np.arange(len(candidates)), -scores))
+
+        results: List[SearchItem] = []
+        skipped = 0
+        for i in order:
+            namespace, key, ref = candidates[i]
+            value = self._read(ref)["value"]
+            if op.filter and not all(
+                _compare_values(value.get(k), v) for k, v in op.filter.items()
+            ):
+                continue
+            if skipped < op.offset:
+                skipped += 1
+                continue
+            score = None
+            if scores is not None and not np.isneginf(scores[i]):
+                score = float(scores[i])
+            results.append(SearchItem(
+                namespace=namespace, key=key, value=value,
+                created_at=_timestamp(ref.created_at),
+                updated_at=_timestamp(ref.updated_at), score=score,
+            ))
+            if len(results) >= op.limit:
+                break
+        return results
+
+    def _list_namespaces(self, op: ListNamespacesOp) -> List[Namespace]:
+        namespaces: Iterable[Namespace] = list(self._items)
+        if op.match_conditions:
+            namespaces = [
+                ns
+                for ns in namespaces
+                if all(_does_match(c, ns) for c in op.match_conditions)
+            ]
+        if op.max_depth is not None:
+            namespaces = {ns[:op.max_depth] for ns in namespaces}
+        return sorted(namespaces)[op.offset:op.offset + op.limit]
+
+    # BaseStore接口
+
+    def _prepare(
+        self, ops: Iterable[Op]
+    ) -> Tuple[List[Op], Dict[Tuple[Namespace, str], PutOp], List[str]]:
+        ops = list(ops)
+        puts: Dict[Tuple[Namespace, str], PutOp] = {}
+        for op in ops:
+            if isinstance(op, PutOp):
+                puts[(op.namespace, op.key)] = op
+            elif not isinstance(op, (GetOp, SearchOp, ListNamespacesOp)):
+                raise ValueError(f"Unknown operation type: {type(op)}")
+        queries = [] if not self.embeddings else list(dict.fromkeys(
+            op.query for op in ops if isinstance(op, SearchOp) and op.query
+        ))
+        return ops, puts, queries
+
+    def _run(self, ops: List[Op], query_vectors: Dict[str, np.ndarray]) -> List[Result]:
+        """执行读操作，同一批次中的读操作看到的是写入之前的数据"""
+        results: List[Result] = []
+        with self._lock:
+            for op in ops:
+                if isinstance(op, GetOp):
+                    results.append(self._get(op))
+                elif isinstance(op, SearchOp):
+                    query = query_vectors.get(op.query) if op.query else None
+                    results.append(self._search(op, query))
+                elif isinstance(op, ListNamespacesOp):
+                    results.append(self._list_namespaces(op))
+                else:
+                    results.append(None)
+        return results
+
+    def batch(self, ops: Iterable[Op]) -> List[Result]:
+        ops, puts, queries = self._prepare(ops)
+        query_vectors = {}
+        if queries:
+            vectors = self._normalize([self.embeddings.embed_query(q) for q in queries])
+            query_vectors = dict(zip(queries, vectors))
+        results = self._run(ops, query_vectors)
+        if puts:
+            self._apply_puts(puts, self._embed_puts(puts))
+        return results
+
+    async def abatch(self, ops: Iterable[Op]) -> List[Result]:
+        ops, puts, queries = self._prepare(ops)
+        query_vectors = {}
+        if queries:
+            embedded = [await self.embeddings.aembed_query(q) for q in queries]
+            query_vectors = dict(zip(queries, self._normalize(embedded)))
+        results = self._run(ops, query_vectors)
+        if puts:
+            texts = self._embed_puts(puts)
+            embeddings = None
+            if texts:
+                pending = [t for pairs in texts.values() for _, t in pairs]
+                embeddings = await self.embeddings.aembed_documents(pending)
+            self._apply_puts(puts, texts, embeddings)
+        return results
+
+    # 压缩
+
+    def dead_ratio(self) -> float:
+        """日志中（不含文件头）失效数据所占的比例"""
+        with self._lock:
+            records = self._log_size - self._header_size
+            return 1 - self._live_bytes / records if records > 0 else 0.0
+
+    def _compact_loop(self, interval: float) -> None:
+        while not self._closed.wait(interval):
+            try:
+                if self.dead_ratio() > self.compact_min_dead_ratio:
+                    self.compact()
+            except Exception:
+                logger.exception("长期记忆存储压缩失败")
+
+    def compact(self) -> Dict[str, int]:
+        """
+        只保留存活条目重写日志
+
+        先在不持有锁的情况下复制存活条目，再持有锁追加复制期间新写入的日志并替换文件，
+        压缩期间读写不会被阻塞。
+
+        Returns:
+            {"before": 压缩前的日志字节数, "after": 压缩后的日志字节数}
+        """
+        with self._compact_lock:
+            with self._lock:
+                end = self._log_size
+                live = sorted(
+                    (ref.offset, ref.length, namespace, key)
+                    for namespace, items in self._items.items()
+                    for key, ref in items.items()
+                )
+            tmp = f"{self._log_path}.tmp"
+            moved: Dict[Tuple[Namespace, str], Tuple[int, int]] = {}
+            with open(self._log_path, "rb") as src, open(tmp, "wb") as dst:
+                dst.write(src.readline())
+                for offset, length, namespace, key in live:
+                    src.seek(offset)
+                    moved[(namespace, key)] = (offset, dst.tell())
+                    dst.write(src.read(length))
+                copied = dst.tell()
+
+            with self._lock:
+                with open(self._log_path, "rb") as src, open(tmp, "ab") as dst:
+                    src.seek(end)
+                    while chunk := src.read(1 << 20):
+                        dst.write(chunk)
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                if self.dims:
+                    self._vectors.flush()
+                self._log.close()
+                os.close(self._reader)
+                os.replace(tmp, self._log_path)
+                self._open_log()
+                # 压缩开始后写入的条目整体前移，之前写入的条目移动到复制后的位置
+                for namespace, items in self._items.items():
+                    for key, ref in items.items():
+                        if ref.offset >= end:
+                            ref.offset += copied - end
+                        else:
+                            ref.offset = moved[(namespace, key)][1]
+                self._compactions += 1
+                logger.info("长期记忆存储压缩完成: %d -> %d 字节", end, self._log_size)
+                return {"before": end, "after": self._log_size}
+
+    def stats(self) -> Dict[str, Any]:
+        """获取存储统计信息"""
+        with self._lock:
+            return {
+                "items": sum(len(items) for items in self._items.values()),
+                "namespaces": len(self._items),
+                "vectors": self._capacity - len(self._free),
+                "capacity": self._capacity,
+                "log_bytes": self._log_size,
+                "dead_ratio": self.dead_ratio(),
+                "compactions": self._compactions,
+            }
+
+    def close(self) -> None:
+        """停止后台压缩线程，把向量写盘并关闭文件"""
+        self._closed.set()
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+        with self._lock:
+            if self.dims:
+                self._vectors.flush()
+            self._log.close()
+            os.close(self._reader)
+            self._lock_file.close()
+
+
+def default_index() -> IndexConfig:
+    """图的长期记忆存储使用的向量索引配置，嵌入模型与语义缓存相同"""
+    from .semantic_cache import FastEmbedEmbedder, HashingEmbedder
+
+    model = settings.graph_store_embedding_model
+    embedder = FastEmbedEmbedder(model) if model else HashingEmbedder()
+    return {
+        "dims": embedder.dim,
+        "embed": lambda texts: embedder.embed(list(texts)).tolist(),
+        "fields": settings.graph_store_index_fields,
+    }
+
+
+_store: Optional[BaseStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> BaseStore:
+    """
+    获取全局长期记忆存储
+
+    langgraph.json 的 store.path 指向这个函数，`langgraph dev` 和LangServe的/graph端点
+    使用同一个存储。
+
+    Returns:
+        根据graph_store配置创建的存储
+    """
+    global _store
+
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                index = default_index()
+                if settings.graph_store == "memory":
+                    _store = InMemoryStore(index=index)
+                else:
+                    embedding_name = settings.graph_store_embedding_model or "hashing"
+                    min_dead_ratio = settings.graph_store_compact_min_dead_ratio
+                    _store = MemmapStore(
+                        settings.graph_store_path,
+                        index=index,
+                        embedding_name=embedding_name,
+                        compact_interval=settings.graph_store_compact_interval,
+                        compact_min_dead_ratio=min_dead_ratio,
+                    )
+    return _store
+
+
+def close_store() -> None:
+    """关闭全局长期记忆存储"""
+    global _store
+
+    if isinstance(_store, MemmapStore):
+        _store.close()
+    _store = None
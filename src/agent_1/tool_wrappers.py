@@ -0,0 +1,473 @@
+"""
+工具包装模块 - 为工具调用增加超时、全局并发限制和结果缓存
+"""
+
+import asyncio
+import contextvars
+import json
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.tools import BaseTool
+from pydantic import ConfigDict
+
+from .cancellation import cancel_requested, raise_if_cancelled
+from .config import settings
+from .metrics import metrics_handler
+
+
+class ConcurrencyLimiter:
+    """
+    工具调用的全局并发限制
+
+    同步调用使用线程信号量，异步调用为每个事件循环创建独立的asyncio信号量，
+    两者共享同一个上限。同步调用的超时控制使用的线程池也以该上限为线程数。
+    """
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max_concurrency
+        self._thread_semaphore = threading.BoundedSemaphore(max_concurrency)
+        # 线程只在提交任务时按需创建
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="tool-timeout"
+        )
+        self._loop_semaphores: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, asyncio.Semaphore
+        ] = weakref.WeakKeyDictionary()
+
+    @property
+    def thread_semaphore(self) -> threading.BoundedSemaphore:
+        """同步调用使用的信号量"""
+        return self._thread_semaphore
+
+    def async_semaphore(self) -> asyncio.Semaphore:
+        """获取当前事件循环的信号量"""
+        loop = asyncio.get_running_loop()
+        semaphore = self._loop_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop_semaphores[loop] = semaphore
+        return semaphore
+
+
+class LimitedTool(BaseTool):
+    """
+    带超时和并发限制的工具包装器
+
+    对外暴露与被包装工具相同的名称、描述和参数schema，调用超时时返回错误说明而不是
+    抛出异常，让智能体可以继续推理。
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    tool: BaseTool
+    timeout: Optional[float] = None
+    limiter: ConcurrencyLimiter
+
+    def __init__(self, tool: BaseTool, **kwargs: Any):
+        super().__init__(
+            tool=tool,
+            name=tool.name,
+            description=tool.description,
+            args_schema=tool.args_schema,
+            return_direct=tool.return_direct,
+            **kwargs,
+        )
+
+    def _tool_input(self, args: tuple, kwargs: Dict[str, Any]) -> Any:
+        """还原被包装工具的输入"""
+        return args[0] if args else kwargs
+
+    def _timeout_message(self) -> str:
+        return f"工具调用超时: {self.name} 超过{self.timeout}秒未返回"
+
+    def _run(self, *args: Any, run_manager: Any = None, **kwargs: Any) -> Any:
+        tool_input = self._tool_input(args, kwargs)
+        try:
+            raise_if_cancelled()
+            semaphore = self.limiter.thread_semaphore
+            semaphore.acquire()
+            future: Optional[Future] = None
+            try:
+                # 排队等待并发名额期间请求可能已被取消
+                raise_if_cancelled()
+                if self.timeout is None:
+                    return self.tool.invoke(tool_input)
+                # 线程池不会复制上下文，工具线程需要看到当前请求的取消范围
+                context = contextvars.copy_context()
+                future = self.limiter.executor.submit(
+                    context.run, self.tool.invoke, tool_input
+                )
+            finally:
+                if future is None:
+                    semaphore.release()
+
+            # 正在运行的线程无法取消，超时后工具仍然占用名额，直到真正返回时才释放
+            future.add_done_callback(lambda _: semaphore.release())
+            try:
+                return future.result(timeout=self.timeout)
+            except FutureTimeoutError:
+                return self._timeout_message()
+        except asyncio.CancelledError as e:
+            # BaseTool只在普通异常时触发on_tool_error，取消需要自己报告
+            if run_manager is not None:
+                run_manager.on_tool_error(e)
+            raise
+
+    async def _arun(self, *args: Any, run_manager: Any = None, **kwargs: Any) -> Any:
+        tool_input = self._tool_input(args, kwargs)
+        try:
+            async with self.limiter.async_semaphore():
+                try:
+                    return await asyncio.wait_for(
+                        self.tool.ainvoke(tool_input), self.timeout
+                    )
+                except asyncio.TimeoutError:
+                    return self._timeout_message()
+        except asyncio.CancelledError as e:
+            if run_manager is not None:
+                await run_manager.on_tool_error(e)
+            raise
+
+
+_limiter: Optional[ConcurrencyLimiter] = None
+
+
+def get_tool_limiter() -> ConcurrencyLimiter:
+    """获取全局工具并发限制器"""
+    global _limiter
+
+    if _limiter is None:
+        _limiter = ConcurrencyLimiter(settings.tool_max_concurrency)
+    return _limiter
+
+
+def with_execution_limits(tools: List[BaseTool]) -> List[BaseTool]:
+    """
+    为工具列表加上超时和全局并发限制
+
+    超时时间优先使用tool_timeouts中按工具名配置的值，否则使用tool_timeout_seconds。
+    包装后的工具会把调用耗时记录到运行指标中。
+
+    Args:
+        tools: 原始工具列表
+
+    Returns:
+        包装后的工具列表，顺序不变
+    """
+    limiter = get_tool_limiter()
+    return [
+        LimitedTool(
+            tool,
+            timeout=settings.tool_timeouts.get(
+                tool.name, settings.tool_timeout_seconds
+            ),
+            limiter=limiter,
+            callbacks=[metrics_handler],
+        )
+        for tool in tools
+    ]
+
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _normalize(value: Any) -> Any:
+    """规范化工具参数：字符串去除首尾空白、合并连续空白并转为小写"""
+    if isinstance(value, str):
+        return _WHITESPACE_RE.sub(" ", value).strip().lower()
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items() if v is not None}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def _is_error_result(result: Any) -> bool:
+    """工具以返回值形式报告的错误，例如TavilySearch返回的{"error": ...}"""
+    return isinstance(result, dict) and "error" in result
+
+
+class ToolResultCache:
+    """
+    工具结果缓存
+
+    按 (工具名, 规范化参数) 缓存成功结果；失败结果只缓存negative_ttl秒，
+    避免下游故障时每次调用都重新请求。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        negative_ttl: float = 10.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        初始化工具结果缓存
+
+        Args:
+            max_entries: 最多保留的条目数
+            negative_ttl: 失败结果的缓存时间（秒），0表示不缓存失败结果
+            clock: 时间函数，便于测试时替换
+        """
+        self.max_entries = max_entries
+        self.negative_ttl = negative_ttl
+        self._clock = clock
+        self._data: "OrderedDict[str, Tuple[float, bool, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self._async_inflight: Dict[str, "asyncio.Future[Any]"] = {}
+        self._async_waiters: Dict[str, int] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def key(tool_name: str, tool_input: Any) -> str:
+        """根据工具名和规范化后的参数生成缓存键"""
+        if not isinstance(tool_input, dict):
+            tool_input = {"input": tool_input}
+        args = json.dumps(
+            _normalize(tool_input), sort_keys=True, ensure_ascii=False, default=str
+        )
+        return f"{tool_name}:{args}"
+
+    def _count(self, tool_name: str, field: str) -> None:
+        stats = self._stats.setdefault(
+            tool_name, {"hits": 0, "misses": 0, "coalesced": 0, "negative_hits": 0}
+        )
+        stats[field] += 1
+
+    def lookup(self, tool_name: str, key: str) -> Optional[Tuple[bool, Any]]:
+        """
+        查找缓存
+
+        Returns:
+            (是否为失败结果, 结果或异常)，未命中时返回None
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] <= self._clock():
+                del self._data[key]
+                item = None
+            if item is None:
+                self._count(tool_name, "misses")
+                return None
+            self._data.move_to_end(key)
+            self._count(tool_name, "negative_hits" if item[1] else "hits")
+            return item[1], item[2]
+
+    def store(self, key: str, result: Any, ttl: float) -> None:
+        """写入结果，以返回值形式报告的错误按失败结果缓存"""
+        if _is_error_result(result):
+            self.store_error(key, result)
+        elif ttl > 0:
+            self._put(key, ttl, False, result)
+
+    def store_error(self, key: str, error: Any) -> None:
+        """写入失败结果"""
+        if self.negative_ttl > 0:
+            self._put(key, self.negative_ttl, True, error)
+
+    def _put(self, key: str, ttl: float, is_error: bool, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (self._clock() + ttl, is_error, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def join(self, tool_name: str, key: str) -> Tuple[Future, bool]:
+        """
+        加入同步调用的单飞分组
+
+        Returns:
+            (共享的Future, 当前调用者是否负责真正执行)
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self._count(tool_name, "coalesced")
+                return future, False
+            future = self._inflight[key] = Future()
+            return future, True
+
+    def leave(self, key: str) -> None:
+        """同步调用执行结束，解散单飞分组"""
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def join_async(
+        self, tool_name: str, key: str, factory: Callable[[], Any]
+    ) -> "asyncio.Future[Any]":
+        """
+        加入异步调用的单飞分组，不存在时用factory创建的协程启动任务
+
+        任务独立于调用者运行，某个调用者超时或被取消不会影响其他等待者。
+        """
+        task = self._async_inflight.get(key)
+        if task is not None and not task.done():
+            self._count(tool_name, "coalesced")
+            self._async_waiters[key] += 1
+            return task
+        task = asyncio.ensure_future(factory())
+        self._async_inflight[key] = task
+        self._async_waiters[key] = 1
+        task.add_done_callback(lambda _: self._finish_async(key, task))
+        return task
+
+    def _finish_async(self, key: str, task: "asyncio.Future[Any]") -> None:
+        if self._async_inflight.get(key) is task:
+            del self._async_inflight[key]
+            del self._async_waiters[key]
+
+    def leave_async(self, key: str, task: "asyncio.Future[Any]") -> None:
+        """
+        等待者被取消时退出单飞分组
+
+        只有当前请求已被客户端取消、且分组中不再有其他等待者时才取消共享的任务；
+        单纯超时的调用者退出后任务继续执行，结果写入缓存供之后的调用使用。
+        """
+        if self._async_inflight.get(key) is not task:
+            return
+        self._async_waiters[key] -= 1
+        if self._async_waiters[key] <= 0 and cancel_requested():
+            task.cancel()
+
+    def clear(self) -> None:
+        """清空缓存和统计"""
+        with self._lock:
+            self._data.clear()
+            self._stats.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息，按工具给出命中率"""
+        tools = {}
+        for name, stats in list(self._stats.items()):
+            hits = stats["hits"] + stats["negative_hits"]
+            lookups = hits + stats["misses"]
+            tools[name] = {**stats, "hit_rate": hits / lookups if lookups else 0.0}
+        return {"entries": len(self._data), "tools": tools}
+
+
+class CachedTool(BaseTool):
+    """
+    带结果缓存和单飞去重的工具包装器
+
+    相同参数的并发调用只会真正执行一次，其余调用等待同一个结果。
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    tool: BaseTool
+    ttl: float
+    cache: ToolResultCache
+
+    def __init__(self, tool: BaseTool, **kwargs: Any):
+        super().__init__(
+            tool=tool,
+            name=tool.name,
+            description=tool.description,
+            args_schema=tool.args_schema,
+            return_direct=tool.return_direct,
+            **kwargs,
+        )
+
+    def _tool_input(self, args: tuple, kwargs: Dict[str, Any]) -> Any:
+        """还原被包装工具的输入"""
+        return args[0] if args else kwargs
+
+    @staticmethod
+    def _cached(entry: Tuple[bool, Any]) -> Any:
+        is_error, value = entry
+        if is_error and isinstance(value, BaseException):
+            raise value
+        return value
+
+    def _run(self, *args: Any, **kwargs: Any) -> Any:
+        tool_input = self._tool_input(args, kwargs)
+        key = self.cache.key(self.name, tool_input)
+        entry = self.cache.lookup(self.name, key)
+        if entry is not None:
+            return self._cached(entry)
+
+        future, leader = self.cache.join(self.name, key)
+        if not leader:
+            return future.result()
+        try:
+            result = self.tool.invoke(tool_input)
+        except BaseException as e:
+            # 取消和中断同样要唤醒等待同一结果的调用者，但不写入失败缓存
+            future.set_exception(e)
+            if isinstance(e, Exception):
+                self.cache.store_error(key, e)
+            raise
+        else:
+            future.set_result(result)
+            self.cache.store(key, result, self.ttl)
+            return result
+        finally:
+            self.cache.leave(key)
+
+    async def _arun(self, *args: Any, **kwargs: Any) -> Any:
+        tool_input = self._tool_input(args, kwargs)
+        key = self.cache.key(self.name, tool_input)
+        entry = self.cache.lookup(self.name, key)
+        if entry is not None:
+            return self._cached(entry)
+
+        async def call() -> Any:
+            try:
+                result = await self.tool.ainvoke(tool_input)
+            except Exception as e:
+                self.cache.store_error(key, e)
+                raise
+            self.cache.store(key, result, self.ttl)
+            return result
+
+        task = self.cache.join_async(self.name, key, call)
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            self.cache.leave_async(key, task)
+            raise
+
+
+_tool_cache: Optional[ToolResultCache] = None
+
+
+def get_tool_cache() -> ToolResultCache:
+    """获取全局工具结果缓存"""
+    global _tool_cache
+
+    if _tool_cache is None:
+        _tool_cache = ToolResultCache(
+            max_entries=settings.tool_cache_max_entries,
+            negative_ttl=settings.tool_cache_negative_ttl_seconds,
+        )
+    return _tool_cache
+
+
+def with_result_cache(tools: List[BaseTool]) -> List[BaseTool]:
+    """
+    为tool_cache_ttls中配置了有效期的工具加上结果缓存
+
+    Args:
+        tools: 原始工具列表
+
+    Returns:
+        包装后的工具列表，顺序不变；未启用缓存或未配置有效期的工具保持原样
+    """
+    if not settings.tool_cache_enabled:
+        return list(tools)
+
+    cache = get_tool_cache()
+    return [
+        CachedTool(tool, ttl=settings.tool_cache_ttls[tool.name], cache=cache)
+        if settings.tool_cache_ttls.get(tool.name, 0) > 0
+        else tool
+        for tool in tools
+    ]
@@ -2,24 +2,17 @@
 智能体工具模块 - 定义智能体可以使用的工具
 """
 
-from typing import Any, Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
-try:
-    # 尝试使用新的langchain-tavily包
-    from langchain_tavily import TavilySearch
-    USE_NEW_TAVILY = True
-except ImportError:
-    # 回退到旧的实现
-    from langchain_community.tools.tavily_search import TavilySearchResults
-    USE_NEW_TAVILY = False
+from langchain_core.tools import BaseTool, StructuredTool, tool
 
-from langchain_core.tools import BaseTool, tool
+from .arithmetic import format_result
 
 
 @tool
 def calculator(expression: str) -> str:
     """
-    计算数学表达式
+    计算数学表达式，支持加减乘除、乘方、取模以及sqrt、log、sin等常用数学函数
     
     Args:
         expression: 要计算的数学表达式，例如 "2 + 2" 或 "10 * 5"
@@ -27,76 +20,80 @@ def calculator(expression: str) -> str:
     Returns:
         计算结果的字符串表示
     """
-    try:
-        # 使用eval进行简单计算，注意在生产环境中应该使用更安全的方法
-        result = eval(expression)
-        return f"计算结果: {result}"
-    except Exception as e:
-        return f"计算错误: {str(e)}"
+    # 使用基于AST白名单的安全求值，拒绝任意代码和超大计算
+    return format_result(expression)
 
 
-@tool
-def get_weather(city: str) -> str:
+def _get_weather(city: str) -> str:
     """
-    获取指定城市的天气信息
+    获取城市的当前天气，支持中文名、拼音和英文名；查询多个城市时用逗号分隔，一次调用即可
     
     Args:
-        city: 城市名称
+        city: 城市名称，例如 "北京" 或 "北京, 上海, Guangzhou"
         
     Returns:
-        天气信息的字符串表示
+        每个城市一行的天气信息
     """
-    # 这里只是一个模拟实现，实际应用中应该调用真实的天气API
-    weather_data = {
-        "北京": "晴天，温度25°C",
-        "上海": "多云，温度22°C",
-        "广州": "雨天，温度28°C",
-        "深圳": "晴天，温度26°C",
-    }
+    from .weather import get_weather_service
+    
+    return get_weather_service().query(city)
+
+
+async def _aget_weather(city: str) -> str:
+    from .weather import get_weather_service
     
-    if city in weather_data:
-        return f"{city}的天气: {weather_data[city]}"
-    else:
-        return f"抱歉，暂时没有{city}的天气信息"
+    return await get_weather_service().aquery(city)
+
+
+# 异步调用直接使用异步HTTP客户端，不占用线程池
+get_weather = StructuredTool.from_function(
+    func=_get_weather, coroutine=_aget_weather, name="get_weather"
+)
 
 
 def get_search_tool() -> Optional[BaseTool]:
     """
     获取搜索工具
     
+    Tavily相关依赖只在配置了API密钥时才导入，避免拖慢启动。
+    
     Returns:
         如果配置了Tavily API密钥，返回Tavily搜索工具，否则返回None
     """
     from .config import settings
     
     if settings.tavily_api_key:
-        if USE_NEW_TAVILY:
-            # 使用新的TavilySearch类
-            return TavilySearch(
-                api_key=settings.tavily_api_key,
-                max_results=5
-            )
-        else:
-            # 回退到旧的TavilySearchResults
-            return TavilySearchResults(
-                max_results=5,
-                api_key=settings.tavily_api_key,
-                description="搜索网络获取最新信息"
-            )
+        from .search import create_tavily_search
+        
+        return create_tavily_search(settings.tavily_api_key, settings.tavily_base_url)
     return None
 
 
+# 按搜索配置缓存的工具列表；包装后的工具不保存调用状态，所有智能体和图共享同一组工具
+_tool_sets: Dict[Tuple[Optional[str], Optional[str]], Tuple[BaseTool, ...]] = {}
+
+
 def get_all_tools() -> List[BaseTool]:
     """
     获取所有可用工具
     
+    同一搜索配置下返回同一组工具对象，工具的schema只生成一次。
+    
     Returns:
-        工具列表
+        工具列表，每个工具都带有超时和全局并发限制，搜索和天气工具带有结果缓存
     """
-    tools = [calculator, get_weather]
-    
-    search_tool = get_search_tool()
-    if search_tool:
-        tools.append(search_tool)
+    from .config import settings
+    from .tool_wrappers import with_execution_limits, with_result_cache
     
-    return tools
\ No newline at end of file
+    key = (settings.tavily_api_key, settings.tavily_base_url)
+    tools = _tool_sets.get(key)
+    if tools is None:
+        base = [calculator, get_weather]
+        
+        search_tool = get_search_tool()
+        if search_tool:
+            base.append(search_tool)
+        
+        # 缓存在并发限制之内，等待同一结果的调用同样受超时控制
+        tools = _tool_sets[key] = tuple(with_execution_limits(with_result_cache(base)))
+    return list(tools)
@@ -0,0 +1,560 @@
+"""
+天气模块 - 可插拔的天气数据源、城市名索引和观测缓存
+
+get_weather 工具通过 WeatherService 查询天气：
+
+- 城市名先经过别名索引规范化，中文名、简称、拼音和英文名（如"京"、"bei jing"、"Peking"）
+  都映射到同一个城市，一次字典查找即可完成
+- 一个问题中的多个城市合并为一次上游请求，Open-Meteo 接口支持在一次请求中查询多组坐标
+- 观测结果缓存在进程内字典和可选的SQLite文件中，过期时间按数据源的观测更新周期对齐：
+  在下一次观测发布之前一直使用缓存，之后第一次查询时才重新请求
+"""
+
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .config import settings
+from .http_clients import get_async_http_client, get_http_client
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# 数据源发布观测后到接口返回新数据之间的延迟（秒），缓存多保留这段时间
+OBSERVATION_GRACE_SECONDS = 60.0
+
+
+@dataclass(frozen=True)
+class City:
+    """城市信息"""
+    name: str
+    pinyin: str
+    english: str
+    latitude: float
+    longitude: float
+    aliases: Tuple[str, ...] = ()
+
+
+CITIES: Tuple[City, ...] = (
+    City("北京", "beijing", "Beijing", 39.9042, 116.4074, ("京", "Peking")),
+    City("上海", "shanghai", "Shanghai", 31.2304, 121.4737, ("沪", "申")),
+    City("广州", "guangzhou", "Guangzhou", 23.1291, 113.2644, ("穗", "Canton")),
+    City("深圳", "shenzhen", "Shenzhen", 22.5431, 114.0579, ("鹏城",)),
+    City("天津", "tianjin", "Tianjin", 39.3434, 117.3616, ("津",)),
+    City("重庆", "chongqing", "Chongqing", 29.5630, 106.5516, ("渝", "Chungking")),
+    City("杭州", "hangzhou", "Hangzhou", 30.2741, 120.1551),
+    City("南京", "nanjing", "Nanjing", 32.0603, 118.7969, ("Nanking",)),
+    City("苏州", "suzhou", "Suzhou", 31.2989, 120.5853),
+    City("武汉", "wuhan", "Wuhan", 30.5928, 114.3055),
+    City("成都", "chengdu", "Chengdu", 30.5728, 104.0668, ("蓉",)),
+    City("西安", "xian", "Xi'an", 34.3416, 108.9398),
+    City("长沙", "changsha", "Changsha", 28.2282, 112.9388),
+    City("郑州", "zhengzhou", "Zhengzhou", 34.7466, 113.6254),
+    City("济南", "jinan", "Jinan", 36.6512, 117.1201),
+    City("青岛", "qingdao", "Qingdao", 36.0671, 120.3826, ("Tsingtao",)),
+    City("沈阳", "shenyang", "Shenyang", 41.8057, 123.4315),
+    City("大连", "dalian", "Dalian", 38.9140, 121.6147),
+    City("哈尔滨", "haerbin", "Harbin", 45.8038, 126.5349),
+    City("长春", "changchun", "Changchun", 43.8171, 125.3235),
+    City("石家庄", "shijiazhuang", "Shijiazhuang", 38.0428, 114.5149),
+    City("太原", "taiyuan", "Taiyuan", 37.8706, 112.5489),
+    City("合肥", "hefei", "Hefei", 31.8206, 117.2272),
+    City("福州", "fuzhou", "Fuzhou", 26.0745, 119.2965),
+    City("厦门", "xiamen", "Xiamen", 24.4798, 118.0894, ("鹭岛", "Amoy")),
+    City("南昌", "nanchang", "Nanchang", 28.6820, 115.8579),
+    City("昆明", "kunming", "Kunming", 25.0389, 102.7183, ("春城",)),
+    City("贵阳", "guiyang", "Guiyang", 26.6470, 106.6302),
+    City("南宁", "nanning", "Nanning", 22.8170, 108.3665),
+    City("海口", "haikou", "Haikou", 20.0440, 110.1999),
+    City("三亚", "sanya", "Sanya", 18.2528, 109.5119),
+    City("兰州", "lanzhou", "Lanzhou", 36.0611, 103.8343),
+    City("西宁", "xining", "Xining", 36.6171, 101.7782),
+    City("银川", "yinchuan", "Yinchuan", 38.4872, 106.2309),
+    City("乌鲁木齐", "wulumuqi", "Urumqi", 43.8256, 87.6168),
+    City("拉萨", "lasa", "Lhasa", 29.6520, 91.1721),
+    City("呼和浩特", "huhehaote", "Hohhot", 40.8424, 111.7490),
+    City("香港", "xianggang", "Hong Kong", 22.3193, 114.1694),
+    City("澳门", "aomen", "Macau", 22.1987, 113.5439, ("Macao",)),
+    City("台北", "taibei", "Taipei", 25.0330, 121.5654),
+    City("东京", "dongjing", "Tokyo", 35.6762, 139.6503),
+    City("首尔", "shouer", "Seoul", 37.5665, 126.9780),
+    City("新加坡", "xinjiapo", "Singapore", 1.3521, 103.8198),
+    City("纽约", "niuyue", "New York", 40.7128, -74.0060),
+    City("伦敦", "lundun", "London", 51.5074, -0.1278),
+    City("巴黎", "bali", "Paris", 48.8566, 2.3522),
+    City("悉尼", "xini", "Sydney", -33.8688, 151.2093),
+)
+
+_STRIP_RE = re.compile(r"[\s'’\-_.·]+")
+_SUFFIX_RE = re.compile(r"(?<=.)(市|city)$")
+# 多个城市之间的分隔符；"和"、"与"、"及"可能是城市名的一部分（如呼和浩特），
+# 在切分连写的城市名时处理
+_SEPARATOR_RE = re.compile(r"[、,，;；/|]+|\band\b", re.IGNORECASE)
+_CONJUNCTIONS = frozenset("和与及")
+
+
+def normalize_city_name(name: str) -> str:
+    """城市名的规范形式：全角转半角、小写，去掉空白、撇号、连字符和"市"、"city"后缀"""
+    text = _STRIP_RE.sub("", unicodedata.normalize("NFKC", name).lower())
+    return _SUFFIX_RE.sub("", text)
+
+
+class CityIndex:
+    """城市名和别名到城市的索引"""
+
+    def __init__(self, cities: Sequence[City] = CITIES):
+        self._index: Dict[str, City] = {}
+        for city in cities:
+            for alias in (city.name, city.pinyin, city.english, *city.aliases):
+                self._index[normalize_city_name(alias)] = city
+        # 连写的多个城市（如"北京上海"）只按两个字符以上的名称切分，避免单字简称误匹配
+        self._max_length = max(map(len, self._index), default=0)
+
+    def resolve(self, name: str) -> Optional[City]:
+        """查找单个城市，未知城市返回None"""
+        return self._index.get(normalize_city_name(name))
+
+    def _scan(self, text: str) -> Optional[List[City]]:
+        """按最长匹配把连写的城市名切开，跳过城市之间的连词，有无法识别的部分时返回None"""
+        cities, i = [], 0
+        while i < len(text):
+            for length in range(min(self._max_length, len(text) - i), 1, -1):
+                city = self._index.get(text[i:i + length])
+                if city is not None:
+                    cities.append(city)
+                    i += length
+                    break
+            else:
+                if text[i] not in _CONJUNCTIONS:
+                    return None
+                i += 1
+        return cities
+
+    def parse(self, text: str) -> List[Tuple[str, Optional[City]]]:
+        """
+        把工具参数拆分为城市列表
+
+        Args:
+            text: 一个或多个城市名，可以用逗号、顿号、"和"等分隔
+
+        Returns:
+            [(原始名称, 城市)] 列表，未知城市为None，重复的城市只保留一次
+        """
+        city = self.resolve(text)
+        if city is not None:
+            parts = [text]
+        else:
+            parts = [p for p in _SEPARATOR_RE.split(text) if p.strip()]
+        results: List[Tuple[str, Optional[City]]] = []
+        seen = set()
+        for part in parts:
+            city = self.resolve(part)
+            if city is not None:
+                found = [city]
+            else:
+                found = self._scan(normalize_city_name(part))
+            if not found:
+                results.append((part.strip(), None))
+                continue
+            for city in found:
+                if city.name not in seen:
+                    seen.add(city.name)
+                    results.append((city.name, city))
+        return results
+
+
+@dataclass
+class Observation:
+    """一个城市的天气观测"""
+    city: str
+    condition: str
+    temperature: float
+    humidity: Optional[float] = None
+    wind_speed: Optional[float] = None
+    observed_at: Optional[float] = None  # 观测时间（Unix时间戳），未知时为None
+    interval: float = 3600.0  # 数据源的观测更新周期（秒）
+
+    def describe(self) -> str:
+        """工具返回给模型的文本"""
+        text = f"{self.city}的天气: {self.condition}，温度{self.temperature:g}°C"
+        if self.humidity is not None:
+            text += f"，湿度{self.humidity:g}%"
+        if self.wind_speed is not None:
+            text += f"，风速{self.wind_speed:g}km/h"
+        return text
+
+
+class WeatherProvider(ABC):
+    """天气数据源接口"""
+
+    name: str = "provider"
+
+    @abstractmethod
+    def fetch(self, cities: Sequence[City]) -> Dict[str, Observation]:
+        """
+        一次请求查询多个城市的当前天气
+
+        Returns:
+            {城市名: 观测}，没有数据的城市不在结果中
+        """
+
+    async def afetch(self, cities: Sequence[City]) -> Dict[str, Observation]:
+        """异步查询，默认在线程池中执行fetch"""
+        return await asyncio.to_thread(self.fetch, cities)
+
+
+class StubWeatherProvider(WeatherProvider):
+    """本地固定数据，用于测试和离线开发，记录每次请求的城市"""
+
+    name = "stub"
+
+    DEFAULT_DATA: Dict[str, Tuple[str, float]] = {
+        "北京": ("晴天", 25),
+        "上海": ("多云", 22),
+        "广州": ("雨天", 28),
+        "深圳": ("晴天", 26),
+    }
+
+    def __init__(
+        self,
+        data: Optional[Dict[str, Tuple[str, float]]] = None,
+        interval: float = 3600.0,
+    ):
+        self.data = self.DEFAULT_DATA if data is None else data
+        self.interval = interval
+        self.calls: List[List[str]] = []
+
+    def fetch(self, cities: Sequence[City]) -> Dict[str, Observation]:
+        self.calls.append([city.name for city in cities])
+        interval = self.interval
+        return {
+            city.name: Observation(city.name, *self.data[city.name], interval=interval)
+            for city in cities if city.name in self.data
+        }
+
+    async def afetch(self, cities: Sequence[City]) -> Dict[str, Observation]:
+        return self.fetch(cities)
+
+
+# WMO天气代码
+WMO_CODES: Dict[int, str] = {
+    0: "晴", 1: "大部晴朗", 2: "多云", 3: "阴",
+    45: "雾", 48: "冻雾",
+    51: "小毛毛雨", 53: "毛毛雨", 55: "大毛毛雨", 56: "冻毛毛雨", 57: "冻毛毛雨",
+    61: "小雨", 63: "中雨", 65: "大雨", 66: "冻雨", 67: "冻雨",
+    71: "小雪", 73: "中雪", 75: "大雪", 77: "米雪",
+    80: "小阵雨", 81: "阵雨", 82: "强阵雨", 85: "小阵雪", 86: "强阵雪",
+    95: "雷阵雨", 96: "雷阵雨伴小冰雹", 99: "雷阵雨伴大冰雹",
+}
+
+
+class OpenMeteoProvider(WeatherProvider):
+    """
+    Open-Meteo 天气接口，不需要API密钥
+
+    latitude和longitude参数传入逗号分隔的多组坐标即可在一次请求中查询多个城市；
+    当前天气按15分钟更新，响应中的current.interval给出更新周期。
+    """
+
+    name = "open-meteo"
+
+    CURRENT_FIELDS = "temperature_2m,relative_humidity_2m,weather_code,wind_speed_10m"
+
+    def __init__(self, base_url: str = "https://api.open-meteo.com"):
+        self.base_url = base_url.rstrip("/")
+
+    def _request(self, cities: Sequence[City]) -> Dict[str, object]:
+        return {
+            "url": f"{self.base_url}/v1/forecast",
+            "params": {
+                "latitude": ",".join(f"{city.latitude:g}" for city in cities),
+                "longitude": ",".join(f"{city.longitude:g}" for city in cities),
+                "current": self.CURRENT_FIELDS,
+                "timeformat": "unixtime",
+            },
+        }
+
+    @staticmethod
+    def _parse(cities: Sequence[City], data: object) -> Dict[str, Observation]:
+        # 只有一组坐标时响应是单个对象，多组坐标时是按请求顺序排列的列表
+        items = data if isinstance(data, list) else [data]
+        observations = {}
+        for city, item in zip(cities, items):
+            current = item["current"]
+            observations[city.name] = Observation(
+                city=city.name,
+                condition=WMO_CODES.get(current.get("weather_code"), "未知"),
+                temperature=current["temperature_2m"],
+                humidity=current.get("relative_humidity_2m"),
+                wind_speed=current.get("wind_speed_10m"),
+                observed_at=float(current["time"]),
+                interval=float(current.get("interval", 900)),
+            )
+        return observations
+
+    def fetch(self, cities: Sequence[City]) -> Dict[str, Observation]:
+        response = get_http_client().get(**self._request(cities))
+        response.raise_for_status()
+        return self._parse(cities, response.json())
+
+    async def afetch(self, cities: Sequence[City]) -> Dict[str, Observation]:
+        response = await get_async_http_client().get(**self._request(cities))
+        response.raise_for_status()
+        return self._parse(cities, response.json())
+
+
+class WeatherCache:
+    """观测缓存：进程内字典，配置了路径时同时写入SQLite，重启后仍可使用"""
+
+    def __init__(
+        self, path: Optional[str] = None, clock: Callable[[], float] = time.time
+    ):
+        """
+        初始化观测缓存
+
+        Args:
+            path: SQLite文件路径，为None时只缓存在内存中
+            clock: 时间函数（需为墙上时间，过期时间跨进程有效）
+        """
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._memory: Dict[str, Tuple[float, Observation]] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS weather ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @property
+    def persistent(self) -> bool:
+        """是否同时写入SQLite"""
+        return self._conn is not None
+
+    def get(self, key: str) -> Optional[Observation]:
+        """读取未过期的观测"""
+        now = self._clock()
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None and item[0] > now:
+                self.memory_hits += 1
+                return item[1]
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT value, expires_at FROM weather "
+                    "WHERE key = ? AND expires_at > ?",
+                    (key, now),
+                ).fetchone()
+                if row is not None:
+                    observation = Observation(**json.loads(row[0]))
+                    self._memory[key] = (row[1], observation)
+                    self.disk_hits += 1
+                    return observation
+            self.misses += 1
+            return None
+
+    def set(self, items: Dict[str, Tuple[float, Observation]]) -> None:
+        """批量写入{键: (过期时间, 观测)}"""
+        with self._lock:
+            self._memory.update(items)
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute(
+                        "DELETE FROM weather WHERE expires_at <= ?", (self._clock(),)
+                    )
+                    rows = [
+                        (key, json.dumps(asdict(obs), ensure_ascii=False), expires_at)
+                        for key, (expires_at, obs) in items.items()
+                    ]
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO weather (key, value, expires_at) "
+                        "VALUES (?, ?, ?)",
+                        rows,
+                    )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute("DELETE FROM weather")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
+
+
+class WeatherService:
+    """规范化城市名、读取缓存、批量请求数据源并格式化结果"""
+
+    def __init__(
+        self,
+        provider: WeatherProvider,
+        index: Optional[CityIndex] = None,
+        cache: Optional[WeatherCache] = None,
+        min_ttl_seconds: float = 60.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        初始化天气服务
+
+        Args:
+            provider: 天气数据源
+            index: 城市名索引，默认使用内置城市表
+            cache: 观测缓存，默认只缓存在内存中
+            min_ttl_seconds: 观测至少缓存的时间（秒），避免数据源延迟发布时反复请求
+            clock: 时间函数
+        """
+        self.provider = provider
+        self.index = index or CityIndex()
+        self.cache = cache or WeatherCache(clock=clock)
+        self.min_ttl_seconds = min_ttl_seconds
+        self._clock = clock
+
+    def _key(self, city: City) -> str:
+        return f"{self.provider.name}:{city.name}"
+
+    def expires_at(self, observation: Observation) -> float:
+        """缓存到下一次观测发布之后；观测时间未知时按更新周期从现在开始计算"""
+        now = self._clock()
+        if observation.observed_at is None:
+            expires_at = now + observation.interval
+        else:
+            published = observation.observed_at + observation.interval
+            expires_at = published + OBSERVATION_GRACE_SECONDS
+        return max(expires_at, now + self.min_ttl_seconds)
+
+    def _plan(
+        self, text: str
+    ) -> Tuple[List[Tuple[str, Optional[City]]], Dict[str, Observation], List[City]]:
+        """解析城市并读取缓存，返回(城市列表, 已缓存的观测, 需要请求的城市)"""
+        entries = self.index.parse(text)
+        cached: Dict[str, Observation] = {}
+        missing: List[City] = []
+        for _, city in entries:
+            if city is None:
+                continue
+            observation = self.cache.get(self._key(city))
+            if observation is None:
+                missing.append(city)
+            else:
+                cached[city.name] = observation
+        return entries, cached, missing
+
+    def _store(self, missing: List[City], fetched: Dict[str, Observation]) -> None:
+        self.cache.set({
+            self._key(city): (self.expires_at(fetched[city.name]), fetched[city.name])
+            for city in missing if city.name in fetched
+        })
+
+    async def _offload(self, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        在异步路径上执行会读写缓存的同步操作
+
+        只有内存缓存时直接执行；缓存同时写入SQLite时放到线程中执行，避免阻塞事件循环。
+        """
+        if not self.cache.persistent:
+            return func(*args)
+        return await asyncio.to_thread(func, *args)
+
+    @staticmethod
+    def _format(
+        entries: List[Tuple[str, Optional[City]]],
+        observations: Dict[str, Observation],
+        error: Optional[Exception] = None,
+    ) -> str:
+        """每个城市一行；请求失败时已缓存的城市照常返回，只有未缓存的城市说明失败原因"""
+        lines = []
+        for name, city in entries:
+            observation = observations.get(city.name) if city is not None else None
+            if observation:
+                lines.append(observation.describe())
+            elif city is not None and error is not None:
+                lines.append(f"抱歉，获取{name}的天气信息失败: {error}")
+            else:
+                lines.append(f"抱歉，暂时没有{name}的天气信息")
+        return "\n".join(lines) or "请提供城市名称"
+
+    def query(self, text: str) -> str:
+        """
+        查询一个或多个城市的天气，未缓存的城市合并为一次请求
+
+        Args:
+            text: 城市名，多个城市用逗号、顿号或"和"分隔
+
+        Returns:
+            每个城市一行的天气描述
+        """
+        entries, observations, missing = self._plan(text)
+        if missing:
+            try:
+                fetched = self.provider.fetch(missing)
+            except Exception as e:
+                logger.warning("天气查询失败: %s", e)
+                return self._format(entries, observations, e)
+            self._store(missing, fetched)
+            observations.update(fetched)
+        return self._format(entries, observations)
+
+    async def aquery(self, text: str) -> str:
+        """异步查询天气"""
+        entries, observations, missing = await self._offload(self._plan, text)
+        if missing:
+            try:
+                fetched = await self.provider.afetch(missing)
+            except Exception as e:
+                logger.warning("天气查询失败: %s", e)
+                return self._format(entries, observations, e)
+            await self._offload(self._store, missing, fetched)
+            observations.update(fetched)
+        return self._format(entries, observations)
+
+
+def create_provider(name: str) -> WeatherProvider:
+    """根据名称创建天气数据源"""
+    if name == "stub":
+        return StubWeatherProvider()
+    if name == "open-meteo":
+        return OpenMeteoProvider(settings.weather_base_url)
+    raise ValueError(f"未知的天气数据源: {name}")
+
+
+_weather_service: Optional[WeatherService] = None
+_weather_service_lock = threading.Lock()
+
+
+def get_weather_service() -> WeatherService:
+    """获取全局天气服务"""
+    global _weather_service
+
+    if _weather_service is None:
+        with _weather_service_lock:
+            if _weather_service is None:
+                _weather_service = WeatherService(
+                    create_provider(settings.weather_provider),
+                    cache=WeatherCache(settings.weather_cache_path),
+                    min_ttl_seconds=settings.weather_min_ttl_seconds,
+                )
+    return _weather_service
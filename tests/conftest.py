@@ -0,0 +1,21 @@
+"""
+测试共用的夹具
+"""
+
+import pytest
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    """从0开始、只在测试修改now时前进的时钟"""
+    return FakeClock()
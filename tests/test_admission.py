@@ -0,0 +1,161 @@
+"""
+测试模块 - 测试模型准入控制
+"""
+
+import asyncio
+import json
+import time
+
+import httpx
+import openai
+import pytest
+from fastapi.testclient import TestClient
+
+from src.agent_1 import admission, server
+from src.agent_1.admission import (
+    AdmissionController,
+    AdmissionRejected,
+    AdmissionTimeout,
+)
+from src.agent_1.config import settings
+from src.agent_1.llm import AdmittedChatOpenAI
+
+COMPLETION = {
+    "id": "chatcmpl-1",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "test",
+    "choices": [
+        {
+            "index": 0,
+            "message": {"role": "assistant", "content": "好的"},
+            "finish_reason": "stop",
+        }
+    ],
+    "usage": {"prompt_tokens": 5, "completion_tokens": 2, "total_tokens": 7},
+}
+
+
+class TestAdmissionController:
+    """测试准入控制器"""
+
+    @pytest.mark.asyncio
+    async def test_concurrency_limit_is_fifo(self):
+        """超过并发上限的请求排队，按到达顺序放行"""
+        controller = AdmissionController(max_concurrency=1)
+        first = await controller.aacquire()
+        order = []
+
+        async def waiter(name):
+            permit = await controller.aacquire(timeout=1)
+            order.append(name)
+            permit.release()
+
+        tasks = [asyncio.create_task(waiter(name)) for name in ("a", "b", "c")]
+        await asyncio.sleep(0.01)
+        assert controller.stats()["queued"] == 3
+        first.release()
+        await asyncio.gather(*tasks)
+        assert order == ["a", "b", "c"]
+        assert controller.stats() == {
+            "inflight": 0,
+            "queued": 0,
+            "max_concurrency": 1,
+            "max_queue": 64,
+        }
+
+    def test_full_queue_rejects_immediately(self):
+        """队列已满时立即拒绝，并给出重试等待时间"""
+        controller = AdmissionController(max_concurrency=1, max_queue=0)
+        controller.acquire()
+        start = time.monotonic()
+        with pytest.raises(AdmissionRejected) as info:
+            controller.acquire()
+        assert time.monotonic() - start < 0.1
+        assert info.value.retry_after >= 1
+
+    def test_deadline(self):
+        """排队超过截止时间后超时，超时的请求离开队列"""
+        controller = AdmissionController(max_concurrency=1)
+        controller.acquire()
+        with pytest.raises(AdmissionTimeout):
+            controller.acquire(timeout=0.05)
+        assert controller.stats()["queued"] == 0
+
+    def test_token_bucket(self):
+        """token额度用完后等待补充"""
+        controller = AdmissionController(tokens_per_minute=600)
+        controller.acquire(cost=600).release()
+        with pytest.raises(AdmissionTimeout):
+            controller.acquire(cost=5, timeout=0.1)
+        start = time.monotonic()
+        controller.acquire(cost=5, timeout=2).release()
+        assert 0.3 < time.monotonic() - start < 1.5
+
+    def test_pause_after_upstream_rate_limit(self):
+        """上游限流后暂停放行"""
+        controller = AdmissionController()
+        controller.pause(5)
+        with pytest.raises(AdmissionTimeout):
+            controller.acquire(timeout=0.05)
+
+
+class TestAdmittedModel:
+    """测试经过准入控制的模型"""
+
+    @pytest.fixture
+    def controller(self, monkeypatch):
+        controller = AdmissionController(max_concurrency=1)
+        monkeypatch.setattr(admission, "_admission_controller", controller)
+        monkeypatch.setattr(settings, "llm_backoff_base", 0.0)
+        return controller
+
+    def model(self, statuses):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            status = statuses[min(len(calls), len(statuses)) - 1]
+            body = COMPLETION if status == 200 else {"error": {"message": "busy"}}
+            return httpx.Response(status, json=body, headers={"retry-after": "0"})
+
+        llm = AdmittedChatOpenAI(
+            model="test",
+            api_key="test",
+            base_url="http://upstream/v1",
+            max_retries=0,
+            http_client=httpx.Client(transport=httpx.MockTransport(handler)),
+        )
+        return llm, calls
+
+    def test_retries_rate_limit_then_succeeds(self, controller):
+        """429和5xx在预算内退避重试，许可被释放"""
+        llm, calls = self.model([429, 503, 200])
+        assert llm.invoke("你好").content == "好的"
+        assert len(calls) == 3
+        assert controller.stats()["inflight"] == 0
+
+    def test_gives_up_after_max_retries(self, controller, monkeypatch):
+        """超过最大重试次数后抛出上游错误"""
+        monkeypatch.setattr(settings, "llm_max_retries", 1)
+        llm, calls = self.model([500])
+        with pytest.raises(openai.InternalServerError, match="Error code: 500"):
+            llm.invoke("你好")
+        assert len(calls) == 2
+        assert controller.stats()["inflight"] == 0
+
+
+class TestServer:
+    """测试服务端的快速失败"""
+
+    def test_busy_returns_503(self, monkeypatch):
+        """准入失败时/chat返回503和Retry-After"""
+        async def busy(input_text, memory=None):
+            raise AdmissionRejected("模型服务繁忙，等待队列已满", 3)
+
+        agent = type("Agent", (), {"ainvoke": staticmethod(busy)})()
+        monkeypatch.setattr(server, "get_agent", lambda: agent)
+        response = TestClient(server.app).post("/chat", json={"message": "你好"})
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "3"
+        assert "繁忙" in json.loads(response.text)["detail"]
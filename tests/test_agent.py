@@ -5,7 +5,10 @@
 import pytest
 from unittest.mock import Mock, patch
 
+from langchain_core.language_models import FakeListChatModel
+
 from src.agent_1.agent import BasicAgent
+from src.agent_1.prompts import create_simple_prompt
 from src.agent_1.tools import calculator, get_weather
 
 
@@ -31,6 +34,28 @@ class TestBasicAgent:
         # 清除记忆应该仍然没有历史记录
         agent.clear_memory()
         assert len(agent.get_chat_history()) == 0
+    
+    @pytest.mark.asyncio
+    async def test_agent_ainvoke(self):
+        """测试异步调用简单链并写入记忆"""
+        agent = BasicAgent(use_tools=False)
+        agent.agent = create_simple_prompt() | FakeListChatModel(responses=["你好！"])
+        
+        response = await agent.ainvoke("你好")
+        assert response == "你好！"
+        assert len(agent.get_chat_history()) == 2
+    
+    @pytest.mark.asyncio
+    async def test_agent_astream(self):
+        """测试流式调用产出token和最终回复"""
+        agent = BasicAgent(use_tools=False)
+        agent.agent = create_simple_prompt() | FakeListChatModel(responses=["你好！"])
+        
+        events = [event async for event in agent.astream("你好")]
+        tokens = "".join(e["data"] for e in events if e["event"] == "token")
+        assert tokens == "你好！"
+        assert events[-1] == {"event": "final", "data": "你好！"}
+        assert len(agent.get_chat_history()) == 2
 
 
 class TestTools:
@@ -0,0 +1,94 @@
+"""
+测试模块 - 测试安全算术求值
+"""
+
+import time
+
+import pytest
+
+from src.agent_1.arithmetic import (
+    ExpressionError,
+    evaluate,
+    evaluate_many,
+    format_result,
+)
+
+
+def eval_result(expression: str) -> str:
+    """原计算器工具基于eval的返回字符串"""
+    try:
+        return f"计算结果: {eval(expression)}"
+    except Exception as e:
+        return f"计算错误: {str(e)}"
+
+
+class TestArithmetic:
+    """测试安全算术求值"""
+    
+    @pytest.mark.parametrize("expression", [
+        "2 + 2",
+        "10 * 5",
+        "25 * 4",
+        " 7 / 2",
+        "7 // 2",
+        "-7 % 3",
+        "2 ** 10",
+        "2 ** -1",
+        "(1 + 2) * 3.5",
+        "abs(-3) + round(2.567, 2)",
+        "max(1, 5, 3) - min(4, 2)",
+        "1 < 2 <= 2",
+        "1 / 0",
+        "1.0 / 0",
+        "invalid expression",
+        "2 +",
+        "(1",
+        "",
+        "unknown_name + 1",
+    ])
+    def test_matches_eval(self, expression):
+        """常见表达式的返回字符串与原eval实现完全一致"""
+        assert format_result(expression) == eval_result(expression)
+    
+    def test_math_functions(self):
+        """支持白名单内的数学函数和常量"""
+        assert evaluate("sqrt(16)") == 4.0
+        assert evaluate("math.floor(pi)") == 3
+        assert evaluate("factorial(5)") == 120
+    
+    @pytest.mark.parametrize("expression", [
+        "__import__('os').system('echo hacked')",
+        "().__class__.__bases__",
+        "open('/etc/passwd')",
+        "'a' * 10",
+        "[1, 2, 3]",
+        "lambda: 1",
+        "round(2.5, ndigits=1)",
+    ])
+    def test_rejects_unsafe_expressions(self, expression):
+        """拒绝任意代码、属性访问和非数字常量"""
+        with pytest.raises((ExpressionError, NameError)):
+            evaluate(expression)
+    
+    @pytest.mark.parametrize("expression", [
+        "9**9**9",
+        "10**10**10",
+        "factorial(10**6)",
+        "99999999999**99999999999",
+        "+".join(["1"] * 1000),
+        "round(1, -10**7)",
+        "+".join(["pow(3, 7**3500, 7**3500+2)"] * 8),
+    ])
+    def test_expensive_expressions_fail_fast(self, expression):
+        """超大计算被快速拒绝"""
+        start = time.monotonic()
+        assert format_result(expression).startswith("计算错误")
+        assert time.monotonic() - start < 0.5
+    
+    def test_evaluate_many(self):
+        """批量计算保持顺序，单个错误不影响其他表达式"""
+        assert evaluate_many(["1 + 1", "1 / 0", "3 * 3"]) == [
+            "计算结果: 2",
+            "计算错误: division by zero",
+            "计算结果: 9",
+        ]
@@ -0,0 +1,79 @@
+"""
+测试模块 - 测试批量请求
+"""
+
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.agent_1 import server
+from src.agent_1.agent import BasicAgent
+from src.agent_1.memory import AgentMemory
+
+
+def make_agent(delays):
+    """创建按输入文本延迟返回的智能体，并记录最大并发数"""
+    agent = BasicAgent(use_tools=False)
+    state = {"running": 0, "peak": 0, "order": []}
+    
+    async def fake_ainvoke(input_text, memory=None):
+        state["running"] += 1
+        state["peak"] = max(state["peak"], state["running"])
+        await asyncio.sleep(delays.get(input_text, 0))
+        state["running"] -= 1
+        state["order"].append(input_text)
+        return f"回复:{input_text}"
+    
+    agent.ainvoke = fake_ainvoke
+    return agent, state
+
+
+class TestBatch:
+    """测试批量处理"""
+    
+    @pytest.mark.asyncio
+    async def test_results_stream_as_completed(self):
+        """结果按完成先后产出，并受并发上限约束"""
+        agent, state = make_agent({"慢": 0.1, "快": 0.0, "中": 0.05})
+        items = [("慢", None), ("快", None), ("中", None)]
+        
+        results = [r async for r in agent.abatch_as_completed(items, max_concurrency=3)]
+        assert [index for index, _ in results] == [1, 2, 0]
+        
+        agent, state = make_agent({})
+        assert await agent.abatch(
+            [(str(i), None) for i in range(6)], max_concurrency=2
+        ) == [f"回复:{i}" for i in range(6)]
+        assert state["peak"] <= 2
+    
+    @pytest.mark.asyncio
+    async def test_same_session_runs_in_order(self):
+        """同一会话的消息按提交顺序执行"""
+        agent, state = make_agent({"第一句": 0.05, "第二句": 0.0})
+        memory = AgentMemory()
+        
+        await agent.abatch([("第一句", memory), ("第二句", memory)], max_concurrency=4)
+        assert state["order"] == ["第一句", "第二句"]
+    
+    def test_batch_endpoint(self, monkeypatch):
+        """批量端点以NDJSON返回每条结果"""
+        agent, _ = make_agent({})
+        monkeypatch.setattr(server, "_agent_instance", agent)
+        client = TestClient(server.app)
+        
+        response = client.post("/chat/batch", json={
+            "messages": [
+                {"message": "你好", "session_id": "a"},
+                {"message": "再见", "session_id": "b"},
+            ],
+            "max_concurrency": 2,
+        })
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert sorted(
+            (line["index"], line["response"], line["session_id"]) for line in lines
+        ) == [
+            (0, "回复:你好", "a"),
+            (1, "回复:再见", "b"),
+        ]
@@ -0,0 +1,113 @@
+"""
+测试模块 - 测试负载测试使用的模拟服务和结果对比
+"""
+
+from fastapi.testclient import TestClient
+from langchain_core.runnables import RunnableLambda
+from langchain_openai import ChatOpenAI
+
+from benchmarks.load import compare_reports, summarize
+from benchmarks.mock_services import MockConfig, create_app
+from src.agent_1 import server
+from src.agent_1.tools import calculator, get_weather
+
+
+def mock_llm(config: MockConfig, **kwargs) -> ChatOpenAI:
+    """连接到进程内模拟服务的ChatOpenAI"""
+    return ChatOpenAI(
+        model="mock",
+        api_key="test",
+        base_url="http://testserver/v1",
+        http_client=TestClient(create_app(config)),
+        **kwargs,
+    )
+
+
+class TestMockServices:
+    """测试兼容OpenAI的模拟服务"""
+
+    def test_tool_call_then_answer(self):
+        """需要调用工具的消息先返回工具调用，收到工具结果后返回最终回复"""
+        config = MockConfig(
+            ttft=0,
+            tokens_per_second=0,
+            output_tokens=3,
+            tool_call_ratio=1.0,
+            tools=["get_weather"],
+        )
+        llm = mock_llm(config).bind_tools([calculator, get_weather])
+
+        first = llm.invoke([("user", "北京天气")])
+        assert first.tool_calls[0]["name"] == "get_weather"
+        assert first.tool_calls[0]["args"] == {"city": "北京"}
+
+        tool_result = {
+            "role": "tool",
+            "content": "晴天",
+            "tool_call_id": first.tool_calls[0]["id"],
+        }
+        second = llm.invoke([("user", "北京天气"), first, tool_result])
+        assert second.content == "模拟回复回复"
+        assert not second.tool_calls
+
+    def test_streaming_without_tools(self):
+        """流式请求逐个推送token"""
+        config = MockConfig(
+            ttft=0, tokens_per_second=0, output_tokens=4, tool_call_ratio=0.0
+        )
+        llm = mock_llm(config, streaming=True)
+        chunks = [chunk.content for chunk in llm.stream("你好")]
+        assert "".join(chunks) == "模拟回复回复回复"
+
+    def test_search_endpoint(self):
+        """搜索接口返回Tavily格式的结果"""
+        client = TestClient(create_app(MockConfig(search_latency=0)))
+        results = client.post("/search", json={"query": "LangChain"}).json()["results"]
+        assert len(results) == 5 and "LangChain" in results[0]["content"]
+
+    def test_forecast_endpoint(self):
+        """天气接口按Open-Meteo格式返回多组坐标的当前天气"""
+        client = TestClient(create_app(MockConfig(weather_latency=0)))
+        params = {"latitude": "39.9,31.2", "longitude": "116.4,121.5"}
+        items = client.get("/v1/forecast", params=params).json()
+        assert len(items) == 2 and items[0]["current"]["interval"] == 900
+
+
+class TestReport:
+    """测试结果汇总与对比"""
+
+    def test_summarize_and_compare(self):
+        """p95延迟上升或吞吐量下降超过阈值时判定为退化"""
+        chat = {"endpoint": "chat", "concurrency": 8}
+        baseline = {"results": [{**chat, **summarize([0.1] * 100, 0, 10.0)}]}
+        slower = summarize([0.1] * 90 + [0.5] * 10, 2, 10.0)
+        current = {"results": [{**chat, **slower}]}
+        assert baseline["results"][0]["latency_ms"]["p99"] == 100.0
+        assert current["results"][0]["requests"] == 102
+
+        rows = compare_reports(baseline, current, max_regression=0.1)
+        assert rows[0]["regressed"]
+        unchanged = compare_reports(baseline, baseline, max_regression=0.1)
+        assert unchanged[0]["regressed"] is False
+
+
+class TestAgentRoute:
+    """测试/agent路由的输入输出转换"""
+
+    def test_invoke_with_chat_input(self, monkeypatch):
+        """/agent/invoke接受ChatInput并返回ChatOutput"""
+        executor = RunnableLambda(
+            lambda data: {**data, "output": f"回复:{data['input']}"}
+        )
+        monkeypatch.setattr(
+            server, "get_agent", lambda: type("Agent", (), {"agent": executor})()
+        )
+        monkeypatch.setattr(server.agent_runnable, "_runnable", None)
+
+        response = TestClient(server.app).post(
+            "/agent/invoke", json={"input": {"message": "你好", "session_id": "s1"}}
+        )
+        assert response.json()["output"] == {
+            "response": "回复:你好",
+            "session_id": "s1",
+        }
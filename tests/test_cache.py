@@ -0,0 +1,107 @@
+"""
+测试模块 - 测试LLM响应缓存
+"""
+
+import asyncio
+
+import pytest
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.outputs import ChatGeneration
+from langchain_core.messages import AIMessage
+
+from src.agent_1.cache import (
+    LRUCacheBackend,
+    ResponseCache,
+    SQLiteCacheBackend,
+    cacheable_temperature,
+    normalize_prompt,
+)
+from src.agent_1.config import settings
+from src.agent_1.llm import create_llm
+
+
+def make_value(text: str):
+    return [ChatGeneration(message=AIMessage(content=text))]
+
+
+class TestResponseCache:
+    """测试响应缓存"""
+    
+    def test_repeated_call_hits_cache(self):
+        """相同提示词的第二次调用命中缓存"""
+        cache = ResponseCache(LRUCacheBackend(max_entries=10))
+        llm = FakeListChatModel(responses=["第一次", "第二次"], cache=cache)
+        
+        assert llm.invoke("你好").content == "第一次"
+        assert llm.invoke("你好").content == "第一次"
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+    
+    def test_normalized_key(self):
+        """规范化模式下空白差异不影响命中"""
+        cache = ResponseCache(LRUCacheBackend(), normalize=True)
+        cache.update("你好  世界", "llm", make_value("hi"))
+        assert cache.lookup("你好 世界\\n", "llm")[0].message.content == "hi"
+        
+        exact = ResponseCache(LRUCacheBackend(), normalize=False)
+        exact.update("你好  世界", "llm", make_value("hi"))
+        assert exact.lookup("你好 世界", "llm") is None
+    
+    def test_ttl_and_size_limit(self):
+        """过期条目失效，超出容量时淘汰最久未使用的条目"""
+        now = [0.0]
+        backend = LRUCacheBackend(max_entries=2, clock=lambda: now[0])
+        cache = ResponseCache(backend, ttl_seconds=10)
+        cache.update("a", "llm", make_value("a"))
+        cache.update("b", "llm", make_value("b"))
+        cache.update("c", "llm", make_value("c"))
+        assert cache.lookup("a", "llm") is None
+        
+        now[0] = 11
+        assert cache.lookup("c", "llm") is None
+    
+    def test_sqlite_backend(self, tmp_path):
+        """SQLite后端可跨实例读取缓存"""
+        path = str(tmp_path / "cache.sqlite")
+        ResponseCache(SQLiteCacheBackend(path)).update("q", "llm", make_value("答案"))
+        
+        cache = ResponseCache(SQLiteCacheBackend(path))
+        assert cache.lookup("q", "llm")[0].message.content == "答案"
+
+    @pytest.mark.asyncio
+    async def test_async_access_offloads_slow_backends(self, tmp_path, monkeypatch):
+        """异步调用时SQLite后端在线程中访问，进程内LRU直接在事件循环中访问"""
+        threads = []
+        to_thread = asyncio.to_thread
+
+        async def recording_to_thread(func, *args):
+            threads.append(func.__name__)
+            return await to_thread(func, *args)
+
+        monkeypatch.setattr(asyncio, "to_thread", recording_to_thread)
+        path = str(tmp_path / "cache.sqlite")
+        backends = [LRUCacheBackend(), SQLiteCacheBackend(path)]
+        for cache in map(ResponseCache, backends):
+            await cache.aupdate("q", "llm", make_value("答案"))
+            assert (await cache.alookup("q", "llm"))[0].message.content == "答案"
+        assert threads == ["update", "lookup"]
+
+
+class TestCacheTemperature:
+    """测试按温度决定是否缓存"""
+
+    def test_default_configuration_does_not_cache(self):
+        """默认温度的模型不使用响应缓存，温度为0的模型使用"""
+        assert not cacheable_temperature(None)
+        assert create_llm().cache is False
+        assert create_llm(temperature=0).cache is not False
+
+    def test_threshold(self, monkeypatch):
+        monkeypatch.setattr(settings, "llm_cache_max_temperature", 0.5)
+        assert cacheable_temperature(0.5)
+        assert not cacheable_temperature(0.7)
+
+
+def test_normalize_prompt():
+    """规范化提示词合并空白"""
+    assert normalize_prompt("  a \\n\\n b\t c ") == "a b c"
@@ -0,0 +1,217 @@
+"""
+测试模块 - 测试客户端断开后的请求取消
+"""
+
+import asyncio
+
+import httpx
+import pytest
+from langchain_core.tools import tool
+
+from src.agent_1 import metrics
+from src.agent_1.cancellation import (
+    DisconnectMiddleware,
+    RequestCancelled,
+    cancel_requested,
+    cancel_scope,
+    raise_if_cancelled,
+)
+from src.agent_1.llm import CancellableChatOpenAI
+from src.agent_1.metrics import MetricsCallbackHandler
+from src.agent_1.tool_wrappers import (
+    CachedTool,
+    ConcurrencyLimiter,
+    LimitedTool,
+    ToolResultCache,
+)
+
+
+def slow_tool(calls, cancelled):
+    @tool
+    async def search(query: str) -> str:
+        """搜索"""
+        calls.append(query)
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(query)
+            raise
+        return f"结果: {query}"
+
+    return search
+
+
+async def cancel_after(coro, delay=0.05):
+    task = asyncio.ensure_future(coro)
+    await asyncio.sleep(delay)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+class TestDisconnectMiddleware:
+    """测试断开连接检测"""
+
+    @staticmethod
+    def client(disconnect_after):
+        """先发送请求体，disconnect_after秒后报告连接断开"""
+        messages = [{"type": "http.request", "body": b"{}", "more_body": False}]
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await asyncio.sleep(disconnect_after)
+            return {"type": "http.disconnect"}
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        return receive, send, sent
+
+    @pytest.mark.asyncio
+    async def test_disconnect_cancels_handler(self):
+        """响应完成之前断开时取消处理任务，并在取消范围内可见"""
+        seen = {}
+
+        async def app(scope, receive, send):
+            await receive()
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                seen["cancel_requested"] = cancel_requested()
+                raise
+
+        before = metrics.REQUESTS_CANCELLED.labels("/chat").value
+        receive, send, sent = self.client(disconnect_after=0.05)
+        middleware = DisconnectMiddleware(app, paths=("/chat",))
+        scope = {"type": "http", "path": "/chat"}
+        await asyncio.wait_for(middleware(scope, receive, send), 1)
+
+        assert seen == {"cancel_requested": True}
+        assert sent == []
+        assert metrics.REQUESTS_CANCELLED.labels("/chat").value == before + 1
+
+    @pytest.mark.asyncio
+    async def test_completed_and_other_paths_untouched(self):
+        """响应发送完毕后的断开和未配置的路径不会触发取消"""
+        async def app(scope, receive, send):
+            await receive()
+            await asyncio.sleep(0.05)
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"ok"})
+
+        before = metrics.REQUESTS_CANCELLED.labels("/chat").value
+        middleware = DisconnectMiddleware(app, paths=("/chat",))
+        for path, disconnect_after in (("/chat/stream", 0.2), ("/metrics", 0.01)):
+            receive, send, sent = self.client(disconnect_after)
+            await middleware({"type": "http", "path": path}, receive, send)
+            assert sent[-1]["body"] == b"ok"
+        assert metrics.REQUESTS_CANCELLED.labels("/chat").value == before
+
+
+class TestCancelledCalls:
+    """测试模型和工具调用的取消"""
+
+    @pytest.mark.asyncio
+    async def test_tool_cancellation_is_counted(self):
+        """工具调用被取消时计入取消指标，不计为失败，也不残留计时"""
+        calls, cancelled = [], []
+        handler = MetricsCallbackHandler()
+        limited = LimitedTool(
+            slow_tool(calls, cancelled),
+            timeout=10,
+            limiter=ConcurrencyLimiter(4),
+            callbacks=[handler],
+        )
+        before = metrics.CALLS_CANCELLED.labels("tool").value
+        errors = metrics.TOOL_ERRORS.labels("search").value
+
+        await cancel_after(limited.ainvoke({"query": "a"}))
+
+        assert cancelled == ["a"]
+        assert metrics.CALLS_CANCELLED.labels("tool").value == before + 1
+        assert metrics.TOOL_ERRORS.labels("search").value == errors
+        assert handler._started == {}
+
+    @pytest.mark.asyncio
+    async def test_llm_cancellation_is_counted(self):
+        """模型调用被取消时关闭上游请求并计入取消指标"""
+        started = asyncio.Event()
+
+        async def upstream(request):
+            started.set()
+            await asyncio.sleep(5)
+
+        handler = MetricsCallbackHandler()
+        llm = CancellableChatOpenAI(
+            model="test",
+            api_key="test",
+            base_url="http://upstream/v1",
+            max_retries=0,
+            http_async_client=httpx.AsyncClient(transport=httpx.MockTransport(upstream)),
+            callbacks=[handler],
+        )
+        before = metrics.CALLS_CANCELLED.labels("llm").value
+
+        await cancel_after(llm.ainvoke("你好"), delay=0.1)
+
+        assert started.is_set()
+        assert metrics.CALLS_CANCELLED.labels("llm").value == before + 1
+        assert handler._started == {}
+
+    @pytest.mark.asyncio
+    async def test_shared_call_cancelled_with_last_waiter(self):
+        """单飞分组中的调用者都因请求取消而退出时，共享的工具调用随之取消"""
+        calls, cancelled = [], []
+        search = slow_tool(calls, cancelled)
+        cached = CachedTool(search, ttl=60, cache=ToolResultCache())
+
+        async def request():
+            with cancel_scope() as scope:
+                task = asyncio.ensure_future(cached.ainvoke({"query": "a"}))
+            await asyncio.sleep(0.05)
+            scope.cancel()
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        await asyncio.gather(request(), request())
+        await asyncio.sleep(0)
+        assert calls == ["a"]
+        assert cancelled == ["a"]
+
+    def test_sync_tool_checks_cancel_scope(self):
+        """同步路径在开始工具调用之前检查当前请求是否已被取消"""
+        @tool
+        def echo(text: str) -> str:
+            """原样返回文本"""
+            return text
+
+        handler = MetricsCallbackHandler()
+        limited = LimitedTool(echo, limiter=ConcurrencyLimiter(1), callbacks=[handler])
+        with cancel_scope() as scope:
+            assert limited.invoke({"text": "hi"}) == "hi"
+            scope.cancel()
+            with pytest.raises(RequestCancelled):
+                limited.invoke({"text": "hi"})
+        assert handler._started == {}
+
+    def test_timed_sync_tool_sees_cancel_scope(self):
+        """带超时的同步调用在线程池中运行，工具线程中同样能看到取消范围"""
+        handler = MetricsCallbackHandler()
+        with cancel_scope() as scope:
+            @tool
+            def echo(text: str) -> str:
+                """取消当前请求后原样返回文本"""
+                scope.cancel()
+                raise_if_cancelled()
+                return text
+
+            limited = LimitedTool(
+                echo, timeout=5, limiter=ConcurrencyLimiter(1), callbacks=[handler]
+            )
+            with pytest.raises(RequestCancelled):
+                limited.invoke({"text": "hi"})
+        assert handler._started == {}
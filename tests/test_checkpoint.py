@@ -0,0 +1,166 @@
+"""
+测试模块 - 测试图检查点存储
+"""
+
+import sqlite3
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessage
+from langgraph.graph import MessagesState, StateGraph
+
+from src.agent_1 import graph as graph_module
+from src.agent_1 import server
+from src.agent_1.checkpoint import SQLiteCheckpointSaver
+
+
+def echo_workflow() -> StateGraph:
+    """回复当前消息数量的简单工作流"""
+    workflow = StateGraph(MessagesState)
+    workflow.add_node(
+        "agent",
+        lambda state: {"messages": [AIMessage(content=str(len(state["messages"])))]},
+    )
+    workflow.set_entry_point("agent")
+    return workflow
+
+
+def thread(thread_id: str) -> dict:
+    return {"configurable": {"thread_id": thread_id}}
+
+
+class TestSQLiteCheckpointSaver:
+    """测试SQLite检查点存储"""
+
+    def test_state_survives_restart(self, tmp_path):
+        """重新打开数据库后仍能继续同一线程的对话"""
+        path = str(tmp_path / "checkpoints.sqlite")
+        saver = SQLiteCheckpointSaver(path)
+        app = echo_workflow().compile(checkpointer=saver)
+        app.invoke({"messages": [("user", "你好")]}, thread("t1"))
+        result = app.invoke({"messages": [("user", "再见")]}, thread("t1"))
+        assert result["messages"][-1].content == "3"
+        saver.close()
+
+        saver = SQLiteCheckpointSaver(path)
+        app = echo_workflow().compile(checkpointer=saver)
+        assert len(app.get_state(thread("t1")).values["messages"]) == 4
+        result = app.invoke({"messages": [("user", "还在吗")]}, thread("t1"))
+        assert result["messages"][-1].content == "5"
+        saver.close()
+
+    def test_write_behind_buffers_until_flush(self, tmp_path):
+        """延迟写入时数据先进入缓冲区，flush后才写入SQLite"""
+        path = str(tmp_path / "checkpoints.sqlite")
+        saver = SQLiteCheckpointSaver(path, write_behind=True, flush_interval=3600)
+        app = echo_workflow().compile(checkpointer=saver)
+        app.invoke({"messages": [("user", "你好")]}, thread("t1"))
+
+        assert saver.stats()["pending_writes"] > 0
+        assert saver.stats()["checkpoints"] == 0
+        # 缓冲区中的数据可以正常读取
+        assert len(app.get_state(thread("t1")).values["messages"]) == 2
+
+        saver.flush()
+        count = (
+            sqlite3.connect(path)
+            .execute("SELECT COUNT(*) FROM checkpoints")
+            .fetchone()[0]
+        )
+        assert count > 0
+        saver.close()
+
+    def test_keep_last_prunes_old_checkpoints(self, tmp_path):
+        """旧检查点和不再引用的通道数据被裁剪，最新状态不受影响"""
+        saver = SQLiteCheckpointSaver(str(tmp_path / "checkpoints.sqlite"), keep_last=2)
+        app = echo_workflow().compile(checkpointer=saver)
+        for i in range(10):
+            app.invoke({"messages": [("user", f"第{i}轮")]}, thread("t1"))
+
+        assert saver.stats()["checkpoints"] <= 4
+        assert len(saver.blobs) <= 8
+        assert len(app.get_state(thread("t1")).values["messages"]) == 20
+
+        assert saver.compact()["threads"] == 1
+        assert saver.stats()["checkpoints"] == 2
+        saver.prune(["t1"])
+        assert saver.stats()["checkpoints"] == 1
+        assert len(app.get_state(thread("t1")).values["messages"]) == 20
+        saver.close()
+
+    def test_evicted_threads_reload_from_disk(self, tmp_path):
+        """超出内存容量的线程被淘汰后可以从SQLite重新加载"""
+        saver = SQLiteCheckpointSaver(
+            str(tmp_path / "checkpoints.sqlite"),
+            write_behind=True,
+            max_cached_threads=1,
+        )
+        app = echo_workflow().compile(checkpointer=saver)
+        app.invoke({"messages": [("user", "a")]}, thread("t1"))
+        app.invoke({"messages": [("user", "b")]}, thread("t2"))
+        assert saver.stats()["cached_threads"] == 1
+        assert {key[0] for key in [*saver.writes, *saver.blobs]} == {"t2"}
+
+        result = app.invoke({"messages": [("user", "c")]}, thread("t1"))
+        assert result["messages"][-1].content == "3"
+        assert len(list(saver.list(None))) == saver.stats()["checkpoints"]
+
+        saver.delete_thread("t2")
+        saver.flush()
+        assert app.get_state(thread("t2")).values == {}
+        saver.close()
+
+    @pytest.mark.asyncio
+    async def test_async_access_runs_off_event_loop(self, tmp_path):
+        """异步调用时加载和写入检查点都在线程中执行"""
+        saver = SQLiteCheckpointSaver(str(tmp_path / "checkpoints.sqlite"))
+        threads = []
+        ensure_loaded = saver._ensure_loaded
+
+        def recording(thread_id):
+            threads.append(threading.get_ident())
+            ensure_loaded(thread_id)
+
+        saver._ensure_loaded = recording
+        app = echo_workflow().compile(checkpointer=saver)
+        await app.ainvoke({"messages": [("user", "你好")]}, thread("t1"))
+        result = await app.ainvoke({"messages": [("user", "再见")]}, thread("t1"))
+        assert result["messages"][-1].content == "3"
+        listed = [item async for item in saver.alist(thread("t1"))]
+        assert threads and threading.get_ident() not in threads
+        assert len(listed) == len(list(saver.list(thread("t1")))) > 0
+        saver.close()
+
+
+class TestGraphRoute:
+    """测试/graph路由的线程状态"""
+
+    @pytest.fixture
+    def client(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(graph_module, "create_workflow", echo_workflow)
+        saver = SQLiteCheckpointSaver(str(tmp_path / "checkpoints.sqlite"))
+        monkeypatch.setattr(
+            server.graph_runnable, "_runnable", graph_module.create_thread_graph(saver)
+        )
+        yield TestClient(server.app)
+        saver.close()
+
+    def test_thread_id_keeps_state(self, client):
+        """提供thread_id时每轮只需发送新消息"""
+        body = {
+            "input": {"messages": [{"type": "human", "content": "你好"}]},
+            "config": {"configurable": {"thread_id": "t1"}},
+        }
+        client.post("/graph/invoke", json=body)
+        response = client.post("/graph/invoke", json=body)
+        messages = response.json()["output"]["messages"]
+        assert len(messages) == 4
+        assert messages[-1]["content"] == "3"
+
+    def test_without_thread_id_is_stateless(self, client):
+        """未提供thread_id时保持无状态"""
+        body = {"input": {"messages": [{"type": "human", "content": "你好"}]}}
+        client.post("/graph/invoke", json=body)
+        messages = client.post("/graph/invoke", json=body).json()["output"]["messages"]
+        assert [m["content"] for m in messages] == ["你好", "1"]
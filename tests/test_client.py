@@ -0,0 +1,197 @@
+"""
+测试模块 - 测试API客户端
+"""
+
+import io
+import json
+
+import httpx
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.agent_1.client import AgentClient, AsyncAgentClient, backoff_delay, iter_sse
+
+SSE_BODY = (
+    'event: token\r\ndata: "你"\r\n\r\n'
+    ": ping\r\n\r\n"
+    'event: token\r\ndata: "好"\r\n\r\n'
+    'event: final\r\ndata: "你好"\r\n\r\n'
+)
+
+
+class ScriptedAdapter(HTTPAdapter):
+    """按顺序返回预设状态码（或抛出预设异常）的requests传输层"""
+
+    def __init__(self, statuses, body=b"{}"):
+        super().__init__()
+        self.statuses = list(statuses)
+        self.body = body
+        self.calls = 0
+
+    def send(self, request, **kwargs):
+        self.calls += 1
+        status = self.statuses.pop(0)
+        if isinstance(status, Exception):
+            raise status
+        response = requests.Response()
+        response.status_code = status
+        response.headers["Retry-After"] = "0"
+        response.raw = io.BytesIO(self.body)
+        response.request = request
+        response.url = request.url
+        return response
+
+
+def scripted_transport(statuses, body):
+    """按顺序返回预设状态码的httpx传输层，记录调用次数"""
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        status = statuses[min(len(calls), len(statuses)) - 1]
+        return httpx.Response(status, content=body)
+
+    return httpx.MockTransport(handler), calls
+
+
+class TestSyncClient:
+    """测试同步客户端"""
+
+    def test_retries_then_succeeds(self):
+        """429和5xx响应按退避重试，请求复用同一个会话"""
+        client = AgentClient(session_id="s1", backoff_base=0)
+        body = json.dumps({"response": "好的"}).encode()
+        adapter = ScriptedAdapter([503, 429, 200], body)
+        client.session.mount("http://", adapter)
+
+        assert client.chat("你好") == "好的"
+        assert adapter.calls == 3
+
+    def test_gives_up_after_max_retries(self):
+        """超过最大重试次数后返回错误"""
+        client = AgentClient(max_retries=1, backoff_base=0)
+        adapter = ScriptedAdapter([503, 503])
+        client.session.mount("http://", adapter)
+
+        assert client.chat("你好").startswith("请求错误")
+        assert adapter.calls == 2
+
+    def test_post_retries_only_unprocessed_requests(self):
+        """POST只在连接失败和429/503时重试，500和读取超时直接返回错误"""
+        body = json.dumps({"response": "好的"}).encode()
+        connect_error = requests.exceptions.ConnectTimeout("connect")
+        for statuses, calls in (
+            ([500, 200], 1),
+            ([requests.exceptions.ReadTimeout("read"), 200], 1),
+            ([connect_error, 503, 200], 3),
+        ):
+            client = AgentClient(backoff_base=0)
+            adapter = ScriptedAdapter(statuses, body)
+            client.session.mount("http://", adapter)
+            reply = client.chat("你好")
+            assert adapter.calls == calls
+            assert (reply == "好的") == (calls == 3)
+
+    def test_retry_non_idempotent_opt_in(self):
+        """打开retry_non_idempotent后POST在500时也重试，GET默认重试"""
+        body = json.dumps({"response": "好的"}).encode()
+        client = AgentClient(backoff_base=0, retry_non_idempotent=True)
+        adapter = ScriptedAdapter([500, 200], body)
+        client.session.mount("http://", adapter)
+        assert client.chat("你好") == "好的"
+
+        client = AgentClient(backoff_base=0)
+        adapter = ScriptedAdapter([502, 200], body)
+        client.session.mount("http://", adapter)
+        assert client.get_api_info() == {"response": "好的"}
+        assert adapter.calls == 2
+
+    def test_default_session_id_is_unique(self):
+        """未指定会话ID时每个客户端使用不同的会话"""
+        assert AgentClient().session_id != AgentClient().session_id
+
+    def test_chat_stream(self):
+        """流式接口解析SSE事件，忽略注释行"""
+        client = AgentClient()
+        client.session.mount("http://", ScriptedAdapter([200], SSE_BODY.encode()))
+        events = list(client.chat_stream("你好"))
+        assert events == [
+            {"event": "token", "data": "你"},
+            {"event": "token", "data": "好"},
+            {"event": "final", "data": "你好"},
+        ]
+
+
+class TestAsyncClient:
+    """测试异步客户端"""
+
+    @pytest.mark.asyncio
+    async def test_retries_then_succeeds(self):
+        """429和5xx响应按退避重试"""
+        body = json.dumps({"response": "好的"}).encode()
+        transport, calls = scripted_transport([503, 429, 200], body)
+        async with AsyncAgentClient(backoff_base=0, transport=transport) as client:
+            assert await client.chat("你好") == "好的"
+        assert len(calls) == 3
+
+    @pytest.mark.asyncio
+    async def test_chat_stream(self):
+        """异步流式接口逐个产出事件"""
+        transport, calls = scripted_transport([503, 200], SSE_BODY.encode())
+        async with AsyncAgentClient(backoff_base=0, transport=transport) as client:
+            events = [event async for event in client.chat_stream("你好")]
+        assert [e["data"] for e in events] == ["你", "好", "你好"]
+        assert json.loads(calls[-1].content)["session_id"] == client.session_id
+
+    @pytest.mark.asyncio
+    async def test_post_not_retried_after_server_error(self):
+        """POST遇到500和读取超时不重试，打开retry_non_idempotent后重试"""
+        body = json.dumps({"response": "好的"}).encode()
+        transport, calls = scripted_transport([500, 200], body)
+        async with AsyncAgentClient(backoff_base=0, transport=transport) as client:
+            assert (await client.chat("你好")).startswith("请求错误")
+        assert len(calls) == 1
+
+        def timeout(request):
+            calls.append(request)
+            raise httpx.ReadTimeout("read", request=request)
+
+        calls.clear()
+        transport = httpx.MockTransport(timeout)
+        async with AsyncAgentClient(backoff_base=0, transport=transport) as client:
+            assert (await client.chat("你好")).startswith("请求错误")
+        assert len(calls) == 1
+
+        transport, calls = scripted_transport([500, 200], body)
+        async with AsyncAgentClient(
+            backoff_base=0, transport=transport, retry_non_idempotent=True
+        ) as client:
+            assert await client.chat("你好") == "好的"
+        assert len(calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_connection_error_is_reported(self):
+        """连接失败在重试耗尽后返回错误"""
+        def handler(request):
+            raise httpx.ConnectError("refused", request=request)
+
+        transport = httpx.MockTransport(handler)
+        async with AsyncAgentClient(
+            max_retries=2, backoff_base=0, transport=transport
+        ) as client:
+            assert (await client.get_api_info())["error"].startswith("请求错误")
+
+
+class TestHelpers:
+    """测试退避和SSE解析"""
+
+    def test_backoff_respects_bounds(self):
+        """退避时间不超过上限，且不短于Retry-After"""
+        assert all(0 <= backoff_delay(10, 0.5, 2.0) <= 2.0 for _ in range(100))
+        assert backoff_delay(0, 0.5, 2.0, retry_after=3.0) == 3.0
+
+    def test_multiline_data(self):
+        """多行data合并，非JSON数据原样返回"""
+        events = list(iter_sse(["data: 第一行", "data: 第二行"]))
+        assert events == [{"event": "message", "data": "第一行\n第二行"}]
@@ -0,0 +1,174 @@
+"""
+测试模块 - 测试对话历史裁剪与摘要
+"""
+
+import pytest
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from pydantic import Field
+
+from src.agent_1.history import HistoryManager, count_tokens, record_tokens
+from src.agent_1.memory import AgentMemory
+
+
+class RecordingModel(FakeListChatModel):
+    """记录每次收到的输入的假模型"""
+
+    requests: list = Field(default_factory=list)
+
+    def _call(self, messages, *args, **kwargs):
+        self.requests.append(messages)
+        return super()._call(messages, *args, **kwargs)
+
+
+def conversation(turns: int, size: int = 100) -> list:
+    messages = []
+    for i in range(turns):
+        messages.append(HumanMessage(content=f"问题{i} " + "x" * size))
+        messages.append(AIMessage(content=f"回答{i} " + "y" * size))
+    return messages
+
+
+def manager(model: FakeListChatModel = None, **kwargs) -> HistoryManager:
+    kwargs.setdefault("keep_turns", 2)
+    kwargs.setdefault("max_tokens", 200)
+    return HistoryManager(summarizer=(lambda: model) if model else None, **kwargs)
+
+
+class TestSplit:
+    """测试按轮切分"""
+
+    def test_within_budget_keeps_everything(self):
+        """未超出预算时不折叠"""
+        messages = conversation(3, size=10)
+        assert manager(max_tokens=10000).split(messages, 10000) == 0
+
+    def test_keeps_last_turns(self):
+        """超出预算时只保留最近K轮"""
+        messages = conversation(6)
+        history = manager()
+        assert history.split(messages, 200) == 8
+        # 最近K轮仍然超出预算时继续丢弃，但至少保留最后一轮
+        assert history.split(messages, 10) == 10
+
+    def test_tool_messages_stay_with_turn(self):
+        """工具调用和工具结果不会被拆开"""
+        messages = conversation(4) + [
+            HumanMessage(content="北京天气"),
+            AIMessage(
+                content="",
+                tool_calls=[
+                    {"name": "get_weather", "args": {"city": "北京"}, "id": "1"}
+                ],
+            ),
+            ToolMessage(content="晴天", tool_call_id="1", name="get_weather"),
+            AIMessage(content="北京晴天"),
+        ]
+        start = manager(keep_turns=1).split(messages, 50)
+        assert isinstance(messages[start], HumanMessage)
+        assert messages[start].content == "北京天气"
+
+    def test_record_counts_match_messages(self):
+        """会话记录上缓存的token数与逐条估算消息的结果一致"""
+        messages = conversation(2) + [
+            HumanMessage(content="北京天气"),
+            AIMessage(
+                content="",
+                tool_calls=[
+                    {"name": "get_weather", "args": {"city": "北京"}, "id": "1"}
+                ],
+            ),
+        ]
+        memory = AgentMemory()
+        memory.chat_history.add_messages(messages)
+        records = memory.chat_history.records
+        assert sum(map(record_tokens, records)) == count_tokens(messages)
+        assert all(r.message is not None or r._tokens >= 0 for r in records)
+
+    def test_per_model_budget(self):
+        """按模型名覆盖预算"""
+        history = manager(token_budgets={"small-model": 50})
+        assert history.budget_for("small-model") == 50
+        assert history.budget_for("other") == 200
+
+
+class TestFoldMemory:
+    """测试会话记忆的滚动摘要"""
+
+    def test_fold_into_summary(self):
+        """较早的对话折叠为摘要并从记忆中移除"""
+        model = RecordingModel(responses=["摘要一", "摘要二"])
+        history = manager(model)
+        memory = AgentMemory()
+        memory.chat_history.add_messages(conversation(6))
+
+        messages = history.fold_memory(memory)
+        assert memory.summary == "摘要一"
+        assert len(memory.chat_history.messages) == 4
+        assert (
+            isinstance(messages[0], SystemMessage) and "摘要一" in messages[0].content
+        )
+        assert messages[1:] == memory.chat_history.messages
+
+        # 未超出预算时不再调用摘要模型
+        history.fold_memory(memory)
+        assert len(model.requests) == 1
+
+        # 再次超出预算时把已有摘要和新折叠的对话合并
+        memory.chat_history.add_messages(conversation(4))
+        history.fold_memory(memory)
+        assert memory.summary == "摘要二"
+        assert "摘要一" in model.requests[1][1].content
+        assert count_tokens(history.fold_memory(memory)) <= 200
+
+    def test_without_summarizer_drops_old_turns(self):
+        """未配置摘要模型时直接丢弃较早的对话"""
+        memory = AgentMemory()
+        memory.chat_history.add_messages(conversation(6))
+        messages = manager().fold_memory(memory)
+        assert memory.summary is None
+        assert messages == memory.chat_history.messages
+        assert len(messages) == 4
+
+    @pytest.mark.asyncio
+    async def test_async_fold(self):
+        """异步折叠"""
+        memory = AgentMemory()
+        memory.chat_history.add_messages(conversation(6))
+        history = manager(FakeListChatModel(responses=["摘要"]))
+        messages = await history.afold_memory(memory)
+        assert memory.summary == "摘要"
+        assert len(messages) == 5
+
+
+class TestTrimMessages:
+    """测试图消息裁剪"""
+
+    def test_summary_cached_by_prefix(self):
+        """相同前缀只生成一次摘要，新增的轮次合并进已有摘要"""
+        model = RecordingModel(responses=["摘要一", "摘要二"])
+        history = manager(model)
+        messages = [SystemMessage(content="系统提示")] + conversation(6)
+
+        trimmed = history.trim_messages(messages)
+        assert trimmed[0].content == "系统提示"
+        assert "摘要一" in trimmed[1].content
+        assert trimmed[2:] == messages[-4:]
+        assert history.trim_messages(messages) == trimmed
+        assert len(model.requests) == 1
+
+        longer = messages + conversation(2)
+        trimmed = history.trim_messages(longer)
+        assert "摘要二" in trimmed[1].content
+        # 第二次只发送新折叠的两轮对话
+        request = model.requests[1][1].content
+        assert "摘要一" in request and "问题0" not in request
+        assert len(messages) == 13
+
+    @pytest.mark.asyncio
+    async def test_async_trim(self):
+        """异步裁剪"""
+        history = manager(FakeListChatModel(responses=["摘要"]))
+        trimmed = await history.atrim_messages(conversation(6))
+        assert "摘要" in trimmed[0].content
+        assert len(trimmed) == 5
@@ -0,0 +1,61 @@
+"""
+测试模块 - 测试共享HTTP连接池
+"""
+
+import httpx
+import pytest
+
+from src.agent_1 import http_clients
+from src.agent_1.llm import create_llm
+from src.agent_1.search import PooledTavilySearchAPIWrapper
+
+
+class TestHttpClients:
+    """测试共享HTTP客户端"""
+    
+    def test_clients_are_shared(self):
+        """多次获取返回同一个客户端"""
+        assert http_clients.get_http_client() is http_clients.get_http_client()
+        assert (
+            http_clients.get_async_http_client() is http_clients.get_async_http_client()
+        )
+
+    def test_llm_uses_shared_clients(self):
+        """模型客户端使用共享连接池"""
+        llm = create_llm()
+        assert llm.http_client is http_clients.get_http_client()
+        assert llm.http_async_client is http_clients.get_async_http_client()
+    
+    def test_tavily_uses_shared_client(self, monkeypatch):
+        """Tavily搜索请求走共享连接池"""
+        requests = []
+        
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            return httpx.Response(200, json={"results": [{"title": "结果"}]})
+        
+        monkeypatch.setattr(
+            http_clients,
+            "_http_client",
+            httpx.Client(transport=httpx.MockTransport(handler)),
+        )
+        wrapper = PooledTavilySearchAPIWrapper(tavily_api_key="test")
+        
+        result = wrapper.raw_results("天气", max_results=5, topic=None)
+        assert result["results"][0]["title"] == "结果"
+        assert requests[0].url.path == "/search"
+        assert b'"topic"' not in requests[0].content
+    
+    @pytest.mark.asyncio
+    async def test_tavily_error_status(self, monkeypatch):
+        """非200状态码抛出错误"""
+        transport = httpx.MockTransport(
+            lambda request: httpx.Response(429, text="rate limited")
+        )
+        monkeypatch.setattr(
+            http_clients, "_async_http_client", httpx.AsyncClient(transport=transport)
+        )
+        wrapper = PooledTavilySearchAPIWrapper(tavily_api_key="test")
+        
+        with pytest.raises(ValueError, match="429"):
+            await wrapper.raw_results_async("天气")
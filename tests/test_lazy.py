@@ -0,0 +1,62 @@
+"""
+测试模块 - 测试延迟构建
+"""
+
+import threading
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from src.agent_1 import llm
+from src.agent_1.lazy import LazyRunnable
+
+
+class TestLazyRunnable:
+    """测试延迟构建的Runnable代理"""
+    
+    def test_built_on_first_use_only(self):
+        """首次调用时才构建，之后复用同一个实例"""
+        calls = []
+        
+        def factory():
+            calls.append(1)
+            return RunnableLambda(lambda x: x * 2)
+        
+        lazy = LazyRunnable(factory, input_type=int, output_type=int)
+        assert not lazy.is_built
+        assert lazy.get_input_schema().model_json_schema()["type"] == "integer"
+        assert not lazy.is_built
+        
+        assert lazy.invoke(2) == 4
+        assert lazy.batch([1, 3]) == [2, 6]
+        assert len(calls) == 1
+    
+    @pytest.mark.asyncio
+    async def test_async_delegation(self):
+        """异步调用和流式调用转发给真实实例"""
+        lazy = LazyRunnable(lambda: RunnableLambda(lambda x: x + 1))
+        assert await lazy.ainvoke(1) == 2
+        assert [chunk async for chunk in lazy.astream(1)] == [2]
+    
+    @pytest.mark.asyncio
+    async def test_async_build_runs_off_event_loop(self):
+        """异步调用触发的首次构建在线程中执行，build可以显式预加载"""
+        threads = []
+        
+        def factory():
+            threads.append(threading.get_ident())
+            return RunnableLambda(lambda x: x + 1)
+        
+        lazy = LazyRunnable(factory)
+        assert await lazy.ainvoke(1) == 2
+        assert threads and threading.get_ident() not in threads
+        
+        preloaded = LazyRunnable(factory)
+        assert preloaded.build() is preloaded.runnable and preloaded.is_built
+
+
+def test_missing_api_key_fails_on_first_llm(monkeypatch):
+    """缺少API密钥时在创建模型时报错，而不是在导入时"""
+    monkeypatch.setattr(llm.settings, "siliconflow_api_key", None)
+    with pytest.raises(ValueError, match="SILICONFLOW_API_KEY"):
+        llm.create_llm()
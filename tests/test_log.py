@@ -0,0 +1,115 @@
+"""
+测试模块 - 测试日志
+"""
+
+import io
+import json
+import logging
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from langchain_classic.agents import AgentExecutor
+
+from src.agent_1 import log
+from src.agent_1.agent import BasicAgent
+from src.agent_1.config import settings
+
+
+@pytest.fixture
+def log_stream(monkeypatch):
+    """把日志输出到内存中，测试结束后恢复"""
+    monkeypatch.setattr(settings, "log_format", "json")
+    monkeypatch.setattr(settings, "log_level", "DEBUG")
+    log.shutdown_logging()
+    stream = io.StringIO()
+    log.setup_logging(stream)
+    yield stream
+    log.shutdown_logging()
+    logging.getLogger(log.LOGGER_NAME).setLevel(logging.NOTSET)
+
+
+class TestPayload:
+    """测试日志负载"""
+
+    def test_truncate(self):
+        """超长文本被截断并注明原始长度"""
+        assert log.truncate("abc", 5) == "abc"
+        assert log.truncate("abcdefgh", 3) == "abc...(共8字符)"
+        assert log.truncate("abcdefgh", 0) == "abcdefgh"
+
+    def test_payload_is_lazy(self):
+        """只有格式化时才会序列化对象"""
+        class Expensive:
+            calls = 0
+
+            def __repr__(self):
+                Expensive.calls += 1
+                return "x" * 100
+
+        value = log.payload(Expensive(), max_chars=10)
+        assert Expensive.calls == 0
+        assert str(value) == "x" * 10 + "...(共100字符)"
+        assert Expensive.calls == 1
+
+
+class TestSamplingFilter:
+    """测试采样过滤器"""
+
+    def test_sampling_only_affects_debug(self):
+        """采样只作用于DEBUG级别"""
+        sampler = log.SamplingFilter(0.0)
+        debug = logging.LogRecord("agent_1", logging.DEBUG, "", 0, "msg", (), None)
+        info = logging.LogRecord("agent_1", logging.INFO, "", 0, "msg", (), None)
+        assert not sampler.filter(debug)
+        assert sampler.filter(info)
+        assert log.SamplingFilter(1.0).filter(debug)
+
+
+class TestQueueLogging:
+    """测试异步队列日志"""
+
+    def test_json_records(self, log_stream):
+        """日志经后台线程写出为JSON行"""
+        logger = log.get_logger("src.agent_1.demo")
+        logger.info(
+            "输出: %s", log.payload("a" * 50, max_chars=5), extra={"tool_calls": 2}
+        )
+        log.shutdown_logging()
+
+        record = json.loads(log_stream.getvalue().strip())
+        assert record["logger"] == "agent_1.demo"
+        assert record["level"] == "INFO"
+        assert record["message"] == "输出: aaaaa...(共50字符)"
+        assert record["tool_calls"] == 2
+
+    def test_level_gating(self, log_stream, monkeypatch):
+        """低于配置级别的日志不会输出"""
+        log.get_logger("demo").setLevel(logging.WARNING)
+        try:
+            log.get_logger("demo").info("不会输出")
+        finally:
+            log.get_logger("demo").setLevel(logging.NOTSET)
+        log.shutdown_logging()
+        assert log_stream.getvalue() == ""
+
+    @pytest.mark.asyncio
+    async def test_agent_logs_instead_of_printing(self, log_stream, capsys):
+        """智能体调用不再向stdout输出，中间步骤以截断后的DEBUG日志记录"""
+        agent = BasicAgent(use_tools=False)
+        agent.agent = Mock(spec=AgentExecutor)
+        agent.agent.ainvoke = AsyncMock(return_value={
+            "output": "晴天",
+            "intermediate_steps": [("get_weather", "x" * 10000)],
+        })
+
+        assert await agent.ainvoke("北京天气") == "晴天"
+        log.shutdown_logging()
+
+        assert capsys.readouterr().out == ""
+        records = [json.loads(line) for line in log_stream.getvalue().splitlines()]
+        messages = [record["message"] for record in records]
+        assert "处理输入: 北京天气" in messages
+        assert all(
+            len(message) < settings.log_payload_max_chars + 50 for message in messages
+        )
+        assert any(record.get("tool_calls") == 1 for record in records)
@@ -0,0 +1,80 @@
+"""
+测试模块 - 测试运行指标
+"""
+
+from fastapi.testclient import TestClient
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.tools import tool
+
+from src.agent_1 import metrics
+from src.agent_1.metrics import MetricsCallbackHandler, MetricsRegistry
+
+
+@tool
+def echo(text: str) -> str:
+    """原样返回文本"""
+    return text
+
+
+class TestMetricsRegistry:
+    """测试指标注册表"""
+    
+    def test_histogram_rendering(self):
+        """直方图按累计桶导出"""
+        registry = MetricsRegistry()
+        latency = registry.histogram(
+            "demo_seconds", "示例", ["stage"], buckets=(0.1, 1.0)
+        )
+        latency.labels("llm").observe(0.05)
+        latency.labels("llm").observe(0.5)
+        latency.labels("llm").observe(5)
+        
+        text = registry.render()
+        assert '# TYPE demo_seconds histogram' in text
+        assert 'demo_seconds_bucket{stage="llm",le="0.1"} 1' in text
+        assert 'demo_seconds_bucket{stage="llm",le="1"} 2' in text
+        assert 'demo_seconds_bucket{stage="llm",le="+Inf"} 3' in text
+        assert 'demo_seconds_count{stage="llm"} 3' in text
+    
+    def test_counter_and_callback(self):
+        """计数器和回调指标"""
+        registry = MetricsRegistry()
+        registry.counter("demo_total", "示例").inc(2)
+        registry.register_callback("demo_gauge", "示例", lambda: 7)
+        
+        text = registry.render()
+        assert "demo_total 2" in text
+        assert "demo_gauge 7" in text
+
+
+class TestMetricsCallbackHandler:
+    """测试指标回调处理器"""
+    
+    def test_records_llm_and_tool_latency(self):
+        """模型和工具调用都会记录耗时"""
+        handler = MetricsCallbackHandler()
+        llm_before = sum(h.count for h in metrics.LLM_LATENCY._children.values())
+        
+        FakeListChatModel(responses=["好"], callbacks=[handler]).invoke("你好")
+        echo.invoke({"text": "hi"}, config={"callbacks": [handler]})
+
+        assert (
+            sum(h.count for h in metrics.LLM_LATENCY._children.values())
+            == llm_before + 1
+        )
+        assert metrics.TOOL_LATENCY.labels("echo").count >= 1
+        assert not handler._started
+
+
+def test_metrics_endpoint():
+    """/metrics 返回Prometheus文本"""
+    from src.agent_1 import server
+    
+    client = TestClient(server.app)
+    client.get("/")
+    response = client.get("/metrics")
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'agent_http_request_latency_seconds_count{path="/"}' in response.text
+    assert "agent_llm_cache_hits_total" in response.text
@@ -0,0 +1,82 @@
+"""
+测试模块 - 测试编译结果注册表
+"""
+
+import threading
+import time
+
+import pytest
+
+from src.agent_1 import registry
+from src.agent_1.agent import BasicAgent
+from src.agent_1.graph import create_graph
+from src.agent_1.registry import CompiledRegistry
+
+
+@pytest.fixture
+def fresh_registry(monkeypatch):
+    """每个测试使用独立的注册表"""
+    instance = CompiledRegistry(max_size=8)
+    monkeypatch.setattr(registry, "_registry", instance)
+    return instance
+
+
+class TestCompiledRegistry:
+    """测试注册表的缓存行为"""
+
+    def test_concurrent_build_once(self):
+        """并发获取同一个键时只构建一次"""
+        reg = CompiledRegistry()
+        calls = []
+
+        def build():
+            calls.append(1)
+            time.sleep(0.05)
+            return object()
+
+        results = []
+
+        def worker():
+            results.append(reg.get_or_build("k", build))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(calls) == 1
+        assert all(result is results[0] for result in results)
+        assert reg.stats()["hits"] == 7
+
+    def test_lru_eviction(self):
+        """超出容量时淘汰最久未使用的条目"""
+        reg = CompiledRegistry(max_size=2)
+        reg.get_or_build("a", lambda: 1)
+        reg.get_or_build("b", lambda: 2)
+        reg.get_or_build("a", lambda: 1)
+        reg.get_or_build("c", lambda: 3)
+        assert reg.get_or_build("a", lambda: "rebuilt") == 1
+        assert reg.get_or_build("b", lambda: "rebuilt") == "rebuilt"
+
+
+class TestSharedAgents:
+    """测试智能体和图复用编译结果"""
+
+    def test_same_config_shares_executor(self, fresh_registry):
+        """相同配置的智能体共享模型和执行器，记忆各自独立"""
+        first, second = BasicAgent(), BasicAgent()
+        assert first.agent is second.agent and first.llm is second.llm
+        assert first.memory is not second.memory
+        assert BasicAgent(model_name=first.model_name).agent is first.agent
+
+    def test_different_config_builds_separately(self, fresh_registry):
+        """模型、温度或是否使用工具不同时分别构建"""
+        agent = BasicAgent(temperature=0.1)
+        assert BasicAgent(temperature=0.2).agent is not agent.agent
+        simple = BasicAgent(temperature=0.1, use_tools=False)
+        assert simple.agent is not agent.agent
+        assert simple.llm is agent.llm
+
+    def test_graph_is_cached(self, fresh_registry):
+        """图只编译一次"""
+        assert create_graph() is create_graph()
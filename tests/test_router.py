@@ -0,0 +1,76 @@
+"""
+测试模块 - 测试模型路由
+"""
+
+import pytest
+from langchain_classic.agents import AgentExecutor
+
+from src.agent_1 import registry
+from src.agent_1.agent import BasicAgent
+from src.agent_1.config import settings
+from src.agent_1.memory import AgentMemory
+from src.agent_1.metrics import ROUTE_DECISIONS
+from src.agent_1.registry import CompiledRegistry
+from src.agent_1.router import AGENT, SIMPLE, SMALL, TurnRouter
+
+
+class TestTurnRouter:
+    """测试路由分类"""
+
+    @pytest.mark.parametrize("text, route, reason", [
+        ("你好！", SMALL, "small_talk"),
+        ("你是谁？", SMALL, "small_talk"),
+        ("谢谢啊", SMALL, "small_talk"),
+        ("计算 (2+3)*4", AGENT, "calculation"),
+        ("北京天气怎么样", AGENT, "weather"),
+        ("今天有什么新闻", AGENT, "search"),
+        ("2024年奥运会在哪里举办", AGENT, "heuristic"),
+        ("讲个笑话", SIMPLE, "heuristic"),
+        ("帮我写一首关于春天的诗", SIMPLE, "heuristic"),
+    ])
+    def test_classify(self, text, route, reason):
+        decision = TurnRouter().classify(text)
+        assert (decision.route, decision.reason) == (route, reason)
+
+    def test_follow_up_needs_context(self):
+        """有历史时的短追问按需要工具处理"""
+        router = TurnRouter()
+        assert router.classify("那上海呢", has_history=True).route == AGENT
+        assert router.classify("那上海呢", has_history=False).route == SIMPLE
+
+    def test_decision_is_recorded(self):
+        """每次路由决策计入运行指标"""
+        counter = ROUTE_DECISIONS.labels(SMALL, "small_talk")
+        before = counter.value
+        TurnRouter().route("你好")
+        assert counter.value == before + 1
+
+
+class TestAgentRouting:
+    """测试智能体按路由选择模型"""
+
+    @pytest.fixture(autouse=True)
+    def fresh_registry(self, monkeypatch):
+        monkeypatch.setattr(registry, "_registry", CompiledRegistry())
+
+    def test_select_agent(self):
+        """寒暄使用小模型，不需要工具的问答使用不带工具的主模型，其余使用工具智能体"""
+        agent = BasicAgent()
+        memory = AgentMemory()
+
+        small = agent._select_agent("你好", memory)
+        assert not isinstance(small, AgentExecutor)
+        assert small.last.model_name == settings.router_small_model
+
+        simple = agent._select_agent("讲个笑话", memory)
+        assert simple.last is agent.llm
+
+        assert agent._select_agent("北京天气", memory) is agent.agent
+
+    def test_routing_disabled(self, monkeypatch):
+        """关闭路由时始终使用工具智能体"""
+        agent = BasicAgent(routing=False)
+        assert agent._select_agent("你好", AgentMemory()) is agent.agent
+
+        monkeypatch.setattr(settings, "router_enabled", False)
+        assert BasicAgent()._select_agent("你好", AgentMemory()) is agent.agent
@@ -0,0 +1,162 @@
+"""
+测试模块 - 测试语义缓存
+"""
+
+import threading
+
+import pytest
+from langchain_core.language_models import FakeListChatModel
+
+from src.agent_1 import semantic_cache
+from src.agent_1.agent import BasicAgent
+from src.agent_1.memory import AgentMemory
+from src.agent_1.prompts import create_simple_prompt
+from src.agent_1.semantic_cache import SemanticCache, is_context_free
+
+
+class TestSemanticCache:
+    """测试语义缓存的命中、过期和失效"""
+
+    def test_paraphrase_hits(self):
+        """换了说法的问题命中，只差一个实体或数字的问题不命中"""
+        cache = SemanticCache()
+        cache.store("北京天气怎么样", "北京晴", tools=["get_weather"])
+        cache.store("什么是机器学习", "机器学习是……")
+        cache.store("计算2+3", "5", tools=["calculator"])
+
+        assert cache.lookup("北京今天天气如何？") == "北京晴"
+        assert cache.lookup("机器学习是什么") == "机器学习是……"
+        assert cache.lookup("上海天气怎么样") is None
+        assert cache.lookup("什么是深度学习") is None
+        assert cache.lookup("计算2+4") is None
+        assert cache.lookup("北京天气怎么样", namespace="other") is None
+
+    def test_ttl_and_volatile_tools(self, clock):
+        """使用了实时性工具的回答有效期较短，有效期为0时不缓存"""
+        cache = SemanticCache(ttl_seconds=3600, volatile_ttl_seconds=60, clock=clock)
+        cache.store("北京天气", "晴", tools=["get_weather"])
+        cache.store("讲个笑话", "……")
+        clock.now += 120
+        assert cache.lookup("北京天气") is None
+        assert cache.lookup("讲个笑话") == "……"
+
+        no_volatile = SemanticCache(volatile_ttl_seconds=0)
+        assert not no_volatile.store("北京天气", "晴", tools=["get_weather"])
+
+    def test_invalidate_by_tool(self):
+        """按工具名让回答立即失效"""
+        cache = SemanticCache()
+        cache.store("北京天气", "晴", tools=["get_weather"])
+        cache.store("讲个笑话", "……")
+        assert cache.invalidate("get_weather") == 1
+        assert cache.lookup("北京天气") is None
+        assert len(cache) == 1
+
+    def test_grows_then_reuses_oldest_slot(self, clock):
+        """索引按需扩容，达到上限后覆盖最早过期的条目"""
+        cache = SemanticCache(max_entries=3, clock=clock)
+        for i, question in enumerate(["苹果", "香蕉", "橙子", "葡萄"]):
+            clock.now += 1
+            cache.store(question, f"回答{i}")
+        assert len(cache) == 3 and cache.stats()["capacity"] == 3
+        assert cache.lookup("苹果") is None
+        assert cache.lookup("葡萄") == "回答3"
+
+    def test_persistence(self, tmp_path):
+        """向量和条目在重启后恢复"""
+        path = str(tmp_path / "semantic")
+        cache = SemanticCache(path=path)
+        for i in range(100):
+            cache.store(f"问题{i}号", f"回答{i}")
+        cache.store("北京天气", "晴", tools=["get_weather"])
+        cache.invalidate("get_weather")
+
+        restored = SemanticCache(path=path)
+        assert len(restored) == 100
+        assert restored.lookup("问题42号") == "回答42"
+        assert restored.lookup("北京天气") is None
+
+    def test_context_free(self):
+        assert is_context_free("北京天气怎么样")
+        assert not is_context_free("那上海呢")
+        assert not is_context_free("它的价格是多少")
+
+
+class TestAgentSemanticCache:
+    """测试智能体使用语义缓存"""
+
+    @pytest.fixture(autouse=True)
+    def fresh_cache(self, monkeypatch):
+        cache = SemanticCache()
+        monkeypatch.setattr(semantic_cache, "_semantic_cache", cache)
+        return cache
+
+    @pytest.mark.asyncio
+    async def test_paraphrase_skips_model(self):
+        """换了说法的重复问题不再调用模型"""
+        model = FakeListChatModel(responses=["第一次回答", "第二次回答"])
+        agent = BasicAgent(use_tools=False, temperature=0)
+        agent.agent = create_simple_prompt() | model
+
+        assert await agent.ainvoke("什么是机器学习") == "第一次回答"
+        answer = await agent.ainvoke("机器学习是什么？", memory=AgentMemory())
+        assert answer == "第一次回答"
+        assert agent.invoke("什么是深度学习", memory=AgentMemory()) == "第二次回答"
+
+    @pytest.mark.asyncio
+    async def test_default_temperature_is_not_cached(self):
+        """默认配置的温度期望非确定性的回复，重复问题仍然调用模型"""
+        model = FakeListChatModel(responses=["第一次回答", "第二次回答"])
+        agent = BasicAgent(use_tools=False)
+        agent.agent = create_simple_prompt() | model
+
+        assert await agent.ainvoke("什么是机器学习") == "第一次回答"
+        assert await agent.ainvoke("什么是机器学习") == "第二次回答"
+
+    @pytest.mark.asyncio
+    async def test_follow_up_is_not_cached(self):
+        """有历史时依赖上下文的追问不使用缓存"""
+        model = FakeListChatModel(responses=["北京晴", "上海雨", "上海多云"])
+        agent = BasicAgent(use_tools=False, temperature=0)
+        agent.agent = create_simple_prompt() | model
+
+        await agent.ainvoke("北京天气")
+        assert await agent.ainvoke("那上海呢") == "上海雨"
+        assert await agent.ainvoke("那上海呢") == "上海多云"
+
+    @pytest.mark.asyncio
+    async def test_async_lookup_runs_off_event_loop(self, fresh_cache, monkeypatch):
+        """异步路径上查找和写入缓存在线程中执行"""
+        threads = []
+        lookup, store = fresh_cache.lookup, fresh_cache.store
+
+        def recording(func):
+            def wrapper(*args):
+                threads.append(threading.get_ident())
+                return func(*args)
+            return wrapper
+
+        monkeypatch.setattr(fresh_cache, "lookup", recording(lookup))
+        monkeypatch.setattr(fresh_cache, "store", recording(store))
+        agent = BasicAgent(use_tools=False, temperature=0)
+        agent.agent = create_simple_prompt() | FakeListChatModel(responses=["回答"])
+
+        assert await agent.ainvoke("什么是机器学习") == "回答"
+        events = [e async for e in agent.astream("机器学习是什么？", AgentMemory())]
+        assert events[-1] == {"event": "final", "data": "回答"}
+        assert len(threads) == 3 and threading.get_ident() not in threads
+
+    @pytest.mark.asyncio
+    async def test_stream_lookup_failure_yields_error(self, fresh_cache, monkeypatch):
+        """流式调用时缓存查找出错也以error事件返回"""
+        def broken(*args):
+            raise RuntimeError("向量模型不可用")
+
+        monkeypatch.setattr(fresh_cache, "lookup", broken)
+        agent = BasicAgent(use_tools=False, temperature=0)
+        agent.agent = create_simple_prompt() | FakeListChatModel(responses=["回答"])
+
+        events = [event async for event in agent.astream("什么是机器学习")]
+        assert events == [
+            {"event": "error", "data": "处理请求时出错: 向量模型不可用"}
+        ]
@@ -0,0 +1,130 @@
+"""
+测试模块 - 测试会话记忆注册表
+"""
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from src.agent_1.memory import AgentMemory, CompactChatMessageHistory
+from src.agent_1.session import SessionStore
+
+
+class TestSessionStore:
+    """测试会话注册表"""
+    
+    def test_sessions_are_isolated(self):
+        """不同会话使用不同的记忆"""
+        store = SessionStore(max_sessions=10)
+        store.get("a").save_context({"input": "你好"}, {"output": "你好！"})
+        
+        assert len(store.get("a").chat_history.messages) == 2
+        assert len(store.get("b").chat_history.messages) == 0
+        assert store.stats()["hits"] == 1
+        assert store.stats()["misses"] == 2
+    
+    def test_lru_eviction(self):
+        """超过容量时淘汰最久未使用的会话"""
+        store = SessionStore(max_sessions=2)
+        store.get("a")
+        store.get("b")
+        store.get("a")
+        store.get("c")
+        
+        assert "a" in store
+        assert "b" not in store
+        assert store.stats()["lru_evictions"] == 1
+    
+    def test_ttl_eviction(self, clock):
+        """空闲超过TTL的会话被清理"""
+        store = SessionStore(max_sessions=10, ttl_seconds=60, clock=clock)
+        store.get("a")
+        clock.now = 30
+        store.get("b")
+        clock.now = 70
+        
+        assert store.purge_expired() == 1
+        assert "a" not in store
+        assert "b" in store
+
+
+class TestAgentMemory:
+    """测试记忆上限"""
+    
+    def test_message_cap(self):
+        """超过消息上限时丢弃最早的消息"""
+        memory = AgentMemory(max_messages=4)
+        for i in range(3):
+            memory.save_context({"input": f"问题{i}"}, {"output": f"回答{i}"})
+        
+        messages = memory.chat_history.messages
+        assert len(messages) == 4
+        assert messages[0].content == "问题1"
+    
+    def test_token_cap(self):
+        """超过token上限时丢弃最早的消息"""
+        memory = AgentMemory(max_tokens=10)
+        memory.save_context({"input": "一二三四五"}, {"output": "六七八九十"})
+        memory.save_context({"input": "甲乙丙"}, {"output": "丁戊己"})
+        
+        contents = [m.content for m in memory.chat_history.messages]
+        assert contents == ["甲乙丙", "丁戊己"]
+    
+    def test_compact_history_round_trip(self):
+        """普通消息以紧凑记录保存，带工具调用和元数据的消息转换前后保持一致"""
+        history = CompactChatMessageHistory(clock=lambda: 100.0)
+        calls = [{"name": "calculator", "args": {"expression": "1+1"}, "id": "c1"}]
+        tool_call = AIMessage(content="", tool_calls=calls)
+        messages = [
+            HumanMessage(content="计算1+1"),
+            tool_call,
+            ToolMessage(content="2", tool_call_id="c1"),
+            AIMessage(content="结果是2"),
+        ]
+        history.add_messages(messages)
+        
+        assert history.messages == messages
+        structured = [r.message is not None for r in history.records]
+        assert structured == [False, True, True, False]
+
+        memory = AgentMemory(history)
+        memory.summary = "之前的摘要"
+        restored = AgentMemory.loads(memory.dumps())
+        assert restored.chat_history.messages == messages
+        assert restored.summary == "之前的摘要"
+        assert restored.chat_history.records[0].role is history.records[0].role
+        assert restored.chat_history.records[0].created_at == 100.0
+
+
+class TestSessionSnapshot:
+    """测试进程内会话的快照"""
+    
+    def test_snapshot_round_trip(self, tmp_path, clock):
+        """快照恢复会话内容、摘要和空闲时间，跳过已过期的会话"""
+        path = str(tmp_path / "sessions.snapshot")
+        store = SessionStore(max_sessions=10, ttl_seconds=60, clock=clock)
+        store.get("old").save_context({"input": "早"}, {"output": "早上好"})
+        clock.now = 30
+        store.get("a").save_context({"input": "你好"}, {"output": "你好！"})
+        store.get("a").summary = "摘要"
+        store.get("b")
+        clock.now = 50
+        assert store.save_snapshot(path) == 3
+        
+        restored = SessionStore(max_sessions=10, ttl_seconds=45, clock=clock)
+        assert restored.load_snapshot(path) == 2
+        assert "old" not in restored
+        clock.now = 60
+        memory = restored.get("a")
+        assert [m.content for m in memory.chat_history.messages] == ["你好", "你好！"]
+        assert memory.summary == "摘要"
+        
+        clock.now = 80
+        assert restored.purge_expired() == 1
+        assert "b" not in restored and "a" in restored
+    
+    def test_rejects_foreign_file(self, tmp_path):
+        path = tmp_path / "sessions.snapshot"
+        assert SessionStore().load_snapshot(str(path)) == 0
+        path.write_bytes(b"not a snapshot")
+        with pytest.raises(ValueError):
+            SessionStore().load_snapshot(str(path))
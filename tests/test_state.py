@@ -0,0 +1,220 @@
+"""
+测试模块 - 测试共享状态后端
+"""
+
+import asyncio
+import json
+import threading
+
+from langchain_core.messages import AIMessage, HumanMessage, messages_to_dict
+from langgraph.graph import MessagesState, StateGraph
+
+from src.agent_1.cache import StateCacheBackend
+from src.agent_1.checkpoint import SQLiteCheckpointSaver
+from src.agent_1.session import SessionStore
+from src.agent_1.state import MemoryStateBackend, SQLiteStateBackend
+
+
+class CountingBackend(MemoryStateBackend):
+    """记录写入次数的进程内后端"""
+
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def set(self, key, value, ttl_seconds=None):
+        self.writes += 1
+        super().set(key, value, ttl_seconds)
+
+
+class ThreadRecordingBackend(MemoryStateBackend):
+    """记录每次读写所在线程的进程内后端"""
+
+    def __init__(self):
+        super().__init__()
+        self.threads = []
+
+    def get(self, key):
+        self.threads.append(threading.get_ident())
+        return super().get(key)
+
+    def compare_and_set(self, key, expected, value, ttl_seconds=None):
+        self.threads.append(threading.get_ident())
+        return super().compare_and_set(key, expected, value, ttl_seconds)
+
+
+class TestStateBackends:
+    """测试键值存储后端"""
+
+    def test_memory_ttl_and_capacity(self, clock):
+        """过期的键不可见，超过容量时淘汰最久未访问的键"""
+        backend = MemoryStateBackend(max_entries=2, clock=clock)
+        backend.set("a", b"1", ttl_seconds=10)
+        backend.set("b", b"2")
+        clock.now = 11
+        assert backend.get("a") is None
+
+        backend.set("c", b"3")
+        backend.set("d", b"4")
+        assert backend.get("b") is None
+        assert backend.count() == 2
+
+    def test_sqlite_shared_between_instances(self, tmp_path, clock):
+        """两个实例打开同一个文件时互相可见，模拟两个工作进程"""
+        path = str(tmp_path / "state.sqlite")
+        first = SQLiteStateBackend(path, clock=clock)
+        second = SQLiteStateBackend(path, clock=clock)
+
+        first.set("session:a", b"x")
+        first.set("llm:k", b"y", ttl_seconds=5)
+        assert second.get("session:a") == b"x"
+        assert second.count("session:") == 1
+
+        clock.now = 6
+        assert second.get("llm:k") is None
+        second.clear("session:")
+        assert first.get("session:a") is None
+        assert first.delete("missing") is False
+
+    def test_compare_and_set(self, tmp_path):
+        """只有当前值与预期值相同时才写入"""
+        sqlite = SQLiteStateBackend(str(tmp_path / "state.sqlite"))
+        for backend in (MemoryStateBackend(), sqlite):
+            assert backend.compare_and_set("k", None, b"1")
+            assert not backend.compare_and_set("k", None, b"2")
+            assert not backend.compare_and_set("k", b"0", b"2")
+            assert backend.compare_and_set("k", b"1", b"2")
+            assert backend.get("k") == b"2"
+
+
+class TestSharedSessions:
+    """测试保存在共享后端中的会话"""
+
+    def test_any_worker_serves_any_session(self, tmp_path):
+        """一个进程写入的消息和摘要，另一个进程可以继续使用"""
+        path = str(tmp_path / "state.sqlite")
+        worker_a = SessionStore(backend=SQLiteStateBackend(path))
+        worker_b = SessionStore(backend=SQLiteStateBackend(path))
+
+        memory = worker_a.get("s1")
+        memory.save_context({"input": "你好"}, {"output": "你好！"})
+        memory.summary = "之前的摘要"
+
+        memory = worker_b.get("s1")
+        assert [m.content for m in memory.chat_history.messages] == ["你好", "你好！"]
+        assert memory.summary == "之前的摘要"
+        assert len(worker_b) == 1 and "s1" in worker_b
+        assert worker_b.stats()["hits"] == 1
+
+        memory.clear()
+        memory = worker_a.get("s1")
+        assert memory.chat_history.messages == [] and memory.summary is None
+        assert worker_a.drop("s1") and "s1" not in worker_a
+
+    def test_interleaved_writers_keep_all_messages(self, tmp_path):
+        """两个进程交替写入同一会话时，各自追加的消息和摘要都不会丢失，裁剪不会重复"""
+        path = str(tmp_path / "state.sqlite")
+        worker_a = SessionStore(max_messages=4, backend=SQLiteStateBackend(path))
+        worker_b = SessionStore(max_messages=4, backend=SQLiteStateBackend(path))
+        worker_a.get("s1").save_context({"input": "问题零"}, {"output": "回答零"})
+
+        memory_a = worker_a.get("s1")
+        memory_b = worker_b.get("s1")
+        memory_a.save_context({"input": "问题一"}, {"output": "回答一"})
+        memory_b.save_context({"input": "问题二"}, {"output": "回答二"})
+        memory_a.summary = "摘要"
+        memory_a.save_context({"input": "问题三"}, {"output": "回答三"})
+        memory_b.save_context({"input": "问题四"}, {"output": "回答四"})
+
+        # 合并后可能暂时超过条数上限，下一轮对话时再裁剪
+        expected = ["问题二", "回答二", "问题三", "回答三", "问题四", "回答四"]
+        memory = worker_a.get("s1")
+        assert [m.content for m in memory.chat_history.messages] == expected
+        assert [m.content for m in memory_b.chat_history.messages] == expected
+        assert memory.summary == "摘要"
+
+        memory.save_context({"input": "问题五"}, {"output": "回答五"})
+        memory = worker_b.get("s1")
+        contents = [m.content for m in memory.chat_history.messages]
+        assert contents == expected[-2:] + ["问题五", "回答五"]
+
+    def test_save_context_writes_once(self):
+        """一轮对话（含裁剪）只写回一次"""
+        backend = CountingBackend()
+        store = SessionStore(max_messages=2, backend=backend)
+        memory = store.get("s1")
+        memory.save_context({"input": "问题一"}, {"output": "回答一"})
+        memory.save_context({"input": "问题二"}, {"output": "回答二"})
+
+        assert backend.writes == 2
+        messages = store.get("s1").chat_history.messages
+        assert [m.content for m in messages] == ["问题二", "回答二"]
+
+    def test_async_access_runs_off_event_loop(self):
+        """异步路径上加载和写回会话都在线程中执行，不占用事件循环"""
+        backend = ThreadRecordingBackend()
+        store = SessionStore(backend=backend)
+
+        async def chat():
+            memory = await store.aget("s1")
+            await memory.asave_context({"input": "你好"}, {"output": "你好！"})
+            return threading.get_ident(), list(backend.threads)
+
+        loop_thread, threads = asyncio.run(chat())
+        assert len(threads) >= 2 and loop_thread not in threads
+        messages = store.get("s1").chat_history.messages
+        assert [m.content for m in messages] == ["你好", "你好！"]
+
+    def test_reads_legacy_json_sessions(self):
+        """旧版本以JSON写入的会话仍能读取，之后以快照格式写回"""
+        backend = MemoryStateBackend()
+        messages = [HumanMessage(content="你好"), AIMessage(content="你好！")]
+        legacy = {"messages": messages_to_dict(messages), "summary": "摘要"}
+        data = json.dumps(legacy, ensure_ascii=False).encode("utf-8")
+        backend.set("session:s1", data)
+        store = SessionStore(backend=backend)
+
+        memory = store.get("s1")
+        assert [m.content for m in memory.chat_history.messages] == ["你好", "你好！"]
+        assert memory.summary == "摘要"
+        memory.save_context({"input": "再见"}, {"output": "再见！"})
+        assert not backend.get("session:s1").startswith(b"{")
+        assert len(store.get("s1").chat_history.messages) == 4
+
+
+class TestSharedCaches:
+    """测试缓存与检查点的多进程共享"""
+
+    def test_llm_cache_on_state_backend(self):
+        """LLM响应缓存可以使用共享状态后端"""
+        cache = StateCacheBackend(MemoryStateBackend())
+        cache.set("k", [], ttl_seconds=None)
+        assert cache.get("k") == []
+        assert len(cache) == 1
+        cache.clear()
+        assert cache.get("k") is None
+
+    def test_shared_checkpointer_sees_other_process(self, tmp_path):
+        """共享模式下每次访问都读取其他进程写入的检查点"""
+        workflow = StateGraph(MessagesState)
+        workflow.add_node(
+            "agent",
+            lambda state: {
+                "messages": [AIMessage(content=str(len(state["messages"])))]
+            },
+        )
+        workflow.set_entry_point("agent")
+        path = str(tmp_path / "checkpoints.sqlite")
+        first = SQLiteCheckpointSaver(path, shared=True, write_behind=True)
+        second = SQLiteCheckpointSaver(path, shared=True)
+        assert first.write_behind is False
+
+        config = {"configurable": {"thread_id": "t1"}}
+        app_a = workflow.compile(checkpointer=first)
+        app_b = workflow.compile(checkpointer=second)
+        app_a.invoke({"messages": [("user", "一")]}, config)
+        app_b.invoke({"messages": [("user", "二")]}, config)
+        result = app_a.invoke({"messages": [("user", "三")]}, config)
+        assert result["messages"][-1].content == "5"
+        first.close()
+        second.close()
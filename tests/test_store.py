@@ -0,0 +1,181 @@
+"""
+测试模块 - 测试长期记忆存储
+"""
+
+import threading
+
+import pytest
+from langgraph.store.base import PutOp
+from langgraph.store.memory import InMemoryStore
+
+from src.agent_1.store import MemmapStore, default_index
+
+
+@pytest.fixture
+def index():
+    config = default_index()
+    config["fields"] = ["text"]
+    return config
+
+
+def fill(store):
+    store.put(("users", "1"), "a", {"text": "北京天气晴朗", "n": 1})
+    store.put(("users", "1"), "b", {"text": "机器学习入门", "n": 2})
+    store.put(("users", "2"), "c", {"text": "上海下雨", "n": 3})
+    store.put(("users", "1"), "a", {"text": "北京天气多云", "n": 4})
+    store.put(("docs",), "x", {"other": "没有向量字段"})
+    store.delete(("users", "1"), "b")
+
+
+def summary(results):
+    return [
+        (r.key, r.value, None if r.score is None else round(r.score, 4))
+        for r in results
+    ]
+
+
+class TestMemmapStore:
+    """测试MemmapStore的读写、检索、持久化和压缩"""
+
+    def test_matches_in_memory_store(self, tmp_path, index):
+        """读写、相似度检索、过滤和命名空间列表与InMemoryStore一致"""
+        store = MemmapStore(str(tmp_path / "store"), index=index, compact_interval=0)
+        reference = InMemoryStore(index=index)
+        for s in (store, reference):
+            fill(s)
+
+        assert store.get(("users", "1"), "a").value == {"text": "北京天气多云", "n": 4}
+        assert store.get(("users", "1"), "b") is None
+        for kwargs in (
+            {"query": "北京天气"},
+            {"query": "北京天气", "limit": 1, "offset": 1},
+            {"query": "上海", "filter": {"n": {"$lt": 4}}},
+            {"filter": {"n": 4}},
+        ):
+            expected = summary(reference.search(("users",), **kwargs))
+            assert summary(store.search(("users",), **kwargs)) == expected
+        expected = summary(reference.search((), limit=2, offset=1))
+        assert summary(store.search((), limit=2, offset=1)) == expected
+        assert store.list_namespaces() == reference.list_namespaces()
+        assert store.list_namespaces(prefix=("users",), max_depth=1) == [("users",)]
+
+    def test_reopen(self, tmp_path, index):
+        """重新打开后条目、时间戳和向量都能恢复"""
+        path = str(tmp_path / "store")
+        store = MemmapStore(path, index=index, compact_interval=0)
+        fill(store)
+        created = store.get(("users", "1"), "a").created_at
+        store.close()
+
+        restored = MemmapStore(path, index=index, compact_interval=0)
+        assert restored.stats()["items"] == 3
+        assert restored.get(("users", "1"), "a").created_at == created
+        assert restored.search(("users",), query="北京天气", limit=1)[0].key == "a"
+
+    def test_truncates_torn_tail(self, tmp_path, index):
+        """写入中途崩溃留下的半行记录被丢弃，之前的条目和之后的写入都正常"""
+        path = str(tmp_path / "store")
+        store = MemmapStore(path, index=index, compact_interval=0)
+        fill(store)
+        store.close()
+        log = tmp_path / "store.jsonl"
+        size = log.stat().st_size
+        with open(log, "ab") as f:
+            f.write(b'{"ns": ["users", "1"], "key": "a", "val')
+
+        restored = MemmapStore(path, index=index, compact_interval=0)
+        assert log.stat().st_size == size
+        assert restored.stats()["items"] == 3
+        assert restored.get(("users", "1"), "a").value["n"] == 4
+        restored.put(("users", "1"), "d", {"text": "新记录"})
+        restored.close()
+
+        reopened = MemmapStore(path, index=index, compact_interval=0)
+        assert reopened.get(("users", "1"), "d").value == {"text": "新记录"}
+        reopened.close()
+
+    def test_overwrite_keeps_old_vector_until_logged(self, tmp_path, index):
+        """覆盖条目时新向量不写入旧条目的位置，日志追加前旧记录仍然完整"""
+        store = MemmapStore(str(tmp_path / "store"), index=index, compact_interval=0)
+        store.put(("users",), "a", {"text": "北京天气晴朗"})
+        old = store._items[("users",)]["a"].slots
+        store.put(("users",), "a", {"text": "上海下雨"})
+        assert not set(store._items[("users",)]["a"].slots) & set(old)
+        store.put(("users",), "b", {"text": "机器学习"})
+        assert store._items[("users",)]["b"].slots == old
+        store.close()
+
+    def test_reindex_when_embedder_changes(self, tmp_path, index):
+        """嵌入模型变化后重新生成向量，条目保持不变"""
+        path = str(tmp_path / "store")
+        store = MemmapStore(path, index=index, embedding_name="old", compact_interval=0)
+        fill(store)
+        store.close()
+
+        restored = MemmapStore(
+            path, index=index, embedding_name="new", compact_interval=0
+        )
+        assert restored.stats()["vectors"] == 2
+        assert restored.search(("users",), query="北京天气", limit=1)[0].key == "a"
+
+    def test_compact_while_writing(self, tmp_path, index):
+        """压缩时并发写入的条目不丢失，释放的向量位置被复用"""
+        path = str(tmp_path / "store")
+        store = MemmapStore(path, index=index, compact_interval=0)
+        puts = [PutOp(("mem",), f"k{i}", {"text": f"记录{i}"}) for i in range(200)]
+        for _ in range(5):
+            store.batch(puts)
+        # 旧向量在整批写入日志后才释放，一批覆盖需要新旧两份位置，之后的批次复用
+        assert store.stats()["capacity"] == 512
+        assert store.dead_ratio() > 0.7
+
+        stop = threading.Event()
+
+        def writer():
+            i = 0
+            while not stop.is_set():
+                store.put(("mem", "w"), f"w{i % 50}", {"text": f"并发{i}"})
+                i += 1
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            result = store.compact()
+        finally:
+            stop.set()
+            thread.join()
+        assert result["after"] < result["before"]
+        store.close()
+
+        restored = MemmapStore(path, index=index, compact_interval=0)
+        assert restored.get(("mem",), "k199").value == {"text": "记录199"}
+        assert restored.search(("mem",), query="记录42", limit=1)[0].key == "k42"
+        written = restored.search(("mem", "w"), limit=100)
+        assert restored.stats()["items"] == 200 + len(written)
+
+    @pytest.mark.asyncio
+    async def test_async(self, tmp_path, index):
+        store = MemmapStore(str(tmp_path / "store"), index=index, compact_interval=0)
+        await store.aput(("users",), "a", {"text": "北京天气"})
+        assert (await store.aget(("users",), "a")).value == {"text": "北京天气"}
+        results = await store.asearch(("users",), query="北京天气")
+        assert results[0].score == pytest.approx(1.0)
+
+    def test_single_process(self, tmp_path):
+        """同一路径不能被打开两次"""
+        path = str(tmp_path / "store")
+        store = MemmapStore(path, compact_interval=0)
+        with pytest.raises(RuntimeError):
+            MemmapStore(path, compact_interval=0)
+        store.close()
+        MemmapStore(path, compact_interval=0).close()
+
+    def test_multi_worker_requires_memory_store(self, monkeypatch):
+        """多进程启动时拒绝只能由一个进程打开的memmap存储"""
+        from src.agent_1 import server
+        from src.agent_1.config import settings
+
+        monkeypatch.setattr(settings, "workers", 2)
+        monkeypatch.setattr(settings, "graph_store", "memmap")
+        with pytest.raises(ValueError, match="GRAPH_STORE=memory"):
+            server.run()
@@ -0,0 +1,245 @@
+"""
+测试模块 - 测试工具超时和并发限制
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.tools import ToolException, tool
+from langgraph.graph import MessagesState, StateGraph
+from langgraph.prebuilt import ToolNode
+
+from src.agent_1.cancellation import RequestCancelled
+from src.agent_1.tool_wrappers import (
+    CachedTool,
+    ConcurrencyLimiter,
+    LimitedTool,
+    ToolResultCache,
+)
+
+
+@tool
+def slow_echo(text: str) -> str:
+    """等待一段时间后原样返回文本"""
+    time.sleep(0.2)
+    return f"echo: {text}"
+
+
+class TestLimitedTool:
+    """测试带限制的工具包装器"""
+    
+    def test_schema_is_preserved(self):
+        """包装后的工具对模型暴露相同的名称和参数"""
+        limited = LimitedTool(slow_echo, limiter=ConcurrencyLimiter(2))
+        assert limited.name == "slow_echo"
+        assert limited.tool_call_schema.model_json_schema() == (
+            slow_echo.tool_call_schema.model_json_schema()
+        )
+        assert limited.invoke({"text": "hi"}) == "echo: hi"
+    
+    def test_sync_timeout(self):
+        """同步调用超时返回错误说明"""
+        limited = LimitedTool(slow_echo, timeout=0.05, limiter=ConcurrencyLimiter(2))
+        assert "工具调用超时" in limited.invoke({"text": "hi"})
+    
+    def test_timed_out_call_keeps_slot(self):
+        """超时的同步调用仍在运行时继续占用并发名额，返回后才释放"""
+        release = threading.Event()
+
+        @tool
+        def blocking(text: str) -> str:
+            """等待外部信号后返回"""
+            release.wait(5)
+            return text
+
+        limiter = ConcurrencyLimiter(1)
+        limited = LimitedTool(blocking, timeout=0.05, limiter=limiter)
+        assert "工具调用超时" in limited.invoke({"text": "hi"})
+        assert not limiter.thread_semaphore.acquire(blocking=False)
+
+        release.set()
+        assert limiter.thread_semaphore.acquire(timeout=1)
+        limiter.thread_semaphore.release()
+    
+    @pytest.mark.asyncio
+    async def test_async_timeout(self):
+        """异步调用超时返回错误说明"""
+        limited = LimitedTool(slow_echo, timeout=0.05, limiter=ConcurrencyLimiter(2))
+        assert "工具调用超时" in await limited.ainvoke({"text": "hi"})
+    
+    @pytest.mark.asyncio
+    async def test_tool_node_runs_calls_concurrently_in_order(self):
+        """ToolNode并发执行多个工具调用并保持原始顺序"""
+        limited = LimitedTool(slow_echo, timeout=5, limiter=ConcurrencyLimiter(4))
+        message = AIMessage(
+            content="",
+            tool_calls=[
+                {"name": "slow_echo", "args": {"text": str(i)}, "id": f"call_{i}"}
+                for i in range(4)
+            ],
+        )
+        
+        workflow = StateGraph(MessagesState)
+        workflow.add_node("tools", ToolNode([limited]))
+        workflow.set_entry_point("tools")
+        graph = workflow.compile()
+        
+        start = time.monotonic()
+        result = await graph.ainvoke({"messages": [message]})
+        elapsed = time.monotonic() - start
+        
+        contents = [m.content for m in result["messages"][1:]]
+        assert contents == [f"echo: {i}" for i in range(4)]
+        assert elapsed < 0.6
+    
+    @pytest.mark.asyncio
+    async def test_global_concurrency_limit(self):
+        """全局并发上限限制同时执行的工具数"""
+        limited = LimitedTool(slow_echo, timeout=5, limiter=ConcurrencyLimiter(1))
+        
+        start = time.monotonic()
+        await asyncio.gather(*[limited.ainvoke({"text": str(i)}) for i in range(3)])
+        assert time.monotonic() - start >= 0.55
+
+
+class CountingTool:
+    """记录真实执行次数的工具"""
+    
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.calls = 0
+        
+        @tool
+        def search(query: str) -> str:
+            """搜索"""
+            self.calls += 1
+            time.sleep(delay)
+            if fail:
+                raise ToolException("服务不可用")
+            return f"结果: {query}"
+        
+        self.tool = search
+
+
+class TestCachedTool:
+    """测试工具结果缓存"""
+    
+    def test_normalized_arguments_share_entry(self):
+        """参数规范化后相同的调用命中同一条缓存"""
+        counting = CountingTool()
+        cache = ToolResultCache()
+        cached = CachedTool(counting.tool, ttl=60, cache=cache)
+        
+        assert cached.invoke({"query": "北京 天气"}) == "结果: 北京 天气"
+        assert cached.invoke({"query": "  北京   天气 "}) == "结果: 北京 天气"
+        assert counting.calls == 1
+        
+        stats = cache.stats()["tools"]["search"]
+        assert stats["hits"] == 1 and stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+    
+    def test_ttl_expiry(self, clock):
+        """超过有效期后重新执行"""
+        counting = CountingTool()
+        cached = CachedTool(counting.tool, ttl=60, cache=ToolResultCache(clock=clock))
+        
+        cached.invoke({"query": "a"})
+        clock.now = 59
+        cached.invoke({"query": "a"})
+        clock.now = 61
+        cached.invoke({"query": "a"})
+        assert counting.calls == 2
+    
+    def test_negative_caching(self, clock):
+        """失败结果只在短时间内缓存"""
+        counting = CountingTool(fail=True)
+        cache = ToolResultCache(negative_ttl=10, clock=clock)
+        cached = CachedTool(counting.tool, ttl=60, cache=cache)
+        
+        for _ in range(2):
+            with pytest.raises(ToolException):
+                cached.invoke({"query": "a"})
+        assert counting.calls == 1
+        assert cache.stats()["tools"]["search"]["negative_hits"] == 1
+        
+        clock.now = 11
+        with pytest.raises(ToolException):
+            cached.invoke({"query": "a"})
+        assert counting.calls == 2
+    
+    def test_sync_single_flight(self):
+        """并发的相同同步调用只执行一次"""
+        counting = CountingTool(delay=0.2)
+        cache = ToolResultCache()
+        cached = CachedTool(counting.tool, ttl=60, cache=cache)
+        
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(cached.invoke({"query": "a"}))
+            )
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert results == ["结果: a"] * 4
+        assert counting.calls == 1
+        assert cache.stats()["tools"]["search"]["coalesced"] == 3
+
+    def test_sync_leader_cancellation_releases_followers(self):
+        """负责执行的调用者被取消时，等待同一结果的调用者随之返回，取消不写入失败缓存"""
+        started, release = threading.Event(), threading.Event()
+
+        @tool
+        def search(query: str) -> str:
+            """搜索"""
+            started.set()
+            release.wait(1)
+            raise RequestCancelled("请求已取消")
+
+        cache = ToolResultCache()
+        cached = CachedTool(search, ttl=60, cache=cache)
+        errors = []
+
+        def call():
+            try:
+                cached.invoke({"query": "a"})
+            except BaseException as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=call, daemon=True)
+        leader.start()
+        started.wait(1)
+        follower = threading.Thread(target=call, daemon=True)
+        follower.start()
+        for _ in range(100):
+            if cache.stats()["tools"]["search"]["coalesced"]:
+                break
+            time.sleep(0.01)
+        release.set()
+        leader.join(1)
+        follower.join(1)
+
+        assert not follower.is_alive()
+        assert [type(e) for e in errors] == [RequestCancelled] * 2
+        assert cache.lookup("search", cache.key("search", {"query": "a"})) is None
+    
+    @pytest.mark.asyncio
+    async def test_async_single_flight_survives_caller_timeout(self):
+        """并发的相同异步调用只执行一次，调用者超时不会取消共享的执行"""
+        counting = CountingTool(delay=0.2)
+        cache = ToolResultCache()
+        cached = CachedTool(counting.tool, ttl=60, cache=cache)
+        limited = LimitedTool(cached, timeout=0.05, limiter=ConcurrencyLimiter(4))
+        
+        assert "工具调用超时" in await limited.ainvoke({"query": "a"})
+        results = await asyncio.gather(
+            *[cached.ainvoke({"query": "a"}) for _ in range(3)]
+        )
+        assert results == ["结果: a"] * 3
+        assert counting.calls == 1
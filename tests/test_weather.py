@@ -0,0 +1,193 @@
+"""
+测试模块 - 测试天气查询
+"""
+
+import threading
+
+import httpx
+import pytest
+
+from src.agent_1 import http_clients, weather
+from src.agent_1.tools import get_weather
+from src.agent_1.weather import (
+    CityIndex,
+    Observation,
+    OpenMeteoProvider,
+    StubWeatherProvider,
+    WeatherCache,
+    WeatherService,
+)
+
+
+class TestCityIndex:
+    """测试城市名规范化"""
+
+    @pytest.mark.parametrize("text, names", [
+        ("北京", ["北京"]),
+        ("北京市", ["北京"]),
+        ("bei jing", ["北京"]),
+        ("Peking", ["北京"]),
+        ("京", ["北京"]),
+        ("Xi'an", ["西安"]),
+        ("HONG KONG", ["香港"]),
+        ("北京、上海和Guangzhou", ["北京", "上海", "广州"]),
+        ("北京上海", ["北京", "上海"]),
+        ("Beijing and Shanghai, 北京", ["北京", "上海"]),
+        ("呼和浩特和乌鲁木齐", ["呼和浩特", "乌鲁木齐"]),
+    ])
+    def test_parse(self, text, names):
+        assert [city.name for _, city in CityIndex().parse(text)] == names
+
+    def test_unknown_city(self):
+        assert CityIndex().parse("北京, 不存在的城市") == [
+            ("北京", CityIndex().resolve("北京")),
+            ("不存在的城市", None),
+        ]
+
+
+class TestWeatherService:
+    """测试批量查询和观测缓存"""
+
+    def test_multi_city_single_request(self):
+        """多个城市合并为一次请求，之后的查询命中缓存"""
+        provider = StubWeatherProvider()
+        service = WeatherService(provider)
+        result = service.query("北京、上海、Guangzhou、拉萨")
+        assert provider.calls == [["北京", "上海", "广州", "拉萨"]]
+        assert result.splitlines() == [
+            "北京的天气: 晴天，温度25°C",
+            "上海的天气: 多云，温度22°C",
+            "广州的天气: 雨天，温度28°C",
+            "抱歉，暂时没有拉萨的天气信息",
+        ]
+
+        service.query("shanghai")
+        lines = service.query("北京,深圳").splitlines()
+        assert lines[1] == "深圳的天气: 晴天，温度26°C"
+        assert provider.calls[1:] == [["深圳"]]
+
+    def test_expiry_follows_observation_interval(self, clock):
+        """观测缓存到下一次观测发布之后"""
+        provider = StubWeatherProvider()
+        provider.fetch = lambda cities: {
+            city.name: Observation(
+                city.name, "晴", 20, observed_at=clock.now - 300, interval=900
+            )
+            for city in cities
+        }
+        service = WeatherService(provider, cache=WeatherCache(clock=clock), clock=clock)
+        service.query("北京")
+        assert service.cache.get("stub:北京") is not None
+
+        clock.now += 600 + weather.OBSERVATION_GRACE_SECONDS - 1
+        assert service.cache.get("stub:北京") is not None
+        clock.now += 1
+        assert service.cache.get("stub:北京") is None
+
+    def test_disk_cache(self, tmp_path):
+        """重启后从SQLite读取未过期的观测"""
+        path = str(tmp_path / "weather.sqlite")
+        WeatherService(StubWeatherProvider(), cache=WeatherCache(path)).query("北京")
+
+        provider = StubWeatherProvider()
+        service = WeatherService(provider, cache=WeatherCache(path))
+        assert service.query("北京") == "北京的天气: 晴天，温度25°C"
+        assert provider.calls == []
+        assert service.cache.stats()["disk_hits"] == 1
+
+    def test_provider_failure(self):
+        """数据源出错时返回说明，不缓存"""
+        def fail(cities):
+            raise httpx.ConnectError("connection refused")
+
+        provider = StubWeatherProvider()
+        provider.fetch = fail
+        service = WeatherService(provider)
+        assert "获取北京的天气信息失败" in service.query("北京")
+        assert service.cache.stats()["entries"] == 0
+
+    def test_failure_keeps_cached_cities(self):
+        """数据源出错时已缓存的城市照常返回，只有未缓存的城市说明失败"""
+        provider = StubWeatherProvider()
+        service = WeatherService(provider)
+        service.query("北京")
+
+        def fail(cities):
+            raise httpx.ConnectError("connection refused")
+
+        provider.fetch = fail
+        assert service.query("北京、上海、拉萨").splitlines() == [
+            "北京的天气: 晴天，温度25°C",
+            "抱歉，获取上海的天气信息失败: connection refused",
+            "抱歉，获取拉萨的天气信息失败: connection refused",
+        ]
+
+    @pytest.mark.asyncio
+    async def test_async_disk_cache_runs_off_event_loop(self, tmp_path):
+        """异步查询时SQLite缓存的读写在线程中执行，出错时同样保留已缓存的城市"""
+        provider = StubWeatherProvider()
+        cache = WeatherCache(str(tmp_path / "weather.sqlite"))
+        service = WeatherService(provider, cache=cache)
+        threads = []
+        get, set_ = cache.get, cache.set
+
+        def recording(func):
+            def wrapper(*args):
+                threads.append(threading.get_ident())
+                return func(*args)
+            return wrapper
+
+        cache.get, cache.set = recording(get), recording(set_)
+        assert await service.aquery("北京") == "北京的天气: 晴天，温度25°C"
+        assert len(threads) == 2 and threading.get_ident() not in threads
+
+        async def fail(cities):
+            raise httpx.ConnectError("connection refused")
+
+        provider.afetch = fail
+        assert (await service.aquery("北京和上海")).splitlines() == [
+            "北京的天气: 晴天，温度25°C",
+            "抱歉，获取上海的天气信息失败: connection refused",
+        ]
+
+
+class TestOpenMeteoProvider:
+    """测试Open-Meteo数据源"""
+
+    def forecast(self, request: httpx.Request) -> httpx.Response:
+        latitudes = request.url.params["latitude"].split(",")
+        items = [
+            {"current": {
+                "time": 1_700_000_100, "interval": 900, "temperature_2m": 20.5 + i,
+                "relative_humidity_2m": 40, "weather_code": 3, "wind_speed_10m": 7.2,
+            }}
+            for i, _ in enumerate(latitudes)
+        ]
+        return httpx.Response(200, json=items if len(items) > 1 else items[0])
+
+    def test_batched_request(self, monkeypatch):
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            return self.forecast(request)
+
+        client = httpx.Client(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(http_clients, "_http_client", client)
+        service = WeatherService(OpenMeteoProvider())
+        assert service.query("北京和上海").splitlines() == [
+            "北京的天气: 阴，温度20.5°C，湿度40%，风速7.2km/h",
+            "上海的天气: 阴，温度21.5°C，湿度40%，风速7.2km/h",
+        ]
+        assert len(requests) == 1
+        assert requests[0].url.params["longitude"] == "116.407,121.474"
+
+    @pytest.mark.asyncio
+    async def test_async_tool(self, monkeypatch):
+        """异步调用工具时使用异步客户端"""
+        client = httpx.AsyncClient(transport=httpx.MockTransport(self.forecast))
+        monkeypatch.setattr(http_clients, "_async_http_client", client)
+        service = WeatherService(OpenMeteoProvider())
+        monkeypatch.setattr(weather, "_weather_service", service)
+        answer = await get_weather.ainvoke({"city": "Tokyo"})
+        assert answer == "东京的天气: 阴，温度20.5°C，湿度40%，风速7.2km/h"